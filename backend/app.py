@@ -117,6 +117,14 @@ def setup_scheduler(app: Flask) -> BackgroundScheduler:
         trigger="interval",
         hours=config.scheduler.UPDATE_INTERVAL_HOURS
     )
+    
+    # 選用：定期重新驗證圖片 URL 快取
+    if config.scheduler.PHOTO_REVERIFY_INTERVAL_HOURS > 0:
+        scheduler.add_job(
+            func=ranking_service.crawler.reverify_photo_urls,
+            trigger="interval",
+            hours=config.scheduler.PHOTO_REVERIFY_INTERVAL_HOURS
+        )
     scheduler.start()
     
     return scheduler
@@ -0,0 +1,159 @@
+"""
+動作分類模型的 TFLite 與 Keras 比較
+- 一致性：同一批輸入的最大/平均機率差異與預測類別一致比例
+- 延遲：單筆推論 (即時分析每一拍呼叫一次) 的平均、p50、p95，
+  Keras 分為原本的 model.predict 與沒有 .tflite 時的後備 (KerasClassifier，tf.function)
+- 載入：執行環境載入耗時與記憶體峰值 (TFLite 先量測，此時尚未載入 TensorFlow)
+
+使用方式：
+    python benchmark_classifier.py --model pose_classifier_model.h5 --scaler scaler.pkl --data sequences.npy
+    python benchmark_classifier.py --export dynamic   # 先由 .h5 重新匯出再比較
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+from typing import Callable, Dict, Optional
+
+import numpy as np
+
+from services.classifier_runtime import KerasClassifier, TFLiteClassifier, tflite_path_for
+
+
+def _max_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS 回傳 bytes，Linux 回傳 KB
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def load_inputs(shape, data_path: Optional[str] = None, scaler_path: Optional[str] = None,
+                samples: int = 200, seed: int = 0) -> np.ndarray:
+    """
+    比較用的輸入序列
+
+    Args:
+        shape: 單筆輸入形狀 (幀, 特徵)
+        data_path: (筆數, 幀, 特徵) 未標準化的 .npy；未指定時使用標準常態亂數 (等同標準化後的分布)
+        scaler_path: 對 data_path 套用的標準化器
+
+    Returns:
+        (筆數, 幀, 特徵) float32
+    """
+    if not data_path:
+        return np.random.default_rng(seed).standard_normal((samples,) + tuple(shape)).astype(np.float32)
+    X = np.load(data_path)[:samples].astype(np.float32)
+    if scaler_path and os.path.exists(scaler_path):
+        import joblib
+        scaler = joblib.load(scaler_path)
+        X = scaler.transform(X.reshape(-1, X.shape[-1])).reshape(X.shape).astype(np.float32)
+    return X
+
+
+def measure_latency(predict: Callable, X: np.ndarray, repeat: int = 200, warmup: int = 10) -> Dict:
+    """單筆推論延遲 (毫秒)"""
+    for i in range(warmup):
+        predict(X[i % len(X)][np.newaxis])
+    times = []
+    for i in range(repeat):
+        sample = X[i % len(X)][np.newaxis]
+        start = time.perf_counter()
+        predict(sample)
+        times.append((time.perf_counter() - start) * 1000)
+    times = np.array(times)
+    return {
+        'mean_ms': round(float(times.mean()), 3),
+        'p50_ms': round(float(np.percentile(times, 50)), 3),
+        'p95_ms': round(float(np.percentile(times, 95)), 3)
+    }
+
+
+def benchmark(model_path: str, scaler_path: Optional[str] = None, data_path: Optional[str] = None,
+              samples: int = 200, repeat: int = 200, export: Optional[str] = None,
+              num_threads: int = 1) -> Dict:
+    """
+    比較 .tflite 與 .h5
+
+    Args:
+        export: 先以此量化方式由 .h5 重新匯出 .tflite (none / dynamic / int8)
+
+    Returns:
+        載入、延遲與一致性結果
+    """
+    from model_export import compare_outputs
+
+    lite_path = tflite_path_for(model_path)
+    report: Dict = {'model': model_path, 'tflite': lite_path, 'num_threads': num_threads}
+
+    if export is None:
+        if not os.path.exists(lite_path):
+            raise FileNotFoundError(f"找不到 {lite_path}，請先訓練模型或使用 --export")
+        # TensorFlow 尚未載入時量測 TFLite 的載入成本
+        rss_before = _max_rss_mb()
+        start = time.perf_counter()
+        lite = TFLiteClassifier(lite_path, num_threads)
+        report['tflite_load'] = {'seconds': round(time.perf_counter() - start, 3),
+                                 'max_rss_mb': round(_max_rss_mb() - rss_before, 1)}
+
+    rss_before = _max_rss_mb()
+    start = time.perf_counter()
+    keras = KerasClassifier(model_path)
+    keras_model = keras.model
+    report['keras_load'] = {'seconds': round(time.perf_counter() - start, 3),
+                            'max_rss_mb': round(_max_rss_mb() - rss_before, 1)}
+
+    X = load_inputs(keras_model.input_shape[1:], data_path, scaler_path, samples)
+    if export is not None:
+        from model_export import export_tflite
+        export_tflite(keras_model, lite_path, export, representative_data=X)
+        lite = TFLiteClassifier(lite_path, num_threads)
+        report['quantization'] = export
+    report['tflite_size_kb'] = round(os.path.getsize(lite_path) / 1024, 1)
+
+    reference = keras.predict(X)
+    report['parity'] = compare_outputs(reference, lite.predict(X))
+    report['latency'] = {
+        'keras_predict': measure_latency(lambda x: keras_model.predict(x, verbose=0), X, repeat),
+        'keras_function': measure_latency(keras.predict, X, repeat),
+        'tflite': measure_latency(lite.predict, X, repeat)
+    }
+    return report
+
+
+def print_report(report: Dict):
+    parity = report['parity']
+    print(f"模型: {report['model']} → {report['tflite']} ({report['tflite_size_kb']} KB)")
+    for name in ('tflite_load', 'keras_load'):
+        if name in report:
+            print(f"{name:<14} {report[name]['seconds']:>8.3f} 秒  記憶體 +{report[name]['max_rss_mb']:.0f} MB")
+    print(f"一致性 ({parity['samples']} 筆): 最大差異 {parity['max_abs_diff']:.2e}，"
+          f"平均差異 {parity['mean_abs_diff']:.2e}，預測一致 {parity['agreement']:.1%}")
+    print(f"{'單筆推論':<14}{'平均':>10}{'p50':>10}{'p95':>10}   (毫秒)")
+    baseline = report['latency']['keras_predict']['mean_ms']
+    for name, row in report['latency'].items():
+        print(f"{name:<14}{row['mean_ms']:>10.3f}{row['p50_ms']:>10.3f}{row['p95_ms']:>10.3f}"
+              f"   {baseline / max(row['mean_ms'], 1e-9):.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='比較動作分類模型的 TFLite 與 Keras 推論')
+    parser.add_argument('--model', type=str, default='pose_classifier_model.h5', help='Keras 模型')
+    parser.add_argument('--scaler', type=str, default='scaler.pkl', help='套用於 --data 的標準化器')
+    parser.add_argument('--data', type=str, default=None,
+                        help='(筆數, 幀, 特徵) 的 .npy 序列；未指定時使用亂數')
+    parser.add_argument('--samples', type=int, default=200, help='比對一致性的筆數')
+    parser.add_argument('--repeat', type=int, default=200, help='量測延遲的推論次數')
+    parser.add_argument('--export', type=str, default=None, choices=['none', 'dynamic', 'int8'],
+                        help='先由 .h5 重新匯出 .tflite')
+    parser.add_argument('--threads', type=int, default=1, help='TFLite 推論執行緒數')
+    parser.add_argument('--json', type=str, default=None, help='將結果另存為 JSON')
+    args = parser.parse_args()
+
+    results = benchmark(args.model, args.scaler, args.data, args.samples, args.repeat,
+                        args.export, args.threads)
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n結果已儲存: {args.json}")
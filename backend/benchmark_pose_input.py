@@ -0,0 +1,176 @@
+"""
+姿勢估計輸入前處理的效能與準確度比較
+以原始解析度的估計結果為基準，比較不同縮小長邊與是否裁切選手範圍時的：
+- 每幀耗時 (前處理 + 姿勢估計，不含影片解碼)
+- 偵測率與關鍵點誤差 (相對畫面對角線)
+- PCK：誤差小於對角線 2% 的關鍵點比例
+
+使用方式：
+    python benchmark_pose_input.py uploads/clips/IhF6x9PyUp0 --sizes 0 960 640 480 320
+"""
+import os
+import time
+import json
+import argparse
+from typing import Callable, Dict, List
+
+import numpy as np
+import cv2
+
+from pose_input import PoseInputPreprocessor
+from pose_sampling import pose_landmarks_array
+
+# 誤差小於畫面對角線此比例視為正確
+PCK_THRESHOLD = 0.02
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+
+
+def default_pose_factory():
+    """與 PoseExtractor 相同設定的 MediaPipe Pose (每個組合使用新的實例，避免沿用追蹤狀態)"""
+    import mediapipe as mp
+    return mp.solutions.pose.Pose(
+        min_detection_confidence=0.5,
+        min_tracking_confidence=0.5,
+        model_complexity=1
+    )
+
+
+def load_frames(video_path: str, max_frames: int = 300) -> List[np.ndarray]:
+    """預先解碼影片，計時時不包含解碼"""
+    cap = cv2.VideoCapture(video_path)
+    frames = []
+    while cap.isOpened() and len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def run_config(frames: List[np.ndarray], target_size: int, roi: bool,
+               pose_factory: Callable = default_pose_factory) -> Dict:
+    """
+    以指定的前處理設定估計所有幀
+
+    Returns:
+        {'landmarks': (幀, 33, 4) (沒有偵測到人為 NaN), 'ms_per_frame': 平均耗時, 'preprocessor': 統計}
+    """
+    pose = pose_factory()
+    preprocessor = PoseInputPreprocessor(target_size, roi)
+    landmarks = []
+    start = time.perf_counter()
+    for frame in frames:
+        landmarks.append(pose_landmarks_array(preprocessor.process(pose, frame)))
+    elapsed = time.perf_counter() - start
+    if hasattr(pose, 'close'):
+        pose.close()
+    return {
+        'landmarks': np.stack(landmarks) if landmarks else np.zeros((0, 33, 4), dtype=np.float32),
+        'ms_per_frame': elapsed * 1000 / max(len(frames), 1),
+        'preprocessor': preprocessor.stats()
+    }
+
+
+def compare(reference: np.ndarray, landmarks: np.ndarray, width: int, height: int) -> Dict:
+    """
+    與基準結果比較 (只計算基準可見度 > 0.5 的關鍵點)
+
+    Returns:
+        偵測率、平均誤差與 PCK (誤差以畫面對角線的百分比表示)
+    """
+    diagonal = float(np.hypot(width, height))
+    ref_detected = ~np.isnan(reference[:, 0, 0])
+    detected = ~np.isnan(landmarks[:, 0, 0])
+    both = ref_detected & detected
+    result = {
+        'detection_rate': round(float(detected.mean()), 3) if len(detected) else 0.0,
+        'missed': int((ref_detected & ~detected).sum()),
+        'mean_error_pct': None,
+        'pck': None
+    }
+    if not both.any():
+        return result
+    ref, ours = reference[both], landmarks[both]
+    visible = ref[:, :, 3] > 0.5
+    offset = (ours[:, :, :2] - ref[:, :, :2]) * [width, height]
+    error = np.linalg.norm(offset, axis=2)[visible] / diagonal
+    if len(error):
+        result['mean_error_pct'] = round(float(error.mean()) * 100, 3)
+        result['pck'] = round(float((error < PCK_THRESHOLD).mean()), 3)
+    return result
+
+
+def benchmark(video_paths: List[str], sizes: List[int], max_frames: int = 300,
+              pose_factory: Callable = default_pose_factory) -> List[Dict]:
+    """
+    對每部影片比較各組合 (縮小長邊 x 是否裁切)
+
+    Returns:
+        每個組合一筆結果 (第一筆為原始解析度的基準)
+    """
+    rows = []
+    for video_path in video_paths:
+        frames = load_frames(video_path, max_frames)
+        if not frames:
+            print(f"警告：無法讀取 {video_path}，跳過")
+            continue
+        height, width = frames[0].shape[:2]
+        baseline = run_config(frames, 0, False, pose_factory)
+        for size in sizes:
+            for roi in (False, True):
+                run = baseline if (size == 0 and not roi) else run_config(frames, size, roi, pose_factory)
+                row = {
+                    'video': os.path.basename(video_path),
+                    'resolution': f'{width}x{height}',
+                    'target_size': size,
+                    'roi': roi,
+                    'ms_per_frame': round(run['ms_per_frame'], 2),
+                    'speedup': round(baseline['ms_per_frame'] / max(run['ms_per_frame'], 1e-9), 2),
+                    'roi_misses': run['preprocessor']['roi_misses']
+                }
+                row.update(compare(baseline['landmarks'], run['landmarks'], width, height))
+                rows.append(row)
+    return rows
+
+
+def print_table(rows: List[Dict]):
+    header = f"{'影片':<16}{'長邊':>6}{'ROI':>5}{'ms/幀':>9}{'加速':>7}{'偵測率':>8}{'誤差%':>8}{'PCK':>7}"
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        error = '-' if row['mean_error_pct'] is None else f"{row['mean_error_pct']:.3f}"
+        pck = '-' if row['pck'] is None else f"{row['pck']:.3f}"
+        print(f"{row['video'][:15]:<16}{row['target_size'] or '原始':>6}{'是' if row['roi'] else '否':>5}"
+              f"{row['ms_per_frame']:>9.2f}{row['speedup']:>7.2f}{row['detection_rate']:>8.3f}{error:>8}{pck:>7}")
+
+
+def _collect_videos(paths: List[str]) -> List[str]:
+    videos = []
+    for path in paths:
+        if os.path.isdir(path):
+            videos.extend(sorted(
+                os.path.join(path, f) for f in os.listdir(path) if f.lower().endswith(VIDEO_EXTENSIONS)
+            ))
+        else:
+            videos.append(path)
+    return videos
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='比較姿勢估計輸入縮小與裁切的速度與準確度')
+    parser.add_argument('paths', nargs='+', help='影片檔案或資料夾')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[0, 960, 640, 480, 320],
+                        help='要比較的長邊 (0 表示原始解析度)')
+    parser.add_argument('--max_frames', type=int, default=300,
+                        help='每部影片最多使用的幀數')
+    parser.add_argument('--json', type=str, default=None,
+                        help='將結果另存為 JSON')
+    args = parser.parse_args()
+
+    results = benchmark(_collect_videos(args.paths), args.sizes, args.max_frames)
+    print_table(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n結果已儲存: {args.json}")
@@ -55,6 +55,18 @@ class PathConfig:
     MODEL_DIR: str = field(default_factory=lambda: os.path.join(
         os.path.dirname(os.path.abspath(__file__)), 'models'
     ))
+    # 分析紀錄與選手檔案的 SQLite 資料庫
+    ANALYSIS_DB: str = field(default_factory=lambda: os.getenv('ANALYSIS_DB_PATH', os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'data', 'analysis.db'
+    )))
+    # 分析用影片的轉檔結果
+    MEDIA_CACHE_DIR: str = field(default_factory=lambda: os.getenv('MEDIA_CACHE_DIR', os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'uploads', 'prepared'
+    )))
+    # Gemini 回應快取
+    GEMINI_CACHE_DB: str = field(default_factory=lambda: os.getenv('GEMINI_CACHE_DB_PATH', os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'data', 'gemini_cache.db'
+    )))
     
     def __post_init__(self):
         """確保必要目錄存在"""
@@ -70,6 +82,35 @@ class AIConfig:
     MAX_VIDEO_DURATION: int = 10  # 秒
     RECOMMENDED_VIDEO_DURATION: int = 4  # 秒
     SUPPORTED_VIDEO_FORMATS: List[str] = field(default_factory=lambda: ['mp4', 'avi', 'mov', 'mkv'])
+    # 上傳至 Gemini 的影片可被後續分析沿用的時間 (遠端保存 48 小時)
+    GEMINI_FILE_TTL_HOURS: int = field(default_factory=lambda: int(os.getenv('GEMINI_FILE_TTL_HOURS', 46)))
+    # 沒有分析使用後保留上傳檔案的時間
+    GEMINI_FILE_IDLE_MINUTES: int = field(default_factory=lambda: int(os.getenv('GEMINI_FILE_IDLE_MINUTES', 15)))
+    # 送出分析前將影片轉為低解析度、無音軌的分析規格 (需要 ffmpeg)
+    MEDIA_PREP_ENABLED: bool = field(default_factory=lambda: os.getenv('MEDIA_PREP_ENABLED', 'true').lower() == 'true')
+    MEDIA_CACHE_MAX_MB: int = field(default_factory=lambda: int(os.getenv('MEDIA_CACHE_MAX_MB', 2048)))
+    # 長比賽分段並行分析：每段長度、相鄰區段重疊秒數與同時分析的段數 (長度 0 表示不分段)
+    MATCH_CHUNK_SECONDS: int = field(default_factory=lambda: int(os.getenv('MATCH_CHUNK_SECONDS', 180)))
+    MATCH_CHUNK_OVERLAP_SECONDS: int = field(default_factory=lambda: int(os.getenv('MATCH_CHUNK_OVERLAP_SECONDS', 20)))
+    MATCH_CHUNK_WORKERS: int = field(default_factory=lambda: int(os.getenv('MATCH_CHUNK_WORKERS', 3)))
+    # Gemini 請求閘道：同時呼叫數、每分鐘請求數上限 (可用 "模型=上限,..." 個別設定) 與可連續送出的請求數
+    GEMINI_WORKERS: int = field(default_factory=lambda: int(os.getenv('GEMINI_WORKERS', 4)))
+    GEMINI_RPM: float = field(default_factory=lambda: float(os.getenv('GEMINI_RPM', 60)))
+    GEMINI_MODEL_RPM: str = field(default_factory=lambda: os.getenv('GEMINI_MODEL_RPM', ''))
+    GEMINI_BURST: float = field(default_factory=lambda: float(os.getenv('GEMINI_BURST', 4)))
+    # 骨架提取抽幀：每隔幾幀執行一次姿勢估計 (其餘幀插值)，或依動作量在此間隔與最大間隔之間自動調整
+    POSE_FRAME_STRIDE: int = field(default_factory=lambda: int(os.getenv('POSE_FRAME_STRIDE', 1)))
+    POSE_ADAPTIVE_STRIDE: bool = field(default_factory=lambda: os.getenv('POSE_ADAPTIVE_STRIDE', 'false').lower() == 'true')
+    POSE_MAX_STRIDE: int = field(default_factory=lambda: int(os.getenv('POSE_MAX_STRIDE', 4)))
+    # 姿勢估計輸入：縮小到此長邊 (0 表示原始解析度)，並依前一幀的骨架只裁切選手範圍
+    # 預設關閉：以 benchmark_pose_input.py 在實際影片上確認準確度後再開啟 (訓練與即時分析共用此設定)
+    POSE_INPUT_SIZE: int = field(default_factory=lambda: int(os.getenv('POSE_INPUT_SIZE', 0)))
+    POSE_ROI_CROP: bool = field(default_factory=lambda: os.getenv('POSE_ROI_CROP', 'false').lower() == 'true')
+    # 即時動作分類：auto 在有最新的 .tflite 時使用輕量執行環境 (不載入 TensorFlow)，否則使用 .h5；也可指定 tflite / keras
+    CLASSIFIER_BACKEND: str = field(default_factory=lambda: os.getenv('CLASSIFIER_BACKEND', 'auto'))
+    CLASSIFIER_NUM_THREADS: int = field(default_factory=lambda: int(os.getenv('CLASSIFIER_NUM_THREADS', 1)))
+    # 訓練完成後匯出 .tflite 的量化方式：none / dynamic (權重 int8) / int8；空字串表示不匯出
+    CLASSIFIER_EXPORT_QUANTIZATION: str = field(default_factory=lambda: os.getenv('CLASSIFIER_EXPORT_QUANTIZATION', 'none'))
 
 
 @dataclass
@@ -77,6 +118,43 @@ class SchedulerConfig:
     """排程器配置"""
     UPDATE_INTERVAL_HOURS: int = field(default_factory=lambda: int(os.getenv('UPDATE_INTERVAL_HOURS', 1)))
     ENABLED: bool = field(default_factory=lambda: os.getenv('SCHEDULER_ENABLED', 'true').lower() == 'true')
+    # 圖片 URL 找不到時，多久後重新探測
+    PHOTO_NEGATIVE_TTL_HOURS: int = field(default_factory=lambda: int(os.getenv('PHOTO_NEGATIVE_TTL_HOURS', 24)))
+    # 重新驗證所有圖片 URL 的間隔，0 表示停用
+    PHOTO_REVERIFY_INTERVAL_HOURS: int = field(default_factory=lambda: int(os.getenv('PHOTO_REVERIFY_INTERVAL_HOURS', 0)))
+    # 排名歷史每隔多少筆差異寫入一次完整快照
+    RANKING_SNAPSHOT_INTERVAL: int = field(default_factory=lambda: int(os.getenv('RANKING_SNAPSHOT_INTERVAL', 50)))
+
+
+@dataclass
+class HttpConfig:
+    """對外 HTTP 請求配置"""
+    POOL_SIZE: int = field(default_factory=lambda: int(os.getenv('HTTP_POOL_SIZE', 32)))
+    PER_HOST_LIMIT: int = field(default_factory=lambda: int(os.getenv('HTTP_PER_HOST_LIMIT', 16)))
+    MAX_RETRIES: int = field(default_factory=lambda: int(os.getenv('HTTP_MAX_RETRIES', 2)))
+    BACKOFF_BASE: float = field(default_factory=lambda: float(os.getenv('HTTP_BACKOFF_BASE', 0.3)))  # 秒
+    # 伺服器要求等待 (Retry-After) 超過此秒數時不再重試，直接回傳該回應
+    MAX_RETRY_AFTER: float = field(default_factory=lambda: float(os.getenv('HTTP_MAX_RETRY_AFTER', 30)))
+    # 圖片探測使用 asyncio 模式（需安裝 aiohttp）
+    ASYNC_PROBES: bool = field(default_factory=lambda: os.getenv('HTTP_ASYNC_PROBES', 'true').lower() == 'true')
+    # WTT 排名 API 與圖片主機，可指向本地測試伺服器
+    RANKING_BASE_URL: str = field(default_factory=lambda: os.getenv(
+        'RANKING_BASE_URL', 'https://wtt-web-frontdoor-withoutcache-cqakg0andqf5hchn.a01.azurefd.net'
+    ))
+    PHOTO_BASE_URL: str = field(default_factory=lambda: os.getenv(
+        'PHOTO_BASE_URL', 'https://photofiles.worldtabletennis.com/wtt-media/photos/400px'
+    ))
+
+
+@dataclass
+class CacheConfig:
+    """快取配置"""
+    PREDICTION_CACHE_SIZE: int = field(default_factory=lambda: int(os.getenv('PREDICTION_CACHE_SIZE', 512)))
+    PREDICTION_CACHE_TTL: int = field(default_factory=lambda: int(os.getenv('PREDICTION_CACHE_TTL', 600)))  # 秒
+    # Gemini 回應快取：相同媒體與提示詞重新分析時直接回傳
+    GEMINI_CACHE_ENABLED: bool = field(default_factory=lambda: os.getenv('GEMINI_CACHE_ENABLED', 'true').lower() == 'true')
+    GEMINI_CACHE_MAX_MB: int = field(default_factory=lambda: int(os.getenv('GEMINI_CACHE_MAX_MB', 256)))
+    GEMINI_CACHE_TTL_DAYS: int = field(default_factory=lambda: int(os.getenv('GEMINI_CACHE_TTL_DAYS', 30)))
 
 
 @dataclass
@@ -88,6 +166,8 @@ class Config:
     paths: PathConfig = field(default_factory=PathConfig)
     ai: AIConfig = field(default_factory=AIConfig)
     scheduler: SchedulerConfig = field(default_factory=SchedulerConfig)
+    cache: CacheConfig = field(default_factory=CacheConfig)
+    http: HttpConfig = field(default_factory=HttpConfig)
 
 
 # 全域配置實例
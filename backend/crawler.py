@@ -1,9 +1,182 @@
-import requests
 import json
 import os
+import time
+import threading
 import concurrent.futures
 from datetime import datetime
 
+from config import get_config
+from http_client import HttpClient, HAS_AIOHTTP, run_first_ok_many
+
+# 選手大頭照檔名的各種可能模式，索引會記錄在圖片 URL 快取中
+PHOTO_URL_PATTERNS = [
+    # 方案 1: 空格轉 %20
+    lambda id, name: f"{id}_Headshot_R_{name.replace(' ', '%20')}.png",
+    # 方案 2: 空格轉 _
+    lambda id, name: f"{id}_Headshot_R_{name.replace(' ', '_')}.png",
+    # 方案 3: HEADSHOT 大寫
+    lambda id, name: f"{id}_HEADSHOT_R_{name.replace(' ', '_')}.png",
+    # 方案 4: 名字前後對調
+    lambda id, name: f"{id}_Headshot_R_{name.split(' ')[1]}_{name.split(' ')[0]}.png" if len(name.split(' ')) >= 2 else None,
+    # 方案 5: 連字符轉 _
+    lambda id, name: f"{id}_Headshot_R_{name.replace(' ', '_').replace('-', '_')}.png",
+    # 方案 6: 混合編碼
+    lambda id, name: f"{id}_Headshot_R_{name.split(' ')[0]}_{'%20'.join(name.split(' ')[1:])}.png" if len(name.split(' ')) >= 2 else None,
+    # 方案 7: 全小寫
+    lambda id, name: f"{id}_Headshot_R_{name.lower().replace(' ', '_').replace('-', '_')}.png"
+]
+
+
+def build_photo_url(base_url, pattern_index, ittf_id, name):
+    """依模式組出完整圖片 URL，模式不適用時回傳 None"""
+    file_name = PHOTO_URL_PATTERNS[pattern_index](ittf_id, name)
+    return f"{base_url}/{file_name}" if file_name else None
+
+
+def ranking_row_key(row):
+    """排名列的穩定鍵：雙打以 PairId、單打以 IttfId，並加上項目代碼"""
+    row_id = row.get('PairId') or row.get('IttfId')
+    return f"{row.get('SubEventCode', '')}|{row_id}" if row_id else None
+
+
+def _row_content(row):
+    # PhotoUrl 是我們自行加入的欄位，不屬於上游內容
+    return {k: v for k, v in row.items() if k != 'PhotoUrl'}
+
+
+def diff_rankings(previous_rows, current_rows):
+    """
+    比對前後兩次排名資料
+
+    Args:
+        previous_rows: 上次儲存的排名列
+        current_rows: 本次抓取的排名列
+
+    Returns:
+        {'added': [...], 'changed': [...], 'unchanged': [...], 'removed': [...]}，
+        前三者為本次的排名列，removed 為上次的排名列
+    """
+    previous = {}
+    for row in previous_rows:
+        key = ranking_row_key(row)
+        if key:
+            previous[key] = row
+
+    diff = {'added': [], 'changed': [], 'unchanged': [], 'removed': []}
+    seen = set()
+    for row in current_rows:
+        key = ranking_row_key(row)
+        old = previous.get(key) if key else None
+        if old is None:
+            diff['added'].append(row)
+        elif _row_content(old) == _row_content(row):
+            diff['unchanged'].append(row)
+        else:
+            diff['changed'].append(row)
+        if key:
+            seen.add(key)
+    diff['removed'] = [row for key, row in previous.items() if key not in seen]
+    return diff
+
+
+class PhotoUrlCache:
+    """
+    選手圖片 URL 解析快取
+    以 IttfId + 姓名為鍵，記錄命中的 URL 與模式；
+    找不到圖片的結果會在 negative_ttl 秒後重新嘗試
+    """
+    
+    def __init__(self, cache_file, negative_ttl=24 * 3600):
+        self.cache_file = cache_file
+        self.negative_ttl = negative_ttl
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._load()
+    
+    @staticmethod
+    def _key(ittf_id, name):
+        return f"{ittf_id}|{name}"
+    
+    def _load(self):
+        if os.path.exists(self.cache_file):
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f)
+            except Exception as e:
+                print(f"⚠️ 讀取圖片 URL 快取失敗: {e}")
+                self.entries = {}
+    
+    def save(self):
+        """寫回快取檔案"""
+        with self._lock:
+            tmp_path = self.cache_file + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_file)
+    
+    def lookup(self, ittf_id, name):
+        """
+        查詢快取
+        
+        Returns:
+            (是否命中, URL)；負面結果未過期時回傳 (True, None)
+        """
+        if not ittf_id:
+            return False, None
+        entry = self.entries.get(self._key(ittf_id, name))
+        if entry is None:
+            return False, None
+        if entry.get('url'):
+            return True, entry['url']
+        if time.time() - entry.get('checked_at', 0) < self.negative_ttl:
+            return True, None
+        return False, None
+    
+    def record(self, ittf_id, name, url, pattern_index):
+        """記錄探測結果（url 為 None 表示找不到）"""
+        with self._lock:
+            self.entries[self._key(ittf_id, name)] = {
+                'ittf_id': ittf_id,
+                'name': name,
+                'url': url,
+                'pattern': pattern_index,
+                'checked_at': time.time()
+            }
+    
+    def pattern_order(self):
+        """依命中次數由多到少排列模式索引"""
+        counts = [0] * len(PHOTO_URL_PATTERNS)
+        with self._lock:
+            entries = list(self.entries.values())
+        for entry in entries:
+            index = entry.get('pattern')
+            if index is not None and 0 <= index < len(counts):
+                counts[index] += 1
+        return sorted(range(len(PHOTO_URL_PATTERNS)), key=lambda i: -counts[i])
+    
+    def seed(self, players, base_url):
+        """以先前儲存的排名資料中的 PhotoUrl 建立初始快取，避免首次執行全面探測"""
+        for player in players:
+            ittf_id = player.get('IttfId')
+            name = player.get('PlayerName', '')
+            url = player.get('PhotoUrl')
+            if not ittf_id or not url or self._key(ittf_id, name) in self.entries:
+                continue
+            pattern_index = next(
+                (i for i in range(len(PHOTO_URL_PATTERNS))
+                 if build_photo_url(base_url, i, ittf_id, name) == url),
+                None
+            )
+            if pattern_index is not None:
+                self.record(ittf_id, name, url, pattern_index)
+    
+    def positive_entries(self):
+        """取得所有已找到圖片的 (IttfId, 姓名, 模式索引)"""
+        with self._lock:
+            entries = list(self.entries.values())
+        return [(e['ittf_id'], e['name'], e['pattern']) for e in entries if e.get('url')]
+
+
 class TableTennisRankingCrawler:
     def __init__(self):
         self.headers = {
@@ -21,98 +194,292 @@ class TableTennisRankingCrawler:
             'sec-fetch-site': 'cross-site',
             'user-agent': 'Mozilla/5.0 (Linux; Android 6.0; Nexus 5 Build/MRA58N) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/141.0.0.0 Mobile Safari/537.36',
         }
+        http_config = get_config().http
+        self.ranking_base_url = http_config.RANKING_BASE_URL
+        self.photo_base_url = http_config.PHOTO_BASE_URL
+        self.async_probes = http_config.ASYNC_PROBES and HAS_AIOHTTP
+        self._http_options = {
+            'per_host_limit': http_config.PER_HOST_LIMIT,
+            'max_retries': http_config.MAX_RETRIES,
+            'backoff_base': http_config.BACKOFF_BASE,
+            'max_retry_after': http_config.MAX_RETRY_AFTER,
+        }
+        # 共用連線池，避免每次探測都重新建立 TCP/TLS 連線
+        self.http = HttpClient(
+            headers=self.headers, pool_size=http_config.POOL_SIZE, **self._http_options
+        )
         self.data_dir = os.path.join(os.path.dirname(__file__), 'data')
         os.makedirs(self.data_dir, exist_ok=True)
-    
+        self.photo_cache = PhotoUrlCache(
+            os.path.join(self.data_dir, 'photo_url_cache.json'),
+            negative_ttl=get_config().scheduler.PHOTO_NEGATIVE_TTL_HOURS * 3600
+        )
+        # 各類別上次回應的 ETag / Last-Modified，用於條件式請求
+        self.state_file = os.path.join(self.data_dir, 'crawl_state.json')
+        self._state_lock = threading.Lock()
+        self.crawl_state = self._load_state()
+
+    def _load_state(self):
+        if os.path.exists(self.state_file):
+            try:
+                with open(self.state_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except Exception as e:
+                print(f"⚠️ 讀取爬蟲狀態失敗: {e}")
+        return {}
+
+    def _update_state(self, category, **values):
+        with self._state_lock:
+            self.crawl_state.setdefault(category, {}).update(values)
+            tmp_path = self.state_file + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.crawl_state, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.state_file)
+
     def fetch_ranking(self, category='SEN_SINGLES'):
         """
         抓取桌球排名資料
-        category: SEN_SINGLES (男單), SEN_DOUBLES (男雙), 
+        category: SEN_SINGLES (男單), SEN_DOUBLES (男雙),
                   WOM_SINGLES (女單), WOM_DOUBLES (女雙)
+
+        Returns:
+            最新的排名資料（內容未變更時為上次儲存的資料），失敗時回傳 None
         """
-        params = {
-            'q': str(datetime.now().timestamp()),
-        }
-        
-        url = f'https://wtt-web-frontdoor-withoutcache-cqakg0andqf5hchn.a01.azurefd.net/ranking/{category}.json'
-        
+        return self.update_category(category)[1]
+
+    def update_category(self, category):
+        """
+        以條件式請求抓取單一類別，並只豐富、寫入有變更的部分
+
+        Returns:
+            (狀態, 排名資料)；狀態為 success (已寫入)、unchanged (內容相同)、
+            not_modified (伺服器回應 304) 或 failed
+        """
+        url = f'{self.ranking_base_url}/ranking/{category}.json'
+        previous = self.load_data(category)
+        previous_rows = previous.get('data', {}).get('Result', []) if previous else []
+
+        # 只有在本地檔案存在時才送出驗證碼，否則 304 會讓我們拿不到資料
+        headers = {}
+        state = self.crawl_state.get(category, {})
+        if previous:
+            if state.get('etag'):
+                headers['If-None-Match'] = state['etag']
+            if state.get('last_modified'):
+                headers['If-Modified-Since'] = state['last_modified']
+
         try:
-            response = requests.get(url, params=params, headers=self.headers, timeout=10)
+            response = self.http.get(url, headers=headers, timeout=10)
+            checked_at = datetime.now().isoformat()
+            if response.status_code == 304:
+                print(f"✓ {category} 未變更 (304)")
+                self._update_state(category, checked_at=checked_at)
+                return 'not_modified', previous['data']
+
             response.raise_for_status()
             data = response.json()
-            
-            # 豐富資料（加入圖片 URL）
-            enriched_data = self.enrich_data(data)
-            
-            # 儲存資料
-            self.save_data(category, enriched_data)
-            return enriched_data
+
+            # 首次使用快取時，沿用上次儲存的圖片 URL
+            if previous_rows:
+                self.photo_cache.seed(previous_rows, self.photo_base_url)
+
+            changed = self._merge_with_previous(category, data, previous_rows)
+            validators = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'checked_at': checked_at
+            }
+
+            if not changed and previous:
+                print(f"✓ {category} 內容未變更，略過寫入")
+                self._update_state(category, **validators)
+                return 'unchanged', previous['data']
+
+            # 儲存資料；寫入成功後才記錄驗證碼，否則之後的 304 會讓舊檔案一直沿用
+            self.save_data(category, data)
+            self._update_state(category, **validators)
+            return 'success', data
         except Exception as e:
             print(f"錯誤: {category} 抓取失敗 - {str(e)}")
-            return None
+            return 'failed', None
+
+    def _merge_with_previous(self, category, data, previous_rows):
+        """
+        與上次的排名逐列比對：未變更的列沿用上次的豐富結果，只豐富新增或變更的列
+
+        Returns:
+            內容是否有任何變更
+        """
+        if 'Result' not in data:
+            return True
+
+        rows = data['Result']
+        diff = diff_rankings(previous_rows, rows)
+        previous_by_key = {ranking_row_key(row): row for row in previous_rows}
+        for row in diff['unchanged']:
+            photo_url = previous_by_key[ranking_row_key(row)].get('PhotoUrl')
+            if photo_url:
+                row['PhotoUrl'] = photo_url
+
+        print(f"{category} 差異: 新增 {len(diff['added'])}、變更 {len(diff['changed'])}、"
+              f"刪除 {len(diff['removed'])}、未變更 {len(diff['unchanged'])}")
+
+        # 豐富資料（加入圖片 URL）；未變更但仍缺圖片的列也交給快取判斷是否該重試
+        dirty = diff['added'] + diff['changed'] + [
+            row for row in diff['unchanged'] if row.get('IttfId') and not row.get('PhotoUrl')
+        ]
+        if dirty:
+            self.enrich_data({'Result': dirty})
+
+        # 列順序也屬於內容的一部分
+        return rows != previous_rows
     
     def enrich_data(self, data):
-        """豐富資料：驗證並加入圖片 URL"""
+        """豐富資料：驗證並加入圖片 URL（僅探測快取中沒有結果的選手）"""
         if 'Result' not in data:
             return data
             
         players = data['Result']
-        print(f"正在驗證 {len(players)} 位選手的圖片 URL...")
         
+        # 先套用快取結果，只探測新選手、名稱變更或負面結果已過期者
+        # 同一選手可能出現在多個項目中，相同鍵只探測一次
+        to_probe = {}
+        for player in players:
+            hit, photo_url = self.photo_cache.lookup(player.get('IttfId'), player.get('PlayerName', ''))
+            if hit:
+                if photo_url:
+                    player['PhotoUrl'] = photo_url
+            elif player.get('IttfId'):
+                key = (player.get('IttfId'), player.get('PlayerName', ''))
+                to_probe.setdefault(key, []).append(player)
+        
+        print(f"正在驗證 {len(to_probe)}/{len(players)} 位選手的圖片 URL...")
+        
+        if to_probe:
+            resolved = self._probe_photo_urls(list(to_probe.keys()))
+            for (ittf_id, player_name), (photo_url, pattern_index) in resolved.items():
+                self.photo_cache.record(ittf_id, player_name, photo_url, pattern_index)
+                if photo_url:
+                    for player in to_probe[(ittf_id, player_name)]:
+                        player['PhotoUrl'] = photo_url
+            self.photo_cache.save()
+                    
+        return data
+
+    def _probe_photo_urls(self, keys):
+        """
+        探測多位選手的圖片 URL
+        
+        asyncio 模式會在單一事件迴圈上同時送出所有選手的所有候選 URL，
+        否則以執行緒池逐一選手、依序嘗試各模式
+        
+        Args:
+            keys: [(IttfId, 姓名), ...]
+            
+        Returns:
+            {(IttfId, 姓名): (URL, 模式索引)}
+        """
+        if self.async_probes:
+            order = self.photo_cache.pattern_order()
+            candidate_lists = [
+                [build_photo_url(self.photo_base_url, i, ittf_id, name) for i in order]
+                for ittf_id, name in keys
+            ]
+            try:
+                hits = run_first_ok_many(candidate_lists, headers=self.headers, **self._http_options)
+            except Exception as e:
+                print(f"⚠️ 非同步探測失敗，改用執行緒模式: {e}")
+            else:
+                return {
+                    key: (candidates[hit], order[hit]) if hit is not None else (None, None)
+                    for key, candidates, hit in zip(keys, candidate_lists, hits)
+                }
+        
+        results = {}
         # 使用 ThreadPoolExecutor 並行處理
         with concurrent.futures.ThreadPoolExecutor(max_workers=20) as executor:
             # 提交所有任務
-            future_to_player = {executor.submit(self._find_valid_photo_url, p): p for p in players}
+            future_to_key = {
+                executor.submit(self._resolve_photo_url, {'IttfId': ittf_id, 'PlayerName': name}): (ittf_id, name)
+                for ittf_id, name in keys
+            }
             
-            for future in concurrent.futures.as_completed(future_to_player):
-                player = future_to_player[future]
+            for future in concurrent.futures.as_completed(future_to_key):
+                key = future_to_key[future]
                 try:
-                    photo_url = future.result()
-                    if photo_url:
-                        player['PhotoUrl'] = photo_url
+                    results[key] = future.result()
                 except Exception as e:
-                    print(f"處理選手 {player.get('PlayerName')} 時發生錯誤: {e}")
-                    
-        return data
+                    print(f"處理選手 {key[1]} 時發生錯誤: {e}")
+        return results
 
     def _find_valid_photo_url(self, player):
         """為單一選手尋找有效的圖片 URL"""
+        return self._resolve_photo_url(player)[0]
+
+    def _resolve_photo_url(self, player, patterns=None):
+        """
+        為單一選手探測圖片 URL
+        
+        Returns:
+            (URL, 命中的模式索引)，找不到時為 (None, None)
+        """
         ittf_id = player.get('IttfId')
         player_name = player.get('PlayerName', '')
         
         if not ittf_id:
-            return None
-            
-        # 定義各種可能的 URL 模式
-        patterns = [
-            # 方案 1: 空格轉 %20
-            lambda id, name: f"https://photofiles.worldtabletennis.com/wtt-media/photos/400px/{id}_Headshot_R_{name.replace(' ', '%20')}.png",
-            # 方案 2: 空格轉 _
-            lambda id, name: f"https://photofiles.worldtabletennis.com/wtt-media/photos/400px/{id}_Headshot_R_{name.replace(' ', '_')}.png",
-            # 方案 3: HEADSHOT 大寫
-            lambda id, name: f"https://photofiles.worldtabletennis.com/wtt-media/photos/400px/{id}_HEADSHOT_R_{name.replace(' ', '_')}.png",
-            # 方案 4: 名字前後對調
-            lambda id, name: f"https://photofiles.worldtabletennis.com/wtt-media/photos/400px/{id}_Headshot_R_{name.split(' ')[1]}_{name.split(' ')[0]}.png" if len(name.split(' ')) >= 2 else None,
-            # 方案 5: 連字符轉 _
-            lambda id, name: f"https://photofiles.worldtabletennis.com/wtt-media/photos/400px/{id}_Headshot_R_{name.replace(' ', '_').replace('-', '_')}.png",
-            # 方案 6: 混合編碼
-            lambda id, name: f"https://photofiles.worldtabletennis.com/wtt-media/photos/400px/{id}_Headshot_R_{name.split(' ')[0]}_{'%20'.join(name.split(' ')[1:])}.png" if len(name.split(' ')) >= 2 else None,
-            # 方案 7: 全小寫
-            lambda id, name: f"https://photofiles.worldtabletennis.com/wtt-media/photos/400px/{id}_Headshot_R_{name.lower().replace(' ', '_').replace('-', '_')}.png"
-        ]
+            return None, None
+        
+        # 依歷史命中次數排序，最常見的模式先試
+        if patterns is None:
+            patterns = self.photo_cache.pattern_order()
         
-        for pattern in patterns:
-            url = pattern(ittf_id, player_name)
+        for index in patterns:
+            url = build_photo_url(self.photo_base_url, index, ittf_id, player_name)
             if url:
                 try:
                     # 使用 HEAD 請求檢查圖片是否存在
-                    response = requests.head(url, timeout=2)
+                    response = self.http.head(url, timeout=2)
                     if response.status_code == 200:
-                        return url
+                        return url, index
                 except:
                     continue
         
-        return None
+        return None, None
+
+    def reverify_photo_urls(self):
+        """
+        重新驗證快取中所有已找到的圖片 URL（選用的背景工作）
+        
+        Returns:
+            驗證統計
+        """
+        entries = self.photo_cache.positive_entries()
+        print(f"重新驗證 {len(entries)} 個圖片 URL...")
+        stats = {'checked': len(entries), 'still_valid': 0, 'changed': 0, 'missing': 0}
+        
+        def verify(entry):
+            ittf_id, name, pattern_index = entry
+            player = {'IttfId': ittf_id, 'PlayerName': name}
+            # 先試上次命中的模式，失敗再全部重試
+            url, index = self._resolve_photo_url(player, patterns=[pattern_index])
+            if url:
+                return entry, url, index, True
+            url, index = self._resolve_photo_url(player)
+            return entry, url, index, False
+        
+        with concurrent.futures.ThreadPoolExecutor(max_workers=20) as executor:
+            for entry, url, index, unchanged in executor.map(verify, entries):
+                ittf_id, name, _ = entry
+                self.photo_cache.record(ittf_id, name, url, index)
+                if unchanged:
+                    stats['still_valid'] += 1
+                elif url:
+                    stats['changed'] += 1
+                else:
+                    stats['missing'] += 1
+        
+        self.photo_cache.save()
+        return stats
 
     def save_data(self, category, data):
         """儲存資料到 JSON 檔案"""
@@ -125,8 +492,11 @@ class TableTennisRankingCrawler:
             'data': data
         }
         
-        with open(file_path, 'w', encoding='utf-8') as f:
+        # 先寫暫存檔再替換，讀取端 (RankingReadModel) 不會讀到寫到一半的檔案
+        tmp_path = f"{file_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
             json.dump(data_with_timestamp, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, file_path)
         
         print(f"✓ {category} 資料已儲存")
     
@@ -142,14 +512,12 @@ class TableTennisRankingCrawler:
     def update_all_rankings(self):
         """更新所有排名資料"""
         categories = ['SEN_SINGLES', 'SEN_DOUBLES']
-        results = {}
-        
-        for category in categories:
-            print(f"正在抓取 {category}...")
-            data = self.fetch_ranking(category)
-            results[category] = 'success' if data else 'failed'
+        print(f"正在抓取 {', '.join(categories)}...")
         
-        return results
+        # 各類別互不相依，同時抓取
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(categories)) as executor:
+            statuses = executor.map(lambda c: self.update_category(c)[0], categories)
+            return dict(zip(categories, statuses))
 
 if __name__ == '__main__':
     crawler = TableTennisRankingCrawler()
@@ -4,7 +4,6 @@
 """
 import os
 import json
-import base64
 import numpy as np
 from typing import Dict, List, Tuple, Optional
 
@@ -23,16 +22,26 @@ except (ImportError, RuntimeError):
     SKELETON_AVAILABLE = False
     PoseExtractor = None
 
-import google.generativeai as genai
 from dotenv import dotenv_values
 
+from services.gemini_cache import get_gemini_cache
+from services.gemini_files import get_gemini_file_manager
+from services.gemini_gateway import PRIORITY_INTERACTIVE, get_gemini_gateway
+from services.media_prep import CLIP_PROFILE, prepare_media
+
+# 提示詞範本版本，修改提示詞或解析方式時遞增，讓快取的舊回應失效
+FAILURE_PROMPT_VERSION = 'failure-v1'
+CLASSIFY_PROMPT_VERSION = 'classify-v1'
+
+
 class FailureAnalyzer:
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, priority: int = PRIORITY_INTERACTIVE):
         """
         初始化失誤分析器
         
         Args:
             api_key: Gemini API 金鑰（若無則從環境變數讀取）
+            priority: Gemini 請求的優先等級 (批次標註使用 PRIORITY_BATCH)
         """
         # 直接從 .env 檔案讀取
         if not api_key:
@@ -41,9 +50,8 @@ class FailureAnalyzer:
         
         self.api_key = api_key
         if self.api_key:
-            genai.configure(api_key=self.api_key)
-            # 使用 Gemini 2.5 Pro 模型
-            self.model = genai.GenerativeModel('gemini-2.5-pro')
+            # 使用 Gemini 2.5 Pro 模型，經由共用閘道呼叫 (統一配額與排程)
+            self.model = get_gemini_gateway(self.api_key).model('gemini-2.5-pro', priority=priority)
         else:
             self.model = None
             print("⚠️  未設定 GEMINI_API_KEY，將使用基礎分析模式")
@@ -52,7 +60,9 @@ class FailureAnalyzer:
         self.pose_extractor = None
         if SKELETON_AVAILABLE:
             try:
-                self.pose_extractor = PoseExtractor()
+                from config import get_config
+                # 關鍵幀彼此不連續，只縮小畫面、不追蹤選手範圍
+                self.pose_extractor = PoseExtractor(input_size=get_config().ai.POSE_INPUT_SIZE, roi_crop=False)
             except Exception as e:
                 print(f"⚠️ PoseExtractor 初始化失敗: {e}")
     
@@ -281,24 +291,29 @@ class FailureAnalyzer:
 請用繁體中文回答，專注於技術分析和實用建議。
 """
             
+            # 相同數據與影片已分析過時，直接使用快取的回應
+            has_video = bool(video_path and os.path.exists(video_path))
+            cache = get_gemini_cache()
+            cache_key = cache.make_key(self.model, FAILURE_PROMPT_VERSION, prompt,
+                                       media=[video_path] if has_video else [])
+            cached_text = cache.get(cache_key)
+            
             # 呼叫 Gemini API
-            if video_path and os.path.exists(video_path):
-                # 影片直接分析模式
-                with open(video_path, 'rb') as f:
-                    video_data = f.read()
-                
-                video_base64 = base64.b64encode(video_data).decode('utf-8')
-                
-                response = self.model.generate_content([
-                    {"text": prompt},
-                    {"inline_data": {"mime_type": "video/mp4", "data": video_base64}}
-                ])
+            if cached_text is not None:
+                result_text = cached_text
+            elif has_video:
+                # 影片直接分析模式 (先轉為分析規格的小檔案)
+                with prepare_media(video_path, CLIP_PROFILE) as prepared_path, \
+                        get_gemini_file_manager().video_part(prepared_path) as video_part:
+                    response = self.model.generate_content([{"text": prompt}, video_part])
+                result_text = response.text
             else:
                 # 純文字分析模式
                 response = self.model.generate_content(prompt)
+                result_text = response.text
             
             # 解析回應
-            result_text = response.text
+            raw_text = result_text
             print(f"📝 Gemini 原始回應長度: {len(result_text)}")
             print(f"📝 Gemini 原始回應前 500 字元:\n{result_text[:500]}")
             
@@ -311,6 +326,8 @@ class FailureAnalyzer:
                     result_text = result_text.split('```')[1].split('```')[0]
                 
                 analysis_result = json.loads(result_text.strip())
+                if cached_text is None:
+                    cache.put(cache_key, raw_text, self.model, FAILURE_PROMPT_VERSION)
                 print(f"✅ JSON 解析成功")
                 print(f"📊 解析結果: {json.dumps(analysis_result, ensure_ascii=False, indent=2)}")
                 analysis_result['source'] = 'gemini'
@@ -347,6 +364,17 @@ class FailureAnalyzer:
             return {'quality': 'normal', 'reason': 'Gemini API 未配置，預設為 Normal'}
             
         try:
+            if not os.path.exists(video_path):
+                return {'quality': 'normal', 'reason': '影片檔案不存在'}
+            
+            # 提示詞中的輔助數據完全由影片內容決定，快取鍵只需影片雜湊；
+            # 命中時連關鍵幀與姿勢分析都可略過
+            cache = get_gemini_cache()
+            cache_key = cache.make_key(self.model, CLASSIFY_PROMPT_VERSION, '', media=[video_path])
+            cached_text = cache.get(cache_key)
+            if cached_text is not None:
+                return self._parse_quality(cached_text)
+            
             # 1. 抽取關鍵幀進行結構化分析 (作為輔助資訊)
             frames = self.extract_key_frames(video_path, num_frames=5)
             pose_analysis = self.analyze_pose_sequence(frames)
@@ -373,43 +401,38 @@ class FailureAnalyzer:
 請務必只輸出 JSON。
 """
             
-            # 3. 呼叫 Gemini API (傳送影片)
-            if os.path.exists(video_path):
-                with open(video_path, 'rb') as f:
-                    video_data = f.read()
-                
-                video_base64 = base64.b64encode(video_data).decode('utf-8')
-                
-                response = self.model.generate_content([
-                    {"text": prompt},
-                    {"inline_data": {"mime_type": "video/mp4", "data": video_base64}}
-                ])
-                
-                # 4. 解析回應
-                result_text = response.text
-                
-                # 移除可能的 markdown 標記
-                if '```json' in result_text:
-                    result_text = result_text.split('```json')[1].split('```')[0]
-                elif '```' in result_text:
-                    result_text = result_text.split('```')[1].split('```')[0]
-                
-                result = json.loads(result_text.strip())
-                
-                # 確保 quality 是小寫且有效
-                quality = result.get('quality', 'normal').lower()
-                if quality not in ['good', 'normal', 'bad']:
-                    quality = 'normal'
-                result['quality'] = quality
-                
-                return result
-                
-            else:
-                return {'quality': 'normal', 'reason': '影片檔案不存在'}
+            # 3. 呼叫 Gemini API (傳送轉為分析規格的影片)
+            with prepare_media(video_path, CLIP_PROFILE) as prepared_path, \
+                    get_gemini_file_manager().video_part(prepared_path) as video_part:
+                response = self.model.generate_content([{"text": prompt}, video_part])
+            
+            # 4. 解析回應 (成功解析後才寫入快取)
+            result = self._parse_quality(response.text)
+            cache.put(cache_key, response.text, self.model, CLASSIFY_PROMPT_VERSION)
+            return result
                 
         except Exception as e:
             print(f"Gemini 分類失敗: {e}")
             return {'quality': 'normal', 'reason': f'分析錯誤: {str(e)}'}
+    
+    @staticmethod
+    def _parse_quality(result_text: str) -> Dict:
+        """解析品質分類回應"""
+        # 移除可能的 markdown 標記
+        if '```json' in result_text:
+            result_text = result_text.split('```json')[1].split('```')[0]
+        elif '```' in result_text:
+            result_text = result_text.split('```')[1].split('```')[0]
+        
+        result = json.loads(result_text.strip())
+        
+        # 確保 quality 是小寫且有效
+        quality = result.get('quality', 'normal').lower()
+        if quality not in ['good', 'normal', 'bad']:
+            quality = 'normal'
+        result['quality'] = quality
+        
+        return result
 
     def _basic_analysis(self, structured_data: Dict) -> Dict:
         """基礎分析（當 Gemini 不可用時）"""
@@ -0,0 +1,40 @@
+"""
+檔案內容雜湊
+以 SHA-256 識別媒體檔案 (Gemini 回應快取、轉檔快取與批次骨架提取共用)，
+不依賴 services 套件，離線腳本與工作行程匯入時不會載入整個服務層
+"""
+import os
+import hashlib
+import threading
+from typing import Dict, Tuple
+
+# 讀取媒體檔案計算雜湊的區塊大小
+_HASH_CHUNK = 1024 * 1024
+
+# (路徑, 大小, 修改時間) -> 內容雜湊，避免重複讀取同一個大檔案
+_digest_memo: Dict[Tuple[str, int, int], str] = {}
+_digest_lock = threading.Lock()
+
+
+def media_digest(path: str) -> str:
+    """
+    計算媒體檔案的內容雜湊 (SHA-256)
+
+    檔案未變動 (大小與修改時間相同) 時沿用先前的結果
+    """
+    path = os.path.realpath(path)
+    stat = os.stat(path)
+    memo_key = (path, stat.st_size, stat.st_mtime_ns)
+    with _digest_lock:
+        digest = _digest_memo.get(memo_key)
+    if digest is not None:
+        return digest
+
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b''):
+            sha.update(chunk)
+    digest = sha.hexdigest()
+    with _digest_lock:
+        _digest_memo[memo_key] = digest
+    return digest
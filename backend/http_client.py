@@ -0,0 +1,201 @@
+"""
+共用 HTTP 客戶端
+提供連線池 (keep-alive)、每主機併發上限、帶抖動的指數退避重試，
+以及可選的 asyncio 模式（需安裝 aiohttp）
+"""
+import time
+import random
+import asyncio
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# aiohttp 為選用套件，未安裝時僅提供同步模式
+try:
+    import aiohttp
+    HAS_AIOHTTP = True
+except ImportError:
+    HAS_AIOHTTP = False
+
+# 需要重試的 HTTP 狀態碼
+RETRY_STATUS = {429, 500, 502, 503, 504}
+# Retry-After 的預設上限 (秒)
+MAX_RETRY_AFTER = 30.0
+
+
+def backoff_delay(attempt: int, base: float, cap: float = 10.0) -> float:
+    """指數退避加上完整抖動 (full jitter)"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def _retry_after(headers) -> Optional[float]:
+    value = headers.get('Retry-After') if headers else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class HttpClient:
+    """執行緒安全的同步 HTTP 客戶端，所有請求共用同一個 Session 連線池"""
+
+    def __init__(self, headers: Optional[Dict[str, str]] = None, pool_size: int = 32,
+                 per_host_limit: int = 16, max_retries: int = 2, backoff_base: float = 0.3,
+                 max_retry_after: float = MAX_RETRY_AFTER):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if headers:
+            self.session.headers.update(headers)
+        self.per_host_limit = per_host_limit
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_retry_after = max_retry_after
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._slots_lock = threading.Lock()
+
+    def _slot(self, url: str) -> threading.BoundedSemaphore:
+        host = urlsplit(url).netloc
+        with self._slots_lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self._host_slots[host]
+
+    def request(self, method: str, url: str, retries: Optional[int] = None, **kwargs) -> requests.Response:
+        """
+        發送請求，連線錯誤與 429/5xx 會以抖動退避重試
+
+        Args:
+            method: HTTP 方法
+            url: 目標 URL
+            retries: 覆寫最大重試次數
+            **kwargs: 傳給 requests 的其他參數
+
+        Returns:
+            最後一次的回應 (Retry-After 超過 max_retry_after 時直接回傳該回應)；
+            重試用盡仍連線失敗時拋出例外
+        """
+        max_retries = self.max_retries if retries is None else retries
+        slot = self._slot(url)
+        attempt = 0
+        while True:
+            try:
+                with slot:
+                    response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= max_retries:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUS or attempt >= max_retries:
+                    return response
+                delay = _retry_after(response.headers)
+                if delay is not None and delay > self.max_retry_after:
+                    return response
+                # 歸還連線給連線池後再重試
+                response.close()
+                if delay is not None:
+                    time.sleep(max(delay, 0))
+                    attempt += 1
+                    continue
+            time.sleep(backoff_delay(attempt, self.backoff_base))
+            attempt += 1
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def head(self, url: str, **kwargs) -> requests.Response:
+        # 與 requests.head 相同，預設不跟隨轉址
+        kwargs.setdefault('allow_redirects', False)
+        return self.request('HEAD', url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncHttpClient:
+    """
+    asyncio HTTP 客戶端，在單一事件迴圈上併發所有請求
+    需以 async with 使用，以便建立與關閉 aiohttp 連線池
+    """
+
+    def __init__(self, headers: Optional[Dict[str, str]] = None, pool_size: int = 64,
+                 per_host_limit: int = 16, max_retries: int = 2, backoff_base: float = 0.3,
+                 timeout: float = 5, max_retry_after: float = MAX_RETRY_AFTER):
+        if not HAS_AIOHTTP:
+            raise RuntimeError("asyncio 模式需要安裝 aiohttp")
+        self.headers = headers or {}
+        self.pool_size = pool_size
+        self.per_host_limit = per_host_limit
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.timeout = timeout
+        self.max_retry_after = max_retry_after
+        self.session = None
+
+    async def __aenter__(self) -> 'AsyncHttpClient':
+        connector = aiohttp.TCPConnector(limit=self.pool_size, limit_per_host=self.per_host_limit)
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            headers=self.headers,
+            timeout=aiohttp.ClientTimeout(total=self.timeout)
+        )
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    async def status(self, method: str, url: str) -> Optional[int]:
+        """
+        發送請求並只回傳狀態碼，重試用盡仍連線失敗時回傳 None
+        Retry-After 超過 max_retry_after 時不等待，直接回傳該狀態碼
+        """
+        attempt = 0
+        while True:
+            delay = None
+            try:
+                async with self.session.request(method, url, allow_redirects=False) as response:
+                    if response.status not in RETRY_STATUS or attempt >= self.max_retries:
+                        return response.status
+                    delay = _retry_after(response.headers)
+                    if delay is not None and delay > self.max_retry_after:
+                        return response.status
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt >= self.max_retries:
+                    return None
+            await asyncio.sleep(max(delay, 0) if delay is not None else backoff_delay(attempt, self.backoff_base))
+            attempt += 1
+
+    async def first_ok(self, candidates: Sequence[Optional[str]], method: str = 'HEAD') -> Optional[int]:
+        """
+        同時探測所有候選 URL，回傳優先順序最高且狀態為 200 的索引
+
+        Args:
+            candidates: 依優先順序排列的 URL（None 會略過）
+            method: HTTP 方法
+
+        Returns:
+            命中的候選索引，全部失敗時回傳 None
+        """
+        indices = [i for i, url in enumerate(candidates) if url]
+        statuses = await asyncio.gather(*(self.status(method, candidates[i]) for i in indices))
+        for i, status in zip(indices, statuses):
+            if status == 200:
+                return i
+        return None
+
+    async def first_ok_many(self, candidate_lists: List[Sequence[Optional[str]]],
+                            method: str = 'HEAD') -> List[Optional[int]]:
+        """對多組候選 URL 併發執行 first_ok"""
+        return await asyncio.gather(*(self.first_ok(c, method) for c in candidate_lists))
+
+
+def run_first_ok_many(candidate_lists: List[Sequence[Optional[str]]], **client_kwargs: Any) -> List[Optional[int]]:
+    """在新的事件迴圈上執行 AsyncHttpClient.first_ok_many（供同步程式碼呼叫）"""
+    async def _run():
+        async with AsyncHttpClient(**client_kwargs) as client:
+            return await client.first_ok_many(candidate_lists)
+    return asyncio.run(_run())
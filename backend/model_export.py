@@ -0,0 +1,153 @@
+"""
+將訓練好的 Keras 分類模型匯出為 TFLite
+- 以固定批次 1 的具體函式轉換，權重凍結為常數 (tf.keras 2 的 LSTM 會轉為融合運算
+  UNIDIRECTIONAL_SEQUENCE_LSTM，Keras 3 則為 WHILE 迴圈，兩者都只需要內建運算)
+- 量化方式：none (float32)、dynamic (權重 int8)、int8 (權重與運算皆 int8，需要代表性資料)；
+  int8 校準無法處理 LSTM 的 WHILE 迴圈，改以展開時間步的等價模型轉換
+- 匯出後與 Keras 在同一批資料上比對輸出，差異過大時移除匯出檔，即時推論繼續使用 Keras
+"""
+import os
+from typing import Dict, Optional
+
+import numpy as np
+
+from services.classifier_runtime import TFLiteClassifier, tflite_path_for
+
+QUANTIZATIONS = ('none', 'dynamic', 'int8')
+# 代表性資料 (int8 量化校準) 最多使用的樣本數
+REPRESENTATIVE_SAMPLES = 100
+# 與 Keras 輸出容許的最大機率差異 (不用預測類別一致比例判斷：機率接近時微小差異就會改變類別)
+FLOAT_MAX_DIFF = 1e-3
+QUANTIZED_MAX_DIFF = 0.05
+
+
+def _unrolled(model):
+    """權重相同、LSTM 展開所有時間步的等價模型 (Bidirectional 內的 LSTM 一併展開)"""
+    def unroll(config):
+        if isinstance(config, dict):
+            if 'unroll' in config:
+                config['unroll'] = True
+            for value in config.values():
+                unroll(value)
+        elif isinstance(config, list):
+            for value in config:
+                unroll(value)
+
+    config = model.get_config()
+    unroll(config)
+    clone = model.__class__.from_config(config)
+    clone.set_weights(model.get_weights())
+    return clone
+
+
+def export_tflite(model, output_path: str, quantization: str = 'none',
+                  representative_data: Optional[np.ndarray] = None) -> str:
+    """
+    匯出 TFLite 模型 (先寫暫存檔再替換，執行中的推論不會讀到寫到一半的檔案)
+
+    Args:
+        model: Keras 模型
+        output_path: .tflite 路徑
+        quantization: none / dynamic / int8
+        representative_data: (筆數, 幀, 特徵) 已標準化的訓練資料，int8 量化時必須提供
+
+    Returns:
+        檔案路徑
+
+    Raises:
+        ValueError: 未知的量化方式或 int8 缺少代表性資料
+    """
+    import tensorflow as tf
+
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"未知的量化方式: {quantization} (可用: {', '.join(QUANTIZATIONS)})")
+    if quantization == 'int8' and (representative_data is None or not len(representative_data)):
+        raise ValueError("int8 量化需要代表性資料")
+
+    input_shape = [1] + list(model.input_shape[1:])
+    if quantization == 'int8':
+        model = _unrolled(model)
+
+    @tf.function(input_signature=[tf.TensorSpec(input_shape, tf.float32)])
+    def serve(x):
+        return model(x, training=False)
+
+    # 不傳入模型物件：權重才會凍結為常數，否則 Keras 3 的 LSTM 會留下執行時讀不到的資源變數
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([serve.get_concrete_function()])
+    if quantization != 'none':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == 'int8':
+        samples = np.asarray(representative_data[:REPRESENTATIVE_SAMPLES], dtype=np.float32)
+
+        def representative_dataset():
+            for sample in samples:
+                yield [sample[np.newaxis]]
+
+        converter.representative_dataset = representative_dataset
+        # 無法量化的運算保留 float，輸入輸出維持 float32 (呼叫端不需處理量化參數)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8,
+                                               tf.lite.OpsSet.TFLITE_BUILTINS]
+
+    content = converter.convert()
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    tmp_path = f"{output_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+def compare_outputs(reference: np.ndarray, outputs: np.ndarray) -> Dict:
+    """
+    比較兩組分類機率
+
+    Returns:
+        {'samples', 'max_abs_diff', 'mean_abs_diff', 'agreement' (預測類別一致的比例)}
+    """
+    diff = np.abs(np.asarray(reference, dtype=np.float32) - np.asarray(outputs, dtype=np.float32))
+    return {
+        'samples': int(len(reference)),
+        'max_abs_diff': float(diff.max()) if diff.size else 0.0,
+        'mean_abs_diff': float(diff.mean()) if diff.size else 0.0,
+        'agreement': float(np.mean(np.argmax(reference, axis=1) == np.argmax(outputs, axis=1)))
+        if len(reference) else 1.0
+    }
+
+
+def parity_passed(parity: Dict, quantization: str) -> bool:
+    limit = FLOAT_MAX_DIFF if quantization == 'none' else QUANTIZED_MAX_DIFF
+    return parity['max_abs_diff'] <= limit
+
+
+def export_classifier(model, model_path: str, X_check: np.ndarray, quantization: str = 'none',
+                      representative_data: Optional[np.ndarray] = None) -> Dict:
+    """
+    匯出 model_path 同名的 .tflite，並以 X_check 與 Keras 比對
+
+    比對未通過時不留下 .tflite (RealtimeClassifier 會改用 .h5)
+
+    Returns:
+        {'path', 'quantization', 'size_bytes', 'parity', 'passed'}
+    """
+    lite_path = tflite_path_for(model_path)
+    # 先匯出到候選檔，比對通過後才替換，執行中的推論不會載入未通過的模型
+    candidate_path = export_tflite(model, f"{lite_path}.candidate", quantization, representative_data)
+    X_check = np.asarray(X_check, dtype=np.float32)
+    reference = model.predict(X_check, verbose=0)
+    parity = compare_outputs(reference, TFLiteClassifier(candidate_path).predict(X_check))
+    passed = parity_passed(parity, quantization)
+    result = {
+        'path': lite_path,
+        'quantization': quantization,
+        'size_bytes': os.path.getsize(candidate_path),
+        'parity': parity,
+        'passed': passed
+    }
+    if passed:
+        os.replace(candidate_path, lite_path)
+    else:
+        os.remove(candidate_path)
+        # 舊的 .tflite 對應先前的模型，不能再使用
+        if os.path.exists(lite_path):
+            os.remove(lite_path)
+    return result
@@ -0,0 +1,169 @@
+"""
+姿勢估計的輸入前處理
+MediaPipe 內部只用 256x256 的影像估計骨架，直接送入 1080p 畫面只是浪費色彩轉換與縮放的時間：
+- 先縮小到指定長邊再轉 RGB (cvtColor 只作用在小圖上)
+- 依前一幀的關鍵點追蹤選手範圍 (ROI)，之後的幀只裁切這個範圍，
+  遠處的選手在縮小後仍保有足夠的像素
+- 估計結果換算回完整畫面的正規化座標，呼叫端不需要知道有裁切或縮放
+"""
+from typing import Optional, Tuple
+
+import numpy as np
+
+try:
+    import cv2
+    HAS_CV2 = True
+except ImportError:
+    cv2 = None
+    HAS_CV2 = False
+
+# 計算選手範圍時只採用可見度高於此值的關鍵點
+ROI_VISIBILITY = 0.5
+# ROI 幾乎涵蓋整個畫面時直接使用整個畫面
+FULL_FRAME_RATIO = 0.9
+
+
+def _downscale(image: np.ndarray, target_size: int) -> np.ndarray:
+    """
+    縮小到指定長邊：先以 INTER_AREA 每次縮小一半 (OpenCV 對偶數邊長的 2 倍縮小有快速路徑)，
+    剩下不到一半的比例用 INTER_LINEAR (任意比例的 INTER_AREA 比雙線性慢數倍)
+    """
+    while max(image.shape[:2]) >= target_size * 2 and not (image.shape[0] % 2 or image.shape[1] % 2):
+        height, width = image.shape[:2]
+        image = cv2.resize(image, (width // 2, height // 2), interpolation=cv2.INTER_AREA)
+    height, width = image.shape[:2]
+    scale = target_size / max(width, height)
+    if scale < 1:
+        size = (max(int(round(width * scale)), 1), max(int(round(height * scale)), 1))
+        image = cv2.resize(image, size, interpolation=cv2.INTER_LINEAR)
+    return image
+
+
+class PoseInputPreprocessor:
+    """縮小並裁切送入 MediaPipe 的畫面，並將結果換算回完整畫面座標"""
+
+    def __init__(self, target_size: int = 640, roi: bool = True, margin: float = 0.35,
+                 min_roi: float = 0.3):
+        """
+        Args:
+            target_size: 送入姿勢估計的影像長邊 (0 表示不縮小)
+            roi: 依前一幀的骨架裁切選手範圍
+            margin: 選手外框四周各保留的比例 (相對外框長邊)，讓揮拍與移動不會超出範圍
+            min_roi: ROI 邊長下限 (相對畫面短邊)
+        """
+        self.target_size = target_size
+        self.roi = roi
+        self.margin = margin
+        self.min_roi = min_roi
+        self.reset()
+
+    def reset(self):
+        """清除追蹤中的選手範圍 (換到不連續的畫面時呼叫)"""
+        self._roi: Optional[Tuple[int, int, int, int]] = None
+        self.frames = 0
+        self.roi_frames = 0
+        self.roi_misses = 0
+
+    def prepare(self, frame: np.ndarray, use_roi: bool = True) -> Tuple[np.ndarray, Tuple[int, int, int, int]]:
+        """
+        裁切、縮小並轉為 RGB
+
+        Args:
+            frame: BGR 畫面
+            use_roi: 是否使用追蹤中的選手範圍
+
+        Returns:
+            (RGB 影像, 裁切範圍 (x, y, 寬, 高)，以完整畫面像素計)
+        """
+        height, width = frame.shape[:2]
+        x, y, w, h = self._roi if (use_roi and self.roi and self._roi) else (0, 0, width, height)
+        image = frame[y:y + h, x:x + w]
+        if self.target_size and max(w, h) > self.target_size:
+            image = _downscale(image, self.target_size)
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB), (x, y, w, h)
+
+    def process(self, pose, frame: np.ndarray):
+        """
+        前處理後執行姿勢估計，並將關鍵點換算回完整畫面的正規化座標
+
+        以 ROI 估計不到人時，改用整個畫面重新估計一次
+
+        Args:
+            pose: MediaPipe Pose (或任何有 process(rgb_frame) 的物件)
+            frame: BGR 畫面
+
+        Returns:
+            MediaPipe 的結果 (關鍵點已就地換算)
+        """
+        height, width = frame.shape[:2]
+        self.frames += 1
+        used_roi = bool(self.roi and self._roi)
+        rgb, crop = self.prepare(frame)
+        results = pose.process(rgb)
+        if used_roi:
+            self.roi_frames += 1
+            if not results.pose_landmarks:
+                self.roi_misses += 1
+                self._roi = None
+                rgb, crop = self.prepare(frame, use_roi=False)
+                results = pose.process(rgb)
+
+        if results.pose_landmarks:
+            self._to_frame_coordinates(results.pose_landmarks.landmark, crop, width, height)
+            if self.roi:
+                self._update_roi(results.pose_landmarks.landmark, width, height)
+        else:
+            self._roi = None
+        return results
+
+    @staticmethod
+    def _to_frame_coordinates(landmarks, crop, width: int, height: int):
+        """將裁切範圍內的正規化座標換算為完整畫面的正規化座標 (z 與 x 同比例)"""
+        x, y, w, h = crop
+        if (x, y, w, h) == (0, 0, width, height):
+            return
+        sx, sy = w / width, h / height
+        ox, oy = x / width, y / height
+        for landmark in landmarks:
+            landmark.x = ox + landmark.x * sx
+            landmark.y = oy + landmark.y * sy
+            landmark.z = landmark.z * sx
+
+    def _update_roi(self, landmarks, width: int, height: int):
+        """
+        以這一幀的骨架外框更新選手範圍
+
+        新外框仍在目前範圍內時不移動，避免範圍每幀抖動 (MediaPipe 會沿用前一幀的位置追蹤)
+        """
+        points = np.array([[lm.x * width, lm.y * height, lm.visibility] for lm in landmarks], dtype=np.float32)
+        visible = points[points[:, 2] > ROI_VISIBILITY, :2]
+        if len(visible) < 4:
+            visible = points[:, :2]
+        (x0, y0), (x1, y1) = visible.min(axis=0), visible.max(axis=0)
+
+        if self._roi:
+            rx, ry, rw, rh = self._roi
+            pad = self.margin * 0.5 * max(x1 - x0, y1 - y0)
+            if x0 - pad >= rx and y0 - pad >= ry and x1 + pad <= rx + rw and y1 + pad <= ry + rh:
+                return
+
+        # 以外框中心取正方形範圍，水平方向保留揮拍空間
+        side = max(x1 - x0, y1 - y0) * (1 + 2 * self.margin)
+        side = max(side, self.min_roi * min(width, height))
+        if side >= FULL_FRAME_RATIO * width and side >= FULL_FRAME_RATIO * height:
+            self._roi = None
+            return
+        cx, cy = (x0 + x1) / 2, (y0 + y1) / 2
+        # 偶數邊長讓縮小可以走 2 倍縮小的快速路徑
+        w, h = int(min(side, width)) & ~1, int(min(side, height)) & ~1
+        x = int(np.clip(cx - w / 2, 0, width - w))
+        y = int(np.clip(cy - h / 2, 0, height - h))
+        self._roi = (x, y, w, h)
+
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'roi_frames': self.roi_frames,
+            'roi_misses': self.roi_misses,
+            'roi': list(self._roi) if self._roi else None
+        }
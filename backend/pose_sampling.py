@@ -0,0 +1,322 @@
+"""
+姿勢估計的抽幀與插值
+MediaPipe 不必在每一幀都執行：每隔 k 幀 (或依動作量自動調整間隔) 估計一次，
+中間的幀以前後兩個估計結果線性插值 (座標與可見度一次向量化計算)，
+並以 confidence 標示每個關鍵點的可信度，讓呼叫端知道哪些值是插值而來
+
+- FrameSampler：決定下一次估計要隔幾幀
+- iter_track：背景執行緒解碼，逐段產生插值完成的骨架 (可與繪製、編碼重疊)
+- extract_track：讀取影片並回傳完整的 PoseTrack
+- interpolate_track：由估計過的幀補齊整段序列
+"""
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import cv2
+    HAS_CV2 = True
+except ImportError:
+    cv2 = None
+    HAS_CV2 = False
+
+NUM_POSE_LANDMARKS = 33
+# 排除臉部 (1-10) 後保留的關鍵點：鼻子 (0) 與身體 (11-32)
+BODY_LANDMARKS = [0] + list(range(11, NUM_POSE_LANDMARKS))
+# 影片結尾之後沒有估計結果可插值，沿用最後一次結果時的可信度比例
+HOLD_CONFIDENCE = 0.5
+# 解碼執行緒的結束標記
+_END = object()
+
+
+@dataclass
+class PoseTrack:
+    """
+    整段影片的骨架序列
+
+    Attributes:
+        landmarks: (幀, 33, 4)，每個關鍵點為 x, y, z, visibility；沒有偵測到人的幀為 0
+        confidence: (幀, 33)，估計的幀等於 visibility，插值的幀隨與估計幀的距離遞減
+        detected: (幀,) 是否有骨架 (估計或插值)
+        keyframes: (幀,) 是否實際執行了姿勢估計
+        fps: 幀率
+    """
+    landmarks: np.ndarray
+    confidence: np.ndarray
+    detected: np.ndarray
+    keyframes: np.ndarray
+    fps: float
+
+    def __len__(self):
+        return len(self.landmarks)
+
+    @property
+    def interpolated(self) -> np.ndarray:
+        """(幀,) 骨架由插值而來的幀"""
+        return self.detected & ~self.keyframes
+
+    def body(self, channels: int = 3) -> np.ndarray:
+        """排除臉部後的 (幀, 23, channels) 序列，與模型輸入相同的排列"""
+        return self.landmarks[:, BODY_LANDMARKS, :channels]
+
+    def slice(self, start: int, stop: int) -> 'PoseTrack':
+        """取出 [start, stop) 幀"""
+        return PoseTrack(self.landmarks[start:stop], self.confidence[start:stop],
+                         self.detected[start:stop], self.keyframes[start:stop], self.fps)
+
+    def stats(self):
+        frames = len(self)
+        return {
+            'frames': frames,
+            'keyframes': int(self.keyframes.sum()),
+            'interpolated': int(self.interpolated.sum()),
+            'detected': int(self.detected.sum()),
+            'pose_ratio': round(float(self.keyframes.sum()) / frames, 3) if frames else 0.0
+        }
+
+
+class FrameSampler:
+    """決定相鄰兩次姿勢估計之間的間隔"""
+
+    def __init__(self, stride: int = 1, adaptive: bool = False, max_stride: int = 4,
+                 target_motion: float = 0.01):
+        """
+        Args:
+            stride: 固定間隔 (每 stride 幀估計一次)；adaptive 時為最小間隔
+            adaptive: 依動作量自動調整間隔
+            max_stride: adaptive 時的最大間隔
+            target_motion: adaptive 時兩次估計之間關鍵點允許的最大位移 (正規化座標)，
+                           動作越快間隔越短
+        """
+        self.stride = max(int(stride), 1)
+        self.adaptive = adaptive
+        self.max_stride = max(int(max_stride), self.stride)
+        self.target_motion = target_motion
+
+    def next_stride(self, previous: Optional[Tuple[int, np.ndarray]],
+                    current: Tuple[int, np.ndarray]) -> int:
+        """
+        Args:
+            previous / current: 前一次與這一次估計的 (幀索引, (33, 4) 關鍵點)，沒有偵測到人時關鍵點為 NaN
+
+        Returns:
+            到下一次估計的幀數
+        """
+        if not self.adaptive:
+            return self.stride
+        index, landmarks = current
+        if np.isnan(landmarks[0, 0]):
+            # 畫面中沒有人：以最大間隔等待人出現
+            return self.max_stride
+        if previous is None or np.isnan(previous[1][0, 0]):
+            return self.stride
+        visible = (landmarks[:, 3] > 0.5) & (previous[1][:, 3] > 0.5)
+        if not visible.any():
+            return self.stride
+        displacement = np.linalg.norm(landmarks[visible, :2] - previous[1][visible, :2], axis=1).max()
+        speed = displacement / max(index - previous[0], 1)
+        return int(np.clip(self.target_motion / max(speed, 1e-6), self.stride, self.max_stride))
+
+
+def pose_landmarks_array(results) -> np.ndarray:
+    """將 MediaPipe 的結果轉為 (33, 4) 陣列，沒有偵測到人時為 NaN"""
+    if not results or not results.pose_landmarks:
+        return np.full((NUM_POSE_LANDMARKS, 4), np.nan, dtype=np.float32)
+    return np.array([[lm.x, lm.y, lm.z, lm.visibility] for lm in results.pose_landmarks.landmark],
+                    dtype=np.float32)
+
+
+def interpolate_track(key_indices: np.ndarray, key_landmarks: np.ndarray, frames: int,
+                      fps: float = 30.0) -> PoseTrack:
+    """
+    由估計過的幀補齊整段序列
+
+    相鄰兩個估計幀都有偵測到人時，中間的幀線性插值；任一端沒有人則視為沒有人。
+    最後一個估計幀之後的幀沿用其結果 (可信度乘上 HOLD_CONFIDENCE)
+
+    Args:
+        key_indices: 估計幀的索引 (遞增，第一個為 0)
+        key_landmarks: (估計幀數, 33, 4)，沒有偵測到人為 NaN
+        frames: 總幀數
+        fps: 幀率
+
+    Returns:
+        PoseTrack
+    """
+    landmarks = np.zeros((frames, NUM_POSE_LANDMARKS, 4), dtype=np.float32)
+    confidence = np.zeros((frames, NUM_POSE_LANDMARKS), dtype=np.float32)
+    detected = np.zeros(frames, dtype=bool)
+    keyframes = np.zeros(frames, dtype=bool)
+    key_indices = np.asarray(key_indices, dtype=int)
+    if frames == 0 or len(key_indices) == 0:
+        return PoseTrack(landmarks, confidence, detected, keyframes, fps)
+
+    keyframes[key_indices] = True
+    key_detected = ~np.isnan(key_landmarks[:, 0, 0])
+    key_landmarks = np.nan_to_num(key_landmarks)
+
+    index = np.arange(frames)
+    left = np.clip(np.searchsorted(key_indices, index, side='right') - 1, 0, len(key_indices) - 1)
+    right = np.minimum(left + 1, len(key_indices) - 1)
+    start, end = key_indices[left], key_indices[right]
+    span = end - start
+    held = span == 0
+    weight = np.where(held, 0.0, (index - start) / np.maximum(span, 1)).astype(np.float32)
+
+    w = weight[:, np.newaxis, np.newaxis]
+    landmarks[:] = key_landmarks[left] * (1 - w) + key_landmarks[right] * w
+    detected[:] = key_detected[left] & (held | key_detected[right])
+
+    # 估計幀為 1，往兩個估計幀中間遞減到 0.5
+    distance = np.minimum(index - start, np.where(held, 0, end - index))
+    factor = np.where(held, HOLD_CONFIDENCE, 1.0 - distance / np.maximum(span, 1))
+    factor[keyframes] = 1.0
+    confidence[:] = landmarks[:, :, 3] * factor[:, np.newaxis]
+
+    landmarks[~detected] = 0.0
+    confidence[~detected] = 0.0
+    return PoseTrack(landmarks, confidence, detected, keyframes, fps)
+
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    """放入有上限的佇列，停止時放棄 (避免消費端提早結束時卡住)"""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q: queue.Queue, stop: threading.Event):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return None
+
+
+def _read_keyframes(cap, sampler: FrameSampler, total: int, max_frames: Optional[int],
+                    frames_out: queue.Queue, feedback: queue.Queue, stop: threading.Event):
+    """
+    解碼執行緒：略過的幀只 grab 不 retrieve，需要估計的幀解碼後交給姿勢估計
+
+    adaptive 時下一個估計幀由估計結果決定，送出一幀後等待 feedback 回傳下一個估計幀的索引；
+    結束時送出 (總幀數, _END)
+    """
+    index = 0
+    next_key = 0
+    try:
+        while not stop.is_set() and (not max_frames or index < max_frames):
+            is_key = index == next_key or index == total - 1
+            if is_key:
+                ret, frame = cap.read()
+            else:
+                ret = cap.grab()
+            if not ret:
+                break
+            if is_key:
+                if not _put(frames_out, (index, frame), stop):
+                    return
+                proposed = _get(feedback, stop) if sampler.adaptive else index + sampler.stride
+                if proposed is None:
+                    return
+                if index == next_key:
+                    next_key = proposed
+            index += 1
+    finally:
+        cap.release()
+        _put(frames_out, (index, _END), stop)
+
+
+def iter_track(pose, video_path: str, sampler: Optional[FrameSampler] = None,
+               max_frames: Optional[int] = None, preprocessor=None,
+               queue_size: int = 8) -> Iterator[Tuple[int, PoseTrack]]:
+    """
+    逐段產生骨架序列：解碼在背景執行緒進行，與姿勢估計重疊；
+    每估計完一幀，就輸出從前一個估計幀到這一幀之前的插值結果
+
+    只在 sampler 選出的幀執行姿勢估計，最後一幀 (依影片幀數) 一定估計，讓結尾也能插值
+
+    Args:
+        pose: MediaPipe Pose (或任何有 process(rgb_frame) 的物件)
+        video_path: 影片路徑
+        sampler: FrameSampler，預設每一幀都估計
+        max_frames: 最多讀取的幀數
+        preprocessor: PoseInputPreprocessor，縮小並裁切送入估計的畫面 (None 表示使用原始畫面)
+        queue_size: 解碼後等待估計的幀數上限
+
+    Yields:
+        (起始幀索引, 該段的 PoseTrack)，依序相接涵蓋整段影片
+    """
+    sampler = sampler or FrameSampler()
+    if preprocessor is not None:
+        preprocessor.reset()
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    if max_frames:
+        total = min(total, max_frames) if total > 0 else max_frames
+
+    frames_in: queue.Queue = queue.Queue(maxsize=queue_size)
+    feedback: queue.Queue = queue.Queue()
+    stop = threading.Event()
+    reader = threading.Thread(target=_read_keyframes, daemon=True,
+                              args=(cap, sampler, total, max_frames, frames_in, feedback, stop))
+    reader.start()
+
+    previous = None
+    try:
+        while True:
+            index, frame = frames_in.get()
+            if frame is _END:
+                if previous is not None:
+                    # 最後一個估計幀與之後沿用其結果的幀
+                    yield previous[0], interpolate_track(np.array([0]), previous[1][np.newaxis],
+                                                         index - previous[0], fps)
+                break
+            if preprocessor is not None:
+                results = preprocessor.process(pose, frame)
+            else:
+                results = pose.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+            landmarks = pose_landmarks_array(results)
+            if sampler.adaptive:
+                feedback.put(index + sampler.next_stride(previous, (index, landmarks)))
+            if previous is not None:
+                gap = index - previous[0]
+                segment = interpolate_track(np.array([0, gap]), np.stack([previous[1], landmarks]), gap + 1, fps)
+                yield previous[0], segment.slice(0, gap)
+            previous = (index, landmarks)
+    finally:
+        stop.set()
+        reader.join()
+
+
+def concat_tracks(tracks: List[PoseTrack], fps: float = 30.0) -> PoseTrack:
+    """依序串接多段 PoseTrack"""
+    if not tracks:
+        return interpolate_track(np.array([], dtype=int), np.zeros((0, NUM_POSE_LANDMARKS, 4)), 0, fps)
+    return PoseTrack(
+        np.concatenate([t.landmarks for t in tracks]),
+        np.concatenate([t.confidence for t in tracks]),
+        np.concatenate([t.detected for t in tracks]),
+        np.concatenate([t.keyframes for t in tracks]),
+        tracks[0].fps
+    )
+
+
+def extract_track(pose, video_path: str, sampler: Optional[FrameSampler] = None,
+                  max_frames: Optional[int] = None, preprocessor=None) -> PoseTrack:
+    """
+    讀取影片，只在 sampler 選出的幀執行姿勢估計，其餘以插值補齊 (參數同 iter_track)
+
+    Returns:
+        整段影片的 PoseTrack
+    """
+    segments = [segment for _, segment in iter_track(pose, video_path, sampler, max_frames, preprocessor)]
+    return concat_tracks(segments)
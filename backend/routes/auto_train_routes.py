@@ -221,6 +221,47 @@ def get_clip(clip_id: str):
         }), 500
 
 
+@auto_train_bp.route('/clips/<clip_id>/skeleton', methods=['GET'])
+def get_clip_skeleton(clip_id: str):
+    """
+    取得片段的骨架資料 (由 .skel 檔只讀取要求的幀範圍)
+    
+    Query Parameters:
+        - start: 起始幀 (預設 0)
+        - end: 結束幀，不含 (預設 start + 300)
+    """
+    try:
+        service = get_auto_training_service()
+        
+        if clip_id not in service.clips:
+            return jsonify({
+                "success": False,
+                "error": "片段不存在"
+            }), 404
+        
+        skeleton = service.load_skeleton(clip_id)
+        if skeleton is None:
+            return jsonify({
+                "success": False,
+                "error": "片段尚未提取骨架"
+            }), 404
+        
+        start = max(request.args.get('start', 0, type=int), 0)
+        end = request.args.get('end', start + 300, type=int)
+        
+        return jsonify({
+            "success": True,
+            "skeleton": skeleton.summary(),
+            "start": start,
+            "frames": skeleton.to_frames(start, end)
+        })
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+
 @auto_train_bp.route('/clips/<clip_id>/approve', methods=['POST'])
 def approve_clip(clip_id: str):
     """核准片段"""
@@ -22,3 +22,16 @@ def health():
 def api_health():
     """API 健康檢查端點"""
     return jsonify({'status': 'ok', 'message': 'Server is running'})
+
+
+@health_bp.get('/api/health/gemini')
+def gemini_health():
+    """Gemini 閘道、回應快取與上傳檔案的統計"""
+    from services.gemini_cache import get_gemini_cache
+    from services.gemini_files import get_gemini_file_manager
+    from services.gemini_gateway import get_gemini_gateway
+    return jsonify({
+        'gateway': get_gemini_gateway().stats(),
+        'response_cache': get_gemini_cache().stats(),
+        'files': get_gemini_file_manager().stats()
+    })
@@ -55,6 +55,8 @@ def init_live_routes(socketio):
         frame_data = data.get('frame')  # base64 編碼的圖片
         
         if frame_data:
+            frame = None
+            pose_energy = None
             # 1. 本地模型分析 (同步執行，因為需要即時回饋)
             if local_classifier:
                 try:
@@ -72,17 +74,17 @@ def init_live_routes(socketio):
                     frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
                     
                     if frame is not None:
-                        # 轉換為 RGB
-                        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                        result = local_classifier.process_frame(frame_rgb)
+                        # BGR 畫面，由分類器與訓練相同的前處理轉為 RGB
+                        result = local_classifier.process_frame(frame)
+                        pose_energy = result.get('motion_energy')
                         
                         if result['prediction']:
                             emit('prediction', result, namespace='/live', room=session_id)
                 except Exception as e:
                     print(f"Local model error: {e}")
 
-            # 2. Gemini 分析 (異步)
-            asyncio.create_task(process_frame_async(service, frame_data, session_id, socketio))
+            # 2. Gemini 分析 (異步，只在偵測到回合開始/結束時呼叫；沿用已解碼的畫面與姿勢動作量)
+            asyncio.create_task(process_frame_async(service, frame_data, session_id, socketio, frame, pose_energy))
 
     @socketio.on('start_analysis', namespace='/live')
     def handle_start_analysis(data):
@@ -181,10 +183,10 @@ def init_live_routes(socketio):
             })
 
 
-async def process_frame_async(service, frame_data, session_id, socketio):
+async def process_frame_async(service, frame_data, session_id, socketio, frame=None, pose_energy=None):
     """異步處理視訊幀"""
     try:
-        result = await service.process_frame(frame_data)
+        result = await service.process_frame(frame_data, frame, pose_energy)
         if result:
             # 發送分析結果
             socketio.emit('frame_analysis', result, namespace='/live', room=session_id)
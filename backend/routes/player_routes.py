@@ -23,6 +23,32 @@ def get_players():
             "error": str(e)
         }), 500
 
+@player_bp.route('/search', methods=['GET'])
+def search_players():
+    """選手名稱自動完成"""
+    try:
+        query = request.args.get('q', '')
+        limit = int(request.args.get('limit', 10))
+        if not query:
+            return jsonify({
+                "success": False,
+                "error": "Missing search query"
+            }), 400
+        
+        service = get_player_service()
+        results = service.search_players(query, limit)
+        
+        return jsonify({
+            "success": True,
+            "results": results,
+            "total": len(results)
+        })
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
 @player_bp.route('/<player_id>', methods=['GET'])
 def get_player(player_id):
     """取得單一選手詳情"""
@@ -1,8 +1,10 @@
 """
 比賽預測 API 路由
 """
+from datetime import datetime
 from flask import request, jsonify
 from services.prediction_model import MatchPredictor
+from services.wtt_data_collector import DuplicateMatchError, MatchRecord
 from services.tactics_advisor import TacticsAdvisor
 from . import predict_bp
 
@@ -26,6 +28,18 @@ def health_check():
     })
 
 
+@predict_bp.route('/cache', methods=['GET'])
+def cache_stats():
+    """取得預測快取命中統計"""
+    pred = get_predictor()
+    return jsonify({
+        "success": True,
+        "cache": pred.cache.stats(),
+        "model_version": pred.model_version,
+        "data_version": pred.data_collector.version
+    })
+
+
 @predict_bp.route('/players', methods=['GET'])
 def get_players():
     """取得選手列表"""
@@ -174,6 +188,106 @@ def head_to_head():
         }), 500
 
 
+@predict_bp.route('/ratings/<player_name>', methods=['GET'])
+def player_rating(player_name: str):
+    """取得選手即時評分與評分歷史"""
+    try:
+        pred = get_predictor()
+        collector = pred.data_collector
+        
+        if player_name not in collector.ratings.players:
+            return jsonify({
+                "success": False,
+                "error": f"找不到選手 {player_name} 的評分"
+            }), 404
+        
+        return jsonify({
+            "success": True,
+            "rating": collector.get_player_rating(player_name),
+            "history": collector.ratings.get_history(player_name)
+        })
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+
+@predict_bp.route('/results', methods=['POST'])
+def add_result():
+    """新增比賽結果，即時更新評分（無需重新訓練模型）"""
+    try:
+        data = request.get_json() or {}
+        player1 = data.get('player1')
+        player2 = data.get('player2')
+        winner = data.get('winner')
+        score = data.get('score', '')
+        
+        if not player1 or not player2 or player1 == player2:
+            return jsonify({
+                "success": False,
+                "error": "請提供兩位不同的選手名稱"
+            }), 400
+        
+        if winner not in (player1, player2):
+            return jsonify({
+                "success": False,
+                "error": "winner 必須是 player1 或 player2 其中之一"
+            }), 400
+        
+        score_parts = score.split('-')
+        if len(score_parts) != 2 or not all(part.isdigit() for part in score_parts):
+            return jsonify({
+                "success": False,
+                "error": "請提供比分，例如 4-2"
+            }), 400
+        
+        pred = get_predictor()
+        collector = pred.data_collector
+        players = {p["name"]: p for p in collector.players.values()}
+        p1_info = players.get(player1, {})
+        p2_info = players.get(player2, {})
+        
+        match = MatchRecord(
+            match_id=str(data.get('match_id') or ''),
+            date=data.get('date') or datetime.now().strftime("%Y-%m-%d"),
+            tournament=data.get('tournament', ''),
+            round=data.get('round', ''),
+            player1_name=player1,
+            player1_country=p1_info.get("country", ''),
+            player1_rank=p1_info.get("rank", 999),
+            player2_name=player2,
+            player2_country=p2_info.get("country", ''),
+            player2_rank=p2_info.get("rank", 999),
+            winner="player1" if winner == player1 else "player2",
+            score=score,
+            sets=data.get('sets', []),
+            match_type=data.get('match_type', 'singles'),
+            gender=data.get('gender', p1_info.get("gender", ''))
+        )
+        try:
+            collector.add_match(match)
+        except DuplicateMatchError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 409
+        
+        return jsonify({
+            "success": True,
+            "match": match.to_dict(),
+            "ratings": {
+                player1: collector.get_player_rating(player1),
+                player2: collector.get_player_rating(player2)
+            }
+        })
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e)
+        }), 500
+
+
 # 戰術建議實例
 tactics_advisor = None
 
@@ -181,7 +295,7 @@ tactics_advisor = None
 def get_tactics_advisor():
     global tactics_advisor
     if tactics_advisor is None:
-        tactics_advisor = TacticsAdvisor()
+        tactics_advisor = TacticsAdvisor(predictor=get_predictor())
     return tactics_advisor
 
 
@@ -2,7 +2,8 @@
 排名相關路由
 處理 WTT 排名資料的查詢和更新
 """
-from flask import jsonify
+import threading
+from flask import jsonify, request, Response
 from . import ranking_bp
 from services.ranking_service import RankingService
 
@@ -26,12 +27,61 @@ def get_ranking(category: str):
             'valid_categories': valid_categories
         }), 400
     
-    data = ranking_service.get_ranking(category)
+    snapshot = ranking_service.get_ranking_snapshot(category)
     
-    if data:
-        return jsonify(data), 200
-    else:
+    if not snapshot:
         return jsonify({'error': '無法取得資料'}), 500
+    
+    # 資料未變更時回傳 304
+    if request.if_none_match.contains(snapshot.etag):
+        response = Response(status=304)
+        response.set_etag(snapshot.etag)
+        return response
+    
+    # 直接回傳預先序列化與壓縮的內容
+    body, encoding = snapshot.encoded_body(request.headers.get('Accept-Encoding', ''))
+    response = Response(body, status=200, mimetype='application/json')
+    response.set_etag(snapshot.etag)
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = 'no-cache'
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+@ranking_bp.route('/rankings/<category>/history/<player_id>', methods=['GET'])
+def get_player_trajectory(category: str, player_id: str):
+    """
+    取得選手的名次軌跡
+    
+    Query Parameters:
+        days: 往回查詢的天數 (預設 365)
+    """
+    if category not in ranking_service.VALID_CATEGORIES:
+        return jsonify({'error': '無效的類別'}), 400
+    
+    days = request.args.get('days', 365, type=float)
+    trajectory = ranking_service.get_player_trajectory(category, player_id, days)
+    if not trajectory['points']:
+        return jsonify({'error': f'找不到選手 {player_id} 的排名歷史'}), 404
+    return jsonify(trajectory), 200
+
+
+@ranking_bp.route('/rankings/<category>/movers', methods=['GET'])
+def get_biggest_movers(category: str):
+    """
+    取得名次變化最大的選手
+    
+    Query Parameters:
+        days: 比較的天數 (預設 7)
+        limit: 每個方向回傳的數量 (預設 10)
+    """
+    if category not in ranking_service.VALID_CATEGORIES:
+        return jsonify({'error': '無效的類別'}), 400
+    
+    days = request.args.get('days', 7, type=float)
+    limit = request.args.get('limit', 10, type=int)
+    return jsonify(ranking_service.get_biggest_movers(category, days, limit)), 200
 
 
 @ranking_bp.route('/rankings', methods=['GET'])
@@ -49,3 +99,11 @@ def manual_update():
         'message': '更新完成',
         'results': results
     }), 200
+
+
+@ranking_bp.route('/update/photos', methods=['POST'])
+def reverify_photos():
+    """在背景重新驗證所有選手圖片 URL"""
+    thread = threading.Thread(target=ranking_service.reverify_photos, daemon=True)
+    thread.start()
+    return jsonify({'message': '已開始重新驗證圖片 URL'}), 202
@@ -81,82 +81,7 @@ def analyze_youtube():
         result = service.analyze(youtube_url, player_focus, player2_focus, description1, description2)
         
         if result['success']:
-            # 儲存分析紀錄
-            record_id = history_service.save_record(
-                video_info=result.get('video_info', {}),
-                analysis_result=result.get('analysis', {}),
-                player_focus=player_focus,
-                player2_focus=player2_focus
-            )
-            result['record_id'] = record_id
-            print(f"✅ 分析紀錄已儲存: {record_id}")
-            
-            # 儲存選手檔案
-            try:
-                from services.player_profile_service import get_player_profile_service
-                import re
-                
-                profile_service = get_player_profile_service()
-                
-                analysis = result.get('analysis', {})
-                structured = analysis.get('structured_data', {})
-                sections = analysis.get('sections', {})
-                video_info = result.get('video_info', {})
-                
-                # 如果沒有 player_focus，嘗試從影片標題解析
-                p1_name = player_focus
-                p2_name = player2_focus
-                
-                if not p1_name or not p2_name:
-                    video_title = video_info.get('title', '')
-                    # 嘗試解析 "A VS B" 格式
-                    vs_patterns = [
-                        r'(.+?)\s+[Vv][Ss]\.?\s+(.+?)(?:\s*[|｜]|$)',
-                        r'(.+?)\s+[Vv][Ss]\.?\s+(.+)',
-                        r'(.+?)[對対]\s*(.+?)(?:\s*[|｜]|$)',
-                    ]
-                    for pattern in vs_patterns:
-                        match = re.match(pattern, video_title)
-                        if match:
-                            if not p1_name:
-                                p1_name = match.group(1).strip()
-                            if not p2_name:
-                                p2_name = match.group(2).strip()
-                            print(f"📝 從標題解析選手: {p1_name} vs {p2_name}")
-                            break
-                
-                # 儲存選手 1 的檔案
-                if p1_name:
-                    p1_analysis = structured.get('player1_analysis', {})
-                    profile_service.save_player_analysis(
-                        player_name=p1_name,
-                        match_id=record_id,
-                        video_id=video_info.get('video_id', ''),
-                        opponent_name=p2_name or '對手',
-                        ratings=p1_analysis.get('ratings', {}),
-                        strengths=sections.get('strengths', []),
-                        weaknesses=sections.get('weaknesses', [])
-                    )
-                    print(f"✅ 選手檔案已更新: {p1_name}")
-                
-                # 儲存選手 2 的檔案
-                if p2_name:
-                    p2_analysis = structured.get('player2_analysis', {})
-                    profile_service.save_player_analysis(
-                        player_name=p2_name,
-                        match_id=record_id,
-                        video_id=video_info.get('video_id', ''),
-                        opponent_name=p1_name or '選手 1',
-                        ratings=p2_analysis.get('ratings', {})
-                    )
-                    print(f"✅ 選手檔案已更新: {p2_name}")
-                    
-            except Exception as profile_error:
-                print(f"⚠️ 選手檔案儲存失敗: {str(profile_error)}")
-                import traceback
-                traceback.print_exc()
-                # 不影響主要流程
-            
+            result['record_id'] = _save_analysis_result(history_service, result, player_focus, player2_focus)
             return jsonify(result), 200
         else:
             return jsonify(result), 500
@@ -171,6 +96,200 @@ def analyze_youtube():
         }), 500
 
 
+def _save_analysis_result(history_service, result, player_focus, player2_focus):
+    """
+    儲存比賽分析紀錄並更新兩位選手的檔案
+
+    分析紀錄與兩位選手檔案在同一交易中寫入，不會只留下部分資料；
+    選手檔案寫入失敗時交易回滾，改為只儲存分析紀錄
+
+    Returns:
+        紀錄 ID
+    """
+    from services.analysis_store import get_analysis_store
+    
+    try:
+        with get_analysis_store().transaction() as tx:
+            record_id = history_service.save_record(
+                video_info=result.get('video_info', {}),
+                analysis_result=result.get('analysis', {}),
+                player_focus=player_focus,
+                player2_focus=player2_focus,
+                tx=tx
+            )
+            _save_match_profiles(result, record_id, player_focus, player2_focus, tx)
+    except Exception as profile_error:
+        print(f"⚠️ 選手檔案儲存失敗: {str(profile_error)}")
+        import traceback
+        traceback.print_exc()
+        # 不影響主要流程：交易已回滾，只儲存分析紀錄
+        record_id = history_service.save_record(
+            video_info=result.get('video_info', {}),
+            analysis_result=result.get('analysis', {}),
+            player_focus=player_focus,
+            player2_focus=player2_focus
+        )
+    print(f"✅ 分析紀錄已儲存: {record_id}")
+    return record_id
+
+
+@youtube_bp.route('/youtube/analyze/stream', methods=['POST'])
+def analyze_youtube_stream():
+    """
+    分析 YouTube 比賽影片，以 Server-Sent Events 逐段回傳進度
+
+    長影片分段分析時，每完成一段即送出該段的回合，不必等整場分析結束
+
+    Request Body:
+        同 /youtube/analyze
+
+    Response (text/event-stream):
+        event: chunk  data: {"index", "total", "start", "end", "status", "points", "error"}
+        event: done   data: 同 /youtube/analyze 的回應
+        event: error  data: {"success": false, "error": "..."}
+    """
+    import json
+    import queue
+    import threading
+    from flask import Response, stream_with_context
+    from services.youtube_service import YouTubeAnalysisService
+    from services.history_service import AnalysisHistoryService
+    
+    data = request.get_json()
+    if not data or 'url' not in data:
+        return jsonify({'success': False, 'error': '請提供 YouTube URL'}), 400
+    
+    youtube_url = data['url']
+    player_focus = data.get('player_focus')
+    player2_focus = data.get('player2_focus')
+    
+    service = YouTubeAnalysisService()
+    if not service.validate_url(youtube_url):
+        return jsonify({'success': False, 'error': '無效的 YouTube URL'}), 400
+    
+    events = queue.Queue()
+    
+    def run():
+        try:
+            result = service.analyze(
+                youtube_url, player_focus, player2_focus,
+                data.get('description1'), data.get('description2'),
+                on_chunk=lambda event: events.put(('chunk', event))
+            )
+            if result['success']:
+                result['record_id'] = _save_analysis_result(
+                    AnalysisHistoryService(), result, player_focus, player2_focus
+                )
+                events.put(('done', result))
+            else:
+                events.put(('error', result))
+        except Exception as e:
+            print(f"❌ YouTube 分析失敗: {str(e)}")
+            events.put(('error', {'success': False, 'error': str(e)}))
+    
+    # 分析在背景執行緒進行，用戶端斷線時仍會完成並儲存紀錄
+    threading.Thread(target=run, daemon=True).start()
+    
+    def stream():
+        while True:
+            try:
+                name, payload = events.get(timeout=15)
+            except queue.Empty:
+                # 保持連線，避免代理伺服器因閒置而中斷
+                yield ': keep-alive\n\n'
+                continue
+            yield f"event: {name}\ndata: {json.dumps(payload, ensure_ascii=False, default=str)}\n\n"
+            if name in ('done', 'error'):
+                return
+    
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def _save_match_profiles(result, record_id, player_focus, player2_focus, tx):
+    """
+    將比賽分析寫入兩位選手的檔案
+
+    未指定選手時從影片標題解析，寫入與分析紀錄使用同一個交易 tx
+    """
+    from services.player_profile_service import get_player_profile_service
+    import re
+    
+    profile_service = get_player_profile_service()
+    
+    analysis = result.get('analysis', {})
+    structured = analysis.get('structured_data', {})
+    sections = analysis.get('sections', {})
+    video_info = result.get('video_info', {})
+    
+    # 如果沒有 player_focus，嘗試從影片標題解析
+    p1_name = player_focus
+    p2_name = player2_focus
+    
+    if not p1_name or not p2_name:
+        from services.player_service import get_player_service
+        player_service = get_player_service()
+        
+        video_title = video_info.get('title', '')
+        # 嘗試解析 "A VS B" 格式
+        vs_patterns = [
+            r'(.+?)\s+[Vv][Ss]\.?\s+(.+?)(?:\s*[|｜]|$)',
+            r'(.+?)\s+[Vv][Ss]\.?\s+(.+)',
+            r'(.+?)[對対]\s*(.+?)(?:\s*[|｜]|$)',
+        ]
+        parsed = None
+        for pattern in vs_patterns:
+            match = re.match(pattern, video_title)
+            if match:
+                parsed = [match.group(1).strip(), match.group(2).strip()]
+                break
+        
+        if parsed:
+            # 以名稱索引將不同寫法 (詞序、別名、中文名) 對應到世界排名名稱
+            for i, raw_name in enumerate(parsed):
+                ittf_player = player_service.find_player_by_name(raw_name)
+                if ittf_player and ittf_player.get('name'):
+                    parsed[i] = ittf_player['name']
+        else:
+            # 無 "VS" 格式時，直接在標題中尋找選手名稱
+            parsed = [p['name'] for p in player_service.find_players_in_text(video_title)]
+        
+        if parsed:
+            if not p1_name and len(parsed) > 0:
+                p1_name = parsed[0]
+            if not p2_name and len(parsed) > 1:
+                p2_name = parsed[1]
+            print(f"📝 從標題解析選手: {p1_name} vs {p2_name}")
+    
+    # 儲存選手 1 的檔案
+    if p1_name:
+        p1_analysis = structured.get('player1_analysis', {})
+        profile_service.save_player_analysis(
+            player_name=p1_name,
+            match_id=record_id,
+            video_id=video_info.get('video_id', ''),
+            opponent_name=p2_name or '對手',
+            ratings=p1_analysis.get('ratings', {}),
+            strengths=sections.get('strengths', []),
+            weaknesses=sections.get('weaknesses', []),
+            tx=tx
+        )
+        print(f"✅ 選手檔案已更新: {p1_name}")
+    
+    # 儲存選手 2 的檔案
+    if p2_name:
+        p2_analysis = structured.get('player2_analysis', {})
+        profile_service.save_player_analysis(
+            player_name=p2_name,
+            match_id=record_id,
+            video_id=video_info.get('video_id', ''),
+            opponent_name=p1_name or '選手 1',
+            ratings=p2_analysis.get('ratings', {}),
+            tx=tx
+        )
+        print(f"✅ 選手檔案已更新: {p2_name}")
+
+
 @youtube_bp.route('/youtube/history', methods=['GET'])
 def get_analysis_history():
     """取得分析歷史紀錄列表"""
@@ -0,0 +1,284 @@
+"""
+分析資料儲存層
+以 SQLite (WAL 模式) 保存分析紀錄與選手檔案，支援多執行緒同時寫入，
+並可在單一交易中原子性地更新多筆資料 (分析紀錄 + 兩位選手檔案)
+"""
+import os
+import glob
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from config import get_config
+
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+CREATE TABLE IF NOT EXISTS analysis_records (
+    record_id TEXT PRIMARY KEY,
+    video_id TEXT NOT NULL DEFAULT '',
+    video_title TEXT,
+    video_url TEXT,
+    thumbnail_url TEXT,
+    player_focus TEXT,
+    player2_focus TEXT,
+    video_duration INTEGER,
+    created_at TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+-- 同一影片只保留一筆紀錄，由資料庫保證而非先查再寫
+CREATE UNIQUE INDEX IF NOT EXISTS idx_records_video
+    ON analysis_records(video_id) WHERE video_id != '';
+CREATE INDEX IF NOT EXISTS idx_records_created ON analysis_records(created_at DESC);
+
+CREATE TABLE IF NOT EXISTS player_profiles (
+    player_id TEXT PRIMARY KEY,
+    display_name TEXT,
+    ittf_name TEXT,
+    aliases TEXT NOT NULL DEFAULT '[]',
+    total_matches INTEGER NOT NULL DEFAULT 0,
+    last_updated TEXT,
+    aggregate_ratings TEXT NOT NULL DEFAULT '{}',
+    recent_form TEXT NOT NULL DEFAULT '{}',
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_profiles_updated ON player_profiles(last_updated DESC);
+
+CREATE TABLE IF NOT EXISTS profile_matches (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    player_id TEXT NOT NULL,
+    video_id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    UNIQUE (player_id, video_id)
+);
+CREATE INDEX IF NOT EXISTS idx_matches_player ON profile_matches(player_id, seq DESC);
+"""
+
+# 選手檔案中另外存成欄位的鍵，其餘放在 data
+PROFILE_COLUMNS = ('display_name', 'ittf_name', 'total_matches', 'last_updated')
+PROFILE_JSON_COLUMNS = ('aliases', 'aggregate_ratings', 'recent_form')
+
+
+class Transaction:
+    """
+    單一寫入交易
+    提交成功後才執行 on_commit 登記的回呼 (例如更新記憶體內的搜尋索引)
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self._callbacks: List[Callable[[], None]] = []
+
+    def execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        return self.conn.execute(sql, params)
+
+    def on_commit(self, callback: Callable[[], None]):
+        self._callbacks.append(callback)
+
+
+class AnalysisStore:
+    """SQLite 儲存層，每個執行緒使用自己的連線"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._local = threading.local()
+        # CREATE ... IF NOT EXISTS 可重複執行；executescript 會自行提交，不放在交易中
+        self._connect().executescript(SCHEMA)
+        with self.transaction() as tx:
+            tx.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('schema_version', ?)",
+                       (str(SCHEMA_VERSION),))
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # isolation_level=None：交易由 transaction() 明確控制
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None,
+                                   check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA busy_timeout=30000')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[Transaction]:
+        """
+        開始寫入交易 (BEGIN IMMEDIATE 先取得寫入鎖，避免讀後寫的競爭)
+        巢狀呼叫時沿用外層交易
+        """
+        conn = self._connect()
+        outer = getattr(self._local, 'tx', None)
+        if outer is not None:
+            yield outer
+            return
+
+        tx = Transaction(conn)
+        self._local.tx = tx
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield tx
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        else:
+            conn.execute('COMMIT')
+        finally:
+            self._local.tx = None
+        for callback in tx._callbacks:
+            callback()
+
+    def query(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        """唯讀查詢 (WAL 模式下不會被寫入阻擋)"""
+        return self._connect().execute(sql, params).fetchall()
+
+    def query_one(self, sql: str, params: tuple = ()) -> Optional[sqlite3.Row]:
+        return self._connect().execute(sql, params).fetchone()
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self.query_one('SELECT value FROM meta WHERE key = ?', (key,))
+        return row['value'] if row else None
+
+    # ==================== 選手檔案 ====================
+
+    @staticmethod
+    def profile_from_row(row: sqlite3.Row) -> Dict[str, Any]:
+        profile = json.loads(row['data'])
+        profile['player_id'] = row['player_id']
+        for column in PROFILE_COLUMNS:
+            profile[column] = row[column]
+        for column in PROFILE_JSON_COLUMNS:
+            profile[column] = json.loads(row[column])
+        return profile
+
+    @staticmethod
+    def write_profile(tx: Transaction, profile: Dict[str, Any]):
+        data = {k: v for k, v in profile.items()
+                if k not in PROFILE_COLUMNS + PROFILE_JSON_COLUMNS + ('player_id', 'match_history')}
+        tx.execute(
+            """INSERT INTO player_profiles
+                   (player_id, display_name, ittf_name, aliases, total_matches, last_updated,
+                    aggregate_ratings, recent_form, data)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT(player_id) DO UPDATE SET
+                   display_name = excluded.display_name, ittf_name = excluded.ittf_name,
+                   aliases = excluded.aliases, total_matches = excluded.total_matches,
+                   last_updated = excluded.last_updated, aggregate_ratings = excluded.aggregate_ratings,
+                   recent_form = excluded.recent_form, data = excluded.data""",
+            (profile['player_id'], profile.get('display_name'), profile.get('ittf_name'),
+             json.dumps(profile.get('aliases', []), ensure_ascii=False),
+             profile.get('total_matches', 0), profile.get('last_updated'),
+             json.dumps(profile.get('aggregate_ratings', {}), ensure_ascii=False),
+             json.dumps(profile.get('recent_form', {}), ensure_ascii=False),
+             json.dumps(data, ensure_ascii=False))
+        )
+
+    @staticmethod
+    def write_match(tx: Transaction, player_id: str, match: Dict[str, Any]):
+        """新增或取代選手的一場比賽紀錄 (取代時保留原本的順序與建立時間)"""
+        tx.execute(
+            """INSERT INTO profile_matches (player_id, video_id, data) VALUES (?, ?, ?)
+               ON CONFLICT(player_id, video_id) DO UPDATE SET
+                   data = json_set(excluded.data, '$.created_at',
+                                   COALESCE(json_extract(profile_matches.data, '$.created_at'),
+                                            json_extract(excluded.data, '$.updated_at')))""",
+            (player_id, match.get('video_id') or '', json.dumps(match, ensure_ascii=False))
+        )
+
+    # ==================== 舊格式匯入 ====================
+
+    def import_legacy_files(self, records_dir: str, profiles_dir: str):
+        """
+        首次建立資料庫時匯入既有的 JSON 檔案
+        (analysis_records/*.json、player_profiles/*.json 與 *.history.jsonl)
+        原檔案保留不動
+        """
+        if self.get_meta('legacy_imported'):
+            return
+
+        records = []
+        for path in glob.glob(os.path.join(records_dir, '*.json')):
+            if os.path.basename(path) == 'index.json':
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    records.append(json.load(f))
+            except Exception as e:
+                print(f"⚠️ 略過無法讀取的分析紀錄 {path}: {e}")
+
+        profiles = []
+        for path in glob.glob(os.path.join(profiles_dir, '*.json')):
+            if os.path.basename(path) == 'index.json':
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    profile = json.load(f)
+            except Exception as e:
+                print(f"⚠️ 略過無法讀取的選手檔案 {path}: {e}")
+                continue
+            # 舊格式的 match_history 由新到舊，紀錄檔則由舊到新
+            matches = list(reversed(profile.pop('match_history', [])))
+            history_path = os.path.join(profiles_dir, f"{profile.get('player_id')}.history.jsonl")
+            if os.path.exists(history_path):
+                with open(history_path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            matches.append(json.loads(line))
+                        except ValueError:
+                            continue
+            profiles.append((profile, matches))
+
+        # 舊資料中同一影片可能有多筆，保留最新的一筆 (與舊版 find_by_video_id 相同)
+        records.sort(key=lambda r: r.get('created_at') or '', reverse=True)
+        with self.transaction() as tx:
+            for record in records:
+                tx.execute(
+                    """INSERT OR IGNORE INTO analysis_records
+                           (record_id, video_id, video_title, video_url, thumbnail_url, player_focus,
+                            player2_focus, video_duration, created_at, data)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (record.get('record_id'), record.get('video_id') or '', record.get('video_title'),
+                     record.get('video_url'), record.get('thumbnail_url'), record.get('player_focus'),
+                     record.get('player2_focus'), record.get('video_duration'),
+                     record.get('created_at') or '', json.dumps(record, ensure_ascii=False))
+                )
+            for profile, matches in profiles:
+                if not profile.get('player_id'):
+                    continue
+                self.write_profile(tx, profile)
+                for match in matches:
+                    self.write_match(tx, profile['player_id'], match)
+            tx.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_imported', '1')")
+
+        if records or profiles:
+            kept = self.query_one('SELECT COUNT(*) AS n FROM analysis_records')['n']
+            print(f"✓ 已匯入 {kept} 筆分析紀錄 (共 {len(records)} 個檔案) 與 {len(profiles)} 位選手檔案至資料庫")
+
+
+# 單例模式
+_analysis_store = None
+_store_lock = threading.Lock()
+
+
+def get_analysis_store() -> AnalysisStore:
+    global _analysis_store
+    if _analysis_store is None:
+        with _store_lock:
+            if _analysis_store is None:
+                data_dir = get_config().paths.DATA_DIR
+                store = AnalysisStore(get_config().paths.ANALYSIS_DB)
+                store.import_legacy_files(
+                    os.path.join(data_dir, 'analysis_records'),
+                    os.path.join(data_dir, 'player_profiles')
+                )
+                _analysis_store = store
+    return _analysis_store
@@ -4,12 +4,14 @@ import glob
 from typing import Dict, List
 from failure_analyzer import FailureAnalyzer
 from youtube_analyzer import YouTubeDownloader
+from services.gemini_gateway import PRIORITY_BATCH
 
 class AutoLabeler:
     def __init__(self, upload_dir='uploads/unlabeled', base_dir='.'):
         self.upload_dir = os.path.join(base_dir, upload_dir)
         self.base_dir = base_dir
-        self.analyzer = FailureAnalyzer()
+        # 批次標註讓位給即時與互動分析
+        self.analyzer = FailureAnalyzer(priority=PRIORITY_BATCH)
         
         # 確保目錄存在
         os.makedirs(self.upload_dir, exist_ok=True)
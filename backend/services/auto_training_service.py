@@ -6,6 +6,7 @@ import os
 import json
 import subprocess
 import shutil
+import threading
 from typing import Dict, List, Any, Optional, Tuple
 from dataclasses import dataclass, asdict
 from datetime import datetime
@@ -59,6 +60,10 @@ class AutoTrainingService:
         self.clips: Dict[str, TrainingClip] = {}
         self._load_clips()
         
+        # 骨架提取器 (需要時才建立；MediaPipe 不可多執行緒同時使用)
+        self._pose_extractor = None
+        self._pose_lock = threading.Lock()
+        
         # 失誤類型到標籤的映射
         self.error_to_label = {
             # 明確的失誤 → bad
@@ -498,18 +503,19 @@ class AutoTrainingService:
         
         # 使用現有的骨架提取模組
         try:
-            from skeleton import extract_skeleton_from_video
+            from skeleton_format import SKELETON_EXTENSION
             
             output_dir = os.path.join(self.skeletons_dir, clip_id)
             os.makedirs(output_dir, exist_ok=True)
             
-            # 提取骨架
-            skeleton_data = extract_skeleton_from_video(video_path, output_dir)
+            # 提取骨架並存成二進位 .skel 檔 (需要 JSON 時由 API 讀檔轉換)
+            with self._pose_lock:
+                skeleton = self._get_pose_extractor().extract_skeleton(video_path)
             
-            if skeleton_data:
-                skeleton_path = os.path.join(output_dir, 'skeleton.json')
-                with open(skeleton_path, 'w') as f:
-                    json.dump(skeleton_data, f)
+            if len(skeleton) and skeleton.present.any():
+                skeleton.source = clip.source_video
+                skeleton.metadata.update({'clip_id': clip_id, 'label': clip.label})
+                skeleton_path = skeleton.save(os.path.join(output_dir, f'skeleton{SKELETON_EXTENSION}'))
                 
                 clip.skeleton_path = skeleton_path
                 clip.processed_at = datetime.now().isoformat()
@@ -517,13 +523,41 @@ class AutoTrainingService:
                 self._save_clips()
                 
                 return skeleton_path
-        except ImportError:
-            print("骨架提取模組未找到")
+        except (ImportError, RuntimeError) as e:
+            print(f"骨架提取模組無法使用: {e}")
         except Exception as e:
             print(f"骨架提取失敗: {e}")
         
         return None
     
+    def _get_pose_extractor(self):
+        """共用的骨架提取器 (MediaPipe 模型載入較慢，只建立一次)"""
+        if self._pose_extractor is None:
+            from skeleton import PoseExtractor
+            from config import get_config
+            ai_config = get_config().ai
+            self._pose_extractor = PoseExtractor(
+                frame_stride=ai_config.POSE_FRAME_STRIDE,
+                adaptive_stride=ai_config.POSE_ADAPTIVE_STRIDE,
+                max_stride=ai_config.POSE_MAX_STRIDE,
+                input_size=ai_config.POSE_INPUT_SIZE,
+                roi_crop=ai_config.POSE_ROI_CROP
+            )
+        return self._pose_extractor
+    
+    def load_skeleton(self, clip_id: str):
+        """
+        讀取片段的骨架資料
+        
+        Returns:
+            SkeletonData (陣列以 memmap 對應，只讀取存取到的幀)；沒有骨架時為 None
+        """
+        clip = self.clips.get(clip_id)
+        if not clip or not clip.skeleton_path or not os.path.exists(clip.skeleton_path):
+            return None
+        from skeleton_format import SkeletonData
+        return SkeletonData.load(clip.skeleton_path)
+    
     def prepare_training_batch(self, label: Optional[str] = None) -> Dict[str, Any]:
         """
         準備訓練批次
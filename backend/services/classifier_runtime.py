@@ -0,0 +1,141 @@
+"""
+動作分類模型的推論執行環境
+訓練完成後除了 Keras 的 .h5 之外，也會匯出同名的 .tflite (見 model_export.py)：
+- TFLiteClassifier：以 LiteRT / tflite-runtime 的 Interpreter 推論，不需要載入 TensorFlow
+  (啟動快數秒、記憶體少數百 MB，單筆推論也沒有 model.predict 的額外開銷)
+- KerasClassifier：沒有 .tflite (或 .tflite 比 .h5 舊) 時的後備，以 tf.function 推論而非 predict
+- load_classifier：依設定與檔案選擇執行環境
+
+兩者都提供 predict(X) -> (筆數, 類別數) 機率
+"""
+import os
+from typing import Optional
+
+import numpy as np
+
+# 輕量 Interpreter：LiteRT (ai-edge-litert) 或舊名 tflite-runtime；都沒有時改用 tensorflow.lite
+try:
+    from ai_edge_litert.interpreter import Interpreter as _LiteInterpreter
+    HAS_LITE_RUNTIME = True
+except ImportError:
+    try:
+        from tflite_runtime.interpreter import Interpreter as _LiteInterpreter
+        HAS_LITE_RUNTIME = True
+    except ImportError:
+        _LiteInterpreter = None
+        HAS_LITE_RUNTIME = False
+
+TFLITE_EXTENSION = '.tflite'
+BACKENDS = ('auto', 'tflite', 'keras')
+
+
+def tflite_path_for(model_path: str) -> str:
+    """與 Keras 模型同名的 .tflite 路徑"""
+    return os.path.splitext(model_path)[0] + TFLITE_EXTENSION
+
+
+def _interpreter_class():
+    if _LiteInterpreter is not None:
+        return _LiteInterpreter
+    import tensorflow as tf
+    return tf.lite.Interpreter
+
+
+class TFLiteClassifier:
+    """以 TFLite Interpreter 執行匯出的分類模型"""
+
+    name = 'tflite'
+
+    def __init__(self, model_path: str, num_threads: Optional[int] = 1):
+        """
+        Args:
+            model_path: .tflite 檔案
+            num_threads: 推論執行緒數 (小型 LSTM 單執行緒通常最快)
+        """
+        self.model_path = model_path
+        self.interpreter = _interpreter_class()(model_path=model_path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+
+    @property
+    def input_shape(self):
+        """單筆輸入的形狀 (不含批次維度)"""
+        return tuple(int(d) for d in self._input['shape'][1:])
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """
+        Args:
+            X: (筆數, 幀, 特徵) 已標準化的序列
+
+        Returns:
+            (筆數, 類別數) 機率
+        """
+        X = np.asarray(X, dtype=np.float32)
+        # 匯出時固定批次為 1 (LSTM 才能轉為融合運算)，多筆輸入逐筆推論
+        outputs = []
+        for sample in X:
+            self.interpreter.set_tensor(self._input['index'], sample[np.newaxis])
+            self.interpreter.invoke()
+            outputs.append(self.interpreter.get_tensor(self._output['index'])[0].copy())
+        return np.stack(outputs) if outputs else np.zeros((0,) + tuple(self._output['shape'][1:]), np.float32)
+
+
+class KerasClassifier:
+    """以 TensorFlow 載入 .h5 模型"""
+
+    name = 'keras'
+
+    def __init__(self, model_path: str):
+        import tensorflow as tf
+        self.model_path = model_path
+        self.model = tf.keras.models.load_model(model_path)
+        # 編譯為圖只做一次：predict 每次呼叫都會建立資料管線，直接呼叫模型則逐步 eager 執行 LSTM
+        self._forward = tf.function(lambda x: self.model(x, training=False), reduce_retracing=True)
+
+    @property
+    def input_shape(self):
+        return tuple(self.model.input_shape[1:])
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return self._forward(np.asarray(X, dtype=np.float32)).numpy()
+
+
+def load_classifier(model_path: str, backend: str = 'auto', num_threads: Optional[int] = 1):
+    """
+    載入分類模型
+
+    Args:
+        model_path: Keras 模型 (.h5)；同名的 .tflite 由 tflite_path_for 決定
+        backend: auto = 有 .tflite 且不比 .h5 舊時使用 TFLite，否則 Keras；
+                 tflite / keras = 只使用指定的執行環境
+        num_threads: TFLite 推論執行緒數
+
+    Returns:
+        TFLiteClassifier / KerasClassifier；模型檔不存在時為 None
+
+    Raises:
+        ValueError: 未知的 backend
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"未知的分類模型執行環境: {backend} (可用: {', '.join(BACKENDS)})")
+    lite_path = tflite_path_for(model_path)
+    has_keras = os.path.exists(model_path)
+    has_lite = os.path.exists(lite_path)
+    auto = backend == 'auto'
+    if auto:
+        # .h5 重新訓練後若匯出失敗，舊的 .tflite 不再代表目前的模型
+        fresh = has_lite and (not has_keras or os.path.getmtime(lite_path) >= os.path.getmtime(model_path))
+        backend = 'tflite' if fresh else 'keras'
+
+    if backend == 'tflite':
+        if not has_lite:
+            return None
+        try:
+            return TFLiteClassifier(lite_path, num_threads)
+        except Exception as e:
+            # 自動選擇時，.tflite 無法載入 (例如執行環境不支援某個運算) 仍可使用 .h5
+            if not (auto and has_keras):
+                raise
+            print(f"⚠️  TFLite 模型載入失敗，改用 Keras: {e}")
+    return KerasClassifier(model_path) if has_keras else None
@@ -0,0 +1,350 @@
+"""
+編譯式樹集成評估器
+將已訓練的 GradientBoostingClassifier 匯出為扁平 NumPy 陣列，
+以向量化方式計算 predict_proba，避免 sklearn 單筆呼叫的額外開銷
+
+評估採用 QuickScorer 位元遮罩法：每個特徵的分裂門檻排序後，
+預先計算「門檻小於 x 的節點」對各棵樹可達葉節點的累積 AND 遮罩，
+預測時每個特徵只需一次 searchsorted 與一次整列查表
+"""
+import os
+import time
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+
+# 匯出格式版本，結構變更時遞增
+FORMAT_VERSION = 1
+
+
+class CompiledEnsemble:
+    """
+    扁平化的梯度提升樹集成
+
+    所有樹的節點串接在同一組陣列中：
+    - feature / threshold: 分裂特徵與門檻（X[:, feature] > threshold 往右），葉節點門檻為 +inf
+    - children: 左子節點的全域索引，右子節點固定為 children + 1；葉節點指向自己
+    - value: 葉節點輸出（已乘上 learning_rate）
+    - roots: 每棵樹根節點的全域索引，依 (stage, class) 排列
+    """
+
+    def __init__(self, feature: np.ndarray, threshold: np.ndarray,
+                 children: np.ndarray, value: np.ndarray,
+                 roots: np.ndarray, init_raw: np.ndarray, max_depth: int,
+                 n_features: int, mean: Optional[np.ndarray] = None,
+                 scale: Optional[np.ndarray] = None):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.roots = roots
+        self.init_raw = init_raw
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self.mean = mean
+        self.scale = scale
+        self.n_outputs = len(init_raw)
+        self.n_stages = len(roots) // self.n_outputs
+        self._build_bitvector_tables()
+
+    @classmethod
+    def from_sklearn(cls, model, scaler=None) -> 'CompiledEnsemble':
+        """
+        從 sklearn 模型編譯
+
+        Args:
+            model: 已訓練的 GradientBoostingClassifier
+            scaler: 可選的 StandardScaler，會一併編入評估流程
+
+        Returns:
+            CompiledEnsemble 實例
+        """
+        if not (isinstance(model.init_, str) and model.init_ == 'zero') and \
+                not hasattr(model.init_, 'class_prior_'):
+            raise ValueError("僅支援預設 init 的 GradientBoostingClassifier")
+
+        n_features = model.n_features_in_
+        init_raw = np.asarray(
+            model._raw_predict_init(np.zeros((1, n_features), dtype=np.float32))[0],
+            dtype=np.float64
+        )
+
+        features, thresholds, children, values, roots = [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for tree in model.estimators_.ravel():
+            t = tree.tree_
+            feature, threshold, child, value = _flatten_tree(t, offset)
+            features.append(feature)
+            thresholds.append(threshold)
+            children.append(child)
+            values.append(value * model.learning_rate)
+            roots.append(offset)
+
+            offset += t.node_count
+            max_depth = max(max_depth, t.max_depth)
+
+        return cls(
+            feature=np.concatenate(features).astype(np.intp),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            children=np.concatenate(children).astype(np.intp),
+            value=np.concatenate(values).astype(np.float64),
+            roots=np.asarray(roots, dtype=np.intp),
+            init_raw=init_raw,
+            max_depth=max_depth,
+            n_features=n_features,
+            mean=None if scaler is None else np.asarray(scaler.mean_, dtype=np.float64),
+            scale=None if scaler is None else np.asarray(scaler.scale_, dtype=np.float64),
+        )
+
+    def _build_bitvector_tables(self):
+        """由扁平陣列建立 QuickScorer 查詢表，單棵樹葉節點超過 64 個時改用逐層走訪"""
+        n_trees = len(self.roots)
+        tree_leaves: List[List[int]] = []
+        # 每個特徵的 (門檻, 樹索引, 條件為假時排除的葉節點範圍)
+        splits: List[List[Tuple[float, int, int, int]]] = [[] for _ in range(self.n_features)]
+
+        def visit(node: int, tree: int, leaves: List[int]) -> None:
+            left = int(self.children[node])
+            if left == node:
+                leaves.append(node)
+                return
+            start = len(leaves)
+            visit(left, tree, leaves)
+            splits[self.feature[node]].append(
+                (float(self.threshold[node]), tree, start, len(leaves))
+            )
+            visit(left + 1, tree, leaves)
+
+        for tree, root in enumerate(self.roots):
+            leaves: List[int] = []
+            visit(int(root), tree, leaves)
+            tree_leaves.append(leaves)
+
+        max_leaves = max(len(leaves) for leaves in tree_leaves)
+        self.use_bitvector = max_leaves <= 64
+        if not self.use_bitvector:
+            return
+
+        n_bits = 32 if max_leaves <= 32 else 64
+        self._mask_dtype = np.uint32 if n_bits == 32 else np.uint64
+        full = (1 << n_bits) - 1
+
+        # 葉節點值依 (tree, leaf_id) 排列
+        self._leaf_values = np.zeros(n_trees * n_bits)
+        for tree, leaves in enumerate(tree_leaves):
+            self._leaf_values[tree * n_bits:tree * n_bits + len(leaves)] = self.value[leaves]
+        self._leaf_base = np.arange(n_trees, dtype=np.intp) * n_bits
+
+        # prefix[f][k, tree] = 特徵 f 中門檻最小的 k 個節點對該樹遮罩的 AND
+        self._sorted_thresholds = []
+        self._prefix_masks = []
+        for feature_splits in splits:
+            feature_splits.sort(key=lambda s: s[0])
+            prefix = np.empty((len(feature_splits) + 1, n_trees), dtype=self._mask_dtype)
+            current = [full] * n_trees
+            prefix[0] = current
+            for k, (_, tree, start, end) in enumerate(feature_splits):
+                current[tree] &= full ^ (((1 << (end - start)) - 1) << start)
+                prefix[k + 1] = current
+            self._sorted_thresholds.append(
+                np.array([s[0] for s in feature_splits], dtype=np.float64)
+            )
+            self._prefix_masks.append(prefix)
+
+    def _prepare(self, X: np.ndarray) -> np.ndarray:
+        """標準化並轉成 sklearn 樹使用的 float32 精度"""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if self.mean is not None:
+            X = (X - self.mean) / self.scale
+        # sklearn 的樹以 float32 比較特徵
+        return X.astype(np.float32).astype(np.float64)
+
+    def _leaf_values_bitvector(self, X: np.ndarray) -> np.ndarray:
+        """以位元遮罩求每棵樹的葉節點輸出"""
+        mask = None
+        for f in range(self.n_features):
+            # 門檻嚴格小於 x 的節點條件為假 (x > threshold)
+            k = np.searchsorted(self._sorted_thresholds[f], X[:, f], side='left')
+            row = self._prefix_masks[f].take(k, axis=0)
+            if mask is None:
+                mask = row
+            else:
+                mask &= row
+
+        # 最左側仍可達的葉節點即為結果
+        lowest = mask & (~mask + self._mask_dtype(1))
+        leaf_ids = np.frexp(lowest.astype(np.float64))[1] - 1
+        return self._leaf_values.take(self._leaf_base + leaf_ids)
+
+    def _leaf_values_traverse(self, X: np.ndarray) -> np.ndarray:
+        """逐層走訪所有樹，求每棵樹的葉節點輸出"""
+        n_samples, n_features = X.shape
+        flat_X = X.ravel()
+        row_offsets = (np.arange(n_samples) * n_features)[:, None]
+        nodes = np.broadcast_to(self.roots, (n_samples, len(self.roots)))
+        for _ in range(self.max_depth):
+            x = flat_X.take(row_offsets + self.feature.take(nodes))
+            nodes = self.children.take(nodes) + (x > self.threshold.take(nodes))
+        return self.value.take(nodes)
+
+    def raw_predict(self, X: np.ndarray) -> np.ndarray:
+        """
+        計算原始分數 (log-odds)
+
+        Args:
+            X: 未標準化的特徵，形狀 (n_samples, n_features) 或 (n_features,)
+
+        Returns:
+            形狀 (n_samples, n_outputs) 的分數
+        """
+        X = self._prepare(X)
+        if self.use_bitvector:
+            leaf_values = self._leaf_values_bitvector(X)
+        else:
+            leaf_values = self._leaf_values_traverse(X)
+        leaf_values = leaf_values.reshape(X.shape[0], self.n_stages, self.n_outputs)
+        return self.init_raw + leaf_values.sum(axis=1)
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """
+        計算各類別機率，與 GradientBoostingClassifier.predict_proba 一致
+
+        Args:
+            X: 未標準化的特徵
+
+        Returns:
+            形狀 (n_samples, n_classes) 的機率
+        """
+        raw = self.raw_predict(X)
+        if self.n_outputs == 1:
+            p1 = 1.0 / (1.0 + np.exp(-raw[:, 0]))
+            return np.column_stack([1.0 - p1, p1])
+        exp = np.exp(raw - raw.max(axis=1, keepdims=True))
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def save(self, path: str):
+        """儲存為 npz 檔案"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        arrays = {
+            'format_version': np.array(FORMAT_VERSION),
+            'feature': self.feature,
+            'threshold': self.threshold,
+            'children': self.children,
+            'value': self.value,
+            'roots': self.roots,
+            'init_raw': self.init_raw,
+            'max_depth': np.array(self.max_depth),
+            'n_features': np.array(self.n_features),
+        }
+        if self.mean is not None:
+            arrays['mean'] = self.mean
+            arrays['scale'] = self.scale
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> 'CompiledEnsemble':
+        """從 npz 檔案載入"""
+        with np.load(path) as data:
+            if int(data['format_version']) != FORMAT_VERSION:
+                raise ValueError(f"不支援的格式版本: {int(data['format_version'])}")
+            return cls(
+                feature=data['feature'].astype(np.intp),
+                threshold=data['threshold'],
+                children=data['children'].astype(np.intp),
+                value=data['value'],
+                roots=data['roots'].astype(np.intp),
+                init_raw=data['init_raw'],
+                max_depth=int(data['max_depth']),
+                n_features=int(data['n_features']),
+                mean=data['mean'] if 'mean' in data else None,
+                scale=data['scale'] if 'scale' in data else None,
+            )
+
+
+def _flatten_tree(tree, offset: int):
+    """
+    以廣度優先重新編號單棵樹，讓每個節點的左右子節點相鄰
+
+    Args:
+        tree: sklearn 的 Tree 物件
+        offset: 此樹在全域陣列中的起始索引
+
+    Returns:
+        (feature, threshold, children, value) 四個陣列
+    """
+    n = tree.node_count
+    feature = np.zeros(n, dtype=np.intp)
+    threshold = np.full(n, np.inf)
+    children = np.zeros(n, dtype=np.intp)
+    value = np.zeros(n)
+
+    # order[new] = old
+    order = [0]
+    i = 0
+    while i < len(order):
+        old = order[i]
+        left = tree.children_left[old]
+        if left == -1:
+            children[i] = offset + i
+            value[i] = tree.value[old, 0, 0]
+        else:
+            children[i] = offset + len(order)
+            feature[i] = tree.feature[old]
+            threshold[i] = tree.threshold[old]
+            order.append(left)
+            order.append(tree.children_right[old])
+        i += 1
+
+    return feature, threshold, children, value
+
+
+def benchmark(model, scaler, X: np.ndarray, repeats: int = 200) -> Dict[str, Any]:
+    """
+    比較 sklearn 與編譯版的一致性與延遲
+
+    Args:
+        model: 已訓練的 GradientBoostingClassifier
+        scaler: 對應的 StandardScaler
+        X: 未標準化的特徵矩陣
+        repeats: 單筆預測重複次數
+
+    Returns:
+        最大機率誤差與各模式耗時（微秒）
+    """
+    compiled = CompiledEnsemble.from_sklearn(model, scaler)
+    X = np.asarray(X, dtype=np.float64)
+
+    expected = model.predict_proba(scaler.transform(X))
+    actual = compiled.predict_proba(X)
+    max_abs_diff = float(np.abs(expected - actual).max())
+
+    row = X[:1]
+    start = time.perf_counter()
+    for _ in range(repeats):
+        model.predict_proba(scaler.transform(row))
+    sklearn_single = (time.perf_counter() - start) / repeats * 1e6
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        compiled.predict_proba(row)
+    compiled_single = (time.perf_counter() - start) / repeats * 1e6
+
+    start = time.perf_counter()
+    model.predict_proba(scaler.transform(X))
+    sklearn_batch = (time.perf_counter() - start) * 1e6
+
+    start = time.perf_counter()
+    compiled.predict_proba(X)
+    compiled_batch = (time.perf_counter() - start) * 1e6
+
+    return {
+        'max_abs_diff': max_abs_diff,
+        'batch_size': len(X),
+        'sklearn_single_us': sklearn_single,
+        'compiled_single_us': compiled_single,
+        'sklearn_batch_us': sklearn_batch,
+        'compiled_batch_us': compiled_batch,
+    }
+
@@ -0,0 +1,197 @@
+"""
+Gemini 回應快取
+以「媒體內容雜湊 + 提示詞版本 + 提示詞 + 模型名稱 + 生成參數」為鍵保存模型回應文字，
+同一段影片重新分析時不必再上傳與呼叫模型
+
+快取存於 SQLite (WAL 模式)，跨行程與重新啟動皆有效，並依 TTL 與總容量淘汰
+"""
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, Optional
+
+from config import get_config
+from file_digest import media_digest
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL,
+    size INTEGER NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_access ON responses(last_access);
+"""
+
+
+def model_name(model: Any) -> str:
+    """取得模型名稱 (GenerativeModel.model_name，或測試用替身的類別名稱)"""
+    if isinstance(model, str):
+        return model
+    return getattr(model, 'model_name', None) or type(model).__name__
+
+
+class GeminiResponseCache:
+    """Gemini 回應快取，每個執行緒使用自己的連線"""
+
+    def __init__(self, db_path: str, max_bytes: int = 256 * 1024 * 1024,
+                 ttl: float = 30 * 86400, enabled: bool = True):
+        """
+        Args:
+            db_path: 快取資料庫路徑
+            max_bytes: 回應文字總容量上限，超過時淘汰最久未使用的項目
+            ttl: 項目存活秒數
+            enabled: 停用時 get 一律未命中、put 不寫入
+        """
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.enabled = enabled
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if enabled:
+            os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+            self._connect().executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def make_key(self, model: Any, prompt_version: str, prompt: str,
+                 media: Iterable[str] = (), generation_config: Optional[Dict[str, Any]] = None) -> str:
+        """
+        建立快取鍵
+
+        Args:
+            model: 模型 (或模型名稱)
+            prompt_version: 提示詞範本版本，範本或解析方式變更時遞增讓舊結果失效
+            prompt: 實際送出的提示詞
+            media: 一併送出的媒體檔案路徑
+            generation_config: 生成參數
+
+        Returns:
+            SHA-256 十六進位字串
+        """
+        payload = {
+            'model': model_name(model),
+            'prompt_version': prompt_version,
+            'prompt': prompt,
+            'media': [media_digest(path) for path in media],
+            'generation_config': generation_config or {},
+        }
+        encoded = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """取得快取的回應文字，未命中或已過期時回傳 None"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        conn = self._connect()
+        row = conn.execute(
+            'SELECT text FROM responses WHERE key = ? AND created_at > ?', (key, now - self.ttl)
+        ).fetchone()
+        with self._stats_lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        conn.execute('UPDATE responses SET last_access = ? WHERE key = ?', (now, key))
+        return row[0]
+
+    def put(self, key: str, text: str, model: Any = '', prompt_version: str = ''):
+        """
+        寫入回應文字，並依 TTL 與容量上限淘汰舊項目
+
+        呼叫端應只在回應成功解析後寫入，避免快取錯誤結果
+        """
+        if not self.enabled or text is None:
+            return
+        now = time.time()
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, model_name(model), prompt_version, now, now, len(text.encode('utf-8')), text)
+            )
+            evicted = conn.execute('DELETE FROM responses WHERE created_at <= ?', (now - self.ttl,)).rowcount
+            total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+            if total > self.max_bytes:
+                # 由最久未使用的項目開始淘汰，直到低於上限
+                for old_key, size in conn.execute(
+                    'SELECT key, size FROM responses WHERE key != ? ORDER BY last_access', (key,)
+                ).fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    conn.execute('DELETE FROM responses WHERE key = ?', (old_key,))
+                    total -= size
+                    evicted += 1
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        if evicted:
+            with self._stats_lock:
+                self.evictions += evicted
+
+    def clear(self):
+        """清除所有快取"""
+        if self.enabled:
+            self._connect().execute('DELETE FROM responses')
+
+    def stats(self) -> Dict[str, Any]:
+        """取得快取統計"""
+        size, total = 0, 0
+        if self.enabled:
+            size, total = self._connect().execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses'
+            ).fetchone()
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'size': size,
+                'bytes': total,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+# 單例模式
+_gemini_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_gemini_cache() -> GeminiResponseCache:
+    global _gemini_cache
+    if _gemini_cache is None:
+        with _cache_lock:
+            if _gemini_cache is None:
+                config = get_config()
+                _gemini_cache = GeminiResponseCache(
+                    config.paths.GEMINI_CACHE_DB,
+                    max_bytes=config.cache.GEMINI_CACHE_MAX_MB * 1024 * 1024,
+                    ttl=config.cache.GEMINI_CACHE_TTL_DAYS * 86400,
+                    enabled=config.cache.GEMINI_CACHE_ENABLED
+                )
+    return _gemini_cache
@@ -0,0 +1,222 @@
+"""
+Gemini 上傳檔案管理
+同一段影片 (以內容雜湊識別) 只上傳一次，多個分析共用同一個遠端檔案：
+以參考計數追蹤使用中的分析，最後一個使用者釋放後保留一段時間供後續分析沿用，
+閒置過久或接近遠端保存期限時才刪除
+
+等待處理完成時以遞增間隔輪詢，短影片不必等待固定的 5 秒
+"""
+import os
+import time
+import atexit
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from config import get_config
+from services.gemini_cache import media_digest
+
+# 輪詢間隔：由 POLL_INITIAL 開始每次乘以 POLL_FACTOR，最多 POLL_MAX 秒
+POLL_INITIAL = 0.5
+POLL_FACTOR = 1.5
+POLL_MAX = 5.0
+# 單一檔案等待處理完成的上限
+PROCESSING_TIMEOUT = 600.0
+# 不超過此大小的影片直接內嵌於請求 (Gemini 單一請求上限 20 MB)
+INLINE_MAX_BYTES = 16 * 1024 * 1024
+
+
+class _RemoteFile:
+    """一個已上傳的遠端檔案"""
+
+    def __init__(self):
+        self.handle = None
+        self.error: Optional[BaseException] = None
+        self.ready = threading.Event()
+        self.refcount = 0
+        self.uploaded_at = 0.0
+        self.last_release = 0.0
+
+
+class GeminiFileManager:
+    """以內容雜湊管理上傳至 Gemini 的檔案"""
+
+    def __init__(self, client: Any = None, ttl: float = 46 * 3600, idle_ttl: float = 900):
+        """
+        Args:
+            client: 提供 upload_file / get_file / delete_file 的物件，預設為 google.generativeai
+            ttl: 上傳後可沿用的秒數 (Gemini 檔案保存 48 小時，保留安全餘裕)
+            idle_ttl: 沒有分析使用後保留的秒數
+        """
+        if client is None:
+            import google.generativeai as client
+        self.client = client
+        self.ttl = ttl
+        self.idle_ttl = idle_ttl
+        self._files: Dict[str, _RemoteFile] = {}
+        self._lock = threading.Lock()
+        self.uploads = 0
+        self.reuses = 0
+
+    @contextmanager
+    def acquire(self, path: str) -> Iterator[Any]:
+        """
+        取得影片對應的遠端檔案 (處理完成、可直接送給模型)
+
+        相同內容已上傳且未過期時直接沿用；其他執行緒正在上傳同一檔案時等待其完成
+
+        Args:
+            path: 本地影片路徑
+
+        Yields:
+            Gemini File 物件
+        """
+        digest = media_digest(path)
+        entry, owner = self._checkout(digest)
+        try:
+            if owner:
+                self._upload(entry, path)
+            elif not entry.ready.wait(PROCESSING_TIMEOUT):
+                raise RuntimeError("等待影片處理逾時")
+            if entry.error is not None:
+                raise RuntimeError("影片處理失敗") from entry.error
+            yield entry.handle
+        finally:
+            self._release(digest, entry)
+
+    @contextmanager
+    def video_part(self, path: str, mime_type: str = 'video/mp4') -> Iterator[Any]:
+        """
+        取得可放入 generate_content 的影片內容
+
+        小檔案直接內嵌原始位元組 (由 SDK 編碼，不另外保留 base64 副本)；
+        較大的檔案改以上傳方式由磁碟串流，並與其他分析共用
+
+        Args:
+            path: 本地影片路徑 (建議先經 media_prep 轉檔)
+            mime_type: 影片格式
+
+        Yields:
+            內嵌資料 dict 或 Gemini File 物件
+        """
+        if os.path.getsize(path) <= INLINE_MAX_BYTES:
+            with open(path, 'rb') as f:
+                yield {"inline_data": {"mime_type": mime_type, "data": f.read()}}
+        else:
+            with self.acquire(path) as handle:
+                yield handle
+
+    def _checkout(self, digest: str):
+        """增加參考計數，回傳 (項目, 是否由呼叫者負責上傳)"""
+        now = time.time()
+        with self._lock:
+            self._sweep(now)
+            entry = self._files.get(digest)
+            if entry is not None and entry.ready.is_set() and (
+                    entry.error is not None or now - entry.uploaded_at > self.ttl):
+                # 失敗或過期的項目不再沿用 (仍在使用中的由最後一位釋放時刪除)
+                del self._files[digest]
+                if entry.refcount == 0:
+                    self._delete_later(entry)
+                entry = None
+            owner = entry is None
+            if owner:
+                entry = _RemoteFile()
+                entry.uploaded_at = now
+                self._files[digest] = entry
+                self.uploads += 1
+            else:
+                self.reuses += 1
+            entry.refcount += 1
+            return entry, owner
+
+    def _upload(self, entry: _RemoteFile, path: str):
+        """上傳並等待處理完成"""
+        try:
+            print(f"📹 正在上傳影片: {path}")
+            handle = self.client.upload_file(path=path)
+            deadline = time.monotonic() + PROCESSING_TIMEOUT
+            interval = POLL_INITIAL
+            while handle.state.name == "PROCESSING":
+                if time.monotonic() > deadline:
+                    raise RuntimeError("影片處理逾時")
+                time.sleep(interval)
+                interval = min(interval * POLL_FACTOR, POLL_MAX)
+                handle = self.client.get_file(handle.name)
+            entry.handle = handle
+            if handle.state.name == "FAILED":
+                raise RuntimeError("影片處理失敗")
+            entry.uploaded_at = time.time()
+        except BaseException as e:
+            entry.error = e
+        finally:
+            entry.ready.set()
+
+    def _release(self, digest: str, entry: _RemoteFile):
+        now = time.time()
+        with self._lock:
+            entry.refcount -= 1
+            entry.last_release = now
+            if entry.refcount == 0 and self._files.get(digest) is not entry:
+                # 已被新的上傳取代
+                self._delete_later(entry)
+            self._sweep(now)
+
+    def _sweep(self, now: float):
+        """移除閒置過久或已過期且未使用的檔案 (需持有鎖)"""
+        for digest, entry in list(self._files.items()):
+            if entry.refcount > 0 or not entry.ready.is_set():
+                continue
+            if (entry.error is not None or now - entry.last_release > self.idle_ttl
+                    or now - entry.uploaded_at > self.ttl):
+                del self._files[digest]
+                self._delete_later(entry)
+
+    def _delete_later(self, entry: _RemoteFile):
+        """在背景刪除遠端檔案，不阻塞呼叫者"""
+        if entry.handle is None:
+            return
+        threading.Thread(target=self._delete, args=(entry.handle.name,), daemon=True).start()
+
+    def _delete(self, name: str):
+        try:
+            self.client.delete_file(name)
+        except Exception:
+            pass
+
+    def close(self):
+        """刪除所有未使用的遠端檔案 (程式結束時呼叫)"""
+        with self._lock:
+            idle = [(d, e) for d, e in self._files.items() if e.refcount == 0 and e.handle is not None]
+            for digest, _ in idle:
+                del self._files[digest]
+        for _, entry in idle:
+            self._delete(entry.handle.name)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'files': len(self._files),
+                'in_use': sum(1 for e in self._files.values() if e.refcount > 0),
+                'uploads': self.uploads,
+                'reuses': self.reuses
+            }
+
+
+# 單例模式
+_file_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_gemini_file_manager() -> GeminiFileManager:
+    global _file_manager
+    if _file_manager is None:
+        with _manager_lock:
+            if _file_manager is None:
+                ai_config = get_config().ai
+                _file_manager = GeminiFileManager(
+                    ttl=ai_config.GEMINI_FILE_TTL_HOURS * 3600,
+                    idle_ttl=ai_config.GEMINI_FILE_IDLE_MINUTES * 60
+                )
+                atexit.register(_file_manager.close)
+    return _file_manager
@@ -0,0 +1,403 @@
+"""
+Gemini 請求閘道
+所有 Gemini 生成請求經由同一個閘道送出，共用 API 配額：
+- 每個模型一個權杖桶 (token bucket) 限制每分鐘請求數，收到 429 時暫停該模型
+- 依優先等級排程：即時分析 > 互動請求 > 批次工作，配額不足時高優先的請求先取得權杖
+- 相同內容的請求正在執行時直接共用其結果 (single-flight)，不重複呼叫模型
+- 以固定數量的工作執行緒送出請求，限制同時進行的呼叫數
+
+各分析器以 get_gemini_gateway().model(name) 取得與 GenerativeModel 相容的物件
+"""
+import time
+import json
+import hashlib
+import itertools
+import threading
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+
+from config import get_config
+
+# 優先等級 (數字越小越優先)
+PRIORITY_LIVE = 0
+PRIORITY_INTERACTIVE = 1
+PRIORITY_BATCH = 2
+PRIORITY_NAMES = {PRIORITY_LIVE: 'live', PRIORITY_INTERACTIVE: 'interactive', PRIORITY_BATCH: 'batch'}
+
+# 收到 429 後的重試次數，與第一次重試前暫停該模型的秒數 (之後加倍)
+RATE_LIMIT_RETRIES = 3
+RATE_LIMIT_COOLDOWN = 5.0
+
+
+class GenaiBackend:
+    """以 google.generativeai 實際呼叫模型"""
+
+    def __init__(self, api_key: Optional[str] = None):
+        import google.generativeai as genai
+        if api_key:
+            genai.configure(api_key=api_key)
+        self._genai = genai
+        self._models: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def generate(self, model: str, contents: Any, generation_config: Optional[Dict[str, Any]] = None) -> Any:
+        with self._lock:
+            if model not in self._models:
+                self._models[model] = self._genai.GenerativeModel(model)
+        if generation_config is None:
+            return self._models[model].generate_content(contents)
+        return self._models[model].generate_content(contents, generation_config=generation_config)
+
+
+class TokenBucket:
+    """權杖桶：每秒補充 rate 個權杖，最多累積 capacity 個"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """距離下一個可用權杖的秒數 (0 表示現在可用)"""
+        if now < self.paused_until:
+            return self.paused_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def pause(self, now: float, seconds: float):
+        """收到 429 時清空權杖並暫停一段時間"""
+        self.tokens = 0.0
+        self.updated = now
+        self.paused_until = max(self.paused_until, now + seconds)
+
+
+def _fingerprint(value: Any, sha: Any):
+    """將請求內容寫入雜湊 (上傳檔案以名稱代表，位元組資料以內容代表)"""
+    if isinstance(value, (bytes, bytearray)):
+        sha.update(b'b')
+        sha.update(hashlib.sha256(value).digest())
+    elif isinstance(value, str):
+        sha.update(b's')
+        sha.update(value.encode('utf-8'))
+    elif isinstance(value, dict):
+        sha.update(b'{')
+        for key in sorted(value, key=str):
+            sha.update(str(key).encode('utf-8'))
+            _fingerprint(value[key], sha)
+        sha.update(b'}')
+    elif isinstance(value, (list, tuple)):
+        sha.update(b'[')
+        for item in value:
+            _fingerprint(item, sha)
+        sha.update(b']')
+    elif hasattr(value, 'name') and hasattr(value, 'uri'):
+        # Gemini File 物件
+        sha.update(b'f')
+        sha.update(str(value.name).encode('utf-8'))
+    else:
+        sha.update(b'o')
+        sha.update(json.dumps(value, default=repr, sort_keys=True).encode('utf-8'))
+
+
+def _is_rate_limited(error: BaseException) -> bool:
+    return (type(error).__name__ in ('ResourceExhausted', 'TooManyRequests')
+            or getattr(error, 'code', None) == 429 or '429' in str(error))
+
+
+class _Job:
+    """一個排隊中的請求 (可能由多個呼叫者共用)"""
+
+    def __init__(self, key: str, model: str, contents: Any, generation_config: Optional[Dict[str, Any]],
+                 priority: int, deadline: Optional[float], seq: int):
+        self.key = key
+        self.seq = seq
+        self.model = model
+        self.contents = contents
+        self.generation_config = generation_config
+        self.priority = priority
+        self.deadline = deadline
+        self.future: Future = Future()
+        self.enqueued = time.monotonic()
+        self.waiters = 1
+        self.attempts = 0
+
+
+class _ModelStats:
+    def __init__(self):
+        self.requests = 0
+        self.calls = 0
+        self.coalesced = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self.expired = 0
+        self.queue_seconds = 0.0
+        self.call_seconds = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'requests': self.requests,
+            'calls': self.calls,
+            'coalesced': self.coalesced,
+            'rate_limited': self.rate_limited,
+            'errors': self.errors,
+            'expired': self.expired,
+            'avg_queue_ms': round(self.queue_seconds / self.calls * 1000, 1) if self.calls else 0.0,
+            'avg_call_ms': round(self.call_seconds / self.calls * 1000, 1) if self.calls else 0.0,
+        }
+
+
+class GeminiGateway:
+    """Gemini 請求閘道"""
+
+    def __init__(self, backend: Any = None, workers: int = 4, default_rpm: float = 60,
+                 model_rpm: Optional[Dict[str, float]] = None, burst: float = 4,
+                 rate_limit_cooldown: float = RATE_LIMIT_COOLDOWN):
+        """
+        Args:
+            backend: 提供 generate(model, contents, generation_config) 的物件，預設為 GenaiBackend
+            workers: 同時進行的模型呼叫數上限
+            default_rpm: 未個別設定的模型每分鐘請求數上限
+            model_rpm: 個別模型的每分鐘請求數上限
+            burst: 權杖桶容量 (可連續送出的請求數)
+            rate_limit_cooldown: 收到 429 後第一次重試前暫停該模型的秒數 (之後加倍)
+        """
+        self.backend = backend if backend is not None else GenaiBackend()
+        self.default_rpm = default_rpm
+        self.model_rpm = model_rpm or {}
+        self.burst = burst
+        self.rate_limit_cooldown = rate_limit_cooldown
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._pending: List[_Job] = []
+        self._inflight: Dict[str, _Job] = {}
+        self._stats: Dict[str, _ModelStats] = {}
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._running = 0
+        self._workers = [
+            threading.Thread(target=self._worker, name=f'gemini-gateway-{i}', daemon=True)
+            for i in range(max(workers, 1))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def model(self, name: str, priority: int = PRIORITY_INTERACTIVE) -> 'GatewayModel':
+        """取得與 GenerativeModel 介面相容、經由閘道送出請求的模型物件"""
+        return GatewayModel(self, name, priority)
+
+    def submit(self, model: str, contents: Any, generation_config: Optional[Dict[str, Any]] = None,
+               priority: int = PRIORITY_INTERACTIVE, timeout: Optional[float] = None) -> Future:
+        """
+        送出生成請求
+
+        Args:
+            model: 模型名稱
+            contents: 請求內容 (同 generate_content)
+            generation_config: 生成參數
+            priority: 優先等級 (PRIORITY_LIVE / PRIORITY_INTERACTIVE / PRIORITY_BATCH)
+            timeout: 排隊超過此秒數仍未送出時放棄 (TimeoutError)，適合過時即無用的即時請求
+
+        Returns:
+            完成時結果為模型回應的 Future
+        """
+        sha = hashlib.sha256(model.encode('utf-8'))
+        _fingerprint([contents, generation_config or {}], sha)
+        key = sha.hexdigest()
+        deadline = time.monotonic() + timeout if timeout else None
+
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Gemini 閘道已關閉")
+            stats = self._stats.setdefault(model, _ModelStats())
+            stats.requests += 1
+            job = self._inflight.get(key)
+            if job is not None:
+                # 相同請求正在排隊或執行：共用結果，並依較高的優先等級排程
+                stats.coalesced += 1
+                job.waiters += 1
+                job.priority = min(job.priority, priority)
+                if job.deadline is not None:
+                    job.deadline = None if deadline is None else max(job.deadline, deadline)
+                return job.future
+            job = _Job(key, model, contents, generation_config, priority, deadline, next(self._seq))
+            self._inflight[key] = job
+            self._pending.append(job)
+            self._cond.notify()
+            return job.future
+
+    def generate(self, model: str, contents: Any, generation_config: Optional[Dict[str, Any]] = None,
+                 priority: int = PRIORITY_INTERACTIVE, timeout: Optional[float] = None) -> Any:
+        """送出請求並等待回應 (見 submit)"""
+        return self.submit(model, contents, generation_config, priority, timeout).result()
+
+    def _bucket(self, model: str) -> TokenBucket:
+        bucket = self._buckets.get(model)
+        if bucket is None:
+            rpm = self.model_rpm.get(model, self.default_rpm)
+            bucket = self._buckets[model] = TokenBucket(rpm / 60.0, self.burst)
+        return bucket
+
+    def _next_job(self) -> Optional[_Job]:
+        """
+        取出下一個可送出的請求 (需持有鎖)
+
+        依優先等級與送出順序挑選第一個所屬模型有權杖的請求；
+        都沒有權杖時等待最近一個權杖補充
+        """
+        while True:
+            if self._closed:
+                return None
+            now = time.monotonic()
+            wait = None
+            for job in sorted(self._pending, key=lambda j: (j.priority, j.seq)):
+                if job.deadline is not None and now > job.deadline:
+                    self._pending.remove(job)
+                    self._finish(job, error=TimeoutError("Gemini 請求排隊逾時"))
+                    self._stats[job.model].expired += 1
+                    continue
+                delay = self._bucket(job.model).wait_time(now)
+                if delay == 0:
+                    self._pending.remove(job)
+                    self._bucket(job.model).take(now)
+                    return job
+                wait = delay if wait is None else min(wait, delay)
+            self._cond.wait(wait)
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+                if job is None:
+                    return
+                self._running += 1
+                stats = self._stats[job.model]
+                stats.queue_seconds += time.monotonic() - job.enqueued
+            started = time.monotonic()
+            try:
+                response = self.backend.generate(job.model, job.contents, job.generation_config)
+                error = None
+            except Exception as e:
+                response, error = None, e
+            with self._cond:
+                self._running -= 1
+                stats.calls += 1
+                stats.call_seconds += time.monotonic() - started
+                if error is not None and _is_rate_limited(error) and job.attempts < RATE_LIMIT_RETRIES:
+                    # 配額用盡：暫停該模型並把請求放回佇列
+                    stats.rate_limited += 1
+                    job.attempts += 1
+                    self._bucket(job.model).pause(time.monotonic(),
+                                                  self.rate_limit_cooldown * 2 ** (job.attempts - 1))
+                    job.enqueued = time.monotonic()
+                    self._pending.append(job)
+                    self._cond.notify_all()
+                    continue
+                if error is not None:
+                    stats.errors += 1
+                self._finish(job, response, error)
+                self._cond.notify_all()
+
+    def _finish(self, job: _Job, response: Any = None, error: Optional[BaseException] = None):
+        """結束請求並通知所有等待者 (需持有鎖)"""
+        if self._inflight.get(job.key) is job:
+            del self._inflight[job.key]
+        if error is not None:
+            job.future.set_exception(error)
+        else:
+            job.future.set_result(response)
+
+    def close(self):
+        """停止工作執行緒，尚未送出的請求以錯誤結束"""
+        with self._cond:
+            self._closed = True
+            for job in self._pending:
+                self._finish(job, error=RuntimeError("Gemini 閘道已關閉"))
+            self._pending.clear()
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        """取得閘道統計 (整體與各模型)"""
+        with self._cond:
+            queued = {name: 0 for name in PRIORITY_NAMES.values()}
+            for job in self._pending:
+                queued[PRIORITY_NAMES.get(job.priority, str(job.priority))] += 1
+            now = time.monotonic()
+            return {
+                'workers': len(self._workers),
+                'running': self._running,
+                'queued': queued,
+                'models': {
+                    name: dict(stats.to_dict(),
+                               rpm=self.model_rpm.get(name, self.default_rpm),
+                               tokens=round(self._bucket(name).tokens, 2),
+                               paused=self._bucket(name).paused_until > now)
+                    for name, stats in self._stats.items()
+                }
+            }
+
+
+class GatewayModel:
+    """經由閘道呼叫的模型，介面與 GenerativeModel.generate_content 相容"""
+
+    def __init__(self, gateway: GeminiGateway, model_name: str, priority: int = PRIORITY_INTERACTIVE):
+        self.gateway = gateway
+        self.model_name = model_name
+        self.priority = priority
+
+    def generate_content(self, contents: Any, generation_config: Optional[Dict[str, Any]] = None,
+                         priority: Optional[int] = None, timeout: Optional[float] = None) -> Any:
+        return self.gateway.generate(self.model_name, contents, generation_config,
+                                     self.priority if priority is None else priority, timeout)
+
+
+def _parse_model_rpm(spec: str) -> Dict[str, float]:
+    """解析 "gemini-2.0-flash=15,gemini-2.5-pro=5" 格式的個別模型上限"""
+    limits = {}
+    for item in (spec or '').split(','):
+        name, _, value = item.partition('=')
+        if name.strip() and value.strip():
+            try:
+                limits[name.strip()] = float(value)
+            except ValueError:
+                print(f"⚠️ 略過無效的 GEMINI_MODEL_RPM 設定: {item}")
+    return limits
+
+
+# 單例模式
+_gateway = None
+_gateway_lock = threading.Lock()
+
+
+def get_gemini_gateway(api_key: Optional[str] = None) -> GeminiGateway:
+    """
+    取得共用的閘道
+
+    Args:
+        api_key: 設定檔沒有 GEMINI_API_KEY 時，建立閘道所使用的金鑰
+    """
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                ai_config = get_config().ai
+                _gateway = GeminiGateway(
+                    GenaiBackend(ai_config.GEMINI_API_KEY or api_key),
+                    workers=ai_config.GEMINI_WORKERS,
+                    default_rpm=ai_config.GEMINI_RPM,
+                    model_rpm=_parse_model_rpm(ai_config.GEMINI_MODEL_RPM),
+                    burst=ai_config.GEMINI_BURST
+                )
+    return _gateway
+
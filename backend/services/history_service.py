@@ -5,9 +5,11 @@
 import os
 import json
 import uuid
+from contextlib import nullcontext
 from datetime import datetime
 from typing import Dict, Any, List, Optional
 from config import get_config
+from services.analysis_store import Transaction, get_analysis_store
 
 config = get_config()
 
@@ -58,39 +60,29 @@ class AnalysisRecord:
         return cls(**data)
 
 
+# 列表與搜尋回傳的摘要欄位
+SUMMARY_COLUMNS = ('record_id', 'video_id', 'video_title', 'video_url', 'thumbnail_url',
+                   'player_focus', 'player2_focus', 'created_at', 'video_duration')
+
+
 class AnalysisHistoryService:
-    """分析歷史紀錄服務"""
+    """分析歷史紀錄服務 (資料存於 AnalysisStore)"""
     
     def __init__(self):
         self.records_dir = os.path.join(config.paths.DATA_DIR, 'analysis_records')
-        self.index_file = os.path.join(self.records_dir, 'index.json')
-        os.makedirs(self.records_dir, exist_ok=True)
-        self._ensure_index()
-    
-    def _ensure_index(self):
-        """確保索引檔案存在"""
-        if not os.path.exists(self.index_file):
-            self._save_index([])
-    
-    def _load_index(self) -> List[Dict[str, Any]]:
-        """載入索引"""
-        try:
-            with open(self.index_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return []
+        self.store = get_analysis_store()
     
-    def _save_index(self, index: List[Dict[str, Any]]):
-        """儲存索引"""
-        with open(self.index_file, 'w', encoding='utf-8') as f:
-            json.dump(index, f, ensure_ascii=False, indent=2)
+    @staticmethod
+    def _summary(row) -> Dict[str, Any]:
+        return {column: row[column] for column in SUMMARY_COLUMNS}
     
     def save_record(
         self,
         video_info: Dict[str, Any],
         analysis_result: Dict[str, Any],
         player_focus: Optional[str] = None,
-        player2_focus: Optional[str] = None
+        player2_focus: Optional[str] = None,
+        tx: Optional[Transaction] = None
     ) -> str:
         """
         儲存分析紀錄
@@ -100,18 +92,12 @@ class AnalysisHistoryService:
             analysis_result: 分析結果
             player_focus: 關注的選手
             player2_focus: 選手2 (可選)
+            tx: 外部交易 (與選手檔案一併提交時傳入)
             
         Returns:
             紀錄 ID (若已存在則返回現有 ID)
         """
         video_id = video_info.get('video_id', '')
-        
-        # 重複偵測：檢查是否已有相同 video_id 的紀錄
-        existing_record = self.find_by_video_id(video_id)
-        if existing_record:
-            print(f"⚠️ 影片已分析過: {video_id}, 返回現有紀錄: {existing_record['record_id']}")
-            return existing_record['record_id']
-        
         record_id = str(uuid.uuid4())[:8]
         
         # 建立縮圖 URL
@@ -130,29 +116,23 @@ class AnalysisHistoryService:
             created_at=datetime.now().isoformat()
         )
         
-        # 儲存完整紀錄
-        record_file = os.path.join(self.records_dir, f'{record_id}.json')
-        with open(record_file, 'w', encoding='utf-8') as f:
-            json.dump(record.to_dict(), f, ensure_ascii=False, indent=2)
-        
-        # 更新索引（只保存摘要資訊）
-        index = self._load_index()
-        index_entry = {
-            'record_id': record_id,
-            'video_id': video_id,
-            'video_title': record.video_title,
-            'video_url': record.video_url,
-            'thumbnail_url': thumbnail_url,
-            'player_focus': player_focus,
-            'player2_focus': player2_focus,
-            'created_at': record.created_at,
-            'video_duration': record.video_duration
-        }
-        index.insert(0, index_entry)  # 最新的放前面
-        
-        # 只保留最近 100 筆
-        index = index[:100]
-        self._save_index(index)
+        # 重複偵測由 video_id 唯一索引保證，同時寫入的請求也只會留下一筆
+        with (self.store.transaction() if tx is None else nullcontext(tx)) as tx:
+            cursor = tx.execute(
+                """INSERT OR IGNORE INTO analysis_records
+                       (record_id, video_id, video_title, video_url, thumbnail_url, player_focus,
+                        player2_focus, video_duration, created_at, data)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (record_id, video_id, record.video_title, record.video_url, thumbnail_url,
+                 player_focus, player2_focus, record.video_duration, record.created_at,
+                 json.dumps(record.to_dict(), ensure_ascii=False))
+            )
+            if cursor.rowcount == 0:
+                existing = tx.execute(
+                    'SELECT record_id FROM analysis_records WHERE video_id = ?', (video_id,)
+                ).fetchone()
+                print(f"⚠️ 影片已分析過: {video_id}, 返回現有紀錄: {existing['record_id']}")
+                return existing['record_id']
         
         return record_id
     
@@ -166,16 +146,18 @@ class AnalysisHistoryService:
         Returns:
             完整的分析紀錄
         """
-        record_file = os.path.join(self.records_dir, f'{record_id}.json')
-        
-        if not os.path.exists(record_file):
-            return None
-        
+        row = self.store.query_one('SELECT data FROM analysis_records WHERE record_id = ?', (record_id,))
         try:
-            with open(record_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return None
+            if row is not None:
+                return json.loads(row['data'])
+            # 匯入時被合併的重複紀錄仍可由舊檔案開啟
+            record_file = os.path.join(self.records_dir, f'{record_id}.json')
+            if os.path.exists(record_file):
+                with open(record_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+        except ValueError:
+            pass
+        return None
     
     def get_all_records(self, limit: int = 50) -> List[Dict[str, Any]]:
         """
@@ -185,10 +167,13 @@ class AnalysisHistoryService:
             limit: 最大筆數
             
         Returns:
-            紀錄摘要列表
+            紀錄摘要列表 (最新的在前)
         """
-        index = self._load_index()
-        return index[:limit]
+        rows = self.store.query(
+            f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM analysis_records ORDER BY created_at DESC LIMIT ?",
+            (limit,)
+        )
+        return [self._summary(row) for row in rows]
     
     def delete_record(self, record_id: str) -> bool:
         """
@@ -200,17 +185,14 @@ class AnalysisHistoryService:
         Returns:
             是否成功刪除
         """
-        record_file = os.path.join(self.records_dir, f'{record_id}.json')
+        with self.store.transaction() as tx:
+            tx.execute('DELETE FROM analysis_records WHERE record_id = ?', (record_id,))
         
-        # 刪除檔案
+        # 一併移除匯入資料庫前留下的舊格式檔案
+        record_file = os.path.join(self.records_dir, f'{record_id}.json')
         if os.path.exists(record_file):
             os.remove(record_file)
         
-        # 更新索引
-        index = self._load_index()
-        index = [r for r in index if r['record_id'] != record_id]
-        self._save_index(index)
-        
         return True
     
     def search_records(self, query: str) -> List[Dict[str, Any]]:
@@ -223,16 +205,15 @@ class AnalysisHistoryService:
         Returns:
             符合的紀錄列表
         """
-        index = self._load_index()
-        query_lower = query.lower()
-        
-        results = []
-        for record in index:
-            if (query_lower in record.get('video_title', '').lower() or
-                query_lower in (record.get('player_focus') or '').lower()):
-                results.append(record)
-        
-        return results
+        # LIKE 對 ASCII 不分大小寫；跳脫萬用字元，查詢字串照字面比對
+        pattern = '%' + query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        rows = self.store.query(
+            f"""SELECT {', '.join(SUMMARY_COLUMNS)} FROM analysis_records
+                WHERE video_title LIKE ? ESCAPE '\\' OR player_focus LIKE ? ESCAPE '\\'
+                ORDER BY created_at DESC""",
+            (pattern, pattern)
+        )
+        return [self._summary(row) for row in rows]
 
     def find_by_video_id(self, video_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -246,9 +227,8 @@ class AnalysisHistoryService:
         """
         if not video_id:
             return None
-            
-        index = self._load_index()
-        for record in index:
-            if record.get('video_id') == video_id:
-                return record
-        return None
+        
+        row = self.store.query_one(
+            f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM analysis_records WHERE video_id = ?", (video_id,)
+        )
+        return self._summary(row) if row else None
@@ -11,9 +11,11 @@ from typing import Optional, Callable, Dict, Any, List
 from dataclasses import dataclass, asdict
 from datetime import datetime
 from enum import Enum
-import google.generativeai as genai
 from dotenv import load_dotenv
 
+from services.gemini_gateway import PRIORITY_LIVE, get_gemini_gateway
+from services.rally_trigger import RALLY_END, RALLY_START, RallyDetector, RallyEvent, decode_thumbnail
+
 load_dotenv()
 
 
@@ -75,10 +77,8 @@ class LiveAnalysisService:
         if not self.api_key:
             raise ValueError("需要 GEMINI_API_KEY")
         
-        genai.configure(api_key=self.api_key)
-        
-        # 使用 Gemini 2.0 Flash 進行即時分析
-        self.model = genai.GenerativeModel('gemini-2.0-flash-exp')
+        # 使用 Gemini 2.0 Flash 進行即時分析，經由共用閘道以最高優先等級送出
+        self.model = get_gemini_gateway(self.api_key).model('gemini-2.0-flash-exp', priority=PRIORITY_LIVE)
         
         # 分析狀態
         self.is_analyzing = False
@@ -87,7 +87,10 @@ class LiveAnalysisService:
         self.alert_callback: Optional[Callable] = None
         self.frame_buffer: List[bytes] = []
         self.last_analysis_time = 0
-        self.analysis_interval = 3  # 每 3 秒分析一次
+        self.analysis_interval = 3  # 無法偵測回合時，每 3 秒分析一次
+        # 依畫面差異與姿勢動作量偵測回合開始/結束，只在這些時刻呼叫 Gemini
+        self.rally_detector = RallyDetector()
+        self.gemini_calls = 0
         
     def set_alert_callback(self, callback: Callable[[LiveAlert], None]):
         """設定提醒回調函數"""
@@ -101,6 +104,8 @@ class LiveAnalysisService:
         self.player_focus = player_focus
         self.frame_buffer = []
         self.last_analysis_time = time.time()
+        self.rally_detector.reset(self.last_analysis_time)
+        self.gemini_calls = 0
         
         # 發送開始提醒
         self._emit_alert(
@@ -130,12 +135,15 @@ class LiveAnalysisService:
         
         return f"警告 {warnings} 次，嚴重 {criticals} 次，戰術建議 {tactics} 條"
     
-    async def process_frame(self, frame_data: bytes) -> Optional[Dict[str, Any]]:
+    async def process_frame(self, frame_data: bytes, frame_image: Any = None,
+                            pose_energy: Optional[float] = None) -> Optional[Dict[str, Any]]:
         """
         處理視訊幀
         
         Args:
             frame_data: 影像幀的 bytes 數據（base64 編碼的圖片）
+            frame_image: 已解碼的 BGR 影像 (本地模型已解碼時傳入，避免重複解碼)
+            pose_energy: 本地模型計算的姿勢動作量 (RealtimeClassifier 的 motion_energy)
             
         Returns:
             分析結果（如果有的話）
@@ -150,47 +158,59 @@ class LiveAnalysisService:
         if len(self.frame_buffer) > 10:
             self.frame_buffer = self.frame_buffer[-10:]
         
-        # 檢查是否需要分析
         current_time = time.time()
-        if current_time - self.last_analysis_time < self.analysis_interval:
-            return None
+        thumbnail = decode_thumbnail(frame_image if frame_image is not None else frame_data)
+        if thumbnail is None and pose_energy is None:
+            # 沒有可用的本地訊號 (無 cv2 且未啟用本地模型)：退回固定間隔分析最新一幀
+            if current_time - self.last_analysis_time < self.analysis_interval:
+                return None
+            event = None
+        else:
+            event = self.rally_detector.update(frame_data, thumbnail, pose_energy, now=current_time)
+            if event is None:
+                return None
             
         self.last_analysis_time = current_time
         
         # 執行分析
         try:
-            result = await self._analyze_frames()
+            result = await self._analyze_frames(event)
             return result
         except Exception as e:
             print(f"分析錯誤: {e}")
             return None
     
-    async def _analyze_frames(self) -> Optional[Dict[str, Any]]:
-        """分析緩衝區中的幀"""
-        if not self.frame_buffer:
+    async def _analyze_frames(self, event: Optional[RallyEvent] = None) -> Optional[Dict[str, Any]]:
+        """
+        分析回合事件的代表畫面 (沒有事件時分析緩衝區中最新的幀)
+        """
+        frames = event.frames if event else self.frame_buffer[-1:]
+        if not frames:
             return None
-            
-        # 取最新的幀進行分析
-        latest_frame = self.frame_buffer[-1]
         
         # 建立分析提示
-        prompt = self._build_live_prompt()
+        prompt = self._build_live_prompt(event, len(frames))
         
         try:
-            # 準備圖片數據
+            # 準備圖片數據 (依時間順序)
             image_parts = [{
-                "mime_type": "image/jpeg",
-                "data": latest_frame if isinstance(latest_frame, str) else base64.b64encode(latest_frame).decode()
-            }]
+                "inline_data": {
+                    "mime_type": "image/jpeg",
+                    "data": frame if isinstance(frame, str) else base64.b64encode(frame).decode()
+                }
+            } for frame in frames]
             
             # 呼叫 Gemini
+            self.gemini_calls += 1
             response = await asyncio.to_thread(
                 self.model.generate_content,
-                [prompt, {"inline_data": image_parts[0]}],
+                [prompt] + image_parts,
                 generation_config={
                     "max_output_tokens": 1024,
                     "temperature": 0.3,
-                }
+                },
+                # 排隊超過一個分析間隔的畫面已過時，直接放棄
+                timeout=self.analysis_interval
             )
             
             # 解析回應
@@ -198,6 +218,9 @@ class LiveAnalysisService:
             
             # 處理分析結果
             if result:
+                if event:
+                    result['trigger'] = event.kind
+                    result['rally_duration'] = round(event.duration, 1)
                 self._process_analysis_result(result)
                 
             return result
@@ -206,16 +229,24 @@ class LiveAnalysisService:
             print(f"Gemini 分析錯誤: {e}")
             return None
     
-    def _build_live_prompt(self) -> str:
+    def _build_live_prompt(self, event: Optional[RallyEvent] = None, frame_count: int = 1) -> str:
         """建立即時分析提示詞"""
         focus_text = f"特別關注 {self.player_focus} 選手。" if self.player_focus else ""
         state_text = f"目前比分：{self.match_state.player1_score}-{self.match_state.player2_score}"
         
+        if event and event.kind == RALLY_END:
+            scene_text = (f"以下 {frame_count} 張畫面依時間順序取自剛結束的回合 (約 {event.duration:.0f} 秒)，"
+                          "最後一張為回合結束時的畫面，請判斷這一分的結果，")
+        elif event and event.kind == RALLY_START:
+            scene_text = "這是回合剛開始 (發球) 的畫面，請"
+        else:
+            scene_text = "請快速分析這個畫面，"
+        
         return f"""你是一位專業桌球教練，正在即時觀看比賽。{focus_text}
 
 {state_text}
 
-請快速分析這個畫面，回答以下問題（用 JSON 格式）：
+{scene_text}回答以下問題（用 JSON 格式）：
 
 ```json
 {{
@@ -327,7 +358,9 @@ class LiveAnalysisService:
             'is_analyzing': self.is_analyzing,
             'match_state': self.match_state.to_dict(),
             'recent_alerts': [a.to_dict() for a in self.alerts[-10:]],
-            'total_alerts': len(self.alerts)
+            'total_alerts': len(self.alerts),
+            'gemini_calls': self.gemini_calls,
+            'rally_detector': self.rally_detector.stats()
         }
     
     def update_score(self, player1_score: int, player2_score: int):
@@ -0,0 +1,283 @@
+"""
+影片前處理
+上傳或送出給 Gemini 前先轉檔為分析用規格：降低解析度與幀率、關鍵幀間隔對齊模型的
+取樣頻率 (每秒 1 幀)、移除音軌，並依影片長度限制位元率使檔案不超過上限
+
+轉檔結果依來源內容雜湊與規格快取，同一影片的多次分析只轉檔一次；
+找不到 ffmpeg 或轉檔失敗時沿用原始檔案。prepare / prepare_window 以 with 使用，
+期間持有檔案的租約，快取清除不會刪除仍在使用中的檔案
+"""
+import os
+import glob
+import shutil
+import hashlib
+import threading
+import subprocess
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from typing import Dict, Iterator, Optional
+
+from config import get_config
+from services.gemini_cache import media_digest
+
+
+@dataclass(frozen=True)
+class MediaProfile:
+    """分析用影片規格"""
+    name: str
+    max_height: int          # 最大高度 (像素)，較小的影片不放大
+    fps: int                 # 輸出幀率
+    keyframe_seconds: float  # 關鍵幀間隔 (秒)
+    crf: int                 # x264 品質參數，越大檔案越小
+    max_bytes: int           # 檔案大小上限
+
+    @property
+    def key(self) -> str:
+        """規格內容的短雜湊，規格變更時快取自然失效"""
+        encoded = repr(sorted(asdict(self).items())).encode('utf-8')
+        return f"{self.name}-{hashlib.sha1(encoded).hexdigest()[:8]}"
+
+
+# 完整比賽：模型以每秒 1 幀取樣，480p/5fps 已足夠辨識回合與比分
+MATCH_PROFILE = MediaProfile('match', max_height=480, fps=5, keyframe_seconds=1.0, crf=30,
+                             max_bytes=100 * 1024 * 1024)
+# 單一回合片段：保留較多幀以觀察動作細節，通常小到可以直接內嵌於請求
+CLIP_PROFILE = MediaProfile('clip', max_height=480, fps=15, keyframe_seconds=1.0, crf=28,
+                            max_bytes=8 * 1024 * 1024)
+
+# 轉檔結果比來源大時寫入的標記，之後直接使用來源
+_SKIP_SUFFIX = '.skip'
+_locks: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+
+def _lock_for(key: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(key, threading.Lock())
+
+
+def probe_duration(path: str) -> Optional[float]:
+    """以 ffprobe 取得影片長度 (秒)"""
+    try:
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'csv=p=0', path],
+            capture_output=True, text=True, timeout=30
+        )
+        duration = float(result.stdout.strip())
+        return duration if duration > 0 else None
+    except (OSError, ValueError, subprocess.SubprocessError):
+        return None
+
+
+def _transcode_command(source: str, output: str, profile: MediaProfile,
+                       duration: Optional[float], start: Optional[float] = None) -> list:
+    gop = max(int(round(profile.fps * profile.keyframe_seconds)), 1)
+    cmd = ['ffmpeg', '-y', '-v', 'error']
+    if start is not None:
+        # -ss 置於 -i 前快速定位，重新編碼時仍精確到幀；-t 限制區段長度
+        cmd += ['-ss', f'{start:.3f}', '-t', f'{duration:.3f}']
+    cmd += [
+        '-i', source,
+        '-an',
+        '-vf', f"fps={profile.fps},scale=-2:'min({profile.max_height},ih)'",
+        '-c:v', 'libx264', '-preset', 'veryfast', '-crf', str(profile.crf),
+        '-g', str(gop), '-keyint_min', str(gop), '-sc_threshold', '0',
+        '-pix_fmt', 'yuv420p',
+    ]
+    if duration:
+        # 以平均位元率上限確保檔案大小 (保留 10% 給容器開銷)
+        maxrate = max(int(profile.max_bytes * 8 * 0.9 / duration), 100_000)
+        cmd += ['-maxrate', str(maxrate), '-bufsize', str(maxrate * 2)]
+    cmd += ['-movflags', '+faststart', '-f', 'mp4', output]
+    return cmd
+
+
+class MediaPreparer:
+    """分析用影片的轉檔與快取"""
+
+    def __init__(self, cache_dir: str, max_cache_bytes: int = 2 * 1024 ** 3, enabled: bool = True):
+        """
+        Args:
+            cache_dir: 轉檔結果目錄
+            max_cache_bytes: 目錄總容量上限，超過時刪除最久未使用的檔案
+            enabled: 停用時一律回傳原始檔案
+        """
+        self.cache_dir = cache_dir
+        self.max_cache_bytes = max_cache_bytes
+        self.has_ffmpeg = shutil.which('ffmpeg') is not None
+        self.enabled = enabled and self.has_ffmpeg
+        if enabled and not self.enabled:
+            print("⚠️ 找不到 ffmpeg，影片將以原始檔案送出分析")
+        os.makedirs(cache_dir, exist_ok=True)
+        # 使用中的轉檔結果 -> 租約數，清除快取時略過
+        self._leases: Dict[str, int] = {}
+        self._leases_lock = threading.Lock()
+
+    def _acquire_lease(self, path: str):
+        with self._leases_lock:
+            self._leases[path] = self._leases.get(path, 0) + 1
+
+    def _release_lease(self, path: str):
+        with self._leases_lock:
+            count = self._leases.get(path, 0) - 1
+            if count > 0:
+                self._leases[path] = count
+            else:
+                self._leases.pop(path, None)
+
+    @contextmanager
+    def _leased(self, path: str, prepared: str) -> Iterator[str]:
+        """yield 轉檔結果，結束時釋放 _produce 取得的租約 (結果為原始檔案時沒有租約)"""
+        try:
+            yield prepared
+        finally:
+            if prepared != path:
+                self._release_lease(prepared)
+
+    @contextmanager
+    def prepare(self, path: str, profile: MediaProfile = MATCH_PROFILE) -> Iterator[str]:
+        """
+        取得影片的分析用版本，with 區塊內檔案不會被快取清除刪除
+
+        Args:
+            path: 原始影片路徑
+            profile: 分析規格
+
+        Yields:
+            轉檔後的路徑；無法轉檔或轉檔沒有變小時為原始路徑
+        """
+        if not self.enabled or not os.path.exists(path):
+            yield path
+            return
+
+        output = os.path.join(self.cache_dir, f"{media_digest(path)[:24]}_{profile.key}.mp4")
+        prepared = self._produce(path, output, profile, probe_duration(path), start=None)
+        with self._leased(path, prepared) as leased:
+            yield leased
+
+    @contextmanager
+    def prepare_window(self, path: str, start: float, duration: float,
+                       profile: MediaProfile = MATCH_PROFILE) -> Iterator[str]:
+        """
+        切出影片的一個時間區段並轉為分析規格 (分段分析使用)，with 區塊內檔案不會被刪除
+
+        Args:
+            path: 原始影片路徑
+            start: 區段開始 (秒)
+            duration: 區段長度 (秒)
+            profile: 分析規格
+
+        Yields:
+            區段檔案路徑
+
+        Raises:
+            RuntimeError: 沒有 ffmpeg 或切割失敗
+        """
+        if not self.has_ffmpeg:
+            raise RuntimeError("分段分析需要 ffmpeg")
+        output = os.path.join(
+            self.cache_dir, f"{media_digest(path)[:24]}_{profile.key}_{start:.0f}_{duration:.0f}.mp4"
+        )
+        prepared = self._produce(path, output, profile, duration, start=start, keep_larger=True)
+        if prepared == path:
+            raise RuntimeError(f"影片區段切割失敗: {start:.0f}s")
+        with self._leased(path, prepared) as leased:
+            yield leased
+
+    def _produce(self, path: str, output: str, profile: MediaProfile, duration: Optional[float],
+                 start: Optional[float], keep_larger: bool = False) -> str:
+        """
+        執行轉檔並快取結果；失敗時回傳原始路徑
+        回傳轉檔結果時已取得其租約，由呼叫端釋放
+        """
+        with _lock_for(output):
+            if os.path.exists(output + _SKIP_SUFFIX):
+                return path
+            # 先取得租約再確認檔案存在：清除快取在租約鎖內檢查並刪除，兩者不會交錯
+            self._acquire_lease(output)
+            try:
+                os.utime(output)
+                return output
+            except OSError:
+                pass
+
+            tmp_path = f"{output}.{threading.get_ident()}.tmp"
+            cmd = _transcode_command(path, tmp_path, profile, duration, start=start)
+            try:
+                result = subprocess.run(cmd, capture_output=True, text=True, timeout=1800)
+            except (OSError, subprocess.SubprocessError) as e:
+                print(f"⚠️ 影片轉檔失敗，使用原始檔案: {e}")
+                self._discard(tmp_path)
+                self._release_lease(output)
+                return path
+            if result.returncode != 0 or not os.path.exists(tmp_path):
+                print(f"⚠️ 影片轉檔失敗，使用原始檔案: {result.stderr.strip()[-300:]}")
+                self._discard(tmp_path)
+                self._release_lease(output)
+                return path
+
+            source_size = os.path.getsize(path)
+            prepared_size = os.path.getsize(tmp_path)
+            if prepared_size >= source_size and not keep_larger:
+                # 來源已經夠小，記錄下來之後不再轉檔
+                self._discard(tmp_path)
+                open(output + _SKIP_SUFFIX, 'w').close()
+                self._release_lease(output)
+                return path
+
+            os.replace(tmp_path, output)
+            if start is None:
+                print(f"🎞️ 影片轉檔 ({profile.name}): {source_size / 1e6:.1f} MB → {prepared_size / 1e6:.1f} MB")
+
+        self._evict()
+        return output
+
+    @staticmethod
+    def _discard(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _evict(self):
+        """總容量超過上限時，由最久未使用的轉檔結果開始刪除 (略過持有租約的檔案)"""
+        files = []
+        for path in glob.glob(os.path.join(self.cache_dir, '*.mp4')):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_cache_bytes:
+                break
+            with self._leases_lock:
+                if path in self._leases:
+                    continue
+                self._discard(path)
+            total -= size
+
+
+# 單例模式
+_media_preparer = None
+_preparer_lock = threading.Lock()
+
+
+def get_media_preparer() -> MediaPreparer:
+    global _media_preparer
+    if _media_preparer is None:
+        with _preparer_lock:
+            if _media_preparer is None:
+                config = get_config()
+                _media_preparer = MediaPreparer(
+                    config.paths.MEDIA_CACHE_DIR,
+                    max_cache_bytes=config.ai.MEDIA_CACHE_MAX_MB * 1024 * 1024,
+                    enabled=config.ai.MEDIA_PREP_ENABLED
+                )
+    return _media_preparer
+
+
+def prepare_media(path: str, profile: MediaProfile = MATCH_PROFILE):
+    """取得影片的分析用版本，以 with 使用 (見 MediaPreparer.prepare)"""
+    return get_media_preparer().prepare(path, profile)
@@ -6,17 +6,21 @@ import os
 import json
 from typing import Dict, Any, Optional
 
+# 提示詞範本版本，修改提示詞或解析方式時遞增，讓快取的舊回應失效
+METADATA_PROMPT_VERSION = 'metadata-v1'
+
+
 class MetadataExtractor:
     def __init__(self, api_key: str = None):
-        import google.generativeai as genai
         from dotenv import load_dotenv
+        from services.gemini_gateway import get_gemini_gateway
         
         load_dotenv()
         self.api_key = api_key or os.getenv('GEMINI_API_KEY')
         
         if self.api_key:
-            genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel('gemini-2.0-flash')
+            # 經由共用閘道呼叫 (統一配額與排程)
+            self.model = get_gemini_gateway(self.api_key).model('gemini-2.0-flash')
         else:
             self.model = None
             print("⚠️ Warning: GEMINI_API_KEY not found, auto-detection disabled")
@@ -55,9 +59,17 @@ class MetadataExtractor:
 """
         
         try:
-            response = self.model.generate_content(prompt)
-            text = response.text.replace('```json', '').replace('```', '').strip()
+            from services.gemini_cache import get_gemini_cache
+            cache = get_gemini_cache()
+            cache_key = cache.make_key(self.model, METADATA_PROMPT_VERSION, prompt)
+            response_text = cache.get(cache_key)
+            cached = response_text is not None
+            if not cached:
+                response_text = self.model.generate_content(prompt).text
+            text = response_text.replace('```json', '').replace('```', '').strip()
             data = json.loads(text)
+            if not cached:
+                cache.put(cache_key, response_text, self.model, METADATA_PROMPT_VERSION)
             return {
                 "player1": data.get("player1"),
                 "player2": data.get("player2")
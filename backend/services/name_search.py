@@ -0,0 +1,480 @@
+"""
+選手名稱搜尋索引
+以正規化詞元、三字元 (trigram) 倒排索引與別名表支援模糊搜尋，
+可處理 "Lin Yun-Ju" / "Yun-Ju Lin" / "林昀儒" 這類拼寫與語系差異；
+排名選手與選手檔案共用同一個索引
+"""
+import os
+import re
+import json
+import math
+import threading
+import unicodedata
+from bisect import bisect_left
+from typing import Dict, List, Any, Iterable, Optional, Set, Tuple
+
+from config import get_config
+
+# 拉丁字母數字或連續的中日韓文字
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:['\-][a-z0-9]+)*|[぀-ヿ㐀-鿿가-힯]+")
+_CJK_RE = re.compile(r'[぀-ヿ㐀-鿿가-힯]')
+
+# 結果分數：完整名稱相符 (不計順序) 1.0、每個詞元完整相符、詞元前綴相符、
+# 詞元中間的子字串相符 (例如 "dong" -> "Shidong")，拼寫差異則依三字元 Dice 係數給分；
+# 同分時依 priority (例如世界排名) 排序
+WHOLE_TOKEN_SCORE = 0.9
+PREFIX_SCORE = 0.8
+INFIX_SCORE = 0.7
+FUZZY_SCORE = 0.6
+# 詞元的三字元 Dice 係數達此門檻才視為拼寫變體
+MIN_FUZZY_DICE = 0.5
+# best() 的預設門檻：其他詞元相符時，單一詞元的拼寫差異 (例如 "Wang Chuquin") 仍可解析
+BEST_MIN_SCORE = FUZZY_SCORE * (1 + MIN_FUZZY_DICE) / 2
+# 候選數不超過 limit 的此倍數時直接排序，否則依全域排序順序掃描
+_DIRECT_SORT_FACTOR = 64
+
+DocKey = Tuple[str, str]
+_EMPTY: frozenset = frozenset()
+
+
+def normalize_name(name: str) -> str:
+    """全形轉半形、去除重音符號並轉小寫"""
+    text = unicodedata.normalize('NFKD', unicodedata.normalize('NFKC', name or ''))
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def tokenize(name: str) -> List[str]:
+    """將名稱切成詞元，連字符或撇號連接的名字會拆開"""
+    return [part for token in _TOKEN_RE.findall(normalize_name(name)) for part in re.split(r"['\-]", token)]
+
+
+def name_variants(name: str) -> List[Tuple[str, ...]]:
+    """
+    名稱的詞元變體：拆開的形式，以及連字符名字合併後的形式
+    ("Yun-Ju" -> ("yun", "ju") 與 ("yunju",))
+    """
+    raw = _TOKEN_RE.findall(normalize_name(name))
+    split = tuple(part for token in raw for part in re.split(r"['\-]", token))
+    joined = tuple(re.sub(r"['\-]", '', token) for token in raw)
+    variants = [split] if split else []
+    if joined and joined != split:
+        variants.append(joined)
+    return variants
+
+
+def _grams(tokens: Iterable[str]) -> Set[str]:
+    grams = set()
+    for token in tokens:
+        padded = f'${token}$'
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class NameSearchIndex:
+    """
+    記憶體內名稱搜尋索引
+    文件以 (來源, ID) 為鍵，例如 ('ranking', IttfId) 或 ('profile', player_id)；
+    內部以整數編號儲存倒排索引以加快集合運算
+    """
+
+    def __init__(self, aliases: Optional[Dict[str, List[str]]] = None):
+        """
+        Args:
+            aliases: 別名表，標準名稱 -> 其他寫法
+        """
+        self._docs: Dict[int, Dict[str, Any]] = {}
+        self._ids: Dict[DocKey, int] = {}
+        self._next_id = 0
+        self._source_docs: Dict[str, Set[int]] = {}
+        # 詞元 -> 文件
+        self._token_docs: Dict[str, Set[int]] = {}
+        # 排序後的詞元組合 (不計順序的完整名稱) -> 文件
+        self._exact_docs: Dict[str, Set[int]] = {}
+        # 三字元 -> 詞彙表中的詞元，模糊比對在詞彙層級進行，不必掃描文件
+        self._gram_tokens: Dict[str, Set[str]] = {}
+        self._token_grams: Dict[str, frozenset] = {}
+        # 中日韓文字名稱 -> 文件，用於在無空格的標題中比對
+        self._cjk_docs: Dict[str, Set[int]] = {}
+        # 以下為延遲重建的衍生結構，索引變動時清除
+        self._vocab: List[str] = []
+        self._prefix_cache: Dict[str, Set[int]] = {}
+        self._infix_cache: Dict[str, Set[int]] = {}
+        self._order: List[int] = []
+        self._rank_pos: Dict[int, int] = {}
+        self._dirty = False
+        self._aliases: Dict[str, List[str]] = {}
+        self._lock = threading.RLock()
+        for canonical, names in (aliases or {}).items():
+            self.add_aliases(canonical, names)
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    @staticmethod
+    def _exact_key(tokens: Iterable[str]) -> str:
+        return ' '.join(sorted(tokens))
+
+    def add_aliases(self, canonical: str, names: Iterable[str]):
+        """加入別名，已索引的文件會立即重新索引"""
+        with self._lock:
+            key = self._exact_key(tokenize(canonical))
+            entries = self._aliases.setdefault(key, [])
+            entries.extend(n for n in names if n not in entries)
+            for doc_id in list(self._exact_docs.get(key, ())):
+                doc = self._docs[doc_id]
+                self.add(doc['source'], doc['id'], doc['names'], doc['payload'], doc['priority'])
+
+    def add(self, source: str, doc_id: str, names: Iterable[str],
+            payload: Any = None, priority: int = 0):
+        """
+        新增或取代一筆文件
+
+        Args:
+            source: 來源 (ranking / profile)
+            doc_id: 來源內的 ID
+            names: 名稱列表，第一個為顯示名稱
+            payload: 搜尋結果回傳的資料
+            priority: 同分時的排序 (小者優先，例如世界排名)
+        """
+        names = [n for n in names if n]
+        if not names:
+            return
+        with self._lock:
+            self._remove((source, str(doc_id)))
+
+            # 別名表中的其他寫法也一併索引
+            all_names = list(names)
+            for name in names:
+                for alias in self._aliases.get(self._exact_key(tokenize(name)), []):
+                    if alias not in all_names:
+                        all_names.append(alias)
+
+            variants = [v for name in all_names for v in name_variants(name)]
+            tokens = {t for v in variants for t in v}
+            doc = {
+                'source': source,
+                'id': str(doc_id),
+                'name': names[0],
+                'names': names,
+                'payload': payload,
+                'priority': priority,
+                'exact_keys': {self._exact_key(v) for v in variants},
+                'variants': [frozenset(v) for v in variants],
+                'tokens': tokens,
+                'cjk': {''.join(tokenize(n)) for n in all_names if _CJK_RE.search(normalize_name(n))},
+            }
+            internal = self._next_id
+            self._next_id += 1
+            self._docs[internal] = doc
+            self._ids[(source, doc['id'])] = internal
+            self._source_docs.setdefault(source, set()).add(internal)
+            for token in tokens:
+                if token not in self._token_docs:
+                    self._token_grams[token] = frozenset(_grams([token]))
+                    for gram in self._token_grams[token]:
+                        self._gram_tokens.setdefault(gram, set()).add(token)
+            for index, values in self._postings(doc):
+                for value in values:
+                    index.setdefault(value, set()).add(internal)
+            self._dirty = True
+
+    def _postings(self, doc: Dict[str, Any]):
+        return ((self._token_docs, doc['tokens']), (self._exact_docs, doc['exact_keys']),
+                (self._cjk_docs, doc['cjk']))
+
+    def _remove(self, key: DocKey):
+        internal = self._ids.pop(key, None)
+        if internal is None:
+            return
+        doc = self._docs.pop(internal)
+        self._source_docs[doc['source']].discard(internal)
+        for index, values in self._postings(doc):
+            for value in values:
+                docs = index.get(value)
+                if docs is not None:
+                    docs.discard(internal)
+                    if not docs:
+                        del index[value]
+        for token in doc['tokens']:
+            if token not in self._token_docs:
+                for gram in self._token_grams.pop(token, _EMPTY):
+                    grams = self._gram_tokens.get(gram)
+                    if grams is not None:
+                        grams.discard(token)
+                        if not grams:
+                            del self._gram_tokens[gram]
+        self._dirty = True
+
+    def remove(self, source: str, doc_id: str):
+        """移除一筆文件"""
+        with self._lock:
+            self._remove((source, str(doc_id)))
+
+    def replace_source(self, source: str, items: Iterable[Tuple[str, List[str], Any, int]]):
+        """
+        以新資料取代整個來源
+
+        Args:
+            source: 來源
+            items: [(ID, 名稱列表, payload, priority), ...]
+        """
+        with self._lock:
+            for internal in list(self._source_docs.get(source, ())):
+                doc = self._docs[internal]
+                self._remove((source, doc['id']))
+            for doc_id, names, payload, priority in items:
+                self.add(source, doc_id, names, payload, priority)
+
+    def _refresh(self):
+        """索引變動後重建詞彙表與依 priority 的全域排序"""
+        if not self._dirty:
+            return
+        self._vocab = sorted(self._token_docs)
+        self._prefix_cache = {}
+        self._infix_cache = {}
+        self._order = sorted(self._docs, key=lambda i: (self._docs[i]['priority'], self._docs[i]['name']))
+        self._rank_pos = {internal: pos for pos, internal in enumerate(self._order)}
+        self._dirty = False
+
+    def _prefix_docs(self, prefix: str) -> Set[int]:
+        docs = self._prefix_cache.get(prefix)
+        if docs is not None:
+            return docs
+        docs = set()
+        i = bisect_left(self._vocab, prefix)
+        while i < len(self._vocab) and self._vocab[i].startswith(prefix):
+            docs |= self._token_docs[self._vocab[i]]
+            i += 1
+        # 短前綴的聯集最大也最常被查詢
+        if len(prefix) <= 3:
+            self._prefix_cache[prefix] = docs
+        return docs
+
+    def _infix_docs(self, fragment: str) -> Set[int]:
+        """名稱中任一詞元包含 fragment 的文件 (含前綴)"""
+        docs = self._infix_cache.get(fragment)
+        if docs is not None:
+            return docs
+        if len(fragment) >= 3:
+            # 子字串的每個 (不含邊界的) 三字元都必須出現在詞元中，以三字元倒排索引縮小候選
+            grams = sorted({fragment[i:i + 3] for i in range(len(fragment) - 2)},
+                           key=lambda g: len(self._gram_tokens.get(g, _EMPTY)))
+            candidates = self._gram_tokens.get(grams[0], _EMPTY).intersection(
+                *(self._gram_tokens.get(g, _EMPTY) for g in grams[1:]))
+        else:
+            # 一兩個字元沒有完整的三字元，直接掃描詞彙表
+            candidates = self._vocab
+        docs = set()
+        for token in candidates:
+            if fragment in token:
+                docs |= self._token_docs[token]
+        if len(fragment) <= 3:
+            self._infix_cache[fragment] = docs
+        return docs
+
+    def _top(self, docs: Set[int], k: Optional[int]) -> List[int]:
+        """依 priority 取出前 k 筆"""
+        if k is None or len(docs) <= k * _DIRECT_SORT_FACTOR:
+            ranked = sorted(docs, key=self._rank_pos.__getitem__)
+            return ranked if k is None else ranked[:k]
+        # 候選很多時，沿全域排序掃描，很快就能湊滿 k 筆
+        top = []
+        for internal in self._order:
+            if internal in docs:
+                top.append(internal)
+                if len(top) == k:
+                    break
+        return top
+
+    def _similar_tokens(self, token: str) -> Dict[str, float]:
+        """詞彙表中與 token 拼寫相近的詞元及其 Dice 係數"""
+        query_grams = _grams([token])
+        # Dice >= t 時共同三字元數至少為 t|q|/(2-t)，因此只需從最稀有的
+        # |q| - 下限 + 1 個三字元取候選 (鴿籠原理)
+        min_shared = max(1, math.ceil(MIN_FUZZY_DICE * len(query_grams) / (2 - MIN_FUZZY_DICE)))
+        rare = sorted(query_grams, key=lambda g: len(self._gram_tokens.get(g, _EMPTY)))
+        candidates = set().union(*(self._gram_tokens.get(g, _EMPTY)
+                                   for g in rare[:len(query_grams) - min_shared + 1]))
+        # 三字元數量差太多的詞元不可能達到門檻
+        max_grams = len(query_grams) * (2 - MIN_FUZZY_DICE) / MIN_FUZZY_DICE
+        similar = {}
+        for candidate in candidates:
+            candidate_grams = self._token_grams[candidate]
+            if min_shared <= len(candidate_grams) <= max_grams:
+                dice = 2 * len(query_grams & candidate_grams) / (len(query_grams) + len(candidate_grams))
+                if dice >= MIN_FUZZY_DICE:
+                    similar[candidate] = dice
+        return similar
+
+    def _fuzzy(self, tokens: List[str], exclude: Set[int], allowed: Optional[Set[int]],
+               min_score: float) -> List[Tuple[float, int]]:
+        """
+        拼寫差異比對：每個查詢詞元對應到拼寫相近 (或以其為前綴) 的詞元，
+        文件分數為各詞元最佳相似度的平均
+        """
+        per_token = []
+        for token in tokens:
+            best: Dict[int, float] = {}
+            for candidate, similarity in self._similar_tokens(token).items():
+                for internal in self._token_docs.get(candidate, _EMPTY):
+                    if best.get(internal, 0.0) < similarity:
+                        best[internal] = similarity
+            # 最後一個詞元可能還在輸入中
+            if token is tokens[-1]:
+                best.update(dict.fromkeys(self._prefix_docs(token), 1.0))
+            per_token.append(best)
+        per_token.sort(key=len)
+
+        matches = []
+        for internal, similarity in per_token[0].items():
+            if internal in exclude or (allowed is not None and internal not in allowed):
+                continue
+            total = similarity
+            for other in per_token[1:]:
+                value = other.get(internal)
+                if value is None:
+                    break
+                total += value
+            else:
+                score = FUZZY_SCORE * total / len(tokens)
+                if score >= min_score:
+                    matches.append((score, internal))
+        matches.sort(key=lambda m: (-m[0], self._rank_pos[m[1]]))
+        return matches
+
+    def _result(self, internal: int, score: float) -> Dict[str, Any]:
+        doc = self._docs[internal]
+        return {'source': doc['source'], 'id': doc['id'], 'name': doc['name'],
+                'score': round(score, 3), 'payload': doc['payload']}
+
+    def search(self, query: str, source: Optional[str] = None, limit: Optional[int] = 10,
+               min_score: float = 0.0) -> List[Dict[str, Any]]:
+        """
+        搜尋名稱
+
+        依序嘗試：不計順序的完整比對、每個詞元完整相符、每個詞元的前綴比對 (自動完成)、
+        每個詞元為名稱中某詞元的子字串，結果不足時再以三字元相似度做模糊比對
+
+        Args:
+            query: 查詢字串
+            source: 只搜尋特定來源
+            limit: 最大筆數 (None 表示不限)
+            min_score: 最低分數
+
+        Returns:
+            [{'source', 'id', 'name', 'score', 'payload'}, ...]，依分數與 priority 排序
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        with self._lock:
+            self._refresh()
+            allowed = self._source_docs.get(source, set()) if source is not None else None
+
+            exact = set()
+            for variant in name_variants(query):
+                exact |= self._exact_docs.get(self._exact_key(variant), _EMPTY)
+            whole = set.intersection(*(self._token_docs.get(t, set()) for t in tokens)) - exact
+            prefix_sets = sorted((self._prefix_docs(t) for t in tokens), key=len)
+            prefix = prefix_sets[0].intersection(*prefix_sets[1:]) - exact - whole
+            infix = set()
+            if INFIX_SCORE >= min_score:
+                infix_sets = sorted((self._infix_docs(t) for t in tokens), key=len)
+                infix = infix_sets[0].intersection(*infix_sets[1:]) - exact - whole - prefix
+
+            results: List[Tuple[float, int]] = []
+            for score, docs in ((1.0, exact), (WHOLE_TOKEN_SCORE, whole), (PREFIX_SCORE, prefix),
+                                (INFIX_SCORE, infix)):
+                need = None if limit is None else limit - len(results)
+                if score < min_score or need == 0:
+                    break
+                if allowed is not None:
+                    docs = docs & allowed
+                results.extend((score, internal) for internal in self._top(docs, need))
+
+            if (limit is None or len(results) < limit) and FUZZY_SCORE >= min_score:
+                fuzzy = self._fuzzy(tokens, exact | whole | prefix | infix, allowed, min_score)
+                results.extend(fuzzy if limit is None else fuzzy[:limit - len(results)])
+
+            return [self._result(internal, score) for score, internal in results]
+
+    def best(self, query: str, source: Optional[str] = None,
+             min_score: float = BEST_MIN_SCORE) -> Optional[Dict[str, Any]]:
+        """回傳最佳結果，分數不足時回傳 None"""
+        results = self.search(query, source=source, limit=1, min_score=min_score)
+        return results[0] if results else None
+
+    def find_in_text(self, text: str, source: Optional[str] = None, limit: int = 2) -> List[Dict[str, Any]]:
+        """
+        在一段文字 (例如影片標題) 中找出完整出現的選手名稱
+
+        Returns:
+            依出現位置排序的結果
+        """
+        tokens = tokenize(text)
+        first_seen: Dict[str, int] = {}
+        for position, token in enumerate(tokens):
+            first_seen.setdefault(token, position)
+
+        with self._lock:
+            self._refresh()
+            allowed = self._source_docs.get(source, set()) if source is not None else None
+            # 文件 -> (詞元位置, 詞元內的字元位置)
+            found: Dict[int, Tuple[int, int]] = {}
+            candidates = set()
+            for token in first_seen:
+                candidates |= self._token_docs.get(token, _EMPTY)
+            if allowed is not None:
+                candidates &= allowed
+            for internal in candidates:
+                for variant in self._docs[internal]['variants']:
+                    # 單一拉丁詞元太容易誤判，至少需要兩個詞元
+                    if len(variant) < 2 and not _CJK_RE.search(next(iter(variant))):
+                        continue
+                    if variant <= first_seen.keys():
+                        # 以名稱中最後出現的詞元位置排序
+                        position = (max(first_seen[t] for t in variant), 0)
+                        found[internal] = min(found.get(internal, position), position)
+
+            # 中日韓文字名稱可能與其他文字相連 (例如「林昀儒對樊振東」)，以子字串比對
+            cjk_tokens = [(i, t) for i, t in enumerate(tokens) if _CJK_RE.search(t)]
+            if cjk_tokens:
+                for name, docs in self._cjk_docs.items():
+                    for i, token in cjk_tokens:
+                        offset = token.find(name)
+                        if offset >= 0:
+                            for internal in docs:
+                                if allowed is None or internal in allowed:
+                                    found[internal] = min(found.get(internal, (i, offset)), (i, offset))
+                            break
+
+            ordered = sorted(found, key=lambda i: (found[i], self._rank_pos[i]))
+            return [self._result(internal, 1.0) for internal in ordered[:limit]]
+
+
+def load_aliases(file_path: str) -> Dict[str, List[str]]:
+    """讀取別名表 JSON ({標準名稱: [其他寫法, ...]})"""
+    if not os.path.exists(file_path):
+        return {}
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"⚠️ 讀取選手別名表失敗: {e}")
+        return {}
+
+
+# 單例模式
+_name_search_index = None
+_index_lock = threading.Lock()
+
+
+def get_name_search_index() -> NameSearchIndex:
+    global _name_search_index
+    if _name_search_index is None:
+        with _index_lock:
+            if _name_search_index is None:
+                aliases_file = os.path.join(get_config().paths.DATA_DIR, 'player_aliases.json')
+                _name_search_index = NameSearchIndex(load_aliases(aliases_file))
+    return _name_search_index
@@ -4,12 +4,15 @@
 """
 import os
 import json
-import time
 from typing import Dict, Any, List, Optional
 from dataclasses import dataclass, asdict
 from enum import Enum
 
 
+# 分析提示詞範本版本，修改提示詞結構或解析方式時遞增，讓快取的舊回應失效
+PLAYER_PROMPT_VERSION = 'player-v1'
+
+
 class ActionQuality(Enum):
     """動作品質評級"""
     GOOD = "good"        # 優秀動作，值得學習
@@ -50,8 +53,8 @@ class PlayerPerformanceAnalyzer:
     """選手表現分析器"""
     
     def __init__(self, api_key: str = None):
-        import google.generativeai as genai
         from dotenv import load_dotenv
+        from services.gemini_gateway import get_gemini_gateway
         
         load_dotenv()
         self.api_key = api_key or os.getenv('GEMINI_API_KEY')
@@ -59,8 +62,8 @@ class PlayerPerformanceAnalyzer:
         if not self.api_key:
             raise ValueError("需要 GEMINI_API_KEY")
         
-        genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel('gemini-2.0-flash')
+        # 經由共用閘道呼叫 (統一配額與排程)
+        self.model = get_gemini_gateway(self.api_key).model('gemini-2.0-flash')
     
     def analyze_player_performance(
         self, 
@@ -79,44 +82,41 @@ class PlayerPerformanceAnalyzer:
         Returns:
             包含得分和失分分析的完整報告
         """
-        import google.generativeai as genai
-        
-        print(f"📹 正在上傳影片進行 {player_name} 表現分析...")
-        
-        # 上傳影片
-        video_file = genai.upload_file(path=video_path)
-        
-        # 等待處理
-        while video_file.state.name == "PROCESSING":
-            print("⏳ 處理中...")
-            time.sleep(5)
-            video_file = genai.get_file(video_file.name)
-        
-        if video_file.state.name == "FAILED":
-            raise RuntimeError("影片處理失敗")
-        
-        print(f"🤖 正在分析 {player_name} 的表現...")
+        from services.gemini_cache import get_gemini_cache
+        from services.gemini_files import get_gemini_file_manager
+        from services.media_prep import prepare_media
         
         # 建立分析提示
         prompt = self._build_player_analysis_prompt(player_name, player_description)
+        generation_config = {
+            "max_output_tokens": 12000,
+            "temperature": 0.3,
+        }
         
-        # 呼叫 Gemini
-        response = self.model.generate_content(
-            [video_file, prompt],
-            generation_config={
-                "max_output_tokens": 12000,
-                "temperature": 0.3,
-            }
-        )
+        # 相同影片與提示詞已分析過時，直接使用快取的回應
+        cache = get_gemini_cache()
+        cache_key = cache.make_key(self.model, PLAYER_PROMPT_VERSION, prompt,
+                                   media=[video_path], generation_config=generation_config)
+        response_text = cache.get(cache_key)
+        if response_text is not None:
+            print(f"⚡ 使用快取的 {player_name} 表現分析")
+            return self._parse_player_analysis(response_text, player_name)
+        
+        # 上傳影片 (同一影片的其他分析會沿用已上傳的檔案)
+        with prepare_media(video_path) as prepared_path, \
+                get_gemini_file_manager().acquire(prepared_path) as video_file:
+            print(f"🤖 正在分析 {player_name} 的表現...")
+            
+            # 呼叫 Gemini
+            response = self.model.generate_content(
+                [video_file, prompt],
+                generation_config=generation_config
+            )
         
         # 解析結果
         result = self._parse_player_analysis(response.text, player_name)
-        
-        # 清理
-        try:
-            genai.delete_file(video_file.name)
-        except:
-            pass
+        if result.get("success"):
+            cache.put(cache_key, response.text, self.model, PLAYER_PROMPT_VERSION)
         
         return result
     
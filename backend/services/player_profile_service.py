@@ -1,51 +1,138 @@
 """
 選手檔案服務
 儲存並管理選手分析數據，支援多場比賽評分累積
+
+選手檔案只保存摘要與累積統計 (各維度 sum/count 與指數加權的近期狀態)，
+比賽紀錄另存一表，每場比賽的更新成本與歷史長度無關；
+資料存於 AnalysisStore，可與分析紀錄在同一交易中提交
 """
-import os
 import json
+from contextlib import nullcontext
 from datetime import datetime
 from typing import Dict, Any, List, Optional
-from config import get_config
+from services.analysis_store import AnalysisStore, Transaction, get_analysis_store
+from services.name_search import get_name_search_index
+
+RATING_KEYS = ['serve', 'receive', 'attack', 'defense', 'tactics']
+# 近期狀態的指數加權係數 (越大越重視最新一場)
+RECENT_FORM_ALPHA = 0.3
+# 列表與搜尋回傳的摘要欄位
+SUMMARY_COLUMNS = ('player_id', 'display_name', 'ittf_name', 'aliases', 'total_matches',
+                   'last_updated', 'aggregate_ratings', 'recent_form')
+
+
+def _rating_values(ratings: Dict[str, Any]) -> Dict[str, float]:
+    """取出有效的五維評分"""
+    values = {}
+    for key in RATING_KEYS:
+        if ratings and ratings.get(key) is not None:
+            try:
+                values[key] = float(ratings[key])
+            except (ValueError, TypeError):
+                pass
+    return values
 
-config = get_config()
+
+def _accumulate(stats: Dict[str, Dict[str, float]], values: Dict[str, float], sign: int = 1):
+    """將一場比賽的評分加入 (或移出) 累積統計"""
+    for key, value in values.items():
+        entry = stats.setdefault(key, {'sum': 0.0, 'count': 0, 'form': None})
+        entry['sum'] += sign * value
+        entry['count'] += sign
+        if sign > 0:
+            entry['form'] = value if entry['form'] is None else (
+                RECENT_FORM_ALPHA * value + (1 - RECENT_FORM_ALPHA) * entry['form']
+            )
+
+
+def _summarize(stats: Dict[str, Dict[str, float]]):
+    """由累積統計計算平均評分與近期狀態"""
+    aggregate, form = {}, {}
+    for key in RATING_KEYS:
+        entry = stats.get(key)
+        if entry and entry['count'] > 0:
+            aggregate[key] = round(entry['sum'] / entry['count'], 1)
+            if entry['form'] is not None:
+                form[key] = round(entry['form'], 1)
+    return aggregate, form
 
 
 class PlayerProfileService:
     """選手檔案服務"""
     
     def __init__(self):
-        self.profiles_dir = os.path.join(config.paths.DATA_DIR, 'player_profiles')
-        self.index_file = os.path.join(self.profiles_dir, 'index.json')
-        os.makedirs(self.profiles_dir, exist_ok=True)
-        self._ensure_index()
+        self.store = get_analysis_store()
+        self._index_profiles()
     
-    def _ensure_index(self):
-        """確保索引檔案存在"""
-        if not os.path.exists(self.index_file):
-            self._save_index({})
+    def _index_profiles(self):
+        """將選手檔案加入共用的名稱搜尋索引"""
+        rows = self.store.query('SELECT player_id, display_name, ittf_name, aliases FROM player_profiles')
+        get_name_search_index().replace_source('profile', [
+            (row['player_id'], self._profile_names(row['player_id'], self._summary(row)), row['player_id'], 0)
+            for row in rows
+        ])
     
-    def _load_index(self) -> Dict[str, Any]:
-        """載入索引"""
-        try:
-            with open(self.index_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return {}
+    @staticmethod
+    def _summary(row) -> Dict[str, Any]:
+        """資料列轉為摘要 (JSON 欄位解碼)"""
+        entry = dict(row)
+        for key in ('aliases', 'aggregate_ratings', 'recent_form'):
+            if key in entry:
+                entry[key] = json.loads(entry[key])
+        return entry
     
-    def _save_index(self, index: Dict[str, Any]):
-        """儲存索引"""
-        with open(self.index_file, 'w', encoding='utf-8') as f:
-            json.dump(index, f, ensure_ascii=False, indent=2)
+    @staticmethod
+    def _profile_names(player_id: str, entry: Dict[str, Any]) -> List[str]:
+        names = [entry.get('display_name'), entry.get('ittf_name')] + list(entry.get('aliases') or [])
+        names.append(player_id.replace('_', ' '))
+        return [n for n in names if n]
     
     def _normalize_name(self, name: str) -> str:
         """正規化選手名稱作為 ID"""
         # 去除空格、轉小寫，作為 key
         return name.strip().lower().replace(' ', '_')
     
-    def _get_profile_path(self, player_id: str) -> str:
-        """取得選手檔案路徑"""
-        return os.path.join(self.profiles_dir, f'{player_id}.json')
+    def _profile_exists(self, player_id: str) -> bool:
+        return self.store.query_one(
+            'SELECT 1 FROM player_profiles WHERE player_id = ?', (player_id,)
+        ) is not None
+    
+    def _resolve_player_id(self, player_name: str) -> str:
+        """
+        取得選手 ID；名稱為既有檔案的另一種寫法時 (詞序不同或別名)，沿用既有檔案
+        """
+        player_id = self._normalize_name(player_name)
+        if not self._profile_exists(player_id):
+            linked = get_name_search_index().best(player_name, source='profile', min_score=1.0)
+            if linked:
+                return linked['id']
+        return player_id
+    
+    def _load_profile(self, player_id: str) -> Optional[Dict[str, Any]]:
+        """載入選手檔案"""
+        row = self.store.query_one('SELECT * FROM player_profiles WHERE player_id = ?', (player_id,))
+        return AnalysisStore.profile_from_row(row) if row else None
+    
+    def _read_history(self, player_id: str, newest_first: bool = True) -> List[Dict[str, Any]]:
+        """讀取比賽紀錄 (重新分析的紀錄保留原本的位置)"""
+        order = 'DESC' if newest_first else 'ASC'
+        rows = self.store.query(
+            f'SELECT data FROM profile_matches WHERE player_id = ? ORDER BY seq {order}', (player_id,)
+        )
+        return [json.loads(row['data']) for row in rows]
+    
+    def _rebuild_stats(self, profile: Dict[str, Any]):
+        """
+        由完整紀錄重建累積統計 (依時間由舊到新)
+        只在重新分析同一影片或舊資料缺少累積統計時使用
+        """
+        matches = self._read_history(profile['player_id'], newest_first=False)
+        stats = {}
+        for match in matches:
+            _accumulate(stats, _rating_values(match.get('ratings', {})))
+        profile['rating_stats'] = stats
+        profile['aggregate_ratings'], profile['recent_form'] = _summarize(stats)
+        profile['total_matches'] = len(matches)
     
     def save_player_analysis(
         self,
@@ -56,7 +143,8 @@ class PlayerProfileService:
         ratings: Dict[str, float],
         strengths: List[Any] = None,
         weaknesses: List[Any] = None,
-        result: str = "未知"
+        result: str = "未知",
+        tx: Optional[Transaction] = None
     ) -> str:
         """
         儲存選手分析結果
@@ -70,17 +158,29 @@ class PlayerProfileService:
             strengths: 優勢列表
             weaknesses: 待改善列表
             result: 比賽結果 (勝/負/未知)
+            tx: 外部交易 (與分析紀錄一併提交時傳入)
             
         Returns:
             選手 ID
         """
-        player_id = self._normalize_name(player_name)
-        profile_path = self._get_profile_path(player_id)
+        # 讀取與寫入在同一個寫入交易中，同時更新同一選手不會互相覆蓋
+        with (self.store.transaction() if tx is None else nullcontext(tx)) as tx:
+            return self._save_player_analysis(
+                tx, player_name, match_id, video_id, opponent_name, ratings, strengths, weaknesses, result
+            )
+    
+    def _save_player_analysis(self, tx, player_name, match_id, video_id, opponent_name,
+                              ratings, strengths, weaknesses, result) -> str:
+        player_id = self._resolve_player_id(player_name)
         
         # 載入或建立 profile
-        if os.path.exists(profile_path):
-            with open(profile_path, 'r', encoding='utf-8') as f:
-                profile = json.load(f)
+        profile = self._load_profile(player_id)
+        if profile is not None:
+            # 記錄新的寫法，之後可直接以別名搜尋
+            if player_name != profile.get('display_name') and player_name not in profile.setdefault('aliases', []):
+                profile['aliases'].append(player_name)
+            if 'rating_stats' not in profile:
+                self._rebuild_stats(profile)
         else:
             # 嘗試從世界排名資料庫取得選手頭像
             avatar_url = None
@@ -106,88 +206,52 @@ class PlayerProfileService:
                 'country_code': ittf_player.get('country_code') if ittf_player else None,
                 'world_ranking': ittf_player.get('rankings') if ittf_player else None,
                 'aggregate_ratings': {},
-                'match_history': [],
+                'recent_form': {},
+                'rating_stats': {},
                 'total_matches': 0,
                 'created_at': datetime.now().isoformat(),
                 'last_updated': datetime.now().isoformat()
             }
         
-        # 檢查是否已有相同 video_id 的紀錄（避免重複）
-        existing_match = next(
-            (m for m in profile['match_history'] if m.get('video_id') == video_id),
-            None
-        )
+        now = datetime.now().isoformat()
+        match = {
+            'match_id': match_id,
+            'video_id': video_id,
+            'opponent': opponent_name,
+            'date': datetime.now().strftime('%Y-%m-%d'),
+            'result': result,
+            'ratings': ratings,
+            'strengths': strengths or [],
+            'weaknesses': weaknesses or []
+        }
+        existing = tx.execute(
+            'SELECT 1 FROM profile_matches WHERE player_id = ? AND video_id = ?', (player_id, video_id)
+        ).fetchone()
         
-        if existing_match:
-            # 更新現有紀錄
-            existing_match['ratings'] = ratings
-            existing_match['strengths'] = strengths or []
-            existing_match['weaknesses'] = weaknesses or []
-            existing_match['result'] = result
-            existing_match['updated_at'] = datetime.now().isoformat()
+        # 同一 video_id 只保留一筆（重新分析時以更新紀錄取代）
+        if existing:
+            match['updated_at'] = now
+            AnalysisStore.write_match(tx, player_id, match)
+            # 近期狀態與比賽順序有關，無法單獨撤銷，重新分析時才整體重建
+            self._rebuild_stats(profile)
         else:
-            # 新增比賽紀錄
-            match_record = {
-                'match_id': match_id,
-                'video_id': video_id,
-                'opponent': opponent_name,
-                'date': datetime.now().strftime('%Y-%m-%d'),
-                'result': result,
-                'ratings': ratings,
-                'strengths': strengths or [],
-                'weaknesses': weaknesses or [],
-                'created_at': datetime.now().isoformat()
-            }
-            profile['match_history'].insert(0, match_record)
-            profile['total_matches'] = len(profile['match_history'])
+            # 新增比賽紀錄：只寫入一列並以 O(1) 更新累積統計
+            match['created_at'] = now
+            AnalysisStore.write_match(tx, player_id, match)
+            stats = profile.setdefault('rating_stats', {})
+            _accumulate(stats, _rating_values(ratings))
+            profile['aggregate_ratings'], profile['recent_form'] = _summarize(stats)
+            profile['total_matches'] = profile.get('total_matches', 0) + 1
         
-        # 重新計算累積評分
-        profile['aggregate_ratings'] = self._calculate_aggregate_ratings(profile['match_history'])
-        profile['last_updated'] = datetime.now().isoformat()
+        profile['last_updated'] = now
+        AnalysisStore.write_profile(tx, profile)
         
-        # 儲存 profile
-        with open(profile_path, 'w', encoding='utf-8') as f:
-            json.dump(profile, f, ensure_ascii=False, indent=2)
-        
-        # 更新索引
-        index = self._load_index()
-        index[player_id] = {
-            'player_id': player_id,
-            'display_name': player_name,
-            'total_matches': profile['total_matches'],
-            'last_updated': profile['last_updated'],
-            'aggregate_ratings': profile['aggregate_ratings']
-        }
-        self._save_index(index)
+        # 交易提交後才更新名稱索引，回滾時索引不會出現不存在的檔案
+        names = self._profile_names(player_id, profile)
+        tx.on_commit(lambda: get_name_search_index().add('profile', player_id, names, player_id))
         
         return player_id
     
-    def _calculate_aggregate_ratings(self, match_history: List[Dict]) -> Dict[str, float]:
-        """計算多場比賽的平均評分"""
-        if not match_history:
-            return {}
-        
-        rating_keys = ['serve', 'receive', 'attack', 'defense', 'tactics']
-        totals = {key: 0.0 for key in rating_keys}
-        counts = {key: 0 for key in rating_keys}
-        
-        for match in match_history:
-            ratings = match.get('ratings', {})
-            for key in rating_keys:
-                if key in ratings and ratings[key] is not None:
-                    try:
-                        totals[key] += float(ratings[key])
-                        counts[key] += 1
-                    except (ValueError, TypeError):
-                        pass
-        
-        aggregate = {}
-        for key in rating_keys:
-            if counts[key] > 0:
-                aggregate[key] = round(totals[key] / counts[key], 1)
-        
-        return aggregate
-    
     def get_player_profile(self, player_name: str) -> Optional[Dict[str, Any]]:
         """
         取得選手檔案
@@ -198,15 +262,14 @@ class PlayerProfileService:
         Returns:
             選手檔案資料
         """
-        player_id = self._normalize_name(player_name)
-        profile_path = self._get_profile_path(player_id)
-        
-        if not os.path.exists(profile_path):
-            return None
+        player_id = self._resolve_player_id(player_name)
         
         try:
-            with open(profile_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            profile = self._load_profile(player_id)
+            if profile is None:
+                return None
+            profile['match_history'] = self._read_history(player_id)
+            return profile
         except:
             return None
     
@@ -218,18 +281,13 @@ class PlayerProfileService:
             limit: 最大筆數
             
         Returns:
-            選手檔案摘要列表
+            選手檔案摘要列表 (按最近更新排序)
         """
-        index = self._load_index()
-        
-        # 按最近更新排序
-        profiles = sorted(
-            index.values(),
-            key=lambda x: x.get('last_updated', ''),
-            reverse=True
+        rows = self.store.query(
+            f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM player_profiles ORDER BY last_updated DESC LIMIT ?",
+            (limit,)
         )
-        
-        return profiles[:limit]
+        return [self._summary(row) for row in rows]
     
     def search_players(self, query: str) -> List[Dict[str, Any]]:
         """
@@ -241,16 +299,22 @@ class PlayerProfileService:
         Returns:
             符合的選手列表
         """
-        index = self._load_index()
-        query_lower = query.lower()
+        # 以共用名稱索引排序相關度（支援詞序、拼寫差異與別名）
+        ids = [r['id'] for r in get_name_search_index().search(query, source='profile', limit=None, min_score=0.3)]
+        if not ids:
+            return []
         
-        results = []
-        for player_id, profile in index.items():
-            if (query_lower in player_id or 
-                query_lower in profile.get('display_name', '').lower()):
-                results.append(profile)
+        rows = {}
+        # SQLite 的參數數量有上限，分批查詢
+        for i in range(0, len(ids), 500):
+            batch = ids[i:i + 500]
+            for row in self.store.query(
+                f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM player_profiles "
+                f"WHERE player_id IN ({', '.join('?' * len(batch))})", tuple(batch)
+            ):
+                rows[row['player_id']] = self._summary(row)
         
-        return results
+        return [rows[player_id] for player_id in ids if player_id in rows]
 
 
 # 單例模式
@@ -1,31 +1,79 @@
 import os
 import json
-from typing import List, Dict, Any, Optional
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+
+from services.name_search import get_name_search_index
+
+# Files to check
+RANKING_FILES = ['SEN_SINGLES', 'SEN_DOUBLES', 'WOM_SINGLES', 'WOM_DOUBLES', 'MIX_DOUBLES']
+
+# Map SubEventCode to internal category names
+SUBEVENT_MAP = {
+    'MDI': 'SEN_SINGLES',
+    'WSI': 'WOM_SINGLES',
+    'MD': 'SEN_DOUBLES',
+    'WD': 'WOM_DOUBLES',
+    'XD': 'MIX_DOUBLES'
+}
+
+
+def _player_sort_key(p: Dict[str, Any]) -> int:
+    """排序：優先顯示有單打排名的，且排名高的"""
+    rank = 9999
+    if 'SEN_SINGLES' in p['rankings']:
+        try:
+            rank = int(p['rankings']['SEN_SINGLES']['rank'])
+        except:
+            pass
+    elif 'WOM_SINGLES' in p['rankings']:
+        try:
+            rank = int(p['rankings']['WOM_SINGLES']['rank'])
+        except:
+            pass
+    return rank
+
 
 class PlayerService:
     def __init__(self):
         self.data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data')
         self.categories = ['SEN_SINGLES', 'SEN_DOUBLES', 'WOM_SINGLES', 'WOM_DOUBLES']
         self.players_cache = {}
-        self._load_all_players()
+        # 依排名預先排序的選手列表，分頁直接切片
+        self.sorted_players = []
+        # 小寫姓名 -> 選手，用於精確比對
+        self.players_by_name = {}
+        # 建立索引時各排名檔案的 (mtime_ns, size)，變更時才重建
+        self._signature = None
+        self.version = 0
+        self._lock = threading.Lock()
+        self._ensure_fresh()
+
+    def _files_signature(self) -> Tuple:
+        signature = []
+        for file_key in RANKING_FILES:
+            try:
+                stat = os.stat(os.path.join(self.data_dir, f'{file_key}.json'))
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _ensure_fresh(self):
+        """排名檔案有變更時才重建選手索引"""
+        signature = self._files_signature()
+        if signature == self._signature:
+            return
+        with self._lock:
+            if signature != self._signature:
+                self._load_all_players()
+                self._signature = signature
 
     def _load_all_players(self):
         """載入所有類別的選手資料並建立索引"""
-        self.players_cache = {}
+        players = {}
         
-        # Map SubEventCode to internal category names
-        subevent_map = {
-            'MDI': 'SEN_SINGLES',
-            'WSI': 'WOM_SINGLES',
-            'MD': 'SEN_DOUBLES',
-            'WD': 'WOM_DOUBLES',
-            'XD': 'MIX_DOUBLES'
-        }
-
-        # Files to check
-        files_to_check = ['SEN_SINGLES', 'SEN_DOUBLES', 'WOM_SINGLES', 'WOM_DOUBLES', 'MIX_DOUBLES']
-        
-        for file_key in files_to_check:
+        for file_key in RANKING_FILES:
             file_path = os.path.join(self.data_dir, f'{file_key}.json')
             if os.path.exists(file_path):
                 try:
@@ -35,23 +83,38 @@ class PlayerService:
                             for item in data['data']['Result']:
                                 # Determine category from SubEventCode
                                 sub_event = item.get('SubEventCode')
-                                category = subevent_map.get(sub_event, file_key)
+                                category = SUBEVENT_MAP.get(sub_event, file_key)
                                 
                                 # Check if it is a pair (Doubles)
                                 if 'PairId' in item:
                                     # Process Player 1
-                                    self._process_player(item, '1', category)
+                                    self._process_player(players, item, '1', category)
                                     # Process Player 2 (suffix '1d' based on observation)
-                                    self._process_player(item, '1d', category)
+                                    self._process_player(players, item, '1d', category)
                                 else:
                                     # Process Single Player
-                                    self._process_player(item, '', category)
+                                    self._process_player(players, item, '', category)
                                     
                 except Exception as e:
                     print(f"Error loading {file_key}: {e}")
 
-    def _process_player(self, item: Dict, suffix: str, category: str):
-        """處理單個選手資料並更新 cache"""
+        players_by_name = {}
+        for player in players.values():
+            players_by_name.setdefault((player.get('name') or '').lower(), player)
+
+        # 一次替換所有索引，讀取端不會看到建到一半的資料
+        self.players_cache = players
+        self.sorted_players = sorted(players.values(), key=_player_sort_key)
+        self.players_by_name = players_by_name
+        get_name_search_index().replace_source('ranking', [
+            (player['id'], [player.get('name')], player['id'], _player_sort_key(player))
+            for player in self.sorted_players
+        ])
+        self.version += 1
+
+    @staticmethod
+    def _process_player(players: Dict[str, Dict], item: Dict, suffix: str, category: str):
+        """處理單個選手資料並更新索引"""
         # Construct field names based on suffix
         id_field = f'IttfId{suffix}'
         name_field = f'PlayerName{suffix}'
@@ -65,17 +128,17 @@ class PlayerService:
         # Points field varies between singles and doubles files
         points = item.get('RankingPointsYTD') or item.get('Points')
         
-        if ittf_id in self.players_cache:
-            if category not in self.players_cache[ittf_id]['categories']:
-                self.players_cache[ittf_id]['categories'].append(category)
+        if ittf_id in players:
+            if category not in players[ittf_id]['categories']:
+                players[ittf_id]['categories'].append(category)
             
             # Update ranking for this category
-            self.players_cache[ittf_id]['rankings'][category] = {
+            players[ittf_id]['rankings'][category] = {
                 'rank': item.get('CurrentRank'),
                 'points': points
             }
         else:
-            self.players_cache[ittf_id] = {
+            players[ittf_id] = {
                 'id': ittf_id,
                 'name': item.get(name_field),
                 'country': item.get(country_field),
@@ -92,37 +155,27 @@ class PlayerService:
 
     def get_all_players(self, page=1, per_page=20, search=None) -> Dict[str, Any]:
         """取得所有選手列表（支援分頁與搜尋）"""
-        # 重新載入以確保資料最新
-        self._load_all_players()
+        # 排名檔案變更時才重建
+        self._ensure_fresh()
         
-        all_players = list(self.players_cache.values())
+        all_players = self.sorted_players
         
-        # 搜尋過濾
+        # 搜尋過濾：名稱依相關度排序，國家或 ID 符合者接在後面（保持預先排序的順序）
         if search:
             search_lower = search.lower()
-            all_players = [
-                p for p in all_players 
-                if search_lower in p['name'].lower() or 
-                   search_lower in p['country'].lower() or
-                   search_lower in p['id']
+            matched = [
+                self.players_cache[r['id']]
+                for r in get_name_search_index().search(search, source='ranking', limit=None, min_score=0.5)
+                if r['id'] in self.players_cache
+            ]
+            matched_ids = {p['id'] for p in matched}
+            all_players = matched + [
+                p for p in all_players
+                if p['id'] not in matched_ids and (
+                    search_lower in (p['country'] or '').lower() or
+                    search_lower in p['id']
+                )
             ]
-        
-        # 排序：優先顯示有單打排名的，且排名高的
-        def sort_key(p):
-            rank = 9999
-            if 'SEN_SINGLES' in p['rankings']:
-                try:
-                    rank = int(p['rankings']['SEN_SINGLES']['rank'])
-                except:
-                    pass
-            elif 'WOM_SINGLES' in p['rankings']:
-                try:
-                    rank = int(p['rankings']['WOM_SINGLES']['rank'])
-                except:
-                    pass
-            return rank
-
-        all_players.sort(key=sort_key)
         
         # 分頁
         total = len(all_players)
@@ -139,8 +192,7 @@ class PlayerService:
 
     def get_player_details(self, player_id: str) -> Optional[Dict[str, Any]]:
         """取得特定選手詳細資料"""
-        # 重新載入以確保資料最新
-        self._load_all_players()
+        self._ensure_fresh()
         return self.players_cache.get(player_id)
 
     def find_player_by_name(self, name: str) -> Optional[Dict[str, Any]]:
@@ -156,31 +208,52 @@ class PlayerService:
         if not name:
             return None
             
-        self._load_all_players()
+        self._ensure_fresh()
         name_lower = name.lower().strip()
         
         # 精確比對
-        for player in self.players_cache.values():
-            player_name = player.get('name', '').lower()
-            if player_name == name_lower:
-                return player
-        
-        # 部分比對（名字包含搜尋詞）
-        for player in self.players_cache.values():
-            player_name = player.get('name', '').lower()
-            if name_lower in player_name or player_name in name_lower:
-                return player
+        player = self.players_by_name.get(name_lower)
+        if player:
+            return player
         
-        # 處理 "姓名" vs "名姓" 格式（如 "Lin Yun-Ju" vs "Yun-Ju Lin"）
-        name_parts = name_lower.replace('-', ' ').split()
-        if len(name_parts) >= 2:
-            for player in self.players_cache.values():
-                player_name = player.get('name', '').lower().replace('-', ' ')
-                # 檢查所有名字部分是否都在選手名字中
-                if all(part in player_name for part in name_parts):
-                    return player
+        # 模糊比對：詞元不計順序、前綴、拼寫差異與別名 (如 "Yun-Ju Lin"、"林昀儒")
+        index = get_name_search_index()
+        result = index.best(name, source='ranking')
+        if not result:
+            # 輸入包含其他文字時 (如 "LIN Yun-Ju (TPE)")，找出其中完整出現的名稱
+            found = index.find_in_text(name, source='ranking', limit=1)
+            result = found[0] if found else None
+        return self.players_cache.get(result['id']) if result else None
+
+    def search_players(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        名稱自動完成
         
-        return None
+        Args:
+            query: 輸入中的名稱
+            limit: 最大筆數
+            
+        Returns:
+            依相關度排序的選手列表，附帶分數
+        """
+        self._ensure_fresh()
+        results = []
+        for r in get_name_search_index().search(query, source='ranking', limit=limit):
+            player = self.players_cache.get(r['id'])
+            if player:
+                results.append({**player, 'score': r['score']})
+        return results
+
+    def find_players_in_text(self, text: str, limit: int = 2) -> List[Dict[str, Any]]:
+        """
+        找出文字 (例如影片標題) 中出現的選手，依出現順序排列
+        """
+        self._ensure_fresh()
+        return [
+            self.players_cache[r['id']]
+            for r in get_name_search_index().find_in_text(text, source='ranking', limit=limit)
+            if r['id'] in self.players_cache
+        ]
 
 _player_service = None
 
@@ -3,8 +3,10 @@ WTT 比賽勝率預測模型
 使用機器學習預測桌球比賽結果
 """
 import os
+import copy
 import json
 import numpy as np
+from datetime import datetime
 from typing import Dict, List, Any, Tuple, Optional
 from dataclasses import dataclass
 from pathlib import Path
@@ -22,6 +24,9 @@ except ImportError:
     print("⚠️ sklearn 未安裝，使用簡化預測模型")
 
 from services.wtt_data_collector import WTTDataCollector
+from services.compiled_ensemble import CompiledEnsemble
+from services.response_cache import ResponseCache
+from config import get_config
 
 
 @dataclass
@@ -55,13 +60,22 @@ class MatchPredictor:
     def __init__(self):
         self.data_collector = WTTDataCollector()
         self.model = None
+        self.compiled = None
+        # 模型版本，每次載入或重新訓練時遞增，用於快取失效
+        self.model_version = 0
+        cache_config = get_config().cache
+        self.cache = ResponseCache(
+            max_size=cache_config.PREDICTION_CACHE_SIZE,
+            ttl=cache_config.PREDICTION_CACHE_TTL
+        )
         self.scaler = StandardScaler() if HAS_SKLEARN else None
         self.model_path = os.path.join(
             os.path.dirname(__file__), '..', 'data', 'wtt_matches', 'predictor_model.joblib'
         )
+        self.compiled_path = os.path.splitext(self.model_path)[0] + '.npz'
         self.feature_names = [
             'rank_diff',           # 排名差距
-            'rating_diff',         # 評分差距
+            'live_rating_diff',    # 即時評分差距 (Glicko)
             'h2h_win_rate',        # 歷史對戰勝率
             'recent_form_diff',    # 近期狀態差距
             'tournament_exp_diff', # 賽事經驗差距
@@ -75,13 +89,27 @@ class MatchPredictor:
         if os.path.exists(self.model_path) and HAS_SKLEARN:
             try:
                 saved = joblib.load(self.model_path)
+                if saved.get('feature_names') != self.feature_names:
+                    raise ValueError("模型特徵與目前版本不一致，需重新訓練")
                 self.model = saved['model']
                 self.scaler = saved['scaler']
+                self._load_or_compile()
+                self.model_version += 1
                 print("✅ 載入已訓練的預測模型")
                 return
             except Exception as e:
                 print(f"⚠️ 載入模型失敗: {e}")
         
+        # 沒有 sklearn 時仍可使用已匯出的編譯模型
+        if not HAS_SKLEARN and os.path.exists(self.compiled_path):
+            try:
+                self.compiled = CompiledEnsemble.load(self.compiled_path)
+                self.model_version += 1
+                print("✅ 載入編譯式預測模型")
+                return
+            except Exception as e:
+                print(f"⚠️ 載入編譯模型失敗: {e}")
+        
         # 確保有訓練數據
         if len(self.data_collector.matches) == 0:
             print("📊 生成訓練數據...")
@@ -90,12 +118,40 @@ class MatchPredictor:
         # 訓練模型
         self._train_model()
     
-    def _extract_features(self, player1: str, player2: str) -> np.ndarray:
-        """提取特徵向量"""
-        # 取得選手資料
-        p1_stats = self.data_collector.get_player_stats(player1)
-        p2_stats = self.data_collector.get_player_stats(player2)
+    def _load_or_compile(self):
+        """載入編譯模型，若不存在或比 joblib 舊則重新匯出"""
+        if (os.path.exists(self.compiled_path) and
+                os.path.getmtime(self.compiled_path) >= os.path.getmtime(self.model_path)):
+            try:
+                self.compiled = CompiledEnsemble.load(self.compiled_path)
+                return
+            except Exception as e:
+                print(f"⚠️ 載入編譯模型失敗: {e}")
+        self._try_export_compiled()
+    
+    def _try_export_compiled(self):
+        """匯出編譯模型，失敗時退回 sklearn 推論"""
+        try:
+            self.export_compiled()
+        except Exception as e:
+            self.compiled = None
+            print(f"⚠️ 匯出編譯模型失敗: {e}")
+    
+    def export_compiled(self) -> Optional[str]:
+        """
+        將目前的 sklearn 模型匯出為扁平陣列格式
         
+        Returns:
+            匯出檔案路徑，沒有模型時回傳 None
+        """
+        if self.model is None:
+            return None
+        self.compiled = CompiledEnsemble.from_sklearn(self.model, self.scaler)
+        self.compiled.save(self.compiled_path)
+        return self.compiled_path
+    
+    def _gather_context(self, player1: str, player2: str) -> Dict[str, Any]:
+        """一次取得兩位選手的資料、統計與對戰記錄"""
         p1_info = None
         p2_info = None
         for p in self.data_collector.players.values():
@@ -104,17 +160,50 @@ class MatchPredictor:
             if p["name"] == player2:
                 p2_info = p
         
+        return {
+            "p1_info": p1_info,
+            "p2_info": p2_info,
+            "p1_stats": self.data_collector.get_player_stats(player1),
+            "p2_stats": self.data_collector.get_player_stats(player2),
+            "h2h": self.data_collector.get_h2h(player1, player2)
+        }
+    
+    def _extract_features(self, player1: str, player2: str,
+                          ratings: Optional[Tuple[float, float]] = None,
+                          context: Optional[Dict[str, Any]] = None) -> np.ndarray:
+        """
+        提取特徵向量
+        
+        Args:
+            player1: 選手 1 名稱
+            player2: 選手 2 名稱
+            ratings: 指定兩位選手的評分（訓練時使用賽前評分），預設為即時評分
+            context: 已取得的 _gather_context 結果，避免重複計算
+        """
+        # 取得選手資料
+        if context is None:
+            context = self._gather_context(player1, player2)
+        p1_stats = context["p1_stats"]
+        p2_stats = context["p2_stats"]
+        p1_info = context["p1_info"]
+        p2_info = context["p2_info"]
+        
         if not p1_info or not p2_info:
             raise ValueError(f"找不到選手資料: {player1} 或 {player2}")
         
         # 排名差距 (負數表示 player1 排名較好)
         rank_diff = p2_info["rank"] - p1_info["rank"]
         
-        # 評分差距
-        rating_diff = p1_info["rating"] - p2_info["rating"]
+        # 即時評分差距 (每 100 分為一單位)
+        if ratings is None:
+            ratings = (
+                self.data_collector.ratings.get(player1).rating,
+                self.data_collector.ratings.get(player2).rating
+            )
+        rating_diff = (ratings[0] - ratings[1]) / 100
         
         # 歷史對戰勝率
-        h2h = self.data_collector.get_h2h(player1, player2)
+        h2h = context["h2h"]
         if h2h and (h2h["player1_wins"] + h2h["player2_wins"]) > 0:
             h2h_win_rate = h2h["player1_wins"] / (h2h["player1_wins"] + h2h["player2_wins"])
         else:
@@ -180,9 +269,15 @@ class MatchPredictor:
         X = []  # 特徵
         y = []  # 標籤 (1 = player1 勝, 0 = player2 勝)
         
+        # 以賽前評分作為特徵，避免使用比賽結果本身
+        pre_match_ratings = self.data_collector.ratings.replay(self.data_collector.matches)
+        
         for match in self.data_collector.matches:
             try:
-                features = self._extract_features(match.player1_name, match.player2_name)
+                features = self._extract_features(
+                    match.player1_name, match.player2_name,
+                    ratings=pre_match_ratings.get(match.match_id)
+                )
                 X.append(features)
                 y.append(1 if match.winner == "player1" else 0)
             except Exception as e:
@@ -221,42 +316,53 @@ class MatchPredictor:
             os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
             joblib.dump({
                 'model': self.model,
-                'scaler': self.scaler
+                'scaler': self.scaler,
+                'feature_names': self.feature_names
             }, self.model_path)
             print(f"💾 模型已儲存至 {self.model_path}")
+            self._try_export_compiled()
+            self.model_version += 1
         else:
             print("⚠️ 使用簡化預測模型 (無 sklearn)")
     
+    def cache_key(self, kind: str, player1: str, player2: str) -> tuple:
+        """建立包含模型與資料版本的快取鍵"""
+        return ResponseCache.pair_key(
+            kind, player1, player2, self.model_version, self.data_collector.version
+        )
+    
     def predict(self, player1: str, player2: str) -> PredictionResult:
-        """預測比賽結果"""
-        try:
-            features = self._extract_features(player1, player2)
-        except ValueError as e:
-            raise e
+        """預測比賽結果（結果依模型與資料版本快取）"""
+        key = self.cache_key("prediction", player1, player2)
+        # 快取內容由多個請求共用，回傳副本避免呼叫端修改快取
+        return copy.deepcopy(self.cache.get_or_compute(key, lambda: self._predict(player1, player2)[0]))
+    
+    def _predict(self, player1: str, player2: str) -> Tuple[PredictionResult, Dict[str, Any]]:
+        """實際執行預測，並回傳計算過程中取得的選手資料"""
+        context = self._gather_context(player1, player2)
+        features = self._extract_features(player1, player2, context=context)
         
         # 取得選手資料用於因素分析
-        p1_stats = self.data_collector.get_player_stats(player1)
-        p2_stats = self.data_collector.get_player_stats(player2)
-        h2h = self.data_collector.get_h2h(player1, player2)
-        
-        p1_info = None
-        p2_info = None
-        for p in self.data_collector.players.values():
-            if p["name"] == player1:
-                p1_info = p
-            if p["name"] == player2:
-                p2_info = p
+        p1_stats = context["p1_stats"]
+        p2_stats = context["p2_stats"]
+        h2h = context["h2h"]
+        p1_info = context["p1_info"]
+        p2_info = context["p2_info"]
         
-        if HAS_SKLEARN and self.model is not None:
+        if self.compiled is not None:
+            # 使用編譯後的樹集成（已包含標準化）
+            prob = self.compiled.predict_proba(features)[0]
+            player1_win_prob = float(prob[1])
+            player2_win_prob = float(prob[0])
+        elif HAS_SKLEARN and self.model is not None:
             # 使用 ML 模型預測
             features_scaled = self.scaler.transform(features.reshape(1, -1))
             prob = self.model.predict_proba(features_scaled)[0]
             player1_win_prob = prob[1]
             player2_win_prob = prob[0]
         else:
-            # 簡化預測：基於排名和評分
-            rating_diff = p1_info["rating"] - p2_info["rating"]
-            base_prob = 0.5 + (rating_diff / 50)  # 評分差 50 分約等於 100% 勝率差
+            # 簡化預測：基於即時評分的預期勝率
+            base_prob = self.data_collector.ratings.expected_score(player1, player2)
             
             # 加入 H2H 調整
             if h2h:
@@ -273,6 +379,8 @@ class MatchPredictor:
         confidence = max(player1_win_prob, player2_win_prob)
         
         # 建立因素分析
+        p1_live = self.data_collector.ratings.get(player1)
+        p2_live = self.data_collector.ratings.get(player2)
         factors = {
             "ranking": {
                 "player1_rank": p1_info["rank"] if p1_info else None,
@@ -284,6 +392,13 @@ class MatchPredictor:
                 "player2_rating": p2_info["rating"] if p2_info else None,
                 "advantage": player1 if (p1_info and p2_info and p1_info["rating"] > p2_info["rating"]) else player2
             },
+            "live_rating": {
+                "player1_rating": round(p1_live.rating, 1),
+                "player1_rd": round(p1_live.rd, 1),
+                "player2_rating": round(p2_live.rating, 1),
+                "player2_rd": round(p2_live.rd, 1),
+                "advantage": player1 if p1_live.rating > p2_live.rating else player2
+            },
             "head_to_head": {
                 "player1_wins": h2h["player1_wins"] if h2h else 0,
                 "player2_wins": h2h["player2_wins"] if h2h else 0,
@@ -322,7 +437,7 @@ class MatchPredictor:
         # 預測比分
         suggested_score = self._suggest_score(player1_win_prob)
         
-        return PredictionResult(
+        result = PredictionResult(
             player1=player1,
             player2=player2,
             player1_win_prob=player1_win_prob,
@@ -332,6 +447,7 @@ class MatchPredictor:
             factors=factors,
             suggested_score=suggested_score
         )
+        return result, context
     
     def _suggest_score(self, win_prob: float) -> str:
         """根據勝率建議比分"""
@@ -364,18 +480,23 @@ class MatchPredictor:
     
     def get_match_preview(self, player1: str, player2: str) -> Dict[str, Any]:
         """取得比賽預覽（包含預測和詳細分析）"""
-        prediction = self.predict(player1, player2)
-        
-        p1_stats = self.data_collector.get_player_stats(player1)
-        p2_stats = self.data_collector.get_player_stats(player2)
-        h2h = self.data_collector.get_h2h(player1, player2)
+        key = self.cache_key("preview", player1, player2)
+        cached = self.cache.get_or_compute(key, lambda: self._build_preview(player1, player2))
+        # 快取內容由多個請求共用，回傳副本避免呼叫端修改快取；分析時間為本次回應的時間
+        preview = copy.deepcopy(cached)
+        preview["analysis_time"] = datetime.now().isoformat()
+        return preview
+    
+    def _build_preview(self, player1: str, player2: str) -> Dict[str, Any]:
+        """建立比賽預覽，沿用預測時已計算的統計資料"""
+        prediction, context = self._predict(player1, player2)
+        self.cache.set(self.cache_key("prediction", player1, player2), prediction)
         
         return {
             "prediction": prediction.to_dict(),
-            "player1_stats": p1_stats,
-            "player2_stats": p2_stats,
-            "head_to_head": h2h,
-            "analysis_time": __import__('datetime').datetime.now().isoformat()
+            "player1_stats": context["p1_stats"],
+            "player2_stats": context["p2_stats"],
+            "head_to_head": context["h2h"]
         }
 
 
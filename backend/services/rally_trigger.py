@@ -0,0 +1,220 @@
+"""
+即時分析的回合偵測
+以低成本的本地訊號判斷回合開始與結束，只在這些時刻呼叫 Gemini：
+- 畫面差異：縮小為灰階小圖後與前一幀相減的平均變化量
+- 姿勢動作量：RealtimeClassifier 由手肘/手腕關鍵點位移計算的動作能量
+
+兩者經指數平滑後以遲滯門檻 (進入與離開門檻不同) 判斷狀態，避免在門檻附近來回切換；
+畫面整個切換 (轉播切鏡頭、重播) 視為回合結束
+"""
+import time
+import base64
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import cv2
+    HAS_CV2 = True
+except ImportError:
+    cv2 = None
+    HAS_CV2 = False
+
+# 比對畫面差異用的縮圖大小
+THUMB_SIZE = (64, 36)
+
+# 回合事件
+RALLY_START = 'rally_start'
+RALLY_END = 'rally_end'
+IDLE_CHECK = 'idle_check'
+
+
+@dataclass
+class RallyEvent:
+    """偵測到的回合事件與要送出分析的代表畫面"""
+    kind: str
+    timestamp: float
+    frames: List[Any] = field(default_factory=list)
+    duration: float = 0.0
+
+
+def decode_thumbnail(frame_data: Any) -> Optional[np.ndarray]:
+    """
+    將 base64 JPEG (可含 data URL 前綴) 或已解碼的 BGR 影像轉為灰階縮圖
+
+    Returns:
+        0-1 之間的 float32 灰階縮圖；沒有 cv2 或無法解碼時回傳 None
+    """
+    if not HAS_CV2:
+        return None
+    image = frame_data
+    if not isinstance(frame_data, np.ndarray):
+        try:
+            if isinstance(frame_data, str):
+                frame_data = base64.b64decode(frame_data.split(',', 1)[-1])
+            image = cv2.imdecode(np.frombuffer(frame_data, np.uint8), cv2.IMREAD_GRAYSCALE)
+        except (ValueError, TypeError):
+            return None
+        if image is None:
+            return None
+    elif image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    # INTER_AREA 縮小時平均像素，順便去除雜訊
+    return cv2.resize(image, THUMB_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32) / 255.0
+
+
+class RallyDetector:
+    """依畫面差異與姿勢動作量判斷回合開始與結束"""
+
+    def __init__(self, start_threshold: float = 0.035, end_threshold: float = 0.015,
+                 pose_start_threshold: float = 0.02, pose_end_threshold: float = 0.008,
+                 start_seconds: float = 0.3, end_seconds: float = 1.2, cut_threshold: float = 0.25,
+                 min_rally_seconds: float = 1.0, idle_seconds: float = 30.0,
+                 smoothing: float = 0.4, max_batch: int = 4):
+        """
+        Args:
+            start_threshold / end_threshold: 畫面差異的進入與離開門檻
+            pose_start_threshold / pose_end_threshold: 姿勢動作量的進入與離開門檻
+            start_seconds: 動作持續多久才判定回合開始
+            end_seconds: 靜止持續多久才判定回合結束
+            cut_threshold: 超過此差異視為切換鏡頭
+            min_rally_seconds: 短於此長度的回合視為雜訊，不送出分析
+            idle_seconds: 長時間沒有事件時仍送出一張畫面確認狀態 (0 表示不送)
+            smoothing: 指數平滑係數 (越大越跟隨最新一幀)
+            max_batch: 回合結束時最多送出的畫面數
+        """
+        self.start_threshold = start_threshold
+        self.end_threshold = end_threshold
+        self.pose_start_threshold = pose_start_threshold
+        self.pose_end_threshold = pose_end_threshold
+        self.start_seconds = start_seconds
+        self.end_seconds = end_seconds
+        self.cut_threshold = cut_threshold
+        self.min_rally_seconds = min_rally_seconds
+        self.idle_seconds = idle_seconds
+        self.smoothing = smoothing
+        self.max_batch = max_batch
+        self.reset()
+
+    def reset(self, now: Optional[float] = None):
+        self.in_rally = False
+        self.motion = 0.0
+        self.pose_motion = 0.0
+        self._previous: Optional[np.ndarray] = None
+        self._active_since: Optional[float] = None
+        self._quiet_since: Optional[float] = None
+        self._rally_start = 0.0
+        self._last_event = now if now is not None else time.time()
+        # 回合中的畫面 (時間, 原始畫面, 動作量)，回合結束時從中挑選代表畫面
+        self._rally_frames: Deque[Tuple[float, Any, float]] = deque(maxlen=300)
+        self.frames_seen = 0
+        self.events = 0
+
+    def update(self, frame_data: Any, thumbnail: Optional[np.ndarray] = None,
+               pose_energy: Optional[float] = None, now: Optional[float] = None) -> Optional[RallyEvent]:
+        """
+        加入一幀並判斷是否發生回合事件
+
+        Args:
+            frame_data: 原始畫面 (送給 Gemini 的格式)
+            thumbnail: decode_thumbnail 產生的縮圖，沒有時只依姿勢動作量判斷
+            pose_energy: 姿勢動作量 (沒有偵測到人時為 None)
+            now: 目前時間 (秒)
+
+        Returns:
+            RallyEvent 或 None
+        """
+        now = time.time() if now is None else now
+        self.frames_seen += 1
+
+        diff = 0.0
+        if thumbnail is not None:
+            if self._previous is not None and self._previous.shape == thumbnail.shape:
+                diff = float(np.mean(np.abs(thumbnail - self._previous)))
+            self._previous = thumbnail
+        if diff > self.cut_threshold:
+            # 切換鏡頭：不計入動作量，進行中的回合視為結束
+            self.motion = 0.0
+            return self._end_rally(now) if self.in_rally else None
+
+        a = self.smoothing
+        self.motion = a * diff + (1 - a) * self.motion
+        if pose_energy is not None:
+            self.pose_motion = a * pose_energy + (1 - a) * self.pose_motion
+
+        active = self.motion > self.start_threshold or self.pose_motion > self.pose_start_threshold
+        quiet = self.motion < self.end_threshold and (
+            pose_energy is None or self.pose_motion < self.pose_end_threshold)
+
+        if not self.in_rally:
+            if not active:
+                self._active_since = None
+                if self.idle_seconds and now - self._last_event >= self.idle_seconds:
+                    self._last_event = now
+                    self.events += 1
+                    return RallyEvent(IDLE_CHECK, now, [frame_data])
+                return None
+            if self._active_since is None:
+                self._active_since = now
+            if now - self._active_since < self.start_seconds:
+                return None
+            self.in_rally = True
+            self._rally_start = self._active_since
+            self._quiet_since = None
+            self._rally_frames.clear()
+            self._rally_frames.append((now, frame_data, self.motion + self.pose_motion))
+            self._last_event = now
+            self.events += 1
+            return RallyEvent(RALLY_START, now, [frame_data])
+
+        self._rally_frames.append((now, frame_data, self.motion + self.pose_motion))
+        if not quiet:
+            self._quiet_since = None
+            return None
+        if self._quiet_since is None:
+            self._quiet_since = now
+        if now - self._quiet_since < self.end_seconds:
+            return None
+        return self._end_rally(now)
+
+    def _end_rally(self, now: float) -> Optional[RallyEvent]:
+        # 回合長度計到開始靜止為止 (不含確認靜止的等待時間)
+        duration = (self._quiet_since or now) - self._rally_start
+        self.in_rally = False
+        self._active_since = None
+        self._quiet_since = None
+        frames = self._representative_frames()
+        self._rally_frames.clear()
+        if duration < self.min_rally_seconds or not frames:
+            return None
+        self._last_event = now
+        self.events += 1
+        return RallyEvent(RALLY_END, now, frames, duration)
+
+    def _representative_frames(self) -> List[Any]:
+        """
+        挑選回合的代表畫面：最後一幀 (結果) 加上動作量最大的幾幀，依時間排序
+        """
+        if not self._rally_frames:
+            return []
+        frames = list(self._rally_frames)
+        last = len(frames) - 1
+        scores = np.array([score for _, _, score in frames])
+        # 以回合長度等分為區段，每段取動作量最大的一幀，避免全部集中在同一拍
+        picks = {last}
+        segments = np.array_split(np.arange(last), max(self.max_batch - 1, 1)) if last else []
+        for segment in segments:
+            if len(segment):
+                picks.add(int(segment[np.argmax(scores[segment])]))
+        return [frames[i][1] for i in sorted(picks)][-self.max_batch:]
+
+    def stats(self):
+        return {
+            'in_rally': self.in_rally,
+            'frames_seen': self.frames_seen,
+            'events': self.events,
+            'motion': round(self.motion, 4),
+            'pose_motion': round(self.pose_motion, 4)
+        }
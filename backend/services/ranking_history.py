@@ -0,0 +1,237 @@
+"""
+排名歷史儲存
+以只追加 (append-only) 的 JSON Lines 檔案保存每個類別的排名變化：
+定期寫入完整快照，其餘時間只記錄有變動的選手 (名次、積分)，
+儲存量隨變動次數成長，而不是快照次數 × 選手數
+"""
+import os
+import json
+import threading
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+
+from crawler import ranking_row_key
+
+
+def _to_int(value: Any) -> Optional[int]:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _row_state(row: Dict) -> Tuple[Optional[int], Optional[int]]:
+    """取出排名列的 (名次, 積分)"""
+    points = row.get('RankingPointsYTD') if 'RankingPointsYTD' in row else row.get('Points')
+    return _to_int(row.get('CurrentRank')), _to_int(points)
+
+
+def _row_name(row: Dict) -> str:
+    if row.get('PairId'):
+        return ' / '.join(filter(None, [row.get('PlayerName1'), row.get('PlayerName1d')]))
+    return row.get('PlayerName', '')
+
+
+class _CategoryHistory:
+    """單一類別的記憶體索引，由歷史檔案重播而來"""
+
+    def __init__(self):
+        # 選手鍵 -> 目前的 (名次, 積分)
+        self.current: Dict[str, Tuple[Optional[int], Optional[int]]] = {}
+        self.names: Dict[str, str] = {}
+        # 選手鍵 -> 變動時間列表與對應的 (名次, 積分)；名次為 None 表示跌出榜外
+        self.times: Dict[str, List[str]] = {}
+        self.values: Dict[str, List[Tuple[Optional[int], Optional[int]]]] = {}
+        self.last_time: Optional[str] = None
+        self.deltas_since_snapshot = 0
+
+    def apply(self, t: str, changes: Dict[str, Tuple], removed: Iterable[str], names: Dict[str, str]):
+        self.names.update(names)
+        for key, state in changes.items():
+            state = tuple(state)
+            self.current[key] = state
+            self.times.setdefault(key, []).append(t)
+            self.values.setdefault(key, []).append(state)
+        for key in removed:
+            if self.current.pop(key, None) is not None:
+                self.times.setdefault(key, []).append(t)
+                self.values.setdefault(key, []).append((None, None))
+        self.last_time = t
+
+    def state_at(self, key: str, t: str) -> Optional[Tuple[Optional[int], Optional[int]]]:
+        """取得選手在時間 t 當下的 (名次, 積分)"""
+        times = self.times.get(key)
+        if not times:
+            return None
+        index = bisect_right(times, t) - 1
+        return self.values[key][index] if index >= 0 else None
+
+
+class RankingHistoryStore:
+    """排名歷史儲存，每個類別一個 JSON Lines 檔案"""
+
+    def __init__(self, history_dir: str, snapshot_interval: int = 50):
+        """
+        Args:
+            history_dir: 歷史檔案目錄
+            snapshot_interval: 每隔多少筆差異寫入一次完整快照
+        """
+        self.history_dir = history_dir
+        self.snapshot_interval = max(snapshot_interval, 1)
+        self._categories: Dict[str, _CategoryHistory] = {}
+        self._lock = threading.Lock()
+        os.makedirs(history_dir, exist_ok=True)
+
+    def _file_path(self, category: str) -> str:
+        return os.path.join(self.history_dir, f'{category}.jsonl')
+
+    def _load(self, category: str) -> _CategoryHistory:
+        history = self._categories.get(category)
+        if history is not None:
+            return history
+
+        history = _CategoryHistory()
+        file_path = self._file_path(category)
+        if os.path.exists(file_path):
+            with open(file_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 寫入中斷造成的不完整行，略過
+                        continue
+                    if record['type'] == 'snapshot':
+                        rows = record['rows']
+                        changes = {k: v for k, v in rows.items() if tuple(v) != history.current.get(k)}
+                        removed = [k for k in history.current if k not in rows]
+                        history.apply(record['t'], changes, removed, record.get('names', {}))
+                        history.deltas_since_snapshot = 0
+                    else:
+                        history.apply(record['t'], record.get('set', {}), record.get('del', []),
+                                      record.get('names', {}))
+                        history.deltas_since_snapshot += 1
+        self._categories[category] = history
+        return history
+
+    def record(self, category: str, rows: List[Dict], timestamp: Optional[str] = None) -> int:
+        """
+        記錄一次排名資料，只追加與上次不同的部分
+
+        Args:
+            category: 排名類別
+            rows: 完整的排名列（原始 API 資料）
+            timestamp: 記錄時間 (ISO 格式)，預設為現在
+
+        Returns:
+            變動的選手數
+        """
+        t = timestamp or datetime.now().isoformat(timespec='seconds')
+        rows_by_key = {}
+        names = {}
+        for row in rows:
+            key = ranking_row_key(row)
+            if key:
+                rows_by_key[key] = list(_row_state(row))
+                names[key] = _row_name(row)
+
+        with self._lock:
+            history = self._load(category)
+            changes = {k: v for k, v in rows_by_key.items() if tuple(v) != history.current.get(k)}
+            removed = [k for k in history.current if k not in rows_by_key]
+            new_names = {k: n for k, n in names.items() if history.names.get(k) != n}
+            if not changes and not removed and not new_names:
+                return 0
+
+            # 時間必須遞增，才能以二分搜尋查詢
+            if history.last_time and t <= history.last_time:
+                t = history.last_time
+
+            if history.last_time is None or history.deltas_since_snapshot + 1 >= self.snapshot_interval:
+                record = {'t': t, 'type': 'snapshot', 'rows': rows_by_key, 'names': names}
+                history.deltas_since_snapshot = 0
+            else:
+                record = {'t': t, 'type': 'delta', 'set': changes, 'del': removed, 'names': new_names}
+                history.deltas_since_snapshot += 1
+
+            with open(self._file_path(category), 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+            history.apply(t, changes, removed, new_names)
+            return len(changes) + len(removed)
+
+    def get_trajectory(self, category: str, player_key: str,
+                       since: Optional[str] = None, until: Optional[str] = None) -> Dict[str, Any]:
+        """
+        取得選手在時間範圍內的名次軌跡
+
+        Args:
+            category: 排名類別
+            player_key: 選手鍵 (項目代碼|IttfId 或 PairId)
+            since: 起始時間 (ISO 格式)
+            until: 結束時間 (ISO 格式)
+
+        Returns:
+            {'name', 'points': [{'t', 'rank', 'points'}, ...]}，
+            起點為 since 當下的狀態
+        """
+        with self._lock:
+            history = self._load(category)
+            times = history.times.get(player_key, [])
+            values = history.values.get(player_key, [])
+            start = bisect_right(times, since) if since else 0
+            end = bisect_right(times, until) if until else len(times)
+
+            points = []
+            # 範圍開始前的最後狀態作為起點
+            if since and start > 0 and values[start - 1][0] is not None:
+                rank, score = values[start - 1]
+                points.append({'t': since, 'rank': rank, 'points': score})
+            for t, (rank, score) in zip(times[start:end], values[start:end]):
+                points.append({'t': t, 'rank': rank, 'points': score})
+
+            return {'name': history.names.get(player_key), 'points': points}
+
+    def get_movers(self, category: str, since: str, limit: int = 10,
+                   sub_event_code: Optional[str] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        取得 since 之後名次變化最大的選手
+
+        Args:
+            category: 排名類別
+            since: 比較起點 (ISO 格式)
+            limit: 每個方向回傳的數量
+            sub_event_code: 只比較特定項目
+
+        Returns:
+            {'risers': [...], 'fallers': [...]}
+        """
+        with self._lock:
+            history = self._load(category)
+            moves = []
+            for key, (rank, score) in history.current.items():
+                if rank is None or (sub_event_code and not key.startswith(f'{sub_event_code}|')):
+                    continue
+                before = history.state_at(key, since)
+                if not before or before[0] is None or before[0] == rank:
+                    continue
+                moves.append({
+                    'key': key,
+                    'name': history.names.get(key),
+                    'previous_rank': before[0],
+                    'rank': rank,
+                    'change': before[0] - rank,
+                    'previous_points': before[1],
+                    'points': score
+                })
+
+        risers = sorted((m for m in moves if m['change'] > 0), key=lambda m: (-m['change'], m['rank']))
+        fallers = sorted((m for m in moves if m['change'] < 0), key=lambda m: (m['change'], m['rank']))
+        return {'risers': risers[:limit], 'fallers': fallers[:limit]}
+
+
+def since_days(days: float) -> str:
+    """回傳 days 天前的 ISO 時間字串"""
+    return (datetime.now() - timedelta(days=days)).isoformat(timespec='seconds')
@@ -0,0 +1,127 @@
+"""
+排名讀取模型
+將過濾、排序後的排名資料與預先壓縮的回應內容常駐於記憶體，
+只在排名檔案變更時重建
+"""
+import os
+import json
+import gzip
+import hashlib
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+# brotli 為選用套件
+try:
+    import brotli
+    HAS_BROTLI = True
+except ImportError:
+    HAS_BROTLI = False
+
+
+@dataclass
+class RankingSnapshot:
+    """單一類別的排名快照"""
+    category: str
+    data: Dict
+    body: bytes
+    gzip_body: bytes
+    brotli_body: Optional[bytes]
+    etag: str
+    file_signature: Tuple[int, int]
+
+    def encoded_body(self, accept_encoding: str) -> Tuple[bytes, Optional[str]]:
+        """
+        依 Accept-Encoding 選擇回應內容
+
+        Returns:
+            (內容, Content-Encoding)
+        """
+        accepted = {
+            part.split(';')[0].strip().lower()
+            for part in (accept_encoding or '').split(',')
+        }
+        if self.brotli_body is not None and 'br' in accepted:
+            return self.brotli_body, 'br'
+        if 'gzip' in accepted:
+            return self.gzip_body, 'gzip'
+        return self.body, None
+
+
+class RankingReadModel:
+    """排名讀取模型，以檔案 mtime/大小判斷是否需要重建"""
+
+    def __init__(self, data_dir: str, transform: Callable[[Dict, str], Dict]):
+        """
+        Args:
+            data_dir: 排名 JSON 檔案目錄
+            transform: 過濾與排序函數 (data, category) -> data
+        """
+        self.data_dir = data_dir
+        self.transform = transform
+        self._snapshots: Dict[str, RankingSnapshot] = {}
+        self._lock = threading.Lock()
+
+    def _file_signature(self, category: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(os.path.join(self.data_dir, f'{category}.json'))
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def get(self, category: str) -> Optional[RankingSnapshot]:
+        """
+        取得類別快照，檔案未變更時不重新解析
+
+        Args:
+            category: 排名類別
+
+        Returns:
+            快照，檔案不存在時回傳 None；檔案無法解析時沿用上一個快照
+        """
+        signature = self._file_signature(category)
+        if signature is None:
+            return None
+
+        snapshot = self._snapshots.get(category)
+        if snapshot is not None and snapshot.file_signature == signature:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshots.get(category)
+            if snapshot is None or snapshot.file_signature != signature:
+                rebuilt = self._build(category, signature)
+                if rebuilt is not None:
+                    self._snapshots[category] = snapshot = rebuilt
+                # 重建失敗時保留舊快照 (簽章不變，下次讀取再重試)，避免請求改為同步重新抓取
+        return snapshot
+
+    def _build(self, category: str, signature: Tuple[int, int]) -> Optional[RankingSnapshot]:
+        file_path = os.path.join(self.data_dir, f'{category}.json')
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 讀取 {category} 排名失敗: {e}")
+            return None
+
+        data = self.transform(data, category)
+        body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+        return RankingSnapshot(
+            category=category,
+            data=data,
+            body=body,
+            gzip_body=gzip.compress(body, compresslevel=9),
+            brotli_body=brotli.compress(body, quality=11) if HAS_BROTLI else None,
+            etag=hashlib.sha1(body).hexdigest(),
+            file_signature=signature
+        )
+
+    def invalidate(self, category: Optional[str] = None):
+        """清除快照，下次讀取時重建"""
+        with self._lock:
+            if category is None:
+                self._snapshots.clear()
+            else:
+                self._snapshots.pop(category, None)
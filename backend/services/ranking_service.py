@@ -2,8 +2,16 @@
 排名服務
 處理 WTT 排名資料的獲取、快取和過濾
 """
+import os
 from typing import Dict, List, Optional, Any
+from config import get_config
 from crawler import TableTennisRankingCrawler
+from services.ranking_read_model import RankingReadModel, RankingSnapshot
+from services.ranking_history import RankingHistoryStore, since_days
+
+# 同一程序內所有 RankingService 共用的讀取模型與歷史儲存
+_read_model = None
+_history = None
 
 
 class RankingService:
@@ -21,7 +29,17 @@ class RankingService:
     VALID_CATEGORIES = ['SEN_SINGLES', 'SEN_DOUBLES', 'WOM_SINGLES', 'WOM_DOUBLES', 'MIX_DOUBLES']
     
     def __init__(self):
+        global _read_model, _history
         self.crawler = TableTennisRankingCrawler()
+        if _read_model is None:
+            _read_model = RankingReadModel(self.crawler.data_dir, self._filter_ranking_data)
+        if _history is None:
+            _history = RankingHistoryStore(
+                os.path.join(self.crawler.data_dir, 'ranking_history'),
+                snapshot_interval=get_config().scheduler.RANKING_SNAPSHOT_INTERVAL
+            )
+        self.read_model = _read_model
+        self.history = _history
     
     def get_ranking(self, category: str) -> Optional[Dict[str, Any]]:
         """
@@ -31,27 +49,38 @@ class RankingService:
             category: 排名類別
             
         Returns:
-            過濾後的排名資料
+            過濾後的排名資料（共用物件，請勿修改）
+        """
+        snapshot = self.get_ranking_snapshot(category)
+        return snapshot.data if snapshot else None
+    
+    def get_ranking_snapshot(self, category: str) -> Optional[RankingSnapshot]:
+        """
+        取得特定類別的排名快照（含預先序列化與壓縮的回應內容）
+        
+        Args:
+            category: 排名類別
+            
+        Returns:
+            排名快照
         """
         if category not in self.VALID_CATEGORIES:
             return None
         
-        # 嘗試讀取快取
-        data = self.crawler.load_data(category)
+        # 檔案未變更時直接使用記憶體中的快照
+        snapshot = self.read_model.get(category)
         
         # 如果沒有資料，立即抓取
-        if not data:
+        if snapshot is None:
             print(f"首次抓取 {category} 資料...")
             self.crawler.fetch_ranking(category)
-            data = self.crawler.load_data(category)
-        
-        if not data:
-            return None
+            self._record_history(category)
+            snapshot = self.read_model.get(category)
         
-        # 過濾和排序資料
-        return self._filter_ranking_data(data, category)
+        return snapshot
     
-    def _filter_ranking_data(self, data: Dict, category: str) -> Dict:
+    @classmethod
+    def _filter_ranking_data(cls, data: Dict, category: str) -> Dict:
         """
         過濾排名資料
         
@@ -66,7 +95,7 @@ class RankingService:
             return data
         
         original_result = data['data']['Result']
-        sub_event_code = self.CATEGORY_FILTER_MAP.get(category)
+        sub_event_code = cls.CATEGORY_FILTER_MAP.get(category)
         
         if sub_event_code:
             filtered_result = [
@@ -97,8 +126,59 @@ class RankingService:
         return all_data
     
     def update_all(self) -> Dict[str, Any]:
-        """更新所有排名資料"""
-        return self.crawler.update_all_rankings()
+        """更新所有排名資料，並立即重建讀取模型"""
+        results = self.crawler.update_all_rankings()
+        for category, status in results.items():
+            if status == 'success':
+                self.read_model.get(category)
+            if status != 'failed':
+                # 內容相同時不會追加，首次執行時則會寫入初始快照
+                self._record_history(category)
+        return results
+    
+    def _record_history(self, category: str):
+        """將目前儲存的排名追加到歷史紀錄（內容相同時不會寫入）"""
+        data = self.crawler.load_data(category)
+        if data and 'Result' in data.get('data', {}):
+            self.history.record(category, data['data']['Result'])
+    
+    def _player_key(self, category: str, player_id: str) -> str:
+        return f"{self.CATEGORY_FILTER_MAP.get(category, '')}|{player_id}"
+    
+    def get_player_trajectory(self, category: str, player_id: str, days: float = 365) -> Dict[str, Any]:
+        """
+        取得選手的名次軌跡
+        
+        Args:
+            category: 排名類別
+            player_id: 單打為 IttfId，雙打為 PairId
+            days: 往回查詢的天數
+            
+        Returns:
+            {'player_id', 'name', 'points': [...]}
+        """
+        trajectory = self.history.get_trajectory(
+            category, self._player_key(category, player_id), since=since_days(days)
+        )
+        return {'player_id': player_id, **trajectory}
+    
+    def get_biggest_movers(self, category: str, days: float = 7, limit: int = 10) -> Dict[str, Any]:
+        """
+        取得期間內名次變化最大的選手
+        
+        Args:
+            category: 排名類別
+            days: 比較的天數
+            limit: 每個方向回傳的數量
+        """
+        return self.history.get_movers(
+            category, since_days(days), limit=limit,
+            sub_event_code=self.CATEGORY_FILTER_MAP.get(category)
+        )
+    
+    def reverify_photos(self) -> Dict[str, int]:
+        """重新驗證所有已快取的選手圖片 URL"""
+        return self.crawler.reverify_photo_urls()
     
     def get_scheduler(self):
         """取得爬蟲實例用於排程"""
@@ -0,0 +1,191 @@
+"""
+選手即時評分引擎
+以 Glicko 演算法逐場更新選手實力評分與不確定度
+"""
+import os
+import json
+import math
+from datetime import datetime
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+from dataclasses import dataclass, asdict
+
+# Glicko 常數
+Q = math.log(10) / 400
+DEFAULT_RATING = 1500.0
+DEFAULT_RD = 350.0
+MIN_RD = 30.0
+# 每日不確定度成長量 (約一年未出賽回到 DEFAULT_RD)
+RD_GROWTH_PER_DAY = 17.5
+
+
+@dataclass
+class PlayerRating:
+    """選手評分狀態"""
+    rating: float = DEFAULT_RATING
+    rd: float = DEFAULT_RD
+    matches: int = 0
+    last_date: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _g(rd: float) -> float:
+    return 1 / math.sqrt(1 + 3 * (Q * rd) ** 2 / math.pi ** 2)
+
+
+def _expected(rating: float, opp_rating: float, opp_rd: float) -> float:
+    return 1 / (1 + 10 ** (-_g(opp_rd) * (rating - opp_rating) / 400))
+
+
+def _days_between(start: Optional[str], end: str) -> int:
+    if not start:
+        return 0
+    try:
+        delta = datetime.strptime(end, "%Y-%m-%d") - datetime.strptime(start, "%Y-%m-%d")
+        return max(delta.days, 0)
+    except ValueError:
+        return 0
+
+
+class RatingEngine:
+    """Glicko 評分引擎，每場比賽 O(1) 更新"""
+
+    def __init__(self, ratings_file: str = None):
+        self.ratings_file = ratings_file
+        self.players: Dict[str, PlayerRating] = {}
+        # 選手名稱 -> [(日期, 評分, 不確定度), ...]
+        self.history: Dict[str, List[Tuple[str, float, float]]] = {}
+        self.version = 0
+
+    def get(self, name: str) -> PlayerRating:
+        """取得選手目前評分（未出賽者回傳預設值）"""
+        return self.players.get(name) or PlayerRating()
+
+    def _current_rd(self, state: PlayerRating, date: str) -> float:
+        """依未出賽天數放大不確定度"""
+        days = _days_between(state.last_date, date)
+        return min(math.sqrt(state.rd ** 2 + RD_GROWTH_PER_DAY ** 2 * days), DEFAULT_RD)
+
+    def expected_score(self, player1: str, player2: str) -> float:
+        """player1 擊敗 player2 的預期機率"""
+        p1 = self.get(player1)
+        p2 = self.get(player2)
+        combined_rd = math.sqrt(p1.rd ** 2 + p2.rd ** 2)
+        return _expected(p1.rating, p2.rating, combined_rd)
+
+    def update(self, player1: str, player2: str, player1_won: bool, date: str) -> Tuple[float, float]:
+        """
+        以單場比賽結果更新兩位選手
+
+        Args:
+            player1: 選手 1 名稱
+            player2: 選手 2 名稱
+            player1_won: 選手 1 是否獲勝
+            date: 比賽日期 (YYYY-MM-DD)
+
+        Returns:
+            更新前兩位選手的評分 (用於避免訓練資料洩漏)
+        """
+        p1 = self.players.setdefault(player1, PlayerRating())
+        p2 = self.players.setdefault(player2, PlayerRating())
+        before = (p1.rating, p2.rating)
+
+        rd1 = self._current_rd(p1, date)
+        rd2 = self._current_rd(p2, date)
+        s1 = 1.0 if player1_won else 0.0
+
+        new1 = self._rate(p1.rating, rd1, p2.rating, rd2, s1)
+        new2 = self._rate(p2.rating, rd2, p1.rating, rd1, 1.0 - s1)
+
+        for name, state, (rating, rd) in ((player1, p1, new1), (player2, p2, new2)):
+            state.rating = rating
+            state.rd = rd
+            state.matches += 1
+            if not state.last_date or date > state.last_date:
+                state.last_date = date
+            self.history.setdefault(name, []).append((date, round(rating, 2), round(rd, 2)))
+
+        self.version += 1
+        return before
+
+    @staticmethod
+    def _rate(rating: float, rd: float, opp_rating: float, opp_rd: float, score: float) -> Tuple[float, float]:
+        g = _g(opp_rd)
+        e = _expected(rating, opp_rating, opp_rd)
+        d_sq = 1 / (Q ** 2 * g ** 2 * e * (1 - e))
+        denom = 1 / rd ** 2 + 1 / d_sq
+        new_rating = rating + Q / denom * g * (score - e)
+        new_rd = max(math.sqrt(1 / denom), MIN_RD)
+        return new_rating, new_rd
+
+    def replay(self, matches: Iterable[Any]) -> Dict[str, Tuple[float, float]]:
+        """
+        依日期順序一次重播所有比賽，重建評分與時間序列
+
+        Args:
+            matches: MatchRecord 列表
+
+        Returns:
+            match_id -> 賽前兩位選手評分
+        """
+        self.players = {}
+        self.history = {}
+        pre_match = {}
+        for match in sorted(matches, key=lambda m: (m.date, m.match_id)):
+            pre_match[match.match_id] = self.update(
+                match.player1_name, match.player2_name,
+                match.winner == "player1", match.date
+            )
+        return pre_match
+
+    def delta(self, *names: str) -> Dict[str, Dict[str, Any]]:
+        """
+        指定選手目前的評分狀態與最後一個時間序列點 (單場更新後寫入增量記錄)
+
+        Returns:
+            選手名稱 -> {'state': PlayerRating 欄位, 'point': [日期, 評分, 不確定度]}
+        """
+        return {
+            name: {"state": self.players[name].to_dict(), "point": list(self.history[name][-1])}
+            for name in names
+        }
+
+    def apply_delta(self, delta: Dict[str, Dict[str, Any]]):
+        """套用 delta() 的結果，不需重算評分"""
+        for name, change in delta.items():
+            self.players[name] = PlayerRating(**change["state"])
+            self.history.setdefault(name, []).append(tuple(change["point"]))
+        self.version += 1
+
+    def get_history(self, name: str) -> List[Dict[str, Any]]:
+        """取得選手評分時間序列"""
+        return [
+            {"date": date, "rating": rating, "rd": rd}
+            for date, rating, rd in self.history.get(name, [])
+        ]
+
+    def load(self) -> bool:
+        """從檔案載入評分狀態"""
+        if not self.ratings_file or not os.path.exists(self.ratings_file):
+            return False
+        with open(self.ratings_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        self.players = {name: PlayerRating(**p) for name, p in data.get("players", {}).items()}
+        self.history = {
+            name: [tuple(point) for point in points]
+            for name, points in data.get("history", {}).items()
+        }
+        self.version = data.get("version", 0)
+        return True
+
+    def save(self):
+        """儲存評分狀態與時間序列"""
+        if not self.ratings_file:
+            return
+        with open(self.ratings_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                "version": self.version,
+                "players": {name: p.to_dict() for name, p in self.players.items()},
+                "history": self.history
+            }, f, ensure_ascii=False)
@@ -1,34 +1,51 @@
 import numpy as np
-import tensorflow as tf
 import joblib
 import os
 from collections import deque
 from skeleton import PoseExtractor
+from stroke_segmentation import ARM_LANDMARKS, StreamingStrokeSegmenter, resample
+from services.classifier_runtime import load_classifier
+
 
 class RealtimeClassifier:
-    def __init__(self, model_path='pose_classifier_model.h5', scaler_path='scaler.pkl'):
+    def __init__(self, model_path='pose_classifier_model.h5', scaler_path='scaler.pkl', fps=10, backend=None):
+        """
+        Args:
+            model_path: Keras 模型；同名的 .tflite 存在且較新時改用 TFLite 推論
+            scaler_path: 標準化器
+            fps: 前端送幀的頻率
+            backend: auto / tflite / keras (預設使用 CLASSIFIER_BACKEND)
+        """
+        from config import get_config
+        ai_config = get_config().ai
         self.model_path = model_path
         self.scaler_path = scaler_path
+        self.backend = backend or ai_config.CLASSIFIER_BACKEND
+        self.num_threads = ai_config.CLASSIFIER_NUM_THREADS
         self.model = None
         self.scaler = None
-        self.pose_extractor = PoseExtractor()
+        # 與訓練資料使用相同的姿勢估計輸入前處理 (縮小/裁切)
+        self.pose_extractor = PoseExtractor(input_size=ai_config.POSE_INPUT_SIZE, roi_crop=ai_config.POSE_ROI_CROP)
         
         # 緩衝區設定
         self.max_frames = 150
         self.num_features = 69  # 23 landmarks * 3 coords
         self.frame_buffer = deque(maxlen=self.max_frames)
         self.classes = ['good', 'normal', 'bad']
+        self._last_arm = None
+        # 只對偵測到的每一拍做分類 (前端約每 100ms 送一幀)
+        self.segmenter = StreamingStrokeSegmenter(fps=fps)
         
         self.load_model()
         
     def load_model(self):
         """載入模型和標準化器"""
-        if os.path.exists(self.model_path):
-            try:
-                self.model = tf.keras.models.load_model(self.model_path)
-                print(f"✅ 模型已載入: {self.model_path}")
-            except Exception as e:
-                print(f"❌ 模型載入失敗: {e}")
+        try:
+            self.model = load_classifier(self.model_path, self.backend, self.num_threads)
+            if self.model is not None:
+                print(f"✅ 模型已載入: {self.model.model_path} ({self.model.name})")
+        except Exception as e:
+            print(f"❌ 模型載入失敗: {e}")
         
         if os.path.exists(self.scaler_path):
             try:
@@ -41,11 +58,14 @@ class RealtimeClassifier:
         """
         處理單一影像幀
         
+        Args:
+            frame: OpenCV 影像幀 (BGR 格式)
+        
         Returns:
-            dict: 包含預測結果（如果緩衝區已滿）和骨架數據
+            dict: 包含預測結果（偵測到一拍結束時）和骨架數據
         """
-        # 1. 提取骨架
-        results = self.pose_extractor.pose.process(frame)
+        # 1. 提取骨架 (經過與訓練相同的前處理，座標換算回完整畫面)
+        results = self.pose_extractor.extract_pose(frame)
         landmarks_data = []
         
         if results.pose_landmarks:
@@ -57,19 +77,22 @@ class RealtimeClassifier:
             # 沒偵測到人，填 0
             landmarks_data = [0.0] * self.num_features
             
-        # 2. 加入緩衝區
+        # 2. 加入緩衝區並偵測一拍是否結束
         self.frame_buffer.append(landmarks_data)
+        stroke = self.segmenter.push(landmarks_data)
         
         result = {
             'has_pose': bool(results.pose_landmarks),
             'prediction': None,
-            'confidence': 0.0
+            'confidence': 0.0,
+            'motion_energy': self._motion_energy(landmarks_data if results.pose_landmarks else None)
         }
         
-        # 3. 如果緩衝區滿了，進行預測 (每 10 幀預測一次，避免過度運算)
-        if len(self.frame_buffer) == self.max_frames and self.model and self.scaler:
-            # 轉換為 numpy array
-            sequence = np.array(self.frame_buffer)
+        # 3. 一拍結束時，將該拍重新採樣為模型輸入長度後預測 (閒置的幀不做推論)
+        if stroke is not None and self.model and self.scaler:
+            segment, frames = stroke
+            sequence = resample(frames, self.max_frames)
+            result['stroke'] = segment.to_dict()
             
             # 標準化
             sequence_reshaped = sequence.reshape(-1, self.num_features)
@@ -77,7 +100,7 @@ class RealtimeClassifier:
             X = sequence_scaled.reshape(1, self.max_frames, self.num_features)
             
             # 預測
-            pred = self.model.predict(X, verbose=0)[0]
+            pred = self.model.predict(X)[0]
             class_idx = np.argmax(pred)
             
             result['prediction'] = self.classes[class_idx]
@@ -90,6 +113,26 @@ class RealtimeClassifier:
             
         return result
 
+    def _motion_energy(self, landmarks_data):
+        """
+        手肘與手腕相對前一幀的平均位移 (正規化座標)，供即時分析判斷回合開始/結束
+
+        Returns:
+            位移量；這一幀或前一幀沒有偵測到人時為 None
+        """
+        if landmarks_data is None:
+            self._last_arm = None
+            return None
+        arm = np.asarray(landmarks_data, dtype=np.float32).reshape(-1, 3)[ARM_LANDMARKS, :2]
+        previous, self._last_arm = self._last_arm, arm
+        if previous is None:
+            return None
+        return float(np.linalg.norm(arm - previous, axis=1).mean())
+
     def reset(self):
         """重置緩衝區"""
         self.frame_buffer.clear()
+        self.segmenter.reset()
+        self._last_arm = None
+        if self.pose_extractor.preprocessor is not None:
+            self.pose_extractor.preprocessor.reset()
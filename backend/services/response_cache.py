@@ -0,0 +1,88 @@
+"""
+回應快取
+有上限的 LRU + TTL 快取，並記錄命中統計
+"""
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+class ResponseCache:
+    """執行緒安全的 LRU/TTL 快取"""
+    
+    def __init__(self, max_size: int = 512, ttl: float = 600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    @staticmethod
+    def pair_key(kind: str, player1: str, player2: str, *versions: Any) -> Tuple:
+        """
+        建立對戰組合的快取鍵
+        
+        選手順序不同的結果不同 (勝率、戰術對象)，鍵保留呼叫順序；
+        版本資訊變更時舊鍵自然失效
+        
+        Args:
+            kind: 快取類別 (prediction / preview / tactics)
+            player1: 選手 1
+            player2: 選手 2
+            versions: 模型與資料版本
+        """
+        return (kind, player1, player2) + tuple(versions)
+    
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """取得快取值，回傳 (是否命中, 值)"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+    
+    def set(self, key: Hashable, value: Any):
+        """寫入快取，超過上限時淘汰最久未使用的項目"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """命中時直接回傳，否則計算後寫入"""
+        hit, value = self.get(key)
+        if hit:
+            return value
+        value = compute()
+        self.set(key, value)
+        return value
+    
+    def clear(self):
+        """清除所有快取"""
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """取得快取統計"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0
+            }
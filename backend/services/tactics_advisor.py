@@ -4,9 +4,9 @@
 """
 from typing import Dict, List, Any, Optional
 from dataclasses import dataclass, asdict
+import copy
 import random
 
-from services.wtt_data_collector import WTTDataCollector
 from services.prediction_model import MatchPredictor
 
 
@@ -48,9 +48,10 @@ class MatchTactics:
 class TacticsAdvisor:
     """戰術建議顧問"""
     
-    def __init__(self):
-        self.data_collector = WTTDataCollector()
-        self.predictor = MatchPredictor()
+    def __init__(self, predictor: Optional[MatchPredictor] = None):
+        # 共用預測器的數據與快取，讓新增比賽結果立即反映在戰術建議中
+        self.predictor = predictor or MatchPredictor()
+        self.data_collector = self.predictor.data_collector
         
         # 打法特點資料庫
         self.style_characteristics = {
@@ -109,7 +110,16 @@ class TacticsAdvisor:
         ]
     
     def generate_tactics(self, player: str, opponent: str) -> MatchTactics:
-        """為選手生成對戰戰術建議"""
+        """為選手生成對戰戰術建議（結果依模型與資料版本快取）"""
+        key = self.predictor.cache_key("tactics", player, opponent)
+        tactics = self.predictor.cache.get_or_compute(
+            key, lambda: self._generate_tactics(player, opponent)
+        )
+        # 快取內容由多個請求共用，回傳副本避免呼叫端修改快取
+        return copy.deepcopy(tactics)
+    
+    def _generate_tactics(self, player: str, opponent: str) -> MatchTactics:
+        """實際生成戰術建議"""
         
         # 取得選手資訊
         player_info = None
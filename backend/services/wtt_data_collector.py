@@ -7,11 +7,17 @@ import json
 import time
 import random
 import requests
+import threading
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
 from dataclasses import dataclass, asdict
 from pathlib import Path
 
+from services.rating_engine import RatingEngine
+
+# 增量記錄累積到此筆數時，改寫完整快照並清空增量記錄
+JOURNAL_COMPACT_EVERY = 500
+
 
 @dataclass
 class MatchRecord:
@@ -36,6 +42,10 @@ class MatchRecord:
         return asdict(self)
 
 
+class DuplicateMatchError(ValueError):
+    """比賽 ID 已存在"""
+
+
 class WTTDataCollector:
     """WTT 數據收集器"""
     
@@ -48,12 +58,22 @@ class WTTDataCollector:
         self.matches_file = os.path.join(self.data_dir, 'matches.json')
         self.players_file = os.path.join(self.data_dir, 'players.json')
         self.h2h_file = os.path.join(self.data_dir, 'head_to_head.json')
+        self.ratings_file = os.path.join(self.data_dir, 'ratings.json')
+        # 逐場新增的比賽與評分增量 (每行一筆 JSON)，快照之後的變更只追加到此檔
+        self.journal_file = os.path.join(self.data_dir, 'matches.journal.jsonl')
+        self.journal_entries = 0
         
         self.matches: List[MatchRecord] = []
         self.players: Dict[str, Dict] = {}
         self.h2h: Dict[str, Dict] = {}  # head-to-head records
+        self.ratings = RatingEngine(self.ratings_file)
+        # 資料版本，新增比賽或重新生成數據時遞增，用於快取失效
+        self.version = 0
+        # 保護比賽、H2H、評分與增量記錄的修改 (多個請求可能同時新增比賽)
+        self._lock = threading.RLock()
         
         self._load_data()
+        self._match_ids = {m.match_id for m in self.matches}
     
     def _load_data(self):
         """載入現有數據"""
@@ -69,9 +89,52 @@ class WTTDataCollector:
         if os.path.exists(self.h2h_file):
             with open(self.h2h_file, 'r', encoding='utf-8') as f:
                 self.h2h = json.load(f)
+        
+        loaded = self.ratings.load()
+        self._replay_journal()
+        
+        # 評分檔不存在或與比賽記錄不一致時，一次重播全部歷史
+        rated_matches = sum(p.matches for p in self.ratings.players.values()) // 2
+        if self.matches and (not loaded or rated_matches != len(self.matches)):
+            self.ratings.replay(self.matches)
+            self._save_data()
+    
+    def _replay_journal(self):
+        """將快照之後的增量記錄套用到已載入的數據"""
+        if not os.path.exists(self.journal_file):
+            return
+        snapshot_size = len(self.matches)
+        with open(self.journal_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # 寫到一半中斷的最後一行
+                    continue
+                self.journal_entries += 1
+                # 快照寫入後、增量記錄清空前中斷時，已包含在快照內的記錄不重複套用
+                if entry["seq"] <= snapshot_size:
+                    continue
+                match = MatchRecord(**entry["match"])
+                self.matches.append(match)
+                self._add_to_h2h(match)
+                self.ratings.apply_delta(entry["ratings"])
+    
+    def _append_journal(self, match: MatchRecord):
+        """追加單場比賽與兩位選手的評分增量，累積過多時改寫快照 (需持有鎖)"""
+        entry = {
+            "seq": len(self.matches),
+            "match": match.to_dict(),
+            "ratings": self.ratings.delta(match.player1_name, match.player2_name)
+        }
+        with open(self.journal_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.journal_entries += 1
+        if self.journal_entries >= JOURNAL_COMPACT_EVERY:
+            self._save_data()
     
     def _save_data(self):
-        """儲存數據"""
+        """儲存完整快照 (重新生成數據或壓縮增量記錄時使用) 並清空增量記錄"""
         with open(self.matches_file, 'w', encoding='utf-8') as f:
             json.dump([m.to_dict() for m in self.matches], f, ensure_ascii=False, indent=2)
         
@@ -80,6 +143,12 @@ class WTTDataCollector:
         
         with open(self.h2h_file, 'w', encoding='utf-8') as f:
             json.dump(self.h2h, f, ensure_ascii=False, indent=2)
+        
+        self.ratings.save()
+        
+        if os.path.exists(self.journal_file):
+            os.remove(self.journal_file)
+        self.journal_entries = 0
     
     def generate_training_data(self) -> List[MatchRecord]:
         """
@@ -201,13 +270,19 @@ class WTTDataCollector:
                         generated_matches.append(match)
                         match_id += 1
         
-        self.matches = generated_matches
-        
-        # 計算 H2H 記錄
-        self._calculate_h2h()
-        
-        # 儲存數據
-        self._save_data()
+        with self._lock:
+            self.matches = generated_matches
+            self._match_ids = {m.match_id for m in self.matches}
+            
+            # 計算 H2H 記錄
+            self._calculate_h2h()
+            
+            # 重播評分
+            self.ratings.replay(self.matches)
+            self.version += 1
+            
+            # 儲存數據
+            self._save_data()
         
         print(f"✅ 生成了 {len(generated_matches)} 場比賽記錄")
         print(f"   選手數: {len(self.players)}")
@@ -240,10 +315,21 @@ class WTTDataCollector:
         self.h2h = {}
         
         for match in self.matches:
-            # 創建雙向的 H2H 記錄
-            key1 = f"{match.player1_name}|{match.player2_name}"
-            key2 = f"{match.player2_name}|{match.player1_name}"
-            
+            self._add_to_h2h(match)
+    
+    def _add_to_h2h(self, match: MatchRecord):
+        """將單場比賽加入 H2H 記錄"""
+        key1 = f"{match.player1_name}|{match.player2_name}"
+        key2 = f"{match.player2_name}|{match.player1_name}"
+        
+        # 已有反向記錄時沿用反向鍵
+        if key1 not in self.h2h and key2 in self.h2h:
+            record = self.h2h[key2]
+            if match.winner == "player1":
+                record["player2_wins"] += 1
+            else:
+                record["player1_wins"] += 1
+        else:
             if key1 not in self.h2h:
                 self.h2h[key1] = {
                     "player1": match.player1_name,
@@ -252,18 +338,55 @@ class WTTDataCollector:
                     "player2_wins": 0,
                     "matches": []
                 }
-            
+            record = self.h2h[key1]
             if match.winner == "player1":
-                self.h2h[key1]["player1_wins"] += 1
+                record["player1_wins"] += 1
             else:
-                self.h2h[key1]["player2_wins"] += 1
-            
-            self.h2h[key1]["matches"].append({
-                "date": match.date,
-                "tournament": match.tournament,
-                "score": match.score,
-                "winner": match.player1_name if match.winner == "player1" else match.player2_name
-            })
+                record["player2_wins"] += 1
+        
+        record["matches"].append({
+            "date": match.date,
+            "tournament": match.tournament,
+            "score": match.score,
+            "winner": match.player1_name if match.winner == "player1" else match.player2_name
+        })
+    
+    def add_match(self, match: MatchRecord):
+        """
+        新增一場比賽結果並即時更新 H2H 與選手評分
+        只追加增量記錄，不改寫整份比賽、H2H 與評分檔
+        
+        Args:
+            match: 比賽記錄；match_id 為空時自動編號 (USR000001 ...)
+        
+        Raises:
+            DuplicateMatchError: match_id 已存在
+        """
+        with self._lock:
+            if not match.match_id:
+                match.match_id = self._next_user_match_id()
+            elif match.match_id in self._match_ids:
+                raise DuplicateMatchError(f"比賽 {match.match_id} 已存在")
+            self.matches.append(match)
+            self._match_ids.add(match.match_id)
+            self._add_to_h2h(match)
+            self.ratings.update(
+                match.player1_name, match.player2_name,
+                match.winner == "player1", match.date
+            )
+            self.version += 1
+            self._append_journal(match)
+    
+    def _next_user_match_id(self) -> str:
+        """使用者新增比賽的下一個未使用編號 (需持有鎖)"""
+        number = len(self.matches) + 1
+        while f"USR{number:06d}" in self._match_ids:
+            number += 1
+        return f"USR{number:06d}"
+    
+    def get_player_rating(self, player_name: str) -> Dict[str, Any]:
+        """取得選手即時評分與不確定度"""
+        return self.ratings.get(player_name).to_dict()
     
     def get_player_stats(self, player_name: str) -> Dict[str, Any]:
         """取得選手統計數據"""
@@ -2,7 +2,7 @@
 YouTube 分析服務
 處理 YouTube 比賽影片的下載和分析
 """
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Callable, Optional
 import os
 
 
@@ -25,7 +25,8 @@ class YouTubeAnalysisService:
         player_focus: str = None,
         player2_focus: str = None,
         description1: str = None,
-        description2: str = None
+        description2: str = None,
+        on_chunk: Callable[[Dict[str, Any]], None] = None
     ) -> Dict[str, Any]:
         """
         分析 YouTube 比賽影片
@@ -36,12 +37,14 @@ class YouTubeAnalysisService:
             player2_focus: 選手2
             description1: 選手1 描述
             description2: 選手2 描述
+            on_chunk: 長影片分段分析時，每段完成的回呼
             
         Returns:
             分析結果
         """
         analyzer = self._get_analyzer()
-        return analyzer.analyze_youtube_match(youtube_url, player_focus, player2_focus, description1, description2)
+        return analyzer.analyze_youtube_match(youtube_url, player_focus, player2_focus, description1, description2,
+                                              on_chunk=on_chunk)
     
     def validate_url(self, url: str) -> bool:
         """
@@ -1,5 +1,8 @@
 import os
-import numpy as np
+from pose_input import PoseInputPreprocessor
+from pose_sampling import FrameSampler, concat_tracks, extract_track, iter_track
+from skeleton_format import SkeletonData
+from skeleton_render import SkeletonRenderer, render_video
 
 # 嘗試導入 cv2 和 mediapipe（雲端部署可能沒有這些套件）
 try:
@@ -12,7 +15,15 @@ except ImportError:
     mp = None
 
 class PoseExtractor:
-    def __init__(self):
+    def __init__(self, frame_stride=1, adaptive_stride=False, max_stride=4, input_size=0, roi_crop=False):
+        """
+        Args:
+            frame_stride: 處理影片時每隔幾幀執行一次姿勢估計 (其餘幀插值)
+            adaptive_stride: 依動作量自動調整間隔 (frame_stride 為最小間隔)
+            max_stride: 自動調整時的最大間隔
+            input_size: 送入姿勢估計的影像長邊 (0 表示原始解析度)
+            roi_crop: 依前一幀的骨架只裁切選手範圍
+        """
         if not MEDIAPIPE_AVAILABLE:
             raise RuntimeError("MediaPipe 未安裝，姿勢提取功能無法使用")
         
@@ -30,6 +41,8 @@ class PoseExtractor:
         
         # 創建包含鼻子和身體的連接線
         self.body_connections = self._create_body_connections()
+        self.sampler = FrameSampler(frame_stride, adaptive_stride, max_stride)
+        self.preprocessor = PoseInputPreprocessor(input_size, roi_crop) if (input_size or roi_crop) else None
     
     def _create_body_connections(self):
         # 創建包含鼻子和身體的連接線（只排除其他臉部關鍵點）
@@ -53,34 +66,6 @@ class PoseExtractor:
         
         return body_connections
     
-    def _draw_body_landmarks(self, image, original_landmarks):
-        # 手動繪製鼻子和身體的關鍵點和連接線（只保留鼻子，排除其他臉部）
-        h, w, _ = image.shape
-        
-        # 繪製關鍵點（保留鼻子索引0，排除其他臉部關鍵點1-10）
-        for orig_idx, landmark in enumerate(original_landmarks.landmark):
-            if orig_idx not in self.face_landmark_indices:  # 保留0（鼻子）和11-32（身體）
-                x = int(landmark.x * w)
-                y = int(landmark.y * h)
-                # 鼻子用不同顏色標示
-                if orig_idx == 0:
-                    cv2.circle(image, (x, y), 5, (255, 0, 0), -1)  # 藍色圓點（鼻子）
-                else:
-                    cv2.circle(image, (x, y), 4, (0, 0, 255), -1)  # 紅色圓點（身體）
-        
-        # 繪製連接線（包含鼻子與身體的連接）
-        for connection in self.body_connections:
-            start_idx, end_idx = connection
-            start_landmark = original_landmarks.landmark[start_idx]
-            end_landmark = original_landmarks.landmark[end_idx]
-            
-            start_x = int(start_landmark.x * w)
-            start_y = int(start_landmark.y * h)
-            end_x = int(end_landmark.x * w)
-            end_y = int(end_landmark.y * h)
-            
-            cv2.line(image, (start_x, start_y), (end_x, end_y), (0, 255, 0), 2)  # 綠色線條
-    
     def extract_pose(self, frame):
         """
         處理單幀影像並返回姿態檢測結果
@@ -91,6 +76,10 @@ class PoseExtractor:
         Returns:
             MediaPipe 姿態檢測結果
         """
+        # 縮小/裁切後再轉為 RGB，座標換算回完整畫面
+        if self.preprocessor is not None:
+            return self.preprocessor.process(self.pose, frame)
+        
         # 轉換為 RGB 格式（MediaPipe 需要）
         frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
         
@@ -99,137 +88,143 @@ class PoseExtractor:
         
         return results
     
-    def extract_pose_from_video(self, input_video_path, output_video_path=None):
+    def extract_track(self, input_video_path, max_frames=None):
+        """
+        依抽幀設定提取整段影片的骨架序列
+        
+        Returns:
+            PoseTrack: 每幀 33 個關鍵點 (x, y, z, visibility)、可信度與是否為插值
+        """
+        return extract_track(self.pose, input_video_path, self.sampler, max_frames, self.preprocessor)
+    
+    def extract_pose_from_video(self, input_video_path, output_video_path=None, landmarks_only=False):
+        """
+        提取骨架並輸出只有骨架的影片 (黑色背景)
+        
+        解碼、姿勢估計、繪製與編碼在不同執行緒重疊進行
+        
+        Args:
+            input_video_path: 輸入影片
+            output_video_path: 輸出影片路徑 (未指定時顯示預覽)
+            landmarks_only: 只需要骨架資料時不繪製影片
+        
+        Returns:
+            SkeletonData；無法開啟影片時為 None
+        """
         # 開啟影片
         cap = cv2.VideoCapture(input_video_path)
         
         if not cap.isOpened():
             print(f"錯誤：無法開啟影片 {input_video_path}")
-            return
+            return None
         
         # 獲取影片屬性
-        fps = int(cap.get(cv2.CAP_PROP_FPS))
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
         width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-
-        # 指定輸出路徑，設定影片寫入器
-        writer = None
-        if output_video_path:
-            fourcc = cv2.VideoWriter_fourcc(*'avc1') 
-            writer = cv2.VideoWriter(output_video_path, fourcc, fps, (width, height))
+        cap.release()
         
+        # 逐段取得骨架 (解碼在背景執行緒，抽幀時中間的幀為插值)
+        segments = iter_track(self.pose, input_video_path, self.sampler, preprocessor=self.preprocessor)
         
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            # 轉換 BGR 到 RGB（MediaPipe 需要 RGB）
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            
-            # 檢測姿勢
-            results = self.pose.process(rgb_frame)
-            
-            # 創建黑色背景（只儲存骨架，不儲存原始影片內容）
-            annotated_frame = np.zeros((height, width, 3), dtype=np.uint8)
-            
-            if results.pose_landmarks:
-                # 手動繪製身體和四肢的關鍵點和連接線（排除臉部）
-                self._draw_body_landmarks(annotated_frame, results.pose_landmarks)
-            
-
-            # 如果指定輸出路徑，寫入影片
-            if writer:
-                writer.write(annotated_frame)
-            else:
-                # 顯示即時預覽
-                cv2.imshow('Pose Extraction', annotated_frame)
+        if landmarks_only:
+            tracks = [track for _, track in segments]
+        elif output_video_path:
+            # 繪製與編碼在背景執行緒進行
+            tracks = render_video(segments, output_video_path, fps, width, height,
+                                  self.body_connections, self.face_landmark_indices)
+        else:
+            tracks = self._preview(segments, width, height)
+            cv2.destroyAllWindows()
+        
+        return self._to_skeleton(concat_tracks(tracks, fps), input_video_path)
+    
+    def _preview(self, segments, width, height):
+        """顯示即時預覽，按 q 結束"""
+        renderer = SkeletonRenderer(width, height, self.body_connections, self.face_landmark_indices)
+        tracks = []
+        for _, track in segments:
+            tracks.append(track)
+            for landmarks, detected in zip(track.landmarks, track.detected):
+                cv2.imshow('Pose Extraction', renderer.render(landmarks, detected))
                 if cv2.waitKey(1) & 0xFF == ord('q'):
-                    break
+                    segments.close()
+                    return tracks
+        return tracks
+    
+    def extract_skeleton(self, input_video_path, max_frames=None):
+        """
+        提取骨架並轉為欄式表示 (可用 save 存成 .skel 檔)
         
-        # 清理資源
-        cap.release()
-        if writer:
-            writer.release()
-        cv2.destroyAllWindows()
-
+        Returns:
+            SkeletonData: (幀, 33, 4) 關鍵點、是否偵測到人、可信度與 fps/來源資訊
+        """
+        return self._to_skeleton(self.extract_track(input_video_path, max_frames), input_video_path)
+    
+    def _to_skeleton(self, track, input_video_path):
+        return SkeletonData.from_track(track, source=os.path.basename(input_video_path), metadata={
+            'frame_stride': self.sampler.stride,
+            'adaptive_stride': self.sampler.adaptive,
+            'input_size': self.preprocessor.target_size if self.preprocessor else 0
+        })
 
     # 提取姿勢數據（關鍵點座標）並返回
     def extract_pose_data(self, input_video_path):
-        cap = cv2.VideoCapture(input_video_path)
-        pose_data = []
-        
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = self.pose.process(rgb_frame)
-            
-            frame_data = {
-                'frame_number': len(pose_data),
-                'landmarks': None
-            }
-            
-            if results.pose_landmarks:
-                landmarks = []
-                # 只提取鼻子和身體的關鍵點（排除其他臉部關鍵點）
-                for idx, landmark in enumerate(results.pose_landmarks.landmark):
-                    if idx not in self.face_landmark_indices:  # 保留0（鼻子）和11-32（身體）
-                        landmarks.append({
-                            'index': idx,
-                            'x': landmark.x,
-                            'y': landmark.y,
-                            'z': landmark.z,
-                            'visibility': landmark.visibility
-                        })
-                frame_data['landmarks'] = landmarks
-            
-            pose_data.append(frame_data)
+        """
+        逐幀 dict 格式的骨架 (供 API 回應；程式內部請使用 extract_skeleton)
         
-        cap.release()
-        return pose_data
+        Returns:
+            list: 每幀 {'frame_number', 'landmarks', 'interpolated'}；
+                  landmarks 每個關鍵點含 confidence (估計的幀等於 visibility，插值的幀較低)
+        """
+        return self.extract_skeleton(input_video_path).to_frames()
 
 
-def main(input_folder, output_folder):
-  
-    extractor = PoseExtractor()
-    
-    # 確保輸出目錄存在
-    if not os.path.exists(output_folder):
-        os.makedirs(output_folder)
-        print(f"已創建輸出目錄: {output_folder}")
-    
-    # 取得資料夾內所有影片檔案（只抓副檔名符合的）
-    video_files = [
-        f for f in os.listdir(input_folder)
-        if f.lower().endswith((".mp4", ".avi", ".mov", ".mkv"))
-    ]
+def main(input_folder, output_folder, workers=None, force=False):
+    """
+    批次提取資料夾內所有影片的骨架影片 (<內容雜湊>.mp4) 與 .skel 檔
 
-    if not video_files:
-        print(f"資料夾 {input_folder} 中沒有找到影片檔案")
-        return
+    輸出資料夾的 manifest.json 記錄處理狀態，重新執行時略過已完成的影片
 
+    Returns:
+        吞吐量報告
+    """
+    from skeleton_batch import run_batch
+    return run_batch([(input_folder, output_folder)], workers=workers, force=force)
 
-    # 依序處理每個影片
-    i = 1
-    for filename in video_files:
-        input_video = os.path.join(input_folder, filename)
-        
-        # 使用數字編號來命名輸出檔案 (1.mp4, 2.mp4, 3.mp4...)
-        output_video = os.path.join(output_folder, f"{i}.mp4")
-        # 提取骨架並儲存到輸出影片
-        extractor.extract_pose_from_video(input_video, output_video)
-        print(f"{input_video}處理完成")
-        i += 1
-    
-    print(f"\n✓ 資料夾 {input_folder} 處理完成！")
-    print("=" * 50)
+
+# 預設處理的 (輸入, 輸出) 資料夾
+DEFAULT_BATCH_JOBS = [
+    ("good_input_movid", "good_output_movid"),
+    ("normal_input_movid", "normal_output_movid"),
+    ("bad_input_movid", "bad_output_movid"),
+]
 
 
 if __name__ == "__main__":
-    main("good_input_movid", "good_output_movid")
-    main("normal_input_movid", "normal_output_movid")
-    main("bad_input_movid", "bad_output_movid")
-    
+    import json
+    import argparse
+    from skeleton_batch import run_batch
+
+    parser = argparse.ArgumentParser(description='批次提取影片骨架 (可平行處理、中斷後接續)')
+    parser.add_argument('jobs', nargs='*', metavar='INPUT:OUTPUT',
+                        help='輸入與輸出資料夾 (預設為 good/normal/bad 三組)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='工作行程數 (預設為 CPU 核心數的一半)')
+    parser.add_argument('--force', action='store_true',
+                        help='忽略 manifest，全部重新處理')
+    parser.add_argument('--report', type=str, default=None,
+                        help='將吞吐量報告另存為 JSON')
+    args = parser.parse_args()
+
+    if not MEDIAPIPE_AVAILABLE:
+        raise SystemExit("MediaPipe 未安裝，姿勢提取功能無法使用")
+    jobs = [tuple(job.split(':', 1)) for job in args.jobs] if args.jobs else DEFAULT_BATCH_JOBS
+    for job in jobs:
+        if len(job) != 2:
+            parser.error(f"格式應為 INPUT:OUTPUT: {job[0]}")
+    report = run_batch(jobs, workers=args.workers, force=args.force)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n報告已儲存: {args.report}")
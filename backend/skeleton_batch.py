@@ -0,0 +1,303 @@
+"""
+批次骨架提取
+多個影片資料夾交給多個工作行程平行處理，每個輸出資料夾有一份 manifest.json：
+- 以來源影片的內容雜湊 (SHA-256) 為鍵，記錄來源、輸出檔、狀態、幀數與耗時
+- 輸出檔以內容雜湊命名 (<雜湊前 16 碼>.mp4 / .skel)，檔名不隨處理順序或重新執行改變
+- 重新執行時略過已完成且抽幀設定相同的影片，中斷後可接續處理
+- 每完成一部影片立即寫回 manifest (先寫暫存檔再替換)，最多只損失處理中的影片
+
+使用方式：
+    python skeleton.py good_input_movid:good_output_movid bad_input_movid:bad_output_movid --workers 4
+"""
+import os
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from file_digest import media_digest
+from skeleton_format import SKELETON_EXTENSION, SKELETON_FORMAT_VERSION
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+# 輸出檔名使用的雜湊長度
+NAME_DIGEST_LENGTH = 16
+
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+# 工作行程內共用的 PoseExtractor (每個行程建立一次，模型不重複載入)
+_worker_extractor = None
+
+
+@dataclass
+class BatchTask:
+    """一部待處理的影片"""
+    digest: str
+    input_path: str
+    output_folder: str
+    # 同一批次中內容相同的其他檔名
+    aliases: List[str] = field(default_factory=list)
+
+    @property
+    def name(self) -> str:
+        return self.digest[:NAME_DIGEST_LENGTH]
+
+    @property
+    def output_video(self) -> str:
+        return os.path.join(self.output_folder, f"{self.name}.mp4")
+
+    @property
+    def output_skeleton(self) -> str:
+        return os.path.join(self.output_folder, f"{self.name}{SKELETON_EXTENSION}")
+
+
+class BatchManifest:
+    """輸出資料夾的處理紀錄 (只在主行程讀寫)"""
+
+    def __init__(self, output_folder: str):
+        self.output_folder = output_folder
+        self.path = os.path.join(output_folder, MANIFEST_NAME)
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f).get('entries', {})
+            except (OSError, ValueError) as e:
+                print(f"警告：無法讀取 {self.path} ({e})，將重新處理所有影片")
+
+    def is_done(self, digest: str, settings: Dict[str, Any]) -> bool:
+        """已用相同設定處理完成，且輸出檔仍存在"""
+        entry = self.entries.get(digest)
+        if not entry or entry.get('status') != STATUS_DONE or entry.get('settings') != settings:
+            return False
+        return all(os.path.exists(os.path.join(self.output_folder, entry[key]))
+                   for key in ('output', 'skeleton') if entry.get(key))
+
+    def add_source(self, digest: str, source: str):
+        """記錄內容相同的其他來源檔名 (只處理一次)"""
+        entry = self.entries.get(digest)
+        if entry is not None and source not in entry.setdefault('sources', []):
+            entry['sources'].append(source)
+
+    def record(self, digest: str, entry: Dict[str, Any], aliases: Optional[List[str]] = None):
+        previous = self.entries.get(digest, {})
+        sources = list(previous.get('sources', []))
+        for source in [entry['source']] + list(aliases or []):
+            if source not in sources:
+                sources.append(source)
+        self.entries[digest] = dict(entry, sources=sources, updated_at=time.strftime('%Y-%m-%dT%H:%M:%S'))
+        self.save()
+
+    def save(self):
+        os.makedirs(self.output_folder, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'entries': self.entries}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def extractor_settings(frame_stride: int = 1, adaptive_stride: bool = False, max_stride: int = 4,
+                       input_size: int = 0, roi_crop: bool = False) -> Dict[str, Any]:
+    """PoseExtractor 的參數 (同時記錄於 manifest，設定變更時重新處理)"""
+    return {
+        'frame_stride': frame_stride,
+        'adaptive_stride': adaptive_stride,
+        'max_stride': max_stride,
+        'input_size': input_size,
+        'roi_crop': roi_crop,
+        'skeleton_format': SKELETON_FORMAT_VERSION
+    }
+
+
+def _default_extractor_factory(settings: Dict[str, Any]):
+    from skeleton import PoseExtractor
+    return PoseExtractor(**{k: v for k, v in settings.items() if k != 'skeleton_format'})
+
+
+def _init_worker(settings: Dict[str, Any], extractor_factory: Callable):
+    global _worker_extractor
+    _worker_extractor = extractor_factory(settings)
+
+
+def _process(task: BatchTask) -> Dict[str, Any]:
+    """
+    在工作行程中處理一部影片
+
+    影片先寫到暫存檔，完成後才替換為正式檔名，中斷時不會留下看似完整的輸出
+
+    Returns:
+        manifest 紀錄 (失敗時含錯誤訊息)
+    """
+    start = time.perf_counter()
+    entry = {
+        'source': os.path.basename(task.input_path),
+        'output': os.path.basename(task.output_video),
+        'skeleton': os.path.basename(task.output_skeleton),
+        'status': STATUS_FAILED,
+        'frames': 0,
+        'duration': 0.0
+    }
+    tmp_video = os.path.join(task.output_folder, f"{task.name}.partial.mp4")
+    try:
+        skeleton = _worker_extractor.extract_pose_from_video(task.input_path, tmp_video)
+        if skeleton is None:
+            raise RuntimeError(f"無法開啟影片 {task.input_path}")
+        skeleton.save(task.output_skeleton)
+        os.replace(tmp_video, task.output_video)
+        entry.update(status=STATUS_DONE, frames=len(skeleton),
+                     duration=round(len(skeleton) / skeleton.fps, 3) if skeleton.fps else 0.0)
+    except Exception as e:
+        entry['error'] = f"{type(e).__name__}: {e}"
+        if os.path.exists(tmp_video):
+            os.remove(tmp_video)
+    entry['seconds'] = round(time.perf_counter() - start, 3)
+    return entry
+
+
+def list_videos(input_folder: str) -> List[str]:
+    """資料夾內的影片 (依檔名排序)"""
+    if not os.path.isdir(input_folder):
+        return []
+    return sorted(
+        os.path.join(input_folder, f) for f in os.listdir(input_folder)
+        if f.lower().endswith(VIDEO_EXTENSIONS)
+    )
+
+
+def plan_tasks(jobs: List[Tuple[str, str]], settings: Dict[str, Any], force: bool = False
+               ) -> Tuple[List[BatchTask], Dict[str, BatchManifest], int]:
+    """
+    計算每部影片的內容雜湊，排除已完成與重複的影片
+
+    Args:
+        jobs: (輸入資料夾, 輸出資料夾) 列表
+        settings: extractor_settings 的結果
+        force: 忽略 manifest，全部重新處理
+
+    Returns:
+        (待處理的影片, 各輸出資料夾的 manifest, 略過的影片數)
+    """
+    tasks: List[BatchTask] = []
+    manifests: Dict[str, BatchManifest] = {}
+    queued_by_folder: Dict[str, Dict[str, BatchTask]] = {}
+    skipped = 0
+    for input_folder, output_folder in jobs:
+        videos = list_videos(input_folder)
+        if not videos:
+            print(f"資料夾 {input_folder} 中沒有找到影片檔案")
+            continue
+        manifest = manifests.setdefault(output_folder, BatchManifest(output_folder))
+        queued = queued_by_folder.setdefault(output_folder, {})
+        for video in videos:
+            digest = media_digest(video)
+            if digest in queued:
+                queued[digest].aliases.append(os.path.basename(video))
+                skipped += 1
+            elif not force and manifest.is_done(digest, settings):
+                manifest.add_source(digest, os.path.basename(video))
+                skipped += 1
+            else:
+                queued[digest] = BatchTask(digest, video, output_folder)
+                tasks.append(queued[digest])
+    return tasks, manifests, skipped
+
+
+def run_batch(jobs: List[Tuple[str, str]], workers: Optional[int] = None,
+              settings: Optional[Dict[str, Any]] = None, force: bool = False,
+              extractor_factory: Callable = _default_extractor_factory) -> Dict[str, Any]:
+    """
+    批次提取骨架影片與 .skel 檔
+
+    Args:
+        jobs: (輸入資料夾, 輸出資料夾) 列表
+        workers: 工作行程數 (預設為 CPU 核心數的一半，每部影片本身已有解碼/繪製/編碼執行緒；
+                 1 表示在目前行程中依序處理)
+        settings: extractor_settings 的結果 (預設使用 config 的 POSE_* 設定)
+        force: 忽略 manifest，全部重新處理
+        extractor_factory: 以 settings 建立 PoseExtractor 的函式 (需可 pickle)
+
+    Returns:
+        吞吐量報告
+    """
+    if settings is None:
+        from config import get_config
+        ai_config = get_config().ai
+        settings = extractor_settings(ai_config.POSE_FRAME_STRIDE, ai_config.POSE_ADAPTIVE_STRIDE,
+                                      ai_config.POSE_MAX_STRIDE, ai_config.POSE_INPUT_SIZE,
+                                      ai_config.POSE_ROI_CROP)
+    if workers is None:
+        workers = max((os.cpu_count() or 1) // 2, 1)
+
+    start = time.perf_counter()
+    tasks, manifests, skipped = plan_tasks(jobs, settings, force)
+    for manifest in manifests.values():
+        manifest.save()
+    hash_seconds = time.perf_counter() - start
+    print(f"共 {len(tasks) + skipped} 部影片：待處理 {len(tasks)}，略過 {skipped} (雜湊 {hash_seconds:.1f} 秒)")
+
+    results: List[Dict[str, Any]] = []
+
+    def finish(task: BatchTask, entry: Dict[str, Any]):
+        entry['settings'] = settings
+        manifests[task.output_folder].record(task.digest, entry, task.aliases)
+        results.append(entry)
+        if entry['status'] == STATUS_DONE:
+            print(f"[{len(results)}/{len(tasks)}] {task.input_path} → {entry['output']} "
+                  f"({entry['frames']} 幀, {entry['seconds']:.1f} 秒)")
+        else:
+            print(f"[{len(results)}/{len(tasks)}] {task.input_path} 處理失敗: {entry.get('error')}")
+
+    workers = min(workers, len(tasks))
+    if workers == 1:
+        _init_worker(settings, extractor_factory)
+        for task in tasks:
+            finish(task, _process(task))
+    elif workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(settings, extractor_factory)) as executor:
+            futures = {executor.submit(_process, task): task for task in tasks}
+            for future in as_completed(futures):
+                finish(futures[future], future.result())
+
+    report = throughput_report(results, time.perf_counter() - start, skipped, workers)
+    print_report(report)
+    return report
+
+
+def throughput_report(results: List[Dict[str, Any]], wall_seconds: float, skipped: int,
+                      workers: int) -> Dict[str, Any]:
+    """彙整處理結果：幀/秒、影片/分鐘，以及處理速度相對影片長度的倍數"""
+    done = [r for r in results if r['status'] == STATUS_DONE]
+    frames = sum(r['frames'] for r in done)
+    duration = sum(r['duration'] for r in done)
+    wall_seconds = max(wall_seconds, 1e-9)
+    return {
+        'processed': len(done),
+        'failed': len(results) - len(done),
+        'skipped': skipped,
+        'workers': workers,
+        'frames': frames,
+        'video_seconds': round(duration, 2),
+        'wall_seconds': round(wall_seconds, 2),
+        'frames_per_second': round(frames / wall_seconds, 2),
+        'videos_per_minute': round(len(done) * 60 / wall_seconds, 2),
+        'realtime_factor': round(duration / wall_seconds, 3),
+        'mean_seconds_per_video': round(sum(r['seconds'] for r in done) / len(done), 2) if done else 0.0,
+        'failures': [{'source': r['source'], 'error': r.get('error')} for r in results if r['status'] != STATUS_DONE]
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    print("=" * 50)
+    print(f"完成 {report['processed']}，失敗 {report['failed']}，略過 {report['skipped']} "
+          f"(工作行程 {report['workers']})")
+    print(f"總幀數 {report['frames']}，影片長度 {report['video_seconds']:.1f} 秒，"
+          f"耗時 {report['wall_seconds']:.1f} 秒")
+    print(f"吞吐量 {report['frames_per_second']:.1f} 幀/秒，{report['videos_per_minute']:.2f} 部/分鐘，"
+          f"{report['realtime_factor']:.2f}x 即時")
+    for failure in report['failures']:
+        print(f"  ✗ {failure['source']}: {failure['error']}")
+    print("=" * 50)
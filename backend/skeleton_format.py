@@ -0,0 +1,230 @@
+"""
+骨架資料的欄式表示與二進位儲存格式
+每幀 33 個關鍵點 (x, y, z, visibility) 存成一個 float32 陣列，搭配是否偵測到人的遮罩與 fps/來源資訊，
+取代每幀 23 個 dict 的 JSON；JSON 只在 API 回應時由 to_frames 產生
+
+檔案格式 (.skel)：
+    8 bytes   MAGIC (6 bytes) + 版本 (uint16, little-endian)
+    4 bytes   標頭長度 (uint32)
+    N bytes   JSON 標頭：幀數、fps、來源、各陣列的 dtype/shape/offset
+    補齊到 64 bytes 對齊後依序為各陣列的原始資料
+可用 np.memmap 直接對應，讀取任意幀不需載入整個檔案
+"""
+import os
+import json
+import struct
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from pose_sampling import BODY_LANDMARKS, NUM_POSE_LANDMARKS
+
+SKELETON_FORMAT_VERSION = 1
+SKELETON_EXTENSION = '.skel'
+MAGIC = b'TTSKEL'
+# 陣列資料的起始位置對齊
+ALIGNMENT = 64
+
+_PREFIX = struct.Struct('<6sHI')
+
+
+@dataclass
+class SkeletonData:
+    """
+    整段影片的骨架
+
+    Attributes:
+        landmarks: (幀, 33, 4) float32，x, y, z, visibility；沒有偵測到人的幀為 0
+        present: (幀,) bool，是否偵測到人
+        fps: 幀率
+        source: 來源影片
+        confidence: (幀, 33) 關鍵點可信度 (插值的幀較低)，可省略
+        keyframes: (幀,) 實際執行姿勢估計的幀，可省略 (表示每一幀都有估計)
+        metadata: 其他資訊 (解析度、抽幀設定等)
+    """
+    landmarks: np.ndarray
+    present: np.ndarray
+    fps: float
+    source: str = ''
+    confidence: Optional[np.ndarray] = None
+    keyframes: Optional[np.ndarray] = None
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+    def __len__(self):
+        return len(self.landmarks)
+
+    @classmethod
+    def from_track(cls, track, source: str = '', metadata: Optional[Dict[str, Any]] = None) -> 'SkeletonData':
+        """由 pose_sampling.PoseTrack 建立"""
+        return cls(track.landmarks, track.detected, float(track.fps), source,
+                   track.confidence, track.keyframes, dict(metadata or {}))
+
+    @classmethod
+    def from_frames(cls, frames: List[Dict], fps: float = 30.0, source: str = '') -> 'SkeletonData':
+        """由舊版 extract_pose_data 的逐幀 dict 建立 (讀取舊的 skeleton.json)"""
+        landmarks = np.zeros((len(frames), NUM_POSE_LANDMARKS, 4), dtype=np.float32)
+        present = np.zeros(len(frames), dtype=bool)
+        for i, frame in enumerate(frames):
+            if not frame.get('landmarks'):
+                continue
+            present[i] = True
+            for lm in frame['landmarks']:
+                landmarks[i, lm['index']] = (lm['x'], lm['y'], lm['z'], lm.get('visibility', 1.0))
+        return cls(landmarks, present, fps, source)
+
+    def body(self, channels: int = 3) -> np.ndarray:
+        """排除臉部後的 (幀, 23, channels) 序列，與模型輸入相同的排列"""
+        return np.asarray(self.landmarks[:, BODY_LANDMARKS, :channels])
+
+    def to_frames(self, start: int = 0, stop: Optional[int] = None) -> List[Dict]:
+        """
+        轉為 API 回應用的逐幀 dict (與 extract_pose_data 相同格式，只含鼻子與身體)
+
+        Args:
+            start / stop: 幀範圍
+        """
+        stop = len(self) if stop is None else min(stop, len(self))
+        landmarks = np.asarray(self.landmarks[start:stop, BODY_LANDMARKS]).tolist()
+        present = np.asarray(self.present[start:stop]).tolist()
+        confidence = (np.asarray(self.confidence[start:stop, BODY_LANDMARKS]).tolist()
+                      if self.confidence is not None else None)
+        keyframes = np.asarray(self.keyframes[start:stop]).tolist() if self.keyframes is not None else None
+
+        frames = []
+        for offset, points in enumerate(landmarks):
+            frame = {
+                'frame_number': start + offset,
+                'landmarks': None,
+                'interpolated': bool(present[offset] and keyframes is not None and not keyframes[offset])
+            }
+            if present[offset]:
+                frame['landmarks'] = [
+                    {
+                        'index': index,
+                        'x': x,
+                        'y': y,
+                        'z': z,
+                        'visibility': visibility,
+                        'confidence': confidence[offset][k] if confidence is not None else visibility
+                    }
+                    for k, (index, (x, y, z, visibility)) in enumerate(zip(BODY_LANDMARKS, points))
+                ]
+            frames.append(frame)
+        return frames
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'frames': len(self),
+            'present_frames': int(np.count_nonzero(self.present)),
+            'fps': self.fps,
+            'duration': round(len(self) / self.fps, 3) if self.fps else 0.0,
+            'source': self.source,
+            'metadata': self.metadata
+        }
+
+    def save(self, path: str) -> str:
+        """
+        寫入 .skel 檔 (先寫暫存檔再替換，讀取端不會看到寫到一半的檔案)
+
+        Returns:
+            檔案路徑
+        """
+        arrays = {
+            'landmarks': np.ascontiguousarray(self.landmarks, dtype=np.float32),
+            'present': np.ascontiguousarray(self.present, dtype=bool)
+        }
+        if self.confidence is not None:
+            arrays['confidence'] = np.ascontiguousarray(self.confidence, dtype=np.float32)
+        if self.keyframes is not None:
+            arrays['keyframes'] = np.ascontiguousarray(self.keyframes, dtype=bool)
+
+        header = {
+            'frames': len(self),
+            'fps': self.fps,
+            'source': self.source,
+            'metadata': self.metadata,
+            'arrays': {}
+        }
+        # 標頭長度 (含 offset 數字) 決定資料起點，重算到起點足以容納標頭為止
+        data_start = 0
+        while True:
+            offset = data_start
+            for name, array in arrays.items():
+                header['arrays'][name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+                offset = _align(offset + array.nbytes)
+            header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+            needed = _align(_PREFIX.size + len(header_bytes))
+            if needed <= data_start:
+                break
+            data_start = needed
+        header_bytes += b' ' * (data_start - _PREFIX.size - len(header_bytes))
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(_PREFIX.pack(MAGIC, SKELETON_FORMAT_VERSION, len(header_bytes)))
+            f.write(header_bytes)
+            for name, array in arrays.items():
+                f.seek(header['arrays'][name]['offset'])
+                f.write(array.tobytes())
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> 'SkeletonData':
+        """
+        讀取 .skel 檔 (或舊版的 skeleton.json)
+
+        Args:
+            path: 檔案路徑
+            mmap: 以唯讀 memmap 對應陣列，只在存取時讀取需要的幀
+
+        Raises:
+            ValueError: 不是骨架檔或版本不支援
+        """
+        if path.endswith('.json'):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            frames = data.get('frames', data) if isinstance(data, dict) else data
+            fps = data.get('fps', 30.0) if isinstance(data, dict) else 30.0
+            return cls.from_frames(frames, fps, path)
+
+        header = read_header(path)
+        arrays = {}
+        for name, spec in header['arrays'].items():
+            shape = tuple(spec['shape'])
+            if not mmap or 0 in shape:
+                with open(path, 'rb') as f:
+                    f.seek(spec['offset'])
+                    count = int(np.prod(shape))
+                    arrays[name] = np.fromfile(f, dtype=spec['dtype'], count=count).reshape(shape)
+            else:
+                arrays[name] = np.memmap(path, dtype=spec['dtype'], mode='r', offset=spec['offset'], shape=shape)
+        return cls(arrays['landmarks'], arrays['present'], header['fps'], header.get('source', ''),
+                   arrays.get('confidence'), arrays.get('keyframes'), header.get('metadata', {}))
+
+
+def read_header(path: str) -> Dict[str, Any]:
+    """
+    只讀取 .skel 檔的標頭 (幀數、fps、來源與陣列位置)
+
+    Raises:
+        ValueError: 不是骨架檔或版本不支援
+    """
+    with open(path, 'rb') as f:
+        prefix = f.read(_PREFIX.size)
+        if len(prefix) < _PREFIX.size:
+            raise ValueError(f"不是骨架檔: {path}")
+        magic, version, header_length = _PREFIX.unpack(prefix)
+        if magic != MAGIC:
+            raise ValueError(f"不是骨架檔: {path}")
+        if version > SKELETON_FORMAT_VERSION:
+            raise ValueError(f"不支援的骨架檔版本 {version}: {path}")
+        header = json.loads(f.read(header_length).decode('utf-8'))
+    header['version'] = version
+    return header
+
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
@@ -0,0 +1,205 @@
+"""
+骨架影片繪製
+- SkeletonRenderer：重複使用黑色畫布，只清除上一次畫過的範圍；
+  關鍵點與連接線各用一次 cv2.polylines 畫完 (零長度的粗線即為實心圓點)
+- render_video：解碼 → 姿勢估計 → 繪製 → 編碼 分別在不同執行緒重疊進行
+"""
+import queue
+import threading
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import cv2
+    HAS_CV2 = True
+except ImportError:
+    cv2 = None
+    HAS_CV2 = False
+
+# 顏色 (BGR)
+NOSE_COLOR = (255, 0, 0)
+POINT_COLOR = (0, 0, 255)
+LINE_COLOR = (0, 255, 0)
+
+_END = object()
+
+
+class SkeletonRenderer:
+    """在重複使用的黑色畫布上繪製骨架"""
+
+    def __init__(self, width: int, height: int, connections: Sequence[Tuple[int, int]],
+                 face_landmark_indices: Iterable[int] = range(1, 11), pool_size: int = 4,
+                 point_radius: int = 4, nose_radius: int = 5, line_thickness: int = 2):
+        """
+        Args:
+            width / height: 畫面大小
+            connections: 要畫的連接線 (原始 33 點索引)
+            face_landmark_indices: 不畫的臉部關鍵點 (保留鼻子 0)
+            pool_size: 輪流使用的畫布數；交給編碼執行緒的畫布在編碼完成前不會被覆寫，
+                       等待編碼的幀數需少於 pool_size - 1
+            point_radius / nose_radius / line_thickness: 關鍵點半徑與連接線粗細
+        """
+        self.width = width
+        self.height = height
+        self.point_radius = point_radius
+        self.nose_radius = nose_radius
+        self.line_thickness = line_thickness
+        face = set(face_landmark_indices)
+        self._connections = np.array(list(connections), dtype=np.int64).reshape(-1, 2)
+        self._points = np.array([i for i in range(33) if i not in face and i != 0], dtype=np.int64)
+        self._pool = [np.zeros((height, width, 3), dtype=np.uint8) for _ in range(pool_size)]
+        # 各畫布上一次繪製的範圍 (x0, y0, x1, y1)，下次使用前只清除這一塊
+        self._dirty: List[Optional[Tuple[int, int, int, int]]] = [None] * pool_size
+        self._next = 0
+
+    @property
+    def pool_size(self) -> int:
+        return len(self._pool)
+
+    def render(self, landmarks: np.ndarray, detected: bool = True) -> np.ndarray:
+        """
+        取出下一張畫布並繪製一幀
+
+        Args:
+            landmarks: (33, 2+) 正規化座標
+            detected: 這一幀是否有骨架 (否則為全黑畫面)
+
+        Returns:
+            畫布 (輪流使用，呼叫端在 pool_size - 1 幀內必須用完)
+        """
+        index = self._next
+        self._next = (index + 1) % len(self._pool)
+        canvas = self._pool[index]
+        dirty = self._dirty[index]
+        if dirty:
+            x0, y0, x1, y1 = dirty
+            canvas[y0:y1, x0:x1] = 0
+        self._dirty[index] = self.draw(canvas, landmarks) if detected else None
+        return canvas
+
+    def draw(self, canvas: np.ndarray, landmarks: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
+        """
+        在畫布上畫出鼻子與身體的關鍵點和連接線
+
+        Returns:
+            畫到的範圍 (x0, y0, x1, y1)，完全在畫面外時為 None
+        """
+        height, width = canvas.shape[:2]
+        # 超出畫面很遠的點限制在合理範圍，避免整數溢位
+        points = np.clip(np.asarray(landmarks)[:, :2] * [width, height], -width, 2 * width).astype(np.int32)
+
+        # 關鍵點 (鼻子先畫，身體在上)：零長度的粗線等同實心圓
+        nose = points[0]
+        cv2.circle(canvas, (int(nose[0]), int(nose[1])), self.nose_radius, NOSE_COLOR, -1)
+        body = points[self._points]
+        cv2.polylines(canvas, np.stack([body, body], axis=1), False, POINT_COLOR, 2 * self.point_radius)
+        # 連接線 (畫在關鍵點上方)
+        if len(self._connections):
+            cv2.polylines(canvas, points[self._connections], False, LINE_COLOR, self.line_thickness)
+
+        pad = max(self.point_radius, self.nose_radius, self.line_thickness) + 2
+        x0, y0 = points.min(axis=0) - pad
+        x1, y1 = points.max(axis=0) + pad + 1
+        x0, y0 = max(int(x0), 0), max(int(y0), 0)
+        x1, y1 = min(int(x1), width), min(int(y1), height)
+        if x0 >= x1 or y0 >= y1:
+            return None
+        return x0, y0, x1, y1
+
+
+def _put(q: queue.Queue, item, stop: threading.Event) -> bool:
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _get(q: queue.Queue, stop: threading.Event):
+    """取出下一項，停止時回傳 _END"""
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _END
+
+
+def render_video(segments: Iterable[Tuple[int, object]], output_path: str, fps: float,
+                 width: int, height: int, connections: Sequence[Tuple[int, int]],
+                 face_landmark_indices: Iterable[int] = range(1, 11), fourcc: str = 'avc1',
+                 queue_size: int = 4) -> List[object]:
+    """
+    將骨架序列繪製並編碼為影片
+
+    segments 在呼叫端執行緒迭代 (通常是 pose_sampling.iter_track，其解碼另有執行緒)，
+    繪製與編碼各自在背景執行緒進行，彼此以有上限的佇列相接
+
+    Args:
+        segments: (起始幀, PoseTrack) 序列
+        output_path: 輸出影片路徑
+        fps / width / height: 輸出影片規格
+        connections / face_landmark_indices: 同 SkeletonRenderer
+        fourcc: 編碼格式
+        queue_size: 各階段之間等待的幀數上限
+
+    Returns:
+        迭代過的所有 PoseTrack (依序)，供呼叫端組成完整骨架
+    """
+    renderer = SkeletonRenderer(width, height, connections, face_landmark_indices, pool_size=queue_size + 2)
+    writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*fourcc), fps, (width, height))
+    to_render: queue.Queue = queue.Queue(maxsize=queue_size)
+    to_encode: queue.Queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    errors: List[BaseException] = []
+
+    def render_stage():
+        try:
+            while True:
+                track = _get(to_render, stop)
+                if track is _END:
+                    break
+                for landmarks, detected in zip(track.landmarks, track.detected):
+                    if not _put(to_encode, renderer.render(landmarks, detected), stop):
+                        return
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _put(to_encode, _END, stop)
+
+    def encode_stage():
+        try:
+            while True:
+                frame = _get(to_encode, stop)
+                if frame is _END:
+                    break
+                writer.write(frame)
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+
+    threads = [threading.Thread(target=render_stage, daemon=True), threading.Thread(target=encode_stage, daemon=True)]
+    for thread in threads:
+        thread.start()
+
+    collected = []
+    try:
+        for _, track in segments:
+            collected.append(track)
+            if not _put(to_render, track, stop):
+                break
+    finally:
+        _put(to_render, _END, stop)
+        # 發生錯誤時讓各階段停止等待
+        if errors:
+            stop.set()
+        for thread in threads:
+            thread.join()
+        writer.release()
+    if errors:
+        raise errors[0]
+    return collected
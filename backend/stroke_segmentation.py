@@ -0,0 +1,294 @@
+"""
+擊球分段
+從骨架關鍵點序列 (23 個關鍵點，排除臉部) 偵測每一拍的位置：
+以手腕/手肘的速度與加速度組成動作訊號，向量化找出峰值 (揮拍最快的瞬間)，
+再以峰值為中心切出固定長度的視窗，讓訓練與即時推論都只處理擊球片段
+
+- segment_strokes：整段序列的批次分段
+- StreamingStrokeSegmenter：逐幀輸入，一拍結束時輸出該拍的視窗
+- stroke_windows：將各拍重新採樣為模型輸入長度
+- group_train_test_split：以影片為單位分割訓練/測試集 (同一影片的各拍不會同時出現在兩邊)
+"""
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+NUM_LANDMARKS = 23
+# 排除臉部後的索引：肩膀 (原始 11, 12)、手肘 (13, 14)、手腕 (15, 16)
+SHOULDERS = [1, 2]
+ELBOWS = [3, 4]
+WRISTS = [5, 6]
+ARM_LANDMARKS = ELBOWS + WRISTS
+
+# 動作訊號中手腕、手肘速度的權重，與加速度的權重 (秒)
+WRIST_WEIGHT = 1.0
+ELBOW_WEIGHT = 0.5
+ACCEL_WEIGHT = 0.05
+
+
+@dataclass
+class StrokeSegment:
+    """一拍的範圍 (幀索引，end 不含)"""
+    start: int
+    end: int
+    peak: int
+    peak_speed: float
+
+    def to_dict(self):
+        return {'start': self.start, 'end': self.end, 'peak': self.peak,
+                'peak_speed': round(self.peak_speed, 4)}
+
+
+def as_landmark_array(landmarks: np.ndarray) -> np.ndarray:
+    """將 (幀, 69) 或 (幀, 23, 3/4) 的序列轉為 (幀, 23, 3)"""
+    landmarks = np.asarray(landmarks, dtype=np.float32)
+    if landmarks.ndim == 2:
+        landmarks = landmarks.reshape(len(landmarks), NUM_LANDMARKS, -1)
+    return landmarks[:, :, :3]
+
+
+def _fill_missing(points: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """以線性插值補上沒有偵測到人的幀 (points: (幀, k))"""
+    if valid.all() or not valid.any():
+        return points
+    frames = np.arange(len(points))
+    filled = points.copy()
+    for col in range(points.shape[1]):
+        filled[~valid, col] = np.interp(frames[~valid], frames[valid], points[valid, col])
+    return filled
+
+
+def _moving_average(values: np.ndarray, width: int) -> np.ndarray:
+    """沿時間軸的置中移動平均 (values: (幀,) 或 (幀, k))"""
+    if width <= 1 or len(values) < 2:
+        return values
+    pad = width // 2
+    padded = np.pad(values, [(pad, width - 1 - pad)] + [(0, 0)] * (values.ndim - 1), mode='edge')
+    cumsum = np.cumsum(padded, axis=0, dtype=np.float64)
+    cumsum = np.concatenate([np.zeros((1,) + values.shape[1:]), cumsum])
+    return ((cumsum[width:] - cumsum[:-width]) / width).astype(np.float32)
+
+
+def motion_signal(landmarks: np.ndarray, fps: float = 30.0, smooth_seconds: float = 0.1) -> np.ndarray:
+    """
+    計算每一幀的揮拍動作訊號
+
+    速度以肩寬正規化 (與拍攝距離無關)，單位為「每秒幾個肩寬」；
+    訊號 = 手腕速度 + 手肘速度 * 0.5 + 手腕|加速度| * 0.05 秒 (各取左右手較大者)
+
+    Args:
+        landmarks: 骨架序列 (幀, 69) 或 (幀, 23, 3)
+        fps: 幀率
+        smooth_seconds: 平滑視窗長度
+
+    Returns:
+        (幀,) 的動作訊號
+    """
+    points = as_landmark_array(landmarks)
+    frames = len(points)
+    if frames < 2:
+        return np.zeros(frames, dtype=np.float32)
+
+    valid = np.abs(points).sum(axis=(1, 2)) > 0
+    xy = points[:, ARM_LANDMARKS + SHOULDERS, :2].reshape(frames, -1)
+    xy = _fill_missing(xy, valid).reshape(frames, -1, 2)
+
+    shoulder_width = np.linalg.norm(xy[:, 4] - xy[:, 5], axis=1)
+    scale = np.median(shoulder_width[shoulder_width > 1e-3]) if (shoulder_width > 1e-3).any() else 1.0
+
+    width = max(int(round(smooth_seconds * fps)), 1)
+    arm = _moving_average(xy[:, :4].reshape(frames, -1), width).reshape(frames, 4, 2)
+    velocity = np.diff(arm, axis=0, prepend=arm[:1]) * fps / scale
+    speed = np.linalg.norm(velocity, axis=2)                       # (幀, 4)
+    accel = np.abs(np.diff(speed, axis=0, prepend=speed[:1])) * fps
+
+    elbow = speed[:, :2].max(axis=1)
+    wrist = speed[:, 2:].max(axis=1)
+    signal = WRIST_WEIGHT * wrist + ELBOW_WEIGHT * elbow + ACCEL_WEIGHT * accel[:, 2:].max(axis=1)
+    signal[~valid] = 0.0
+    return _moving_average(signal, width)
+
+
+def find_peaks(signal: np.ndarray, height: float, distance: int) -> np.ndarray:
+    """
+    找出高於 height 的局部最大值，且相鄰峰值至少相隔 distance 幀 (保留較高者)
+
+    Returns:
+        峰值索引 (遞增)
+    """
+    if len(signal) < 3:
+        return np.array([], dtype=int)
+    middle = signal[1:-1]
+    candidates = np.flatnonzero((middle > signal[:-2]) & (middle >= signal[2:]) & (middle > height)) + 1
+    if len(candidates) < 2 or distance <= 1:
+        return candidates
+    # 由高到低挑選，略過與已選峰值太近的候選
+    order = candidates[np.argsort(-signal[candidates], kind='stable')]
+    taken = np.zeros(len(signal), dtype=bool)
+    kept = []
+    for index in order:
+        if not taken[index]:
+            kept.append(index)
+            taken[max(index - distance + 1, 0):index + distance] = True
+    return np.sort(np.array(kept, dtype=int))
+
+
+def segment_strokes(landmarks: np.ndarray, fps: float = 30.0, min_speed: float = 3.0,
+                    min_gap_seconds: float = 0.7, pre_seconds: float = 0.6, post_seconds: float = 0.5,
+                    signal: Optional[np.ndarray] = None) -> List[StrokeSegment]:
+    """
+    將骨架序列切成各拍的範圍
+
+    Args:
+        landmarks: 骨架序列 (幀, 69) 或 (幀, 23, 3)
+        fps: 幀率
+        min_speed: 峰值訊號下限 (每秒肩寬)，低於此視為沒有揮拍
+        min_gap_seconds: 相鄰兩拍峰值的最短間隔
+        pre_seconds / post_seconds: 峰值前 (引拍) 與峰值後 (隨揮) 保留的秒數
+        signal: 已計算的 motion_signal (可省略)
+
+    Returns:
+        各拍範圍；相鄰兩拍重疊時在兩峰之間訊號最低處切開
+    """
+    if signal is None:
+        signal = motion_signal(landmarks, fps)
+    peaks = find_peaks(signal, min_speed, max(int(round(min_gap_seconds * fps)), 1))
+    if not len(peaks):
+        return []
+
+    frames = len(signal)
+    pre = int(round(pre_seconds * fps))
+    post = int(round(post_seconds * fps))
+    starts = np.maximum(peaks - pre, 0)
+    ends = np.minimum(peaks + post + 1, frames)
+    # 重疊的相鄰兩拍以兩峰之間的谷底為界
+    for i in np.flatnonzero(ends[:-1] > starts[1:]):
+        valley = peaks[i] + int(np.argmin(signal[peaks[i]:peaks[i + 1] + 1]))
+        ends[i] = valley
+        starts[i + 1] = valley
+    return [StrokeSegment(int(s), int(e), int(p), float(signal[p])) for s, e, p in zip(starts, ends, peaks)]
+
+
+def resample(sequence: np.ndarray, length: int) -> np.ndarray:
+    """沿時間軸線性插值為固定長度 (所有特徵一次計算)"""
+    sequence = np.asarray(sequence, dtype=np.float32)
+    if len(sequence) == length:
+        return sequence
+    if len(sequence) == 1:
+        return np.repeat(sequence, length, axis=0)
+    position = np.linspace(0, len(sequence) - 1, length)
+    low = np.floor(position).astype(int)
+    high = np.minimum(low + 1, len(sequence) - 1)
+    weight = (position - low).reshape((-1,) + (1,) * (sequence.ndim - 1)).astype(np.float32)
+    return sequence[low] * (1 - weight) + sequence[high] * weight
+
+
+def stroke_windows(landmarks: np.ndarray, segments: Sequence[StrokeSegment], length: int = 150) -> np.ndarray:
+    """
+    取出各拍的片段並重新採樣為模型輸入長度
+
+    Returns:
+        (拍數, length, 特徵...)，維度與輸入的單幀相同
+    """
+    landmarks = np.asarray(landmarks, dtype=np.float32)
+    if not segments:
+        return np.zeros((0, length) + landmarks.shape[1:], dtype=np.float32)
+    return np.stack([resample(landmarks[seg.start:seg.end], length) for seg in segments])
+
+
+def group_train_test_split(X: np.ndarray, y: np.ndarray, groups: Sequence, test_size: float = 0.2,
+                           random_state: Optional[int] = 42):
+    """
+    以影片為單位分割訓練/測試集
+
+    同一部影片切出的各拍高度相似，逐樣本隨機分割會讓測試集混入訓練過的影片而高估準確率；
+    這裡先依各影片的類別分層分割影片，再取出各自的樣本
+
+    Args:
+        X / y: 樣本與標籤
+        groups: 每個樣本所屬的影片 (同一影片的樣本類別相同)
+        test_size: 測試集影片比例
+        random_state: 亂數種子
+
+    Returns:
+        (X_train, X_test, y_train, y_test)
+    """
+    from sklearn.model_selection import train_test_split
+
+    X, y, groups = np.asarray(X), np.asarray(y), np.asarray(groups)
+    videos, first = np.unique(groups, return_index=True)
+    labels = y[first]
+    try:
+        _, test_videos = train_test_split(videos, test_size=test_size, stratify=labels,
+                                          random_state=random_state)
+    except ValueError:
+        # 某類別只有一部影片、或測試集影片數少於類別數時無法分層
+        _, test_videos = train_test_split(videos, test_size=test_size, random_state=random_state)
+    test_mask = np.isin(groups, test_videos)
+    return X[~test_mask], X[test_mask], y[~test_mask], y[test_mask]
+
+
+class StreamingStrokeSegmenter:
+    """
+    逐幀分段：每一拍的隨揮結束 (峰值後 post_seconds) 時輸出該拍
+
+    使用與 segment_strokes 相同的訊號與峰值判斷，只保留最近幾秒的幀
+    """
+
+    def __init__(self, fps: float = 30.0, min_speed: float = 3.0, min_gap_seconds: float = 0.7,
+                 pre_seconds: float = 0.6, post_seconds: float = 0.5):
+        self.fps = fps
+        self.min_speed = min_speed
+        self.min_gap = max(int(round(min_gap_seconds * fps)), 1)
+        self.pre = int(round(pre_seconds * fps))
+        self.post = int(round(post_seconds * fps))
+        # 保留足夠判斷峰值與切出一拍的長度
+        self._frames: Deque[np.ndarray] = deque(maxlen=self.pre + self.post + self.min_gap * 2 + 1)
+        self.frame_index = 0
+        self._last_peak: Optional[int] = None
+
+    def reset(self):
+        self._frames.clear()
+        self.frame_index = 0
+        self._last_peak = None
+
+    def push(self, frame_landmarks: Sequence[float]) -> Optional[Tuple[StrokeSegment, np.ndarray]]:
+        """
+        加入一幀
+
+        Args:
+            frame_landmarks: 69 個數值 (沒有偵測到人時全為 0)
+
+        Returns:
+            (一拍的範圍 (以輸入幀數計), 該拍的幀 (幀, 69))；沒有完成的一拍時為 None
+        """
+        self._frames.append(np.asarray(frame_landmarks, dtype=np.float32).reshape(-1))
+        self.frame_index += 1
+        if len(self._frames) < self.post + 3:
+            return None
+
+        window = np.stack(self._frames)
+        offset = self.frame_index - len(window)
+        signal = motion_signal(window, self.fps)
+        # 只判斷剛好經過隨揮時間的那一幀，之後的幀已足夠確認它是峰值
+        candidate = len(window) - 1 - self.post
+        lo = max(candidate - self.min_gap + 1, 0)
+        hi = min(candidate + self.min_gap, len(window))
+        value = signal[candidate]
+        if value <= self.min_speed or value < signal[lo:hi].max() or (
+                candidate > 0 and value <= signal[candidate - 1]):
+            return None
+        peak = offset + candidate
+        if self._last_peak is not None and peak - self._last_peak < self.min_gap:
+            return None
+
+        start = max(candidate - self.pre, 0)
+        if self._last_peak is not None and self._last_peak - offset >= start:
+            # 與上一拍重疊時，從兩峰之間的谷底開始
+            previous = max(self._last_peak - offset, 0)
+            start = previous + int(np.argmin(signal[previous:candidate + 1]))
+        self._last_peak = peak
+        segment = StrokeSegment(offset + start, self.frame_index, peak, float(value))
+        return segment, window[start:]
@@ -0,0 +1,5 @@
+"""pytest 共用設定：由 backend/ 執行時可直接匯入 services、config 等模組"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
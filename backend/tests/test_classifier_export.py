@@ -0,0 +1,155 @@
+"""動作分類模型的 TFLite 匯出一致性與執行環境選擇"""
+import importlib.util
+import os
+
+import numpy as np
+import pytest
+
+from services import classifier_runtime
+from services.classifier_runtime import load_classifier, tflite_path_for
+
+requires_tensorflow = pytest.mark.skipif(
+    importlib.util.find_spec('tensorflow') is None, reason='需要 TensorFlow'
+)
+
+FRAMES, FEATURES, CLASSES = 12, 6, 3
+
+
+def _touch(path, mtime):
+    with open(path, 'wb'):
+        pass
+    os.utime(path, (mtime, mtime))
+
+
+class FakeLite:
+    name = 'tflite'
+
+    def __init__(self, model_path, num_threads=1):
+        if open(model_path, 'rb').read() == b'broken':
+            raise ValueError('unsupported op')
+        self.model_path = model_path
+
+
+class FakeKeras:
+    name = 'keras'
+
+    def __init__(self, model_path):
+        self.model_path = model_path
+
+
+@pytest.fixture
+def fake_backends(monkeypatch):
+    monkeypatch.setattr(classifier_runtime, 'TFLiteClassifier', FakeLite)
+    monkeypatch.setattr(classifier_runtime, 'KerasClassifier', FakeKeras)
+
+
+@pytest.fixture
+def model_path(tmp_path):
+    return str(tmp_path / 'pose_classifier_model.h5')
+
+
+def test_auto_prefers_tflite_not_older_than_h5(fake_backends, model_path):
+    _touch(model_path, 1000)
+    _touch(tflite_path_for(model_path), 1000)
+    assert load_classifier(model_path).name == 'tflite'
+
+
+def test_auto_falls_back_to_keras_when_tflite_is_stale(fake_backends, model_path):
+    # 重新訓練後 .h5 較新，舊的 .tflite 不再代表目前的模型
+    _touch(tflite_path_for(model_path), 1000)
+    _touch(model_path, 2000)
+    assert load_classifier(model_path).name == 'keras'
+
+
+def test_auto_uses_tflite_without_h5(fake_backends, model_path):
+    _touch(tflite_path_for(model_path), 1000)
+    assert load_classifier(model_path).name == 'tflite'
+
+
+def test_auto_falls_back_to_keras_when_tflite_fails_to_load(fake_backends, model_path):
+    _touch(model_path, 1000)
+    with open(tflite_path_for(model_path), 'wb') as f:
+        f.write(b'broken')
+    os.utime(tflite_path_for(model_path), (2000, 2000))
+    assert load_classifier(model_path).name == 'keras'
+    # 明確指定 tflite 時不改用 Keras
+    with pytest.raises(ValueError):
+        load_classifier(model_path, backend='tflite')
+
+
+def test_explicit_backend_and_missing_files(fake_backends, model_path):
+    assert load_classifier(model_path) is None
+    _touch(model_path, 2000)
+    _touch(tflite_path_for(model_path), 1000)
+    assert load_classifier(model_path, backend='tflite').name == 'tflite'
+    assert load_classifier(model_path, backend='keras').name == 'keras'
+    with pytest.raises(ValueError):
+        load_classifier(model_path, backend='onnx')
+
+
+def test_compare_outputs():
+    from model_export import FLOAT_MAX_DIFF, compare_outputs, parity_passed
+    reference = np.array([[0.7, 0.2, 0.1], [0.1, 0.3, 0.6]])
+    parity = compare_outputs(reference, reference + 1e-4)
+    assert parity['samples'] == 2 and parity['agreement'] == 1.0
+    assert parity['max_abs_diff'] == pytest.approx(1e-4, rel=1e-3)
+    assert parity_passed(parity, 'none')
+    assert not parity_passed(compare_outputs(reference, reference + 2 * FLOAT_MAX_DIFF), 'none')
+
+
+@pytest.fixture(scope='module')
+def tiny_lstm():
+    import tensorflow as tf
+    tf.keras.utils.set_random_seed(0)
+    model = tf.keras.Sequential([
+        tf.keras.Input((FRAMES, FEATURES)),
+        tf.keras.layers.LSTM(8),
+        tf.keras.layers.Dense(CLASSES, activation='softmax'),
+    ])
+    X = np.random.default_rng(0).standard_normal((32, FRAMES, FEATURES)).astype(np.float32)
+    return model, X
+
+
+@requires_tensorflow
+def test_float_export_matches_keras(tiny_lstm, tmp_path):
+    from model_export import FLOAT_MAX_DIFF, compare_outputs, export_tflite
+    from services.classifier_runtime import TFLiteClassifier
+    model, X = tiny_lstm
+    path = export_tflite(model, str(tmp_path / 'model.tflite'), 'none')
+    lite = TFLiteClassifier(path)
+    assert lite.input_shape == (FRAMES, FEATURES)
+
+    parity = compare_outputs(model.predict(X, verbose=0), lite.predict(X))
+    assert parity['samples'] == len(X)
+    assert parity['max_abs_diff'] <= FLOAT_MAX_DIFF
+    assert parity['agreement'] == 1.0
+
+
+@requires_tensorflow
+@pytest.mark.parametrize('quantization', ['none', 'dynamic'])
+def test_export_classifier_replaces_tflite_when_parity_passes(tiny_lstm, tmp_path, quantization):
+    from model_export import export_classifier
+    model, X = tiny_lstm
+    model_path = str(tmp_path / 'pose_classifier_model.h5')
+    result = export_classifier(model, model_path, X, quantization)
+    assert result['passed'] and result['quantization'] == quantization
+    assert os.path.exists(tflite_path_for(model_path))
+    assert not os.path.exists(tflite_path_for(model_path) + '.candidate')
+
+
+@requires_tensorflow
+def test_load_classifier_picks_fresh_tflite(tiny_lstm, tmp_path):
+    from model_export import export_classifier
+    model, X = tiny_lstm
+    model_path = str(tmp_path / 'pose_classifier_model.h5')
+    model.save(model_path)
+    export_classifier(model, model_path, X, 'none')
+    lite = load_classifier(model_path)
+    assert lite.name == 'tflite'
+
+    # .h5 比 .tflite 新時改用 Keras，兩者輸出一致
+    stamp = os.path.getmtime(tflite_path_for(model_path)) + 10
+    os.utime(model_path, (stamp, stamp))
+    keras = load_classifier(model_path)
+    assert keras.name == 'keras'
+    np.testing.assert_allclose(keras.predict(X), lite.predict(X), atol=1e-3)
@@ -0,0 +1,74 @@
+"""編譯式樹集成與 sklearn GradientBoostingClassifier 的一致性"""
+import numpy as np
+import pytest
+
+pytest.importorskip('sklearn')
+from sklearn.ensemble import GradientBoostingClassifier
+from sklearn.preprocessing import StandardScaler
+
+from services.compiled_ensemble import CompiledEnsemble, benchmark
+
+MAX_DIFF = 1e-9
+
+
+def _fit(n_classes: int, max_depth: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(600, 8))
+    # 類別由特徵的非線性組合決定，讓每棵樹都有足夠的分裂
+    score = X[:, 0] * X[:, 1] + np.sin(X[:, 2]) + 0.5 * X[:, 3] ** 2
+    y = np.digitize(score, np.quantile(score, np.linspace(0, 1, n_classes + 1)[1:-1]))
+    scaler = StandardScaler().fit(X)
+    model = GradientBoostingClassifier(n_estimators=40, max_depth=max_depth, random_state=seed)
+    model.fit(scaler.transform(X), y)
+    return model, scaler, X
+
+
+def _samples(X, rng):
+    """原始特徵與加入雜訊的特徵 (涵蓋門檻附近的數值)"""
+    return np.vstack([X, X + rng.normal(0, 0.5, X.shape)])
+
+
+@pytest.mark.parametrize('n_classes', [2, 3])
+@pytest.mark.parametrize('max_depth', [3, 8])
+def test_matches_sklearn(n_classes, max_depth):
+    model, scaler, X = _fit(n_classes, max_depth)
+    X_check = _samples(X, np.random.default_rng(1))
+    expected = model.predict_proba(scaler.transform(X_check))
+
+    compiled = CompiledEnsemble.from_sklearn(model, scaler)
+    # 深度 3 的樹使用位元遮罩，深度 8 的樹葉節點超過 64 個時改用逐層走訪
+    assert compiled.use_bitvector == (max_depth == 3)
+    assert np.abs(compiled.predict_proba(X_check) - expected).max() < MAX_DIFF
+
+    compiled.use_bitvector = False
+    assert np.abs(compiled.predict_proba(X_check) - expected).max() < MAX_DIFF
+
+
+def test_split_thresholds_follow_sklearn_direction():
+    model, scaler, X = _fit(2, 3)
+    compiled = CompiledEnsemble.from_sklearn(model, scaler)
+    # 將每個分裂門檻換算回未標準化的數值，檢查剛好等於門檻時的方向
+    internal = np.isfinite(compiled.threshold)
+    rows = np.repeat(X[:1], internal.sum(), axis=0)
+    features = compiled.feature[internal]
+    rows[np.arange(len(rows)), features] = (
+        compiled.threshold[internal] * scaler.scale_[features] + scaler.mean_[features]
+    )
+    expected = model.predict_proba(scaler.transform(rows))
+    assert np.abs(compiled.predict_proba(rows) - expected).max() < MAX_DIFF
+
+
+def test_save_and_load_round_trip(tmp_path):
+    model, scaler, X = _fit(3, 3)
+    compiled = CompiledEnsemble.from_sklearn(model, scaler)
+    path = str(tmp_path / 'ensemble.npz')
+    compiled.save(path)
+    loaded = CompiledEnsemble.load(path)
+    np.testing.assert_array_equal(loaded.predict_proba(X), compiled.predict_proba(X))
+
+
+def test_benchmark_reports_parity():
+    model, scaler, X = _fit(2, 3)
+    report = benchmark(model, scaler, X[:50], repeats=5)
+    assert report['max_abs_diff'] < MAX_DIFF
+    assert report['batch_size'] == 50
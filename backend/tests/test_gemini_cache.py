@@ -0,0 +1,129 @@
+"""Gemini 回應快取：以本地假模型與暫存資料庫測試"""
+import pytest
+
+from services import gemini_cache
+from services.gemini_cache import GeminiResponseCache
+
+
+class FakeModel:
+    """與 GenerativeModel 相同介面的假模型，記錄呼叫次數"""
+
+    def __init__(self, model_name='models/fake-flash'):
+        self.model_name = model_name
+        self.calls = 0
+
+    def generate_content(self, contents, generation_config=None):
+        self.calls += 1
+        return type('Response', (), {'text': f'{self.model_name}:{contents[-1]}:{self.calls}'})()
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(gemini_cache, 'time', fake)
+    return fake
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / 'rally.mp4'
+    path.write_bytes(b'\x00video-bytes' * 100)
+    return str(path)
+
+
+def _analyze(cache, model, prompt, media=()):
+    """分析器使用快取的方式：命中時不呼叫模型，成功後才寫入"""
+    key = cache.make_key(model, 'v1', prompt, media=media)
+    text = cache.get(key)
+    if text is None:
+        text = model.generate_content([prompt]).text
+        cache.put(key, text, model, 'v1')
+    return text
+
+
+def test_hit_skips_model_call(tmp_path, clock, video):
+    cache = GeminiResponseCache(str(tmp_path / 'cache.db'))
+    model = FakeModel()
+    first = _analyze(cache, model, 'describe', [video])
+    second = _analyze(cache, model, 'describe', [video])
+    assert first == second and model.calls == 1
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['size']) == (1, 1, 1)
+    assert stats['hit_rate'] == 0.5
+
+
+def test_make_key_components(tmp_path, video):
+    cache = GeminiResponseCache(str(tmp_path / 'cache.db'))
+    model = FakeModel()
+    base = cache.make_key(model, 'v1', 'prompt', media=[video], generation_config={'temperature': 0.4})
+    # 相同內容 (不同路徑) 與參數順序不影響鍵
+    copy = tmp_path / 'copy.mp4'
+    copy.write_bytes(open(video, 'rb').read())
+    assert base == cache.make_key('models/fake-flash', 'v1', 'prompt', media=[str(copy)],
+                                  generation_config={'temperature': 0.4})
+    changed = [
+        cache.make_key(FakeModel('models/fake-pro'), 'v1', 'prompt', media=[video],
+                       generation_config={'temperature': 0.4}),
+        cache.make_key(model, 'v2', 'prompt', media=[video], generation_config={'temperature': 0.4}),
+        cache.make_key(model, 'v1', 'prompt!', media=[video], generation_config={'temperature': 0.4}),
+        cache.make_key(model, 'v1', 'prompt', media=[], generation_config={'temperature': 0.4}),
+        cache.make_key(model, 'v1', 'prompt', media=[video], generation_config={'temperature': 0.5}),
+    ]
+    assert len({base, *changed}) == len(changed) + 1
+
+
+def test_media_content_change_invalidates(tmp_path, clock, video):
+    cache = GeminiResponseCache(str(tmp_path / 'cache.db'))
+    model = FakeModel()
+    _analyze(cache, model, 'describe', [video])
+    with open(video, 'ab') as f:
+        f.write(b'more frames')
+    _analyze(cache, model, 'describe', [video])
+    assert model.calls == 2
+
+
+def test_ttl_expiry(tmp_path, clock):
+    cache = GeminiResponseCache(str(tmp_path / 'cache.db'), ttl=60)
+    model = FakeModel()
+    _analyze(cache, model, 'a')
+    clock.now += 59
+    _analyze(cache, model, 'a')
+    assert model.calls == 1
+    clock.now += 2
+    assert cache.get(cache.make_key(model, 'v1', 'a')) is None
+    # 過期項目在下一次寫入時刪除
+    _analyze(cache, model, 'b')
+    stats = cache.stats()
+    assert (stats['evictions'], stats['size'], stats['misses']) == (1, 1, 3)
+
+
+def test_lru_eviction_by_size(tmp_path, clock):
+    cache = GeminiResponseCache(str(tmp_path / 'cache.db'), max_bytes=250)
+    for key in ('a', 'b'):
+        cache.put(key, key * 100)
+        clock.now += 1
+    # 讀取 a 後 b 成為最久未使用
+    assert cache.get('a') == 'a' * 100
+    clock.now += 1
+    cache.put('c', 'c' * 100)
+    assert cache.get('b') is None
+    assert cache.get('a') == 'a' * 100 and cache.get('c') == 'c' * 100
+    stats = cache.stats()
+    assert stats['evictions'] == 1 and stats['bytes'] == 200
+
+
+def test_disabled_cache_never_hits(tmp_path):
+    cache = GeminiResponseCache(str(tmp_path / 'cache.db'), enabled=False)
+    model = FakeModel()
+    _analyze(cache, model, 'a')
+    _analyze(cache, model, 'a')
+    assert model.calls == 2
+    assert not (tmp_path / 'cache.db').exists()
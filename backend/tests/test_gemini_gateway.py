@@ -0,0 +1,151 @@
+"""Gemini 請求閘道：以本地假後端測試排程行為 (不呼叫模型)"""
+import threading
+import time
+
+import pytest
+
+from services.gemini_gateway import (
+    PRIORITY_BATCH, PRIORITY_INTERACTIVE, PRIORITY_LIVE, GeminiGateway
+)
+
+
+class ResourceExhausted(Exception):
+    pass
+
+
+class FakeBackend:
+    """記錄呼叫順序；gate 未開啟前呼叫會等待，rate_limited 中的模型第一次呼叫回傳 429"""
+
+    def __init__(self):
+        self.calls = []
+        self.gate = threading.Event()
+        self.rate_limited = set()
+        self.lock = threading.Lock()
+
+    def generate(self, model, contents, generation_config=None):
+        with self.lock:
+            self.calls.append((model, contents, time.monotonic()))
+            limited = model in self.rate_limited
+            self.rate_limited.discard(model)
+        self.gate.wait(5)
+        if limited:
+            raise ResourceExhausted("429 Resource has been exhausted")
+        return f"{model}:{contents}"
+
+    def wait_for_calls(self, count, timeout=5):
+        deadline = time.monotonic() + timeout
+        while len(self.calls) < count:
+            assert time.monotonic() < deadline, "等待後端呼叫逾時"
+            time.sleep(0.005)
+
+
+@pytest.fixture
+def backend():
+    return FakeBackend()
+
+
+@pytest.fixture
+def make_gateway(backend):
+    gateways = []
+
+    def make(**kwargs):
+        kwargs.setdefault('default_rpm', 6000)
+        kwargs.setdefault('burst', 10)
+        gateway = GeminiGateway(backend, **kwargs)
+        gateways.append(gateway)
+        return gateway
+
+    yield make
+    for gateway in gateways:
+        gateway.close()
+
+
+def test_single_flight_coalesces_identical_requests(backend, make_gateway):
+    gateway = make_gateway(workers=4)
+    futures = [gateway.submit('flash', 'same prompt') for _ in range(5)]
+    futures.append(gateway.submit('flash', 'other prompt'))
+    backend.gate.set()
+    results = [f.result(5) for f in futures]
+
+    assert results[:5] == ['flash:same prompt'] * 5
+    assert results[5] == 'flash:other prompt'
+    assert len(backend.calls) == 2
+    stats = gateway.stats()['models']['flash']
+    assert (stats['requests'], stats['coalesced'], stats['calls']) == (6, 4, 2)
+
+
+def test_completed_request_is_not_coalesced(backend, make_gateway):
+    gateway = make_gateway(workers=1)
+    backend.gate.set()
+    assert gateway.generate('flash', 'prompt') == gateway.generate('flash', 'prompt')
+    assert len(backend.calls) == 2
+
+
+def test_priority_order_when_workers_busy(backend, make_gateway):
+    gateway = make_gateway(workers=1)
+    blocker = gateway.submit('flash', 'blocker')
+    backend.wait_for_calls(1)
+    queued = [('batch-1', PRIORITY_BATCH), ('interactive-1', PRIORITY_INTERACTIVE),
+              ('batch-2', PRIORITY_BATCH), ('live-1', PRIORITY_LIVE), ('interactive-2', PRIORITY_INTERACTIVE)]
+    futures = [gateway.submit('flash', prompt, priority=priority) for prompt, priority in queued]
+    # 與排隊中的批次請求相同的即時請求：共用並提升為即時
+    futures.append(gateway.submit('flash', 'batch-2', priority=PRIORITY_LIVE))
+    assert gateway.stats()['queued'] == {'live': 2, 'interactive': 2, 'batch': 1}
+
+    backend.gate.set()
+    for future in [blocker] + futures:
+        future.result(5)
+    order = [contents for _, contents, _ in backend.calls[1:]]
+    assert order == ['batch-2', 'live-1', 'interactive-1', 'interactive-2', 'batch-1']
+
+
+def test_rate_limit_pauses_model_and_requeues(backend, make_gateway):
+    cooldown = 0.3
+    gateway = make_gateway(workers=2, rate_limit_cooldown=cooldown)
+    backend.gate.set()
+    backend.rate_limited.add('pro')
+    started = time.monotonic()
+    limited = gateway.submit('pro', 'limited')
+    backend.wait_for_calls(1)
+    time.sleep(0.05)
+    assert gateway.stats()['models']['pro']['paused']
+
+    # 其他模型不受暫停影響
+    assert gateway.submit('flash', 'unaffected').result(5) == 'flash:unaffected'
+    other_done = time.monotonic() - started
+    assert limited.result(5) == 'pro:limited'
+    retried_at = [t for model, _, t in backend.calls if model == 'pro'][-1] - started
+
+    assert other_done < cooldown <= retried_at
+    stats = gateway.stats()['models']['pro']
+    assert (stats['rate_limited'], stats['calls'], stats['errors']) == (1, 2, 0)
+
+
+def test_rate_limit_gives_up_after_retries(backend, make_gateway):
+    class AlwaysLimited(FakeBackend):
+        def generate(self, model, contents, generation_config=None):
+            self.calls.append((model, contents, time.monotonic()))
+            raise ResourceExhausted("429")
+
+    gateway = GeminiGateway(AlwaysLimited(), workers=1, default_rpm=6000, burst=10,
+                            rate_limit_cooldown=0.01)
+    try:
+        with pytest.raises(ResourceExhausted):
+            gateway.generate('pro', 'prompt')
+        stats = gateway.stats()['models']['pro']
+        assert (stats['rate_limited'], stats['errors']) == (3, 1)
+    finally:
+        gateway.close()
+
+
+def test_queue_timeout_expires_request(backend, make_gateway):
+    gateway = make_gateway(workers=1)
+    blocker = gateway.submit('flash', 'blocker')
+    backend.wait_for_calls(1)
+    stale = gateway.submit('flash', 'live frame', priority=PRIORITY_LIVE, timeout=0.05)
+    time.sleep(0.1)
+    backend.gate.set()
+    blocker.result(5)
+    with pytest.raises(TimeoutError):
+        stale.result(5)
+    assert gateway.stats()['models']['flash']['expired'] == 1
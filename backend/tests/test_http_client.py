@@ -0,0 +1,175 @@
+"""共用 HTTP 客戶端：以本機 http.server 測試連線重用、重試與 Retry-After 上限"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from http_client import HAS_AIOHTTP, HttpClient, run_first_ok_many
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """
+    依路徑回應：
+    /ok                 200
+    /missing            404
+    /flaky/<狀態>/<n>   前 n 次回傳該狀態，之後 200
+    /retry-after/<秒>   第一次回傳 429 與 Retry-After，之後 200
+    /slow/<秒>          延遲後回傳 200
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _respond(self, status, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        body = b'' if self.command == 'HEAD' else b'ok'
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.command, self.path, self.client_address))
+            count = server.counts[self.path] = server.counts.get(self.path, 0) + 1
+        parts = self.path.strip('/').split('/')
+        if parts[0] == 'ok':
+            self._respond(200)
+        elif parts[0] == 'flaky':
+            status, failures = int(parts[1]), int(parts[2])
+            self._respond(status if count <= failures else 200)
+        elif parts[0] == 'retry-after':
+            if count == 1:
+                self._respond(429, {'Retry-After': parts[1]})
+            else:
+                self._respond(200)
+        elif parts[0] == 'slow':
+            time.sleep(float(parts[1]))
+            self._respond(200)
+        else:
+            self._respond(404)
+
+    do_HEAD = do_GET
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    httpd.daemon_threads = True
+    httpd.lock = threading.Lock()
+    httpd.requests = []
+    httpd.counts = {}
+    httpd.url = f'http://127.0.0.1:{httpd.server_port}'
+    thread = threading.Thread(target=httpd.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def client():
+    http = HttpClient(backoff_base=0.01)
+    yield http
+    http.close()
+
+
+def test_pooled_connection_is_reused(server, client):
+    for _ in range(20):
+        assert client.head(f'{server.url}/ok').status_code == 200
+    # 所有請求都經由同一條 keep-alive 連線 (相同的用戶端埠號)
+    assert len({address for _, _, address in server.requests}) == 1
+
+
+@pytest.mark.parametrize('status', [429, 500, 502, 503, 504])
+def test_retries_transient_status(server, client, status):
+    response = client.get(f'{server.url}/flaky/{status}/2')
+    assert response.status_code == 200
+    assert server.counts[f'/flaky/{status}/2'] == 3
+
+
+def test_returns_last_response_when_retries_exhausted(server, client):
+    response = client.get(f'{server.url}/flaky/503/5', retries=1)
+    assert response.status_code == 503
+    assert server.counts['/flaky/503/5'] == 2
+
+
+def test_does_not_retry_client_errors(server, client):
+    assert client.get(f'{server.url}/missing').status_code == 404
+    assert server.counts['/missing'] == 1
+
+
+def test_retry_after_within_cap_is_honoured(server):
+    http = HttpClient(max_retry_after=1)
+    started = time.monotonic()
+    response = http.get(f'{server.url}/retry-after/0.2')
+    elapsed = time.monotonic() - started
+    http.close()
+    assert response.status_code == 200
+    assert 0.2 <= elapsed < 1
+
+
+def test_retry_after_above_cap_fails_fast(server):
+    http = HttpClient(max_retry_after=1)
+    started = time.monotonic()
+    response = http.get(f'{server.url}/retry-after/3600')
+    elapsed = time.monotonic() - started
+    http.close()
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '3600'
+    assert elapsed < 1
+    assert server.counts['/retry-after/3600'] == 1
+
+
+def test_retried_response_releases_connection(server, client, monkeypatch):
+    closed = []
+    original_close = requests.Response.close
+
+    def close(response):
+        closed.append(response.status_code)
+        original_close(response)
+
+    monkeypatch.setattr(requests.Response, 'close', close)
+    response = client.get(f'{server.url}/flaky/500/2', stream=True)
+    # 重試前歸還兩個失敗的回應，最後的回應留給呼叫端
+    assert response.status_code == 200
+    assert closed == [500, 500]
+    response.close()
+
+
+def test_connection_error_raises_after_retries():
+    http = HttpClient(max_retries=1, backoff_base=0.01)
+    with pytest.raises(requests.ConnectionError):
+        # discard 服務埠 (9)，本機通常沒有服務在監聽
+        http.get('http://127.0.0.1:9/', timeout=1)
+    http.close()
+
+
+@pytest.mark.skipif(not HAS_AIOHTTP, reason='需要 aiohttp')
+def test_first_ok_many_prefers_candidate_order(server):
+    url = server.url
+    candidate_lists = [
+        # 優先的候選較慢仍應勝出
+        [f'{url}/slow/0.2', f'{url}/ok'],
+        [f'{url}/missing', None, f'{url}/ok'],
+        [f'{url}/missing', f'{url}/flaky/503/1'],
+        [f'{url}/missing', None],
+        [],
+    ]
+    hits = run_first_ok_many(candidate_lists, backoff_base=0.01)
+    assert hits == [0, 2, 1, None, None]
+
+
+@pytest.mark.skipif(not HAS_AIOHTTP, reason='需要 aiohttp')
+def test_async_retry_after_above_cap_fails_fast(server):
+    started = time.monotonic()
+    hits = run_first_ok_many([[f'{server.url}/retry-after/3600']], max_retry_after=1)
+    assert hits == [None]
+    assert time.monotonic() - started < 1
+    assert server.counts['/retry-after/3600'] == 1
@@ -0,0 +1,42 @@
+"""選手名稱搜尋索引"""
+from services.name_search import BEST_MIN_SCORE, INFIX_SCORE, PREFIX_SCORE, NameSearchIndex
+
+
+def _index():
+    index = NameSearchIndex({'LIN Yun-Ju': ['林昀儒']})
+    players = ['WANG Chuqin', 'LIN Shidong', 'XU Haidong', 'LIN Yun-Ju', 'Tomokazu HARIMOTO', 'Mima ITO',
+               'MORIZONO Masataka']
+    for rank, name in enumerate(players, 1):
+        index.add('ranking', str(rank), [name], priority=rank)
+    return index
+
+
+def test_infix_matches_inside_tokens():
+    results = _index().search('dong', source='ranking', limit=None, min_score=0.5)
+    assert [r['name'] for r in results] == ['LIN Shidong', 'XU Haidong']
+    assert all(r['score'] == INFIX_SCORE for r in results)
+
+
+def test_infix_ranks_after_prefix():
+    results = _index().search('mo', limit=None)
+    assert [(r['name'], r['score']) for r in results] == [
+        ('MORIZONO Masataka', PREFIX_SCORE), ('Tomokazu HARIMOTO', INFIX_SCORE)
+    ]
+
+
+def test_best_resolves_single_typo():
+    index = _index()
+    assert index.best('Wang Chuquin')['name'] == 'WANG Chuqin'
+    assert index.best('Mima Itto')['name'] == 'Mima ITO'
+    assert index.best('Harimotto Tomokazu')['name'] == 'Tomokazu HARIMOTO'
+    assert BEST_MIN_SCORE < 0.5
+
+
+def test_best_rejects_unrelated_names():
+    assert _index().best('Ovtcharov Dimitrij') is None
+
+
+def test_aliases_and_word_order():
+    index = _index()
+    assert index.best('林昀儒')['name'] == 'LIN Yun-Ju'
+    assert index.best('Yun-Ju Lin')['score'] == 1.0
@@ -0,0 +1,63 @@
+"""快取的預測與戰術建議回傳副本，呼叫端修改不影響快取"""
+from types import SimpleNamespace
+
+import pytest
+
+from services.prediction_model import MatchPredictor, PredictionResult
+from services.response_cache import ResponseCache
+from services.tactics_advisor import MatchTactics, TacticsAdvisor
+
+
+@pytest.fixture
+def predictor(monkeypatch):
+    # 不經過 __init__，避免載入或生成比賽數據
+    predictor = MatchPredictor.__new__(MatchPredictor)
+    predictor.model_version = 0
+    predictor.data_collector = SimpleNamespace(version=0)
+    predictor.cache = ResponseCache()
+    calls = []
+
+    def _predict(player1, player2):
+        calls.append((player1, player2))
+        return PredictionResult(
+            player1=player1, player2=player2, player1_win_prob=0.6, player2_win_prob=0.4,
+            predicted_winner=player1, confidence=0.2, factors={'rank': {'diff': 3}},
+            suggested_score='4-2'
+        ), {}
+
+    monkeypatch.setattr(predictor, '_predict', _predict)
+    predictor.calls = calls
+    return predictor
+
+
+def test_predict_returns_copy_of_cached_result(predictor):
+    first = predictor.predict('WANG Chuqin', 'LIN Shidong')
+    first.predicted_winner = 'LIN Shidong'
+    first.factors['rank']['diff'] = -1
+
+    second = predictor.predict('WANG Chuqin', 'LIN Shidong')
+    assert predictor.calls == [('WANG Chuqin', 'LIN Shidong')]
+    assert second is not first
+    assert second.predicted_winner == 'WANG Chuqin'
+    assert second.factors == {'rank': {'diff': 3}}
+
+
+def test_generate_tactics_returns_copy_of_cached_result(predictor, monkeypatch):
+    advisor = TacticsAdvisor(predictor)
+    calls = []
+
+    def _generate_tactics(player, opponent):
+        calls.append((player, opponent))
+        return MatchTactics(
+            player=player, opponent=opponent, overall_strategy='穩定相持',
+            key_points=['發球搶攻'], suggestions=[], opponent_weaknesses=['反手'],
+            player_strengths=['正手'], risk_factors=[]
+        )
+
+    monkeypatch.setattr(advisor, '_generate_tactics', _generate_tactics)
+    first = advisor.generate_tactics('WANG Chuqin', 'LIN Shidong')
+    first.key_points.append('呼叫端加入的內容')
+
+    second = advisor.generate_tactics('WANG Chuqin', 'LIN Shidong')
+    assert calls == [('WANG Chuqin', 'LIN Shidong')]
+    assert second.key_points == ['發球搶攻']
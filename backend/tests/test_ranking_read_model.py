@@ -0,0 +1,78 @@
+"""排名讀取模型與排名檔案的寫入"""
+import json
+import os
+
+from crawler import TableTennisRankingCrawler
+from services.ranking_read_model import RankingReadModel
+
+
+def _write(path, content, mtime):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.utime(path, (mtime, mtime))
+
+
+def _ranking(*names):
+    return json.dumps({'data': {'Result': [{'PlayerName': name} for name in names]}})
+
+
+def test_rebuilds_only_when_file_changes(tmp_path):
+    calls = []
+    read_model = RankingReadModel(str(tmp_path), lambda data, category: calls.append(category) or data)
+    path = tmp_path / 'SEN_SINGLES.json'
+    _write(path, _ranking('WANG Chuqin'), 1000)
+
+    first = read_model.get('SEN_SINGLES')
+    assert read_model.get('SEN_SINGLES') is first and calls == ['SEN_SINGLES']
+
+    _write(path, _ranking('WANG Chuqin', 'LIN Shidong'), 2000)
+    second = read_model.get('SEN_SINGLES')
+    assert second is not first and len(second.data['data']['Result']) == 2
+    assert second.etag != first.etag
+
+
+def test_keeps_last_snapshot_when_file_is_unreadable(tmp_path):
+    read_model = RankingReadModel(str(tmp_path), lambda data, category: data)
+    path = tmp_path / 'SEN_SINGLES.json'
+    _write(path, _ranking('WANG Chuqin'), 1000)
+    good = read_model.get('SEN_SINGLES')
+
+    # 寫到一半的檔案：沿用上一個快照，不回傳 None (否則服務會同步重新抓取)
+    _write(path, '{"data": {"Result": [', 2000)
+    assert read_model.get('SEN_SINGLES') is good
+
+    # 檔案修復後重新建立
+    _write(path, _ranking('LIN Shidong'), 3000)
+    assert read_model.get('SEN_SINGLES').data['data']['Result'] == [{'PlayerName': 'LIN Shidong'}]
+
+
+def test_missing_or_unreadable_without_snapshot(tmp_path):
+    read_model = RankingReadModel(str(tmp_path), lambda data, category: data)
+    assert read_model.get('SEN_SINGLES') is None
+    _write(tmp_path / 'SEN_SINGLES.json', 'not json', 1000)
+    assert read_model.get('SEN_SINGLES') is None
+
+
+def test_save_data_replaces_file_atomically(tmp_path, monkeypatch):
+    crawler = TableTennisRankingCrawler.__new__(TableTennisRankingCrawler)
+    crawler.data_dir = str(tmp_path)
+    path = tmp_path / 'SEN_SINGLES.json'
+    _write(path, _ranking('WANG Chuqin'), 1000)
+
+    replaced = []
+    original_replace = os.replace
+
+    def replace(src, dst):
+        # 替換前目標檔仍是完整的舊內容
+        assert json.loads(path.read_text(encoding='utf-8'))['data']['Result'][0]['PlayerName'] == 'WANG Chuqin'
+        replaced.append(dst)
+        original_replace(src, dst)
+
+    monkeypatch.setattr(os, 'replace', replace)
+    crawler.save_data('SEN_SINGLES', {'Result': [{'PlayerName': 'LIN Shidong'}]})
+
+    assert replaced == [str(path)]
+    saved = json.loads(path.read_text(encoding='utf-8'))
+    assert saved['category'] == 'SEN_SINGLES'
+    assert saved['data'] == {'Result': [{'PlayerName': 'LIN Shidong'}]}
+    assert os.listdir(tmp_path) == ['SEN_SINGLES.json']
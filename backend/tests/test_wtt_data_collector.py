@@ -0,0 +1,106 @@
+"""比賽記錄的新增、增量記錄與重複比賽 ID"""
+import json
+import threading
+
+import pytest
+
+from services import wtt_data_collector
+from services.wtt_data_collector import DuplicateMatchError, MatchRecord, WTTDataCollector
+
+
+def _match(match_id='', player1='WANG Chuqin', player2='LIN Shidong', winner='player1', date='2026-01-01'):
+    return MatchRecord(
+        match_id=match_id, date=date, tournament='WTT Champions', round='Final',
+        player1_name=player1, player1_country='CHN', player1_rank=1,
+        player2_name=player2, player2_country='CHN', player2_rank=2,
+        winner=winner, score='4-2' if winner == 'player1' else '2-4', sets=[],
+        match_type='singles', gender='men'
+    )
+
+
+@pytest.fixture
+def collector(tmp_path):
+    return WTTDataCollector(str(tmp_path))
+
+
+def test_duplicate_match_id_is_rejected(collector):
+    collector.add_match(_match('M1'))
+    with pytest.raises(DuplicateMatchError):
+        collector.add_match(_match('M1', winner='player2'))
+    assert len(collector.matches) == 1
+    assert collector.get_player_rating('WANG Chuqin')['matches'] == 1
+
+
+def test_missing_match_id_gets_unused_number(collector):
+    collector.add_match(_match('USR000002'))
+    first, second = _match(), _match()
+    collector.add_match(first)
+    collector.add_match(second)
+    assert (first.match_id, second.match_id) == ('USR000003', 'USR000004')
+
+
+def test_journal_replays_after_restart(tmp_path, collector):
+    for i in range(5):
+        collector.add_match(_match(f'M{i}', winner='player1' if i % 2 else 'player2'))
+    reloaded = WTTDataCollector(str(tmp_path))
+    assert [m.match_id for m in reloaded.matches] == [m.match_id for m in collector.matches]
+    assert reloaded.h2h == collector.h2h
+    assert reloaded.ratings.players == collector.ratings.players
+    # 重新載入後仍能偵測重複
+    with pytest.raises(DuplicateMatchError):
+        reloaded.add_match(_match('M3'))
+
+
+def test_concurrent_add_match_keeps_journal_consistent(tmp_path, collector, monkeypatch):
+    monkeypatch.setattr(wtt_data_collector, 'JOURNAL_COMPACT_EVERY', 10_000)
+    players = [f'Player {i}' for i in range(6)]
+    errors = []
+
+    def worker(thread_id):
+        try:
+            for i in range(25):
+                p1, p2 = players[(thread_id + i) % 6], players[(thread_id + i + 1) % 6]
+                collector.add_match(_match('', p1, p2, winner='player1' if i % 3 else 'player2'))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(t,)) for t in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+
+    with open(collector.journal_file, encoding='utf-8') as f:
+        entries = [json.loads(line) for line in f]
+    assert [e['seq'] for e in entries] == list(range(1, 201))
+    assert len({e['match']['match_id'] for e in entries}) == 200
+    rated = sum(p.matches for p in collector.ratings.players.values()) // 2
+    assert rated == 200
+
+    # 同一天的比賽依比賽 ID 重播，順序與加入順序相同
+    reloaded = WTTDataCollector(str(tmp_path))
+    assert reloaded.ratings.players == collector.ratings.players
+    assert reloaded.h2h == collector.h2h
+
+
+def test_results_route_returns_409_for_duplicate(collector, monkeypatch):
+    flask = pytest.importorskip('flask')
+    from routes import predict_bp, predict_routes
+
+    predictor = type('Predictor', (), {'data_collector': collector})()
+    monkeypatch.setattr(predict_routes, 'get_predictor', lambda: predictor)
+    app = flask.Flask(__name__)
+    app.register_blueprint(predict_bp)
+    client = app.test_client()
+
+    body = {'player1': 'WANG Chuqin', 'player2': 'LIN Shidong', 'winner': 'WANG Chuqin',
+            'score': '4-1', 'match_id': 'WTT-2026-F1'}
+    first = client.post('/api/predict/results', json=body)
+    assert first.status_code == 200 and first.get_json()['match']['match_id'] == 'WTT-2026-F1'
+    second = client.post('/api/predict/results', json=dict(body, winner='LIN Shidong'))
+    assert second.status_code == 409
+    assert len(collector.matches) == 1
+
+    generated = client.post('/api/predict/results', json=dict(body, match_id=None))
+    assert generated.get_json()['match']['match_id'] == 'USR000002'
@@ -1,17 +1,27 @@
-import cv2
 import os
 import numpy as np
 import mediapipe as mp
-from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 import tensorflow as tf
 from tensorflow import keras
 from tensorflow.keras import layers # type: ignore
 import pickle
 
+from pose_input import PoseInputPreprocessor
+from pose_sampling import FrameSampler, extract_track
+from stroke_segmentation import group_train_test_split, resample, segment_strokes, stroke_windows
+
 class PoseFeatureExtractor:
     """從骨架影片中提取特徵"""
-    def __init__(self):
+    def __init__(self, frame_stride=1, adaptive_stride=False, max_stride=4, input_size=0, roi_crop=False):
+        """
+        Args:
+            frame_stride: 每隔幾幀執行一次姿勢估計 (其餘幀插值)
+            adaptive_stride: 依動作量自動調整間隔 (frame_stride 為最小間隔)
+            max_stride: 自動調整時的最大間隔
+            input_size: 送入姿勢估計的影像長邊 (0 表示原始解析度)
+            roi_crop: 依前一幀的骨架只裁切選手範圍
+        """
         self.mp_pose = mp.solutions.pose
         self.pose = self.mp_pose.Pose(
             min_detection_confidence=0.5,
@@ -20,6 +30,18 @@ class PoseFeatureExtractor:
         )
         # 排除臉部關鍵點（1-10），保留鼻子（0）和身體（11-32）
         self.face_landmark_indices = set(range(1, 11))
+        self.sampler = FrameSampler(frame_stride, adaptive_stride, max_stride)
+        self.preprocessor = PoseInputPreprocessor(input_size, roi_crop) if (input_size or roi_crop) else None
+    
+    def extract_sequence(self, video_path):
+        """
+        提取整段影片的骨架關鍵點 (不截斷、不填充)
+        
+        Returns:
+            tuple: (特徵 (幀數, num_landmarks, 3), 幀率)
+        """
+        track = extract_track(self.pose, video_path, self.sampler, preprocessor=self.preprocessor)
+        return track.body(), track.fps
     
     def extract_features_from_video(self, video_path, max_frames=150):
         """
@@ -32,60 +54,54 @@ class PoseFeatureExtractor:
         Returns:
             numpy array: 特徵向量 (max_frames, num_landmarks, 3)
         """
-        cap = cv2.VideoCapture(video_path)
-        features = []
-        
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            # 轉換為 RGB
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = self.pose.process(rgb_frame)
-            
-            # 提取關鍵點（只保留鼻子和身體）
-            frame_features = []
-            if results.pose_landmarks:
-                for idx, landmark in enumerate(results.pose_landmarks.landmark):
-                    if idx not in self.face_landmark_indices:
-                        frame_features.append([
-                            landmark.x,
-                            landmark.y,
-                            landmark.z
-                        ])
-            else:
-                # 如果沒有檢測到姿勢，使用零向量
-                num_landmarks = 23  # 鼻子(1) + 身體(22) = 23
-                frame_features = [[0.0, 0.0, 0.0] for _ in range(num_landmarks)]
-            
-            features.append(frame_features)
-            
-            if len(features) >= max_frames:
-                break
-        
-        cap.release()
+        # 只保留鼻子和身體；沒有檢測到姿勢的幀為零向量
+        features = extract_track(self.pose, video_path, self.sampler, max_frames, self.preprocessor).body()
         
         # 如果影片太短，用最後一幀填充
-        while len(features) < max_frames:
-            if features:
-                features.append(features[-1])
-            else:
-                num_landmarks = 23
-                features.append([[0.0, 0.0, 0.0] for _ in range(num_landmarks)])
-        
-        return np.array(features[:max_frames])
+        if len(features) == 0:
+            num_landmarks = 23  # 鼻子(1) + 身體(22) = 23
+            return np.zeros((max_frames, num_landmarks, 3), dtype=np.float32)
+        if len(features) < max_frames:
+            padding = np.repeat(features[-1:], max_frames - len(features), axis=0)
+            features = np.concatenate([features, padding])
+        
+        return features[:max_frames]
 
 
 class VideoClassifier:
     """影片分類器"""
-    def __init__(self):
+    def __init__(self, segment_strokes=True):
+        """
+        Args:
+            segment_strokes: 是否以每一拍為中心切出樣本 (否則整段影片截斷/填充為 150 幀)
+        """
         self.model = None
         self.scaler = None
         self.feature_extractor = PoseFeatureExtractor()
         self.classes = ['bad', 'normal', 'good']
         self.max_frames = 150
         self.num_landmarks = 23  # 鼻子(1) + 身體(22)
+        self.segment_strokes = segment_strokes
+    
+    def extract_samples(self, video_path):
+        """
+        將影片轉為模型輸入樣本
+        
+        Returns:
+            tuple: (樣本 (數量, max_frames, num_landmarks, 3), 各拍範圍)；
+                   偵測不到揮拍或未啟用分段時為整段影片的單一樣本
+        """
+        if not self.segment_strokes:
+            features = self.feature_extractor.extract_features_from_video(video_path, self.max_frames)
+            return features[np.newaxis], []
+        
+        sequence, fps = self.feature_extractor.extract_sequence(video_path)
+        if len(sequence) == 0:
+            return np.zeros((1, self.max_frames, self.num_landmarks, 3), dtype=np.float32), []
+        strokes = segment_strokes(sequence, fps=fps)
+        if strokes:
+            return stroke_windows(sequence, strokes, self.max_frames), strokes
+        return resample(sequence, self.max_frames)[np.newaxis], []
     
     def load_data(self, data_folders):
         """
@@ -97,9 +113,11 @@ class VideoClassifier:
         Returns:
             X: 特徵數據
             y: 標籤
+            groups: 各樣本的來源影片 (分割訓練/驗證集時同一影片不拆開)
         """
         X = []
         y = []
+        groups = []
         
         for label, folder_path in data_folders.items():
             if not os.path.exists(folder_path):
@@ -115,12 +133,11 @@ class VideoClassifier:
             for filename in video_files:
                 video_path = os.path.join(folder_path, filename)
                 try:
-                    features = self.feature_extractor.extract_features_from_video(
-                        video_path, self.max_frames
-                    )
-                    X.append(features)
-                    y.append(self.classes.index(label))
-                    print(f"  已載入: {filename}")
+                    samples, strokes = self.extract_samples(video_path)
+                    X.extend(samples)
+                    y.extend([self.classes.index(label)] * len(samples))
+                    groups.extend([video_path] * len(samples))
+                    print(f"  已載入: {filename}" + (f" ({len(strokes)} 拍)" if strokes else ""))
                 except Exception as e:
                     print(f"  錯誤：無法載入 {filename}: {e}")
         
@@ -130,11 +147,11 @@ class VideoClassifier:
         X = np.array(X)
         y = np.array(y)
         
-        print(f"\n總共載入 {len(X)} 個影片")
+        print(f"\n總共載入 {len(X)} 個樣本")
         print(f"特徵形狀: {X.shape}")
         print(f"標籤分布: {np.bincount(y)}")
         
-        return X, y
+        return X, y, np.array(groups)
     
     def build_model(self, input_shape):
         """建立 LSTM 模型"""
@@ -180,7 +197,7 @@ class VideoClassifier:
         print("=" * 50)
         
         # 載入資料
-        X, y = self.load_data(data_folders)
+        X, y, groups = self.load_data(data_folders)
         
         # 資料預處理：標準化
         # 將 (samples, frames, landmarks, 3) 重塑為 (samples, frames, landmarks*3)
@@ -193,9 +210,9 @@ class VideoClassifier:
             self.scaler.fit_transform(sample) for sample in X_reshaped
         ])
         
-        # 分割訓練集和驗證集
-        X_train, X_val, y_train, y_val = train_test_split(
-            X_scaled, y, test_size=validation_split, random_state=42, stratify=y
+        # 以影片為單位分割訓練集和驗證集 (同一影片的各拍不會同時出現在兩邊)
+        X_train, X_val, y_train, y_val = group_train_test_split(
+            X_scaled, y, groups, test_size=validation_split, random_state=42
         )
         
         print(f"\n訓練集大小: {X_train.shape}")
@@ -263,40 +280,46 @@ class VideoClassifier:
             video_path: 影片路徑
         
         Returns:
-            dict: 包含預測類別和機率
+            dict: 包含預測類別和機率 (各拍機率的平均)，分段時另含每一拍的結果
         """
         if self.model is None:
             raise ValueError("模型尚未載入！請先訓練或載入模型。")
         
-        # 提取特徵
-        features = self.feature_extractor.extract_features_from_video(
-            video_path, self.max_frames
-        )
+        # 提取特徵 (每一拍一個樣本)
+        samples, strokes = self.extract_samples(video_path)
         
         # 預處理
-        n_frames, n_landmarks, n_coords = features.shape
-        features_reshaped = features.reshape(1, n_frames, n_landmarks * n_coords)
+        n_samples, n_frames, n_landmarks, n_coords = samples.shape
+        features_reshaped = samples.reshape(n_samples, n_frames, n_landmarks * n_coords)
         features_scaled = np.array([
             self.scaler.transform(sample) for sample in features_reshaped
         ])
         
-        # 預測
+        # 預測 (所有拍一次送入模型)
         predictions = self.model.predict(features_scaled, verbose=0)
-        predicted_class_idx = np.argmax(predictions[0])
+        mean_prediction = predictions.mean(axis=0)
+        predicted_class_idx = np.argmax(mean_prediction)
         predicted_class = self.classes[predicted_class_idx]
-        confidence = predictions[0][predicted_class_idx]
+        confidence = mean_prediction[predicted_class_idx]
         
         # 所有類別的機率
         probabilities = {
-            self.classes[i]: float(predictions[0][i])
+            self.classes[i]: float(mean_prediction[i])
             for i in range(len(self.classes))
         }
         
-        return {
+        result = {
             'predicted_class': predicted_class,
             'confidence': float(confidence),
             'probabilities': probabilities
         }
+        if strokes:
+            result['strokes'] = [
+                dict(stroke.to_dict(), predicted_class=self.classes[int(np.argmax(pred))],
+                     confidence=float(np.max(pred)))
+                for stroke, pred in zip(strokes, predictions)
+            ]
+        return result
 
 
 def main():
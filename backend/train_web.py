@@ -5,7 +5,6 @@
 import numpy as np
 import os
 import glob
-from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 import tensorflow as tf
 from tensorflow.keras.models import Sequential
@@ -15,6 +14,7 @@ from tensorflow.keras.optimizers import Adam
 import joblib
 from datetime import datetime
 from skeleton import PoseExtractor
+from stroke_segmentation import group_train_test_split, resample, segment_strokes, stroke_windows
 
 
 class TrainingProgressCallback(Callback):
@@ -44,15 +44,29 @@ class TrainingProgressCallback(Callback):
 
 
 def load_training_data():
-    """載入訓練資料"""
+    """
+    載入訓練資料
+    
+    Returns:
+        (樣本, 標籤, 各樣本來源影片)；同一影片的各拍需分在同一邊
+    """
     X_data = []
     y_data = []
+    groups = []
     
     # 定義類別對應
     class_map = {'good': 0, 'normal': 1, 'bad': 2}
     
-    # 初始化骨架提取器
-    pose_extractor = PoseExtractor()
+    # 初始化骨架提取器 (依設定抽幀)
+    from config import get_config
+    ai_config = get_config().ai
+    pose_extractor = PoseExtractor(
+        frame_stride=ai_config.POSE_FRAME_STRIDE,
+        adaptive_stride=ai_config.POSE_ADAPTIVE_STRIDE,
+        max_stride=ai_config.POSE_MAX_STRIDE,
+        input_size=ai_config.POSE_INPUT_SIZE,
+        roi_crop=ai_config.POSE_ROI_CROP
+    )
     
     # 掃描各個類別的影片資料夾
     for class_name, class_id in class_map.items():
@@ -68,29 +82,15 @@ def load_training_data():
         
         for video_path in video_files:
             try:
-                # 提取骨架特徵（返回字典列表）
-                pose_data = pose_extractor.extract_pose_data(video_path)
-                
-                if pose_data is None or len(pose_data) == 0:
-                    print(f"警告：{video_path} 未提取到骨架資料")
-                    continue
-                
-                # 將骨架資料轉換為數值陣列
-                landmarks_array = []
-                for frame_data in pose_data:
-                    if frame_data['landmarks'] is not None:
-                        frame_landmarks = []
-                        for lm in frame_data['landmarks']:
-                            # 只使用 x, y, z 座標（忽略 visibility）
-                            frame_landmarks.extend([lm['x'], lm['y'], lm['z']])
-                        landmarks_array.append(frame_landmarks)
+                # 提取骨架 ((幀, 33, 4) 陣列與是否偵測到人的遮罩)
+                skeleton = pose_extractor.extract_skeleton(video_path)
                 
+                # 只使用偵測到人的幀，x, y, z 座標（忽略 visibility）
+                landmarks_array = skeleton.body()[np.asarray(skeleton.present)]
                 if len(landmarks_array) == 0:
                     print(f"警告：{video_path} 未偵測到有效幀")
                     continue
-                
-                # 轉換為 numpy 陣列
-                landmarks_array = np.array(landmarks_array)
+                landmarks_array = landmarks_array.reshape(len(landmarks_array), -1)
                 
                 # 標準化為 150 幀 × 69 特徵（23 個關鍵點 × 3 座標）
                 # MediaPipe Pose 有 33 個關鍵點，排除臉部後剩 23 個
@@ -102,22 +102,18 @@ def load_training_data():
                     print(f"警告：{video_path} 特徵維度不符 ({landmarks_array.shape[1]} != {target_features})，跳過")
                     continue
                 
-                # 重新採樣到 150 幀
-                if landmarks_array.shape[0] != target_frames:
-                    # 使用線性插值重新採樣
-                    original_frames = landmarks_array.shape[0]
-                    resampled = np.zeros((target_frames, target_features))
-                    
-                    for feature_idx in range(target_features):
-                        resampled[:, feature_idx] = np.interp(
-                            np.linspace(0, original_frames - 1, target_frames),
-                            np.arange(original_frames),
-                            landmarks_array[:, feature_idx]
-                        )
-                    landmarks_array = resampled
+                # 每一拍各自成為一個樣本 (重新採樣到 150 幀)；
+                # 偵測不到揮拍時沿用整段影片
+                strokes = segment_strokes(landmarks_array, fps=skeleton.fps)
+                if strokes:
+                    samples = stroke_windows(landmarks_array, strokes, target_frames)
+                else:
+                    samples = [resample(landmarks_array, target_frames)]
                 
-                X_data.append(landmarks_array)
-                y_data.append(class_id)
+                for sample in samples:
+                    X_data.append(sample)
+                    y_data.append(class_id)
+                    groups.append(video_path)
                 
             except Exception as e:
                 print(f"處理影片 {video_path} 時出錯: {e}")
@@ -129,7 +125,7 @@ def load_training_data():
         raise ValueError("未找到任何訓練資料，請確認影片資料夾是否存在且包含有效影片")
     
     print(f"成功載入 {len(X_data)} 個訓練樣本")
-    return np.array(X_data), np.array(y_data)
+    return np.array(X_data), np.array(y_data), np.array(groups)
 
 
 def create_model_basic(input_shape=(150, 69), num_classes=3):
@@ -175,6 +171,45 @@ def create_model_deep(input_shape=(150, 69), num_classes=3):
     return model
 
 
+def export_model(model, model_path, X_train, X_test, quantization, task_id, training_tasks):
+    """
+    匯出 model_path 同名的 .tflite 並與 Keras 比對輸出
+    
+    Args:
+        quantization: none / dynamic / int8；None 時使用 CLASSIFIER_EXPORT_QUANTIZATION，空字串表示不匯出
+    
+    Returns:
+        匯出結果 (路徑、大小、比對結果)；未匯出或失敗時為 None
+    """
+    from config import get_config
+    from model_export import export_classifier
+    
+    if quantization is None:
+        quantization = get_config().ai.CLASSIFIER_EXPORT_QUANTIZATION
+    if not quantization:
+        return None
+    
+    training_tasks[task_id]['message'] = '正在匯出 TFLite 模型...'
+    try:
+        result = export_classifier(model, model_path, X_test, quantization, representative_data=X_train)
+    except Exception as e:
+        training_tasks[task_id]['logs'].append(f'⚠️  TFLite 匯出失敗，即時分析將使用 .h5: {e}')
+        return None
+    
+    parity = result['parity']
+    training_tasks[task_id]['logs'].append(
+        f"   TFLite 比對 ({parity['samples']} 筆): 最大差異 {parity['max_abs_diff']:.2e}，"
+        f"預測一致 {parity['agreement']:.1%}"
+    )
+    if result['passed']:
+        training_tasks[task_id]['logs'].append(
+            f"✅ TFLite 模型已匯出至: {result['path']} ({quantization}, {result['size_bytes'] / 1024:.0f} KB)"
+        )
+    else:
+        training_tasks[task_id]['logs'].append('⚠️  TFLite 輸出與 Keras 差異過大，已移除匯出檔，即時分析將使用 .h5')
+    return result
+
+
 def train_model(config, task_id, training_tasks):
     """
     執行模型訓練
@@ -194,7 +229,7 @@ def train_model(config, task_id, training_tasks):
         training_tasks[task_id]['message'] = '正在載入訓練資料...'
         training_tasks[task_id]['logs'].append('📂 載入訓練資料...')
         
-        X_data, y_data = load_training_data()
+        X_data, y_data, groups = load_training_data()
         
         training_tasks[task_id]['logs'].append(f'✅ 載入完成：共 {len(X_data)} 個樣本')
         training_tasks[task_id]['logs'].append(f'   - Good: {np.sum(y_data == 0)} 個')
@@ -235,11 +270,14 @@ def train_model(config, task_id, training_tasks):
         else:
             test_size = 0.2   # 正常情況用 20%
         
-        X_train, X_test, y_train, y_test = train_test_split(
-            X_data, y_data, test_size=test_size, stratify=y_data, random_state=42
+        # 以影片為單位分割，同一影片的各拍不會同時出現在訓練集與測試集
+        X_train, X_test, y_train, y_test = group_train_test_split(
+            X_data, y_data, groups, test_size=test_size, random_state=42
         )
         
-        training_tasks[task_id]['logs'].append(f'✅ 訓練集: {len(X_train)} 樣本，測試集: {len(X_test)} 樣本')
+        training_tasks[task_id]['logs'].append(
+            f'✅ 訓練集: {len(X_train)} 樣本，測試集: {len(X_test)} 樣本 (共 {len(set(groups))} 部影片)'
+        )
         
         # 3. 標準化
         training_tasks[task_id]['message'] = '正在標準化特徵...'
@@ -305,6 +343,10 @@ def train_model(config, task_id, training_tasks):
         model.save(model_path)
         training_tasks[task_id]['logs'].append(f'✅ 模型已儲存至: {model_path}')
         
+        # 9. 匯出 TFLite (即時推論不需載入 TensorFlow)，失敗時仍保留 .h5
+        export_result = export_model(model, model_path, X_train, X_test,
+                                     config.get('export_quantization'), task_id, training_tasks)
+        
         # 計算訓練時間
         end_time = datetime.now()
         training_time = str(end_time - start_time).split('.')[0]  # 移除微秒
@@ -320,7 +362,8 @@ def train_model(config, task_id, training_tasks):
             'total_samples': len(X_data),
             'train_samples': len(X_train),
             'test_samples': len(X_test),
-            'model_params': int(total_params)
+            'model_params': int(total_params),
+            'export': export_result
         }
         
     except Exception as e:
@@ -4,9 +4,11 @@ YouTube 比賽分析模組
 """
 import os
 import re
+import json
+import time
 import tempfile
 import subprocess
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, Callable, Iterable, List, Tuple
 from pathlib import Path
 
 
@@ -202,12 +204,101 @@ class YouTubeDownloader:
 
 
 
+# 分析提示詞範本版本，修改提示詞結構或解析方式時遞增，讓快取的舊回應失效
+MATCH_PROMPT_VERSION = 'match-v1'
+MATCH_CHUNK_PROMPT_VERSION = 'match-chunk-v1'
+
+# 分段分析：每段失敗後的重試次數與第一次重試前的等待秒數 (之後加倍)
+CHUNK_RETRIES = 2
+CHUNK_RETRY_BACKOFF = 2.0
+
+# 分段分析時附加在提示詞後的區段說明
+CHUNK_PROMPT_SUFFIX = """
+## 🧩 分段分析說明
+
+這段影片是整場比賽中 {start:.0f} 秒到 {end:.0f} 秒的片段 (長度 {length:.0f} 秒)。
+1. 所有時間戳請以**這段影片的開頭為 0 秒**標記，不要加上原始比賽的時間。
+2. 影片開頭或結尾被截斷、看不到完整過程的回合請略過，相鄰片段會完整涵蓋。
+3. 比分請以這段影片最後可見的比分填寫 score_summary。
+"""
+
+
+def _strip_code_fence(text: str) -> str:
+    """移除模型回應中可能的 markdown 代碼塊標記"""
+    text = text.strip()
+    if text.startswith('```json'):
+        text = text[7:]
+    if text.startswith('```'):
+        text = text[3:]
+    if text.endswith('```'):
+        text = text[:-3]
+    return text.strip()
+
+
+def _to_seconds(value: Any) -> Optional[float]:
+    """將模型回傳的時間 (數字或數字字串) 轉為秒數"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _same_rally(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    """兩個相鄰區段回報的回合是否為同一回合 (開始時間相近或時間範圍大半重疊)"""
+    a_start, b_start = _to_seconds(a.get('start_seconds')), _to_seconds(b.get('start_seconds'))
+    if abs(a_start - b_start) <= 3.0:
+        return True
+    a_end = _to_seconds(a.get('end_seconds')) or a_start
+    b_end = _to_seconds(b.get('end_seconds')) or b_start
+    overlap = min(a_end, b_end) - max(a_start, b_start)
+    union = max(a_end, b_end) - min(a_start, b_start)
+    return union > 0 and overlap / union >= 0.5
+
+
+def _join_unique(values: Iterable[Any]) -> str:
+    """合併各區段的文字欄位，略過空白與重複內容"""
+    seen = []
+    for value in values:
+        if value and str(value) not in seen:
+            seen.append(str(value))
+    return '\n'.join(seen)
+
+
+def _merge_player_analysis(analyses: List[Tuple[Dict[str, Any], float]]) -> Dict[str, Any]:
+    """
+    合併各區段的選手分析
+    
+    評分依區段長度加權平均；優缺點與建議取聯集並依標題去重
+    """
+    merged = dict(analyses[0][0])
+    totals: Dict[str, List[float]] = {}
+    for analysis, weight in analyses:
+        for key, value in (analysis.get('ratings') or {}).items():
+            score = _to_seconds(value)
+            if score is not None:
+                acc = totals.setdefault(key, [0.0, 0.0])
+                acc[0] += score * weight
+                acc[1] += weight
+    merged['ratings'] = {key: round(total / weight, 1) for key, (total, weight) in totals.items() if weight}
+    
+    for key in ('strengths', 'weaknesses', 'suggestions'):
+        items, titles = [], set()
+        for analysis, _ in analyses:
+            for item in analysis.get(key) or []:
+                title = item.get('title') if isinstance(item, dict) else item
+                if title not in titles:
+                    titles.add(title)
+                    items.append(item)
+        merged[key] = items
+    return merged
+
+
 class MatchAnalyzer:
     """比賽分析器 - 使用 Gemini AI 分析比賽影片"""
     
     def __init__(self, api_key: str = None):
-        import google.generativeai as genai
         from dotenv import load_dotenv
+        from services.gemini_gateway import get_gemini_gateway
         
         load_dotenv()
         self.api_key = api_key or os.getenv('GEMINI_API_KEY')
@@ -215,8 +306,8 @@ class MatchAnalyzer:
         if not self.api_key:
             raise ValueError("需要 GEMINI_API_KEY")
         
-        genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel('gemini-3.0-pro-preview')
+        # 經由共用閘道呼叫 (統一配額與排程)
+        self.model = get_gemini_gateway(self.api_key).model('gemini-3.0-pro-preview')
     
     def analyze_match(self, video_path: str, player_focus: str = None, player2_focus: str = None, description1: str = None, description2: str = None) -> Dict[str, Any]:
         """
@@ -232,41 +323,49 @@ class MatchAnalyzer:
         Returns:
             分析結果
         """
-        import google.generativeai as genai
-        
-        print(f"📹 正在上傳影片: {video_path}")
-        
-        # 上傳影片到 Gemini
-        video_file = genai.upload_file(path=video_path)
-        
-        # 等待處理完成
-        import time
-        while video_file.state.name == "PROCESSING":
-            print("⏳ 處理中...")
-            time.sleep(5)
-            video_file = genai.get_file(video_file.name)
-        
-        if video_file.state.name == "FAILED":
-            raise RuntimeError("影片處理失敗")
-        
-        print("🤖 正在分析比賽...")
+        from services.gemini_cache import get_gemini_cache
+        from services.gemini_files import get_gemini_file_manager
+        from services.media_prep import prepare_media
         
         # 建立分析提示
         prompt = self._build_analysis_prompt(player_focus, player2_focus, description1, description2)
+        generation_config = {
+            "max_output_tokens": 8192,
+            "temperature": 0.4,
+        }
         
-        # 呼叫 Gemini 分析
-        response = self.model.generate_content(
-            [video_file, prompt],
-            generation_config={
-                "max_output_tokens": 8192,
-                "temperature": 0.4,
-            }
-        )
+        # 相同影片內容與提示詞已分析過時，直接使用快取的回應
+        cache = get_gemini_cache()
+        cache_key = cache.make_key(self.model, MATCH_PROMPT_VERSION, prompt,
+                                   media=[video_path], generation_config=generation_config)
+        response_text = cache.get(cache_key)
+        
+        if response_text is not None:
+            print("⚡ 使用快取的分析結果")
+        else:
+            # 上傳影片到 Gemini (同一影片的其他分析會沿用已上傳的檔案)
+            with prepare_media(video_path) as prepared_path, \
+                    get_gemini_file_manager().acquire(prepared_path) as video_file:
+                print("🤖 正在分析比賽...")
+                
+                # 呼叫 Gemini 分析
+                response = self.model.generate_content(
+                    [video_file, prompt],
+                    generation_config=generation_config
+                )
+                response_text = response.text
         
         # 解析回應
-        analysis = self._parse_response(response.text)
+        analysis = self._parse_response(response_text)
+        # 無法解析為 JSON 的回應不快取，下次重新分析
+        if analysis.get('structured_data') is not None:
+            cache.put(cache_key, response_text, self.model, MATCH_PROMPT_VERSION)
         
-        # 切割影片片段
+        self._cut_point_clips(video_path, analysis)
+        return analysis
+    
+    def _cut_point_clips(self, video_path: str, analysis: Dict[str, Any]):
+        """依分析結果的時間戳從原始影片切割得分/失分片段"""
         print(f"🎬 開始切割影片片段，來源: {video_path}")
         try:
             video_filename = os.path.basename(video_path)
@@ -321,15 +420,221 @@ class MatchAnalyzer:
             print(f"⚠️ 切割片段時發生錯誤: {e}")
             import traceback
             traceback.print_exc()
+    
+    def analyze_match_chunked(
+        self,
+        video_path: str,
+        player_focus: str = None,
+        player2_focus: str = None,
+        description1: str = None,
+        description2: str = None,
+        duration: float = None,
+        on_chunk: Callable[[Dict[str, Any]], None] = None
+    ) -> Dict[str, Any]:
+        """
+        分段分析長比賽影片
         
-        # 清理上傳的檔案
-        try:
-            genai.delete_file(video_file.name)
-        except:
-            pass
+        影片切成互相重疊的時間區段並行分析 (同時進行的數量有上限)，
+        每段各自重試，完成後依時間偏移合併回合並去除重疊區的重複回合；
+        部分區段失敗時仍回傳其餘區段的結果
+        
+        Args:
+            video_path: 影片檔案路徑
+            player_focus: 關注選手/選手1
+            player2_focus: 選手2 (可選)
+            description1: 選手1 特徵描述
+            description2: 選手2 特徵描述
+            duration: 影片長度 (秒)，未提供時以 ffprobe 取得
+            on_chunk: 每段完成時的回呼，參數為 {'index', 'total', 'start', 'end', 'status', 'points', 'error'}
+            
+        Returns:
+            分析結果 (格式同 analyze_match，另含 chunks 與 failed_chunks)
+        """
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        from config import get_config
+        from services.media_prep import get_media_preparer, probe_duration
+        
+        ai_config = get_config().ai
+        chunk_seconds = ai_config.MATCH_CHUNK_SECONDS
+        overlap = ai_config.MATCH_CHUNK_OVERLAP_SECONDS
+        duration = duration or probe_duration(video_path)
+        
+        # 影片不長、無法取得長度或無法切割時，整段分析
+        if (not chunk_seconds or not duration or duration <= chunk_seconds + overlap
+                or not get_media_preparer().has_ffmpeg):
+            return self.analyze_match(video_path, player_focus, player2_focus, description1, description2)
+        
+        windows = self._chunk_windows(duration, chunk_seconds, overlap)
+        base_prompt = self._build_analysis_prompt(player_focus, player2_focus, description1, description2)
+        print(f"🧩 分段分析: {len(windows)} 段 (每段 {chunk_seconds}s，重疊 {overlap}s)")
         
+        results: List[Optional[Dict[str, Any]]] = [None] * len(windows)
+        failed = []
+        with ThreadPoolExecutor(max_workers=max(ai_config.MATCH_CHUNK_WORKERS, 1)) as executor:
+            futures = {
+                executor.submit(self._analyze_chunk, video_path, base_prompt, start, end): index
+                for index, (start, end) in enumerate(windows)
+            }
+            for future in as_completed(futures):
+                index = futures[future]
+                start, end = windows[index]
+                event = {'index': index, 'total': len(windows), 'start': start, 'end': end}
+                try:
+                    results[index] = future.result()
+                    event.update(status='done', points=results[index].get('points', []))
+                    print(f"  ✅ 區段 {index + 1}/{len(windows)} 完成 ({start:.0f}s - {end:.0f}s)")
+                except Exception as e:
+                    failed.append({'start': start, 'end': end, 'error': str(e)})
+                    event.update(status='failed', points=[], error=str(e))
+                    print(f"  ❌ 區段 {index + 1}/{len(windows)} 失敗: {e}")
+                if on_chunk:
+                    on_chunk(event)
+        
+        completed = [(windows[i], r) for i, r in enumerate(results) if r is not None]
+        if not completed:
+            raise RuntimeError(f"所有區段分析皆失敗: {failed[0]['error']}")
+        
+        analysis = self._build_analysis(self._merge_chunks(completed))
+        analysis['chunks'] = [{'start': start, 'end': end} for start, end in windows]
+        analysis['failed_chunks'] = sorted(failed, key=lambda f: f['start'])
+        self._cut_point_clips(video_path, analysis)
         return analysis
     
+    @staticmethod
+    def _chunk_windows(duration: float, chunk_seconds: float, overlap: float) -> List[Tuple[float, float]]:
+        """切出互相重疊 overlap 秒的時間區段，最後一段不足一半時併入前一段"""
+        step = max(chunk_seconds - overlap, 1)
+        windows = []
+        start = 0.0
+        while start < duration:
+            end = min(start + chunk_seconds, duration)
+            if windows and end - start < chunk_seconds / 2 and end >= duration:
+                windows[-1] = (windows[-1][0], duration)
+                break
+            windows.append((start, end))
+            if end >= duration:
+                break
+            start += step
+        return windows
+    
+    def _analyze_chunk(self, video_path: str, base_prompt: str, start: float, end: float) -> Dict[str, Any]:
+        """
+        分析單一區段，失敗時自行重試
+        
+        Returns:
+            模型回傳的 JSON (時間戳已換算為整場影片的時間)
+        """
+        from services.gemini_cache import get_gemini_cache
+        from services.gemini_files import get_gemini_file_manager
+        from services.media_prep import get_media_preparer
+        
+        prompt = base_prompt + CHUNK_PROMPT_SUFFIX.format(start=start, end=end, length=end - start)
+        generation_config = {
+            "max_output_tokens": 8192,
+            "temperature": 0.4,
+        }
+        cache = get_gemini_cache()
+        
+        last_error = None
+        for attempt in range(CHUNK_RETRIES + 1):
+            if attempt:
+                time.sleep(CHUNK_RETRY_BACKOFF * 2 ** (attempt - 1))
+            try:
+                # 區段檔案在使用完畢前持有租約，其他區段轉檔觸發的快取清除不會刪除它
+                with get_media_preparer().prepare_window(video_path, start, end - start) as chunk_path:
+                    cache_key = cache.make_key(self.model, MATCH_CHUNK_PROMPT_VERSION, prompt,
+                                               media=[chunk_path], generation_config=generation_config)
+                    response_text = cache.get(cache_key)
+                    if response_text is None:
+                        with get_gemini_file_manager().acquire(chunk_path) as chunk_file:
+                            response_text = self.model.generate_content(
+                                [chunk_file, prompt],
+                                generation_config=generation_config
+                            ).text
+                parsed = json.loads(_strip_code_fence(response_text))
+                cache.put(cache_key, response_text, self.model, MATCH_CHUNK_PROMPT_VERSION)
+                return self._offset_chunk(parsed, start, end)
+            except Exception as e:
+                last_error = e
+                print(f"  ⚠️ 區段 {start:.0f}s 第 {attempt + 1} 次分析失敗: {e}")
+        raise last_error
+    
+    @staticmethod
+    def _offset_chunk(parsed: Dict[str, Any], start: float, end: float) -> Dict[str, Any]:
+        """將區段內的相對時間戳換算為整場影片的時間，並記錄離區段邊界的距離"""
+        for key in ('points', 'point_wins', 'point_losses'):
+            for point in parsed.get(key) or []:
+                for field in ('serve_time', 'dead_ball_time', 'start_seconds', 'end_seconds', 'replay_start_seconds'):
+                    value = _to_seconds(point.get(field))
+                    if value is not None:
+                        point[field] = round(value + start, 2)
+                begin = _to_seconds(point.get('start_seconds'))
+                if begin is not None:
+                    point['timestamp_display'] = f"{int(begin // 60):02d}:{int(begin % 60):02d}"
+                    finish = _to_seconds(point.get('end_seconds')) or begin
+                    # 離區段邊界越遠，越不可能是被切斷的回合
+                    point['_margin'] = min(begin - start, end - finish)
+        return parsed
+    
+    @staticmethod
+    def _merge_chunks(completed: List[Tuple[Tuple[float, float], Dict[str, Any]]]) -> Dict[str, Any]:
+        """
+        合併各區段的分析結果
+        
+        重疊區中開始時間相近或時間範圍大半重疊的回合視為同一回合，
+        保留離所屬區段邊界較遠 (較完整) 的那一筆
+        """
+        merged: Dict[str, Any] = {}
+        for key in ('points', 'point_wins', 'point_losses'):
+            candidates = []
+            for index, (_, parsed) in enumerate(completed):
+                for point in parsed.get(key) or []:
+                    if _to_seconds(point.get('start_seconds')) is not None:
+                        candidates.append((index, point))
+            if not candidates:
+                continue
+            candidates.sort(key=lambda c: _to_seconds(c[1]['start_seconds']))
+            
+            kept: List[Tuple[int, Dict[str, Any]]] = []
+            for index, point in candidates:
+                if kept and kept[-1][0] != index and _same_rally(kept[-1][1], point):
+                    if point.get('_margin', 0) > kept[-1][1].get('_margin', 0):
+                        kept[-1] = (index, point)
+                    continue
+                kept.append((index, point))
+            
+            points = []
+            for number, (_, point) in enumerate(kept, start=1):
+                point = {k: v for k, v in point.items() if k != '_margin'}
+                point['id'] = number
+                points.append(point)
+            merged[key] = points
+        
+        parts = [parsed for _, parsed in completed]
+        weights = [end - start for (start, end), _ in completed]
+        for player_key in ('player1_analysis', 'player2_analysis'):
+            analyses = [(p.get(player_key), w) for p, w in zip(parts, weights) if p.get(player_key)]
+            if analyses:
+                merged[player_key] = _merge_player_analysis(analyses)
+        
+        overviews = [p.get('match_overview') or {} for p in parts]
+        overview = dict(overviews[0])
+        # 比分以最後一段為準，其餘文字欄位合併
+        overview['score_summary'] = next(
+            (o.get('score_summary') for o in reversed(overviews) if o.get('score_summary')),
+            overview.get('score_summary')
+        )
+        overview['key_moments'] = _join_unique(o.get('key_moments') for o in overviews)
+        overview['total_points_analyzed'] = len(merged.get('points', [])) or overview.get('total_points_analyzed')
+        merged['match_overview'] = overview
+        
+        summaries = [p.get('summary') or {} for p in parts]
+        merged['summary'] = {
+            field: _join_unique(s.get(field) for s in summaries)
+            for field in ('overall_assessment', 'tactical_analysis', 'encouragement', 'main_issue')
+        }
+        return merged
+    
     def _build_analysis_prompt(self, player_focus: str = None, player2_focus: str = None, description1: str = None, description2: str = None) -> str:
         """建立分析提示詞"""
         
@@ -519,112 +824,10 @@ class MatchAnalyzer:
 
     def _parse_response(self, response_text: str) -> Dict[str, Any]:
         """解析 Gemini 回應"""
-        import json
-        
         # 嘗試從回應中提取 JSON
         try:
-            # 移除可能的 markdown 代碼塊標記
-            clean_text = response_text.strip()
-            if clean_text.startswith('```json'):
-                clean_text = clean_text[7:]
-            if clean_text.startswith('```'):
-                clean_text = clean_text[3:]
-            if clean_text.endswith('```'):
-                clean_text = clean_text[:-3]
-            clean_text = clean_text.strip()
-            
-            # 解析 JSON
-            parsed = json.loads(clean_text)
-            
-            # --- 相容性轉換 ---
-            # 新版 Prompt 回傳 'points' 列表，需轉換為舊版的 point_wins / point_losses
-            # 這裡假設如果沒有特別指定 player_focus，則第一位選手或者 winner 是 '關注選手' 為 Win
-            
-            point_wins = []
-            point_losses = []
-            
-            if 'points' in parsed:
-                # 新版結構
-                for p in parsed['points']:
-                    # 簡易判斷：如果沒有明確指定 player_focus，我們暫時無法精確區分
-                    # 但通常前端會傳入 player_focus。
-                    # 這裡我們將所有 points 都保留，但在前端顯示時可能需要過濾。
-                    # 為相容舊版，直接轉換欄位
-                    
-                    # 暫時將所有點都放入 wins/losses，這取決於 winner 欄位
-                    # 但這裏我們不知道 "Player 1" 是誰，除非我們有 context。
-                    # 不過，我們可以直接把 'points' 傳回去，讓前端處理。
-                    # 為了舊版相容，我們嘗試轉換：
-                    
-                    winner = p.get('winner', '')
-                    # 假設主要關注的是 player1_analysis 中的 name
-                    p1_name = parsed.get('player1_analysis', {}).get('name', '')
-                    
-                    base_point = {
-                        "id": p.get('id'),
-                        "start_seconds": p.get('start_seconds'),
-                        "end_seconds": p.get('end_seconds'),
-                        "timestamp_display": p.get('timestamp_display'),
-                        "description": p.get('description'),
-                        "serve_time": p.get('serve_time'),
-                        "dead_ball_time": p.get('dead_ball_time'),
-                        "winner": winner
-                    }
-                    
-                    # 判斷是 Win 還是 Loss (相對於 Player 1)
-                    # 如果 winner 包含 p1_name (模糊比對)
-                    is_p1_win = False
-                    if p1_name and p1_name in winner:
-                        is_p1_win = True
-                    elif "選手A" in winner: # Default name
-                        is_p1_win = True
-                    
-                    if is_p1_win:
-                        win_point = base_point.copy()
-                        win_point['win_type'] = p.get('win_reason', '得分')
-                        win_point['key_technique'] = p.get('key_technique')
-                        win_point['tactical_value'] = p.get('tactic')
-                        point_wins.append(win_point)
-                    else:
-                        loss_point = base_point.copy()
-                        loss_point['loss_type'] = p.get('win_reason', '失分') # 對手的得分原因 = 我的失分原因 (+/-)
-                        loss_point['technical_issue'] = p.get('key_technique') # 對手的技術 = 我的問題? 不一定，先這樣映射
-                        point_losses.append(loss_point)
-
-            else:
-                # 舊版結構 (Fallback)
-                point_wins = parsed.get('point_wins', [])
-                point_losses = parsed.get('point_losses', [])
-            
-            # 合併新舊結構的 Strengths/Weaknesses
-            strengths = parsed.get('strengths', parsed.get('player1_analysis', {}).get('strengths', []))
-            weaknesses = parsed.get('weaknesses', parsed.get('player1_analysis', {}).get('weaknesses', []))
-            suggestions = parsed.get('training_suggestions', parsed.get('player1_analysis', {}).get('suggestions', []))
-            summary_section = parsed.get('summary', {})
-            
-            # --- 結束相容性轉換 ---
-            
-            # 生成人類可讀的分析文字
-            raw_analysis = self._generate_readable_analysis(parsed)
-            
-            return {
-                'success': True,
-                'raw_analysis': raw_analysis,
-                'structured_data': parsed,
-                'point_wins': point_wins,
-                'point_losses': point_losses,
-                'points': parsed.get('points', []), # 保留完整 points 列表供新版前端使用
-                'player1_analysis': parsed.get('player1_analysis'),
-                'player2_analysis': parsed.get('player2_analysis'),
-                'match_overview': parsed.get('match_overview', {}),
-                'sections': {
-                    'match_overview': parsed.get('match_overview', {}),
-                    'strengths': strengths,
-                    'weaknesses': weaknesses,
-                    'training_suggestions': suggestions,
-                    'summary': summary_section
-                }
-            }
+            parsed = json.loads(_strip_code_fence(response_text))
+            return self._build_analysis(parsed)
         except json.JSONDecodeError as e:
             print(f"⚠️ JSON 解析失敗，使用原始文字: {e}")
             # 如果無法解析 JSON，回退到原始文字
@@ -637,6 +840,98 @@ class MatchAnalyzer:
                 'sections': self._extract_sections(response_text)
             }
     
+    def _build_analysis(self, parsed: Dict[str, Any]) -> Dict[str, Any]:
+        """由模型回傳的 JSON 建立分析結果"""
+        # --- 相容性轉換 ---
+        # 新版 Prompt 回傳 'points' 列表，需轉換為舊版的 point_wins / point_losses
+        # 這裡假設如果沒有特別指定 player_focus，則第一位選手或者 winner 是 '關注選手' 為 Win
+        
+        point_wins = []
+        point_losses = []
+        
+        if 'points' in parsed:
+            # 新版結構
+            for p in parsed['points']:
+                # 簡易判斷：如果沒有明確指定 player_focus，我們暫時無法精確區分
+                # 但通常前端會傳入 player_focus。
+                # 這裡我們將所有 points 都保留，但在前端顯示時可能需要過濾。
+                # 為相容舊版，直接轉換欄位
+                
+                # 暫時將所有點都放入 wins/losses，這取決於 winner 欄位
+                # 但這裏我們不知道 "Player 1" 是誰，除非我們有 context。
+                # 不過，我們可以直接把 'points' 傳回去，讓前端處理。
+                # 為了舊版相容，我們嘗試轉換：
+                
+                winner = p.get('winner', '')
+                # 假設主要關注的是 player1_analysis 中的 name
+                p1_name = parsed.get('player1_analysis', {}).get('name', '')
+                
+                base_point = {
+                    "id": p.get('id'),
+                    "start_seconds": p.get('start_seconds'),
+                    "end_seconds": p.get('end_seconds'),
+                    "timestamp_display": p.get('timestamp_display'),
+                    "description": p.get('description'),
+                    "serve_time": p.get('serve_time'),
+                    "dead_ball_time": p.get('dead_ball_time'),
+                    "winner": winner
+                }
+                
+                # 判斷是 Win 還是 Loss (相對於 Player 1)
+                # 如果 winner 包含 p1_name (模糊比對)
+                is_p1_win = False
+                if p1_name and p1_name in winner:
+                    is_p1_win = True
+                elif "選手A" in winner: # Default name
+                    is_p1_win = True
+                
+                if is_p1_win:
+                    win_point = base_point.copy()
+                    win_point['win_type'] = p.get('win_reason', '得分')
+                    win_point['key_technique'] = p.get('key_technique')
+                    win_point['tactical_value'] = p.get('tactic')
+                    point_wins.append(win_point)
+                else:
+                    loss_point = base_point.copy()
+                    loss_point['loss_type'] = p.get('win_reason', '失分') # 對手的得分原因 = 我的失分原因 (+/-)
+                    loss_point['technical_issue'] = p.get('key_technique') # 對手的技術 = 我的問題? 不一定，先這樣映射
+                    point_losses.append(loss_point)
+
+        else:
+            # 舊版結構 (Fallback)
+            point_wins = parsed.get('point_wins', [])
+            point_losses = parsed.get('point_losses', [])
+        
+        # 合併新舊結構的 Strengths/Weaknesses
+        strengths = parsed.get('strengths', parsed.get('player1_analysis', {}).get('strengths', []))
+        weaknesses = parsed.get('weaknesses', parsed.get('player1_analysis', {}).get('weaknesses', []))
+        suggestions = parsed.get('training_suggestions', parsed.get('player1_analysis', {}).get('suggestions', []))
+        summary_section = parsed.get('summary', {})
+        
+        # --- 結束相容性轉換 ---
+        
+        # 生成人類可讀的分析文字
+        raw_analysis = self._generate_readable_analysis(parsed)
+        
+        return {
+            'success': True,
+            'raw_analysis': raw_analysis,
+            'structured_data': parsed,
+            'point_wins': point_wins,
+            'point_losses': point_losses,
+            'points': parsed.get('points', []), # 保留完整 points 列表供新版前端使用
+            'player1_analysis': parsed.get('player1_analysis'),
+            'player2_analysis': parsed.get('player2_analysis'),
+            'match_overview': parsed.get('match_overview', {}),
+            'sections': {
+                'match_overview': parsed.get('match_overview', {}),
+                'strengths': strengths,
+                'weaknesses': weaknesses,
+                'training_suggestions': suggestions,
+                'summary': summary_section
+            }
+        }
+    
     def _generate_readable_analysis(self, data: Dict[str, Any]) -> str:
         """從結構化數據生成可讀的分析報告"""
         lines = []
@@ -786,7 +1081,8 @@ class YouTubeMatchAnalyzer:
         player2_focus: str = None,
         description1: str = None,
         description2: str = None,
-        keep_video: bool = False
+        keep_video: bool = False,
+        on_chunk: Callable[[Dict[str, Any]], None] = None
     ) -> Dict[str, Any]:
         """
         分析 YouTube 桌球比賽影片
@@ -798,6 +1094,7 @@ class YouTubeMatchAnalyzer:
             description1: 選手1 描述
             description2: 選手2 描述
             keep_video: 是否保留下載的影片
+            on_chunk: 長影片分段分析時，每段完成的回呼 (見 MatchAnalyzer.analyze_match_chunked)
             
         Returns:
             完整分析結果
@@ -816,7 +1113,11 @@ class YouTubeMatchAnalyzer:
             
             # 2. 分析影片
             print("\n🔍 開始分析比賽...")
-            analysis = self.analyzer.analyze_match(video_path, player_focus, player2_focus, description1, description2)
+            # 長影片切成重疊區段並行分析，短影片整段分析
+            analysis = self.analyzer.analyze_match_chunked(
+                video_path, player_focus, player2_focus, description1, description2,
+                duration=video_info.get('duration') or None, on_chunk=on_chunk
+            )
             
             # 3. 組合結果
             result = {